@@ -219,10 +219,19 @@ def create_agent_filesystem_middleware(
     if context is not None:
 
         def build_context_backend(_runtime):
-            """按可变运行上下文重建文件作用域，读取已同步的 Skill 投影。"""
+            """按可变运行上下文重建文件作用域，读取已同步的 Skill 投影。
+
+            编译后的 graph 会跨 thread / run 复用，优先使用本次运行的 context，构建时的 context 只作兜底。
+            """
+            runtime_context = getattr(_runtime, "context", None)
+            source = (
+                runtime_context
+                if runtime_context is not None and getattr(runtime_context, "thread_id", None)
+                else context
+            )
             return _BackendScope.from_sources(
-                context,
-                readable_skills_source=context,
+                source,
+                readable_skills_source=source,
                 error_context="runtime context",
             ).create_backend()
 
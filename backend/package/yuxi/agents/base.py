@@ -16,6 +16,7 @@ from langgraph.types import Command
 
 from yuxi import config as sys_config
 from yuxi.agents.context import DEFAULT_MAX_EXECUTION_STEPS, BaseContext, resolve_agent_resource_options
+from yuxi.agents.graph_cache import invalidate_agent_graph_cache
 from yuxi.storage.postgres.manager import pg_manager
 from yuxi.utils import logger
 from yuxi.utils.hash_utils import subagent_child_thread_id
@@ -342,6 +343,7 @@ class BaseAgent:
     def reload_graph(self):
         """重置 graph 缓存，强制下次调用 get_graph 时重新构建"""
         self.graph = None
+        invalidate_agent_graph_cache("reload", agent_id=self.id)
         logger.info(f"{self.name} graph 缓存已清空，将在下次调用时重新构建")
 
     @abstractmethod
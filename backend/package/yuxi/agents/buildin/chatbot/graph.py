@@ -4,6 +4,8 @@ from langchain.agents.middleware import ModelRetryMiddleware, TodoListMiddleware
 
 from yuxi.agents import BaseAgent, load_chat_model, resolve_chat_model_spec
 from yuxi.agents.backends import create_agent_filesystem_middleware, sync_agent_context_skills
+from yuxi.agents.graph_cache import build_graph_fingerprint, compiled_graph_cache
+from yuxi.agents.mcp.service import get_mcp_server_config_hashes
 from yuxi.agents.context import (
     DEFAULT_SUMMARY_KEEP_MESSAGES,
     DEFAULT_SUMMARY_L2_TRIGGER_RATIO,
@@ -94,24 +96,35 @@ class ChatbotAgent(BaseAgent):
         super().__init__(**kwargs)
 
     async def get_graph(self, context=None, **kwargs):
-
+        """构建（或从缓存复用）编译后的 graph；thread / run 相关信息由运行时 context 传入。"""
         context = await prepare_agent_runtime_context(
             context or self.context_schema(),
             context_schema=self.context_schema,
         )
         await sync_agent_context_skills(context)
 
-        # 使用 create_agent 创建智能体
         model_spec = resolve_chat_model_spec(context.model)
-        graph = create_agent(
-            model=load_chat_model(fully_specified_name=model_spec),
-            tools=await resolve_configured_runtime_tools(context),
-            system_prompt=build_prompt_with_context(context),
-            middleware=await _build_middlewares(context),
-            state_schema=ChatBotState,
-            checkpointer=await self._get_checkpointer(),
+        system_prompt = build_prompt_with_context(context)
+        fingerprint = build_graph_fingerprint(
+            context,
+            model_spec=model_spec,
+            system_prompt=system_prompt,
+            mcp_config_hashes=await get_mcp_server_config_hashes(list(getattr(context, "mcps", None) or [])),
         )
 
+        async def build_graph():
+            # 使用 create_agent 创建智能体
+            return create_agent(
+                model=load_chat_model(fully_specified_name=model_spec),
+                tools=await resolve_configured_runtime_tools(context),
+                system_prompt=system_prompt,
+                middleware=await _build_middlewares(context),
+                state_schema=ChatBotState,
+                checkpointer=await self._get_checkpointer(),
+            )
+
+        graph = await compiled_graph_cache.get_or_build(f"{self.id}:{fingerprint}", build_graph)
+
         return graph
 
 
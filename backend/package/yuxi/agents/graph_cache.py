@@ -0,0 +1,140 @@
+"""已编译 Agent graph 的进程内缓存。
+
+graph 的结构只取决于有效上下文（模型、工具、MCP 配置、Skill、知识库、子智能体、提示词等），
+与 thread / run 无关。按上下文指纹缓存编译结果，同一配置的后续运行直接复用，跳过模型加载、
+工具与 MCP 解析和中间件实例化。
+
+失效方式：
+- 指纹变化：配置字段、MCP 配置 hash、Skill 元数据、提示词日期等任一变化都会换 key；
+- 显式失效：智能体配置、MCP 服务、Skill 变更时调用 ``invalidate_agent_graph_cache``；
+- TTL：兜底其他进程中发生、本进程收不到通知的变更（如子智能体定义）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import fields, is_dataclass
+from typing import Any
+
+from yuxi.utils import hashstr, logger
+
+AGENT_GRAPH_CACHE_MAX_ENTRIES = max(0, int(os.getenv("AGENT_GRAPH_CACHE_MAX_ENTRIES") or 64))
+AGENT_GRAPH_CACHE_TTL_SECONDS = float(os.getenv("AGENT_GRAPH_CACHE_TTL_SECONDS") or 300)
+
+# 每次运行都不同、且不影响 graph 结构的字段
+_RUN_SCOPED_CONTEXT_FIELDS = frozenset({"thread_id", "run_id", "request_id"})
+# prepare_agent_runtime_context 解析出的运行时资源
+_RESOLVED_CONTEXT_ATTRS = (
+    "_visible_knowledge_bases",
+    "_prompt_skills",
+    "_readable_skills",
+    "_runtime_skill_metadata",
+    "_runtime_skill_dependency_map",
+    "_runtime_skill_sources",
+)
+
+
+def build_graph_fingerprint(context: Any, **extra: Any) -> str:
+    """计算上下文中影响 graph 结构部分的指纹。"""
+    payload: dict[str, Any] = {}
+    if is_dataclass(context):
+        payload.update(
+            {
+                item.name: getattr(context, item.name, None)
+                for item in fields(context)
+                if item.name not in _RUN_SCOPED_CONTEXT_FIELDS
+            }
+        )
+    payload["_resolved"] = {attr: getattr(context, attr, None) for attr in _RESOLVED_CONTEXT_ATTRS}
+    payload["_extra"] = extra
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashstr(encoded, 32)
+
+
+class CompiledGraphCache:
+    """按 key 缓存编译后的 graph：LRU 容量上限 + TTL，同一 key 并发构建只执行一次。"""
+
+    def __init__(
+        self,
+        max_entries: int = AGENT_GRAPH_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = AGENT_GRAPH_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._build_locks: dict[str, asyncio.Lock] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, graph = entry
+        if self.ttl_seconds > 0 and time.monotonic() - created_at > self.ttl_seconds:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return graph
+
+    async def get_or_build(self, key: str, builder: Callable[[], Awaitable[Any]]) -> Any:
+        if self.max_entries <= 0:
+            return await builder()
+
+        graph = self._lookup(key)
+        if graph is not None:
+            self.hits += 1
+            return graph
+
+        lock = self._build_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                graph = self._lookup(key)
+                if graph is not None:
+                    self.hits += 1
+                    return graph
+
+                self.misses += 1
+                generation = self._generation
+                graph = await builder()
+                # 构建期间发生过失效时，结果可能基于旧配置，只返回不入缓存
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic(), graph)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                return graph
+        finally:
+            if not lock.locked() and self._build_locks.get(key) is lock:
+                self._build_locks.pop(key, None)
+
+    def invalidate(self, prefix: str | None = None) -> int:
+        """清除缓存；指定 ``prefix`` 时只清除以其开头的 key。返回清除条数。"""
+        self._generation += 1
+        if prefix is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+        stale_keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in stale_keys:
+            self._entries.pop(key, None)
+        return len(stale_keys)
+
+    def get_stats(self) -> dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+compiled_graph_cache = CompiledGraphCache()
+
+
+def invalidate_agent_graph_cache(reason: str, *, agent_id: str | None = None) -> None:
+    """智能体配置、MCP 服务或 Skill 变更后调用，使后续运行重新构建 graph。"""
+    removed = compiled_graph_cache.invalidate(prefix=f"{agent_id}:" if agent_id else None)
+    if removed:
+        logger.info(f"Agent graph cache invalidated ({reason}): {removed} entries")
@@ -18,6 +18,7 @@ from langchain_mcp_adapters.client import MultiServerMCPClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from yuxi.agents.graph_cache import invalidate_agent_graph_cache
 from yuxi.storage.postgres.models_business import MCPServer
 from yuxi.utils import logger
 
@@ -194,6 +195,20 @@ async def get_enabled_mcp_server_slugs(*, db: AsyncSession | None = None) -> lis
         return await get_enabled_mcp_server_slugs(db=session)
 
 
+def mcp_server_config_hash(server_config: dict[str, Any]) -> str:
+    """MCP 服务配置的短 hash，用作工具缓存与 Agent graph 缓存的版本标识。"""
+    config_payload = json.dumps(server_config, sort_keys=True, ensure_ascii=True, separators=(",", ":"))
+    return hashlib.sha256(config_payload.encode("utf-8")).hexdigest()[:16]
+
+
+async def get_mcp_server_config_hashes(names: list[str]) -> dict[str, str]:
+    """批量获取已启用 MCP 服务的配置 hash；未启用或不存在的服务不出现在结果中。"""
+    if not names:
+        return {}
+    configs = await _load_enabled_mcp_server_configs(names=names)
+    return {slug: mcp_server_config_hash(config) for slug, config in configs.items()}
+
+
 async def get_mcp_tools(
     server_slug: str,
     additional_servers: dict[str, dict[str, Any]] | None = None,
@@ -226,9 +241,7 @@ async def get_mcp_tools(
 
     # 配置 hash 直接基于完整配置生成。只要数据库中的配置发生变化，
     # 本地工具缓存 key 就会变化，从而自然触发重建。
-    config_payload = json.dumps(server_config, sort_keys=True, ensure_ascii=True, separators=(",", ":"))
-    config_hash = hashlib.sha256(config_payload.encode("utf-8")).hexdigest()[:16]
-    cache_key = f"{server_slug}:{config_hash}"
+    cache_key = f"{server_slug}:{mcp_server_config_hash(server_config)}"
 
     all_processed_tools: list[Callable[..., Any]] = []
 
@@ -313,6 +326,7 @@ def clear_mcp_cache() -> None:
     global _mcp_tools_cache, _mcp_tools_stats
     _mcp_tools_cache = {}
     _mcp_tools_stats = {}
+    invalidate_agent_graph_cache("mcp cache cleared")
 
 
 def clear_mcp_server_tools_cache(server_slug: str) -> None:
@@ -323,6 +337,7 @@ def clear_mcp_server_tools_cache(server_slug: str) -> None:
     for stale_key in stale_keys:
         _mcp_tools_cache.pop(stale_key, None)
     _mcp_tools_stats.pop(server_slug, None)
+    invalidate_agent_graph_cache(f"mcp server '{server_slug}' changed")
     logger.info(f"Cleared tools cache for MCP server '{server_slug}'")
 
 
@@ -244,7 +244,7 @@ class YuxiSubAgentMiddleware(AgentMiddleware[Any, ContextT, ResponseT]):
         ) -> str | Command:
             from yuxi.services.agent_run_service import get_agent_run_progress, get_agent_run_result
 
-            parent_runtime, runtime_error = self._require_async_parent_runtime("无法查询子智能体")
+            parent_runtime, runtime_error = self._require_async_parent_runtime("无法查询子智能体", runtime)
             if runtime_error:
                 return runtime_error
             try:
@@ -284,7 +284,7 @@ class YuxiSubAgentMiddleware(AgentMiddleware[Any, ContextT, ResponseT]):
         ) -> str | Command:
             from yuxi.services.agent_run_service import request_cancel_agent_run
 
-            parent_runtime, runtime_error = self._require_async_parent_runtime("无法取消子智能体")
+            parent_runtime, runtime_error = self._require_async_parent_runtime("无法取消子智能体", runtime)
             if runtime_error:
                 return runtime_error
             try:
@@ -317,7 +317,7 @@ class YuxiSubAgentMiddleware(AgentMiddleware[Any, ContextT, ResponseT]):
         ) -> str | Command:
             from yuxi.services.agent_run_service import AgentRunWaitTimeout, await_agent_run_result
 
-            parent_runtime, runtime_error = self._require_async_parent_runtime("无法等待子智能体")
+            parent_runtime, runtime_error = self._require_async_parent_runtime("无法等待子智能体", runtime)
             if runtime_error:
                 return runtime_error
             wait_timed_out = False
@@ -385,21 +385,31 @@ class YuxiSubAgentMiddleware(AgentMiddleware[Any, ContextT, ResponseT]):
             ),
         ]
 
-    def _parent_runtime(self) -> _ParentRuntime:
+    def _resolve_parent_context(self, runtime: ToolRuntime | None = None):
+        """优先使用本次调用的运行时 context；编译后的 graph 会跨 thread / run 复用，构建时的 context 只作兜底。"""
+        context = getattr(runtime, "context", None) if runtime is not None else None
+        if context is not None and getattr(context, "thread_id", None):
+            return context
+        return self.parent_context
+
+    def _parent_runtime(self, runtime: ToolRuntime | None = None) -> _ParentRuntime:
         """从父智能体 context 中抽取子智能体运行所需的最小父运行信息。"""
-        parent_thread_id = str(getattr(self.parent_context, "parent_thread_id", None) or self.parent_context.thread_id)
-        file_thread_id = str(getattr(self.parent_context, "file_thread_id", None) or parent_thread_id)
-        uid = str(getattr(self.parent_context, "uid", "") or "").strip()
-        created_by_run_id = str(getattr(self.parent_context, "run_id", "") or "").strip()
+        parent_context = self._resolve_parent_context(runtime)
+        parent_thread_id = str(getattr(parent_context, "parent_thread_id", None) or parent_context.thread_id)
+        file_thread_id = str(getattr(parent_context, "file_thread_id", None) or parent_thread_id)
+        uid = str(getattr(parent_context, "uid", "") or "").strip()
+        created_by_run_id = str(getattr(parent_context, "run_id", "") or "").strip()
         return _ParentRuntime(
             file_thread_id=file_thread_id,
             uid=uid,
             created_by_run_id=created_by_run_id,
         )
 
-    def _require_async_parent_runtime(self, error_prefix: str) -> tuple[_ParentRuntime, str | None]:
+    def _require_async_parent_runtime(
+        self, error_prefix: str, runtime: ToolRuntime | None = None
+    ) -> tuple[_ParentRuntime, str | None]:
         """校验后台子智能体工具必须依赖的父运行上下文。"""
-        parent_runtime = self._parent_runtime()
+        parent_runtime = self._parent_runtime(runtime)
         if not parent_runtime.uid:
             return parent_runtime, f"{error_prefix}：当前运行时缺少 uid"
         if not parent_runtime.created_by_run_id:
@@ -422,7 +432,7 @@ class YuxiSubAgentMiddleware(AgentMiddleware[Any, ContextT, ResponseT]):
         if not runtime.tool_call_id:
             raise ValueError("Tool call ID is required for subagent invocation")
 
-        parent_runtime, runtime_error = self._require_async_parent_runtime(error_prefix)
+        parent_runtime, runtime_error = self._require_async_parent_runtime(error_prefix, runtime)
         if runtime_error:
             return None, runtime_error
 
@@ -46,10 +46,12 @@ BUILTIN_SKILLS: list[BuiltinSkillSpec] = [
         slug="knowledge-base",
         source_dir=_SKILLS_ROOT / "knowledge-base",
         description="使用 Yuxi 知识库进行检索、打开文档、文档内定位和查看思维导图。",
-        version="2026.06.24",
+        version="2026.10.17",
         tool_dependencies=(
             "list_kbs",
             "query_kb",
+            "query_kb_multi",
+            "query_kbs",
             "find_kb_document",
             "open_kb_document",
             "get_mindmap",
@@ -13,7 +13,9 @@ from yuxi.agents.backends.sandbox.paths import (
 )
 from yuxi.agents.toolkits.registry import tool
 from yuxi.knowledge.schemas import (
+    FederatedSearchInputSchema,
     FindInputSchema,
+    MultiSearchInputSchema,
     OpenInputSchema,
     SearchInputSchema,
 )
@@ -25,10 +27,12 @@ from yuxi.utils import logger
 def get_common_kb_tools() -> list:
     """获取通用知识库工具列表
 
-    返回 7 个通用工具：
+    返回 9 个通用工具：
     - list_kbs: 列出用户可访问的知识库
     - get_mindmap: 获取指定知识库的思维导图
     - query_kb: 在指定知识库中检索
+    - query_kb_multi: 在指定知识库中一次检索多个子问题
+    - query_kbs: 同时检索多个知识库并合并排序结果
     - find_kb_document: 在指定文件内定位关键词或正则模式
     - open_kb_document: 按 file_id 分段打开知识库文档
     - search_file: 搜索知识库中的文件
@@ -38,6 +42,8 @@ def get_common_kb_tools() -> list:
         list_kbs,
         get_mindmap,
         query_kb,
+        query_kb_multi,
+        query_kbs,
         find_kb_document,
         open_kb_document,
         search_file,
@@ -171,6 +177,74 @@ async def query_kb(kb_id: str, query_text: str, file_name: str | None = None, ru
         return f"检索失败: {str(e)}"
 
 
+QueryKBMultiInput = MultiSearchInputSchema
+
+
+@tool(category="knowledge", tags=["知识库"], args_schema=QueryKBMultiInput)
+async def query_kb_multi(
+    kb_id: str, queries: list[str], file_name: str | None = None, runtime: ToolRuntime = None
+) -> Any:
+    """在指定知识库中一次检索多个子问题
+
+    当一个问题需要拆成多个子问题分别检索时使用，比多次调用 query_kb 更快。
+    返回结果按 queries 顺序排列，每项包含对应的 query 与检索结果。
+    """
+    if not kb_id:
+        return "请提供 kb_id"
+    normalized_queries = [str(query).strip() for query in queries or [] if str(query or "").strip()]
+    if not normalized_queries:
+        return "请提供查询内容"
+
+    visible_kbs = await _resolve_visible_knowledge_bases_for_query(runtime)
+    target_kb_id, target_error = _find_query_target(kb_id=kb_id, visible_kbs=visible_kbs)
+    if target_error:
+        return target_error
+
+    try:
+        kwargs = {"file_name": file_name} if file_name else {}
+        outputs = await _get_knowledge_base().retrieve_many(target_kb_id, normalized_queries, **kwargs)
+    except Exception as e:
+        logger.error(f"检索失败: {e}")
+        return f"检索失败: {str(e)}"
+    return {
+        "kb_id": target_kb_id,
+        "queries": [
+            {"query": query, "results": output.get("results", []) if isinstance(output, dict) else output}
+            for query, output in zip(normalized_queries, outputs)
+        ],
+    }
+
+
+QueryKBsInput = FederatedSearchInputSchema
+
+
+@tool(category="knowledge", tags=["知识库"], args_schema=QueryKBsInput)
+async def query_kbs(query_text: str, kb_ids: list[str] | None = None, runtime: ToolRuntime = None) -> Any:
+    """同时检索多个知识库
+
+    不确定答案在哪个知识库时使用。各知识库并发检索，结果合并排序后返回，每条结果带有所属 kb_id；
+    未在时限内返回的知识库会在 kbs 中标记为 timeout。
+    """
+    if not query_text:
+        return "请提供查询内容"
+
+    visible_kbs = await _resolve_visible_knowledge_bases_for_query(runtime)
+    if not visible_kbs:
+        return "无法获取当前会话可访问的知识库"
+    target_kb_ids = []
+    for kb_id in kb_ids or [kb.get("kb_id") for kb in visible_kbs]:
+        target_kb_id, target_error = _find_query_target(kb_id=kb_id, visible_kbs=visible_kbs)
+        if target_error:
+            return target_error
+        target_kb_ids.append(target_kb_id)
+
+    try:
+        return await _get_knowledge_base().federated_retrieve(target_kb_ids, query_text)
+    except Exception as e:
+        logger.error(f"检索失败: {e}")
+        return f"检索失败: {str(e)}"
+
+
 OpenKBDocumentInput = OpenInputSchema
 
 
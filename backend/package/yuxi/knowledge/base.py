@@ -6,6 +6,8 @@ from abc import ABC, abstractmethod
 from typing import Any
 
 from yuxi.knowledge.chunking.ragflow_like.presets import ensure_chunk_defaults_in_additional_params
+from yuxi.knowledge.document_cache import MarkdownDocument, markdown_document_cache
+from yuxi.knowledge.file_claims import RELEASED_CLAIM, claim_fields, start_claim_heartbeat
 from yuxi.knowledge.read_models import KnowledgeBaseConfig
 from yuxi.knowledge.schemas import (
     FindOutputSchema,
@@ -282,7 +284,7 @@ class KnowledgeBase(ABC):
         from yuxi.repositories.knowledge_file_repository import KnowledgeFileRepository
 
         file_repo = KnowledgeFileRepository()
-        claim_data = {"status": FileStatus.PARSING, "error_message": None}
+        claim_data = {"status": FileStatus.PARSING, "error_message": None, **claim_fields()}
         if operator_id:
             claim_data["updated_by"] = operator_id
         claimed_record = await file_repo.update_fields_if_status(
@@ -303,12 +305,13 @@ class KnowledgeBase(ABC):
         file_path = file_meta.get("path")
         if not file_path:
             message = f"File {file_id} has no valid path in metadata"
-            update_data = {"status": FileStatus.ERROR_PARSING, "error_message": message}
+            update_data = {"status": FileStatus.ERROR_PARSING, "error_message": message, **RELEASED_CLAIM}
             if operator_id:
                 update_data["updated_by"] = operator_id
             await file_repo.update_fields(file_id=file_id, kb_id=kb_id, data=update_data)
             raise ValueError(message)
 
+        heartbeat = start_claim_heartbeat(kb_id, file_id)
         try:
             from yuxi.services.ocr_service import parse_document
 
@@ -339,6 +342,7 @@ class KnowledgeBase(ABC):
                 "status": FileStatus.PARSED,
                 "markdown_file": markdown_file_path,
                 "error_message": None,
+                **RELEASED_CLAIM,
             }
             if operator_id:
                 update_data["updated_by"] = operator_id
@@ -359,12 +363,14 @@ class KnowledgeBase(ABC):
             file_meta["updated_at"] = utc_isoformat()
             if operator_id:
                 file_meta["updated_by"] = operator_id
-            update_data = {"status": FileStatus.ERROR_PARSING, "error_message": error_msg}
+            update_data = {"status": FileStatus.ERROR_PARSING, "error_message": error_msg, **RELEASED_CLAIM}
             if operator_id:
                 update_data["updated_by"] = operator_id
             await file_repo.update_fields(file_id=file_id, kb_id=kb_id, data=update_data)
 
             raise
+        finally:
+            heartbeat.cancel()
 
     async def update_file_params(
         self,
@@ -409,7 +415,7 @@ class KnowledgeBase(ABC):
     async def _mark_file_unparsed(self, kb_id: str, file_id: str, operator_id: str | None = None) -> None:
         from yuxi.repositories.knowledge_file_repository import KnowledgeFileRepository
 
-        update_data = {"status": FileStatus.UPLOADED, "markdown_file": None, "error_message": None}
+        update_data = {"status": FileStatus.UPLOADED, "markdown_file": None, "error_message": None, **RELEASED_CLAIM}
         if operator_id:
             update_data["updated_by"] = operator_id
         record = await KnowledgeFileRepository().update_fields(file_id=file_id, kb_id=kb_id, data=update_data)
@@ -452,6 +458,10 @@ class KnowledgeBase(ABC):
         content_bytes = await self._read_minio_bytes(file_path)
         return content_bytes.decode("utf-8")
 
+    async def _load_markdown_document(self, file_id: str, markdown_file: str) -> MarkdownDocument:
+        """读取解析后的 Markdown，按 (file_id, ETag) 命中本地缓存时不再下载全文"""
+        return await markdown_document_cache.get_document(file_id, markdown_file)
+
     async def _get_file_meta(self, kb_id: str, file_id: str) -> dict:
         return await self._load_file_meta(kb_id, file_id)
 
@@ -670,12 +680,14 @@ class KnowledgeBase(ABC):
             "media_type": media_type,
         }
 
-    def _build_open_file_window(self, content: str, *, offset: int = 0, limit: int = 800) -> dict[str, Any]:
-        lines = content.splitlines()
-        total_lines = len(lines)
+    def _build_open_file_window(
+        self, content: str | MarkdownDocument, *, offset: int = 0, limit: int = 800
+    ) -> dict[str, Any]:
+        document = content if isinstance(content, MarkdownDocument) else MarkdownDocument.from_text(content)
+        total_lines = document.total_lines
         start = min(max(int(offset), 0), total_lines)
         window_size = min(max(int(limit), 1), 2000)
-        selected = lines[start : start + window_size]
+        selected = document.lines(start, start + window_size)
         end = start + len(selected)
 
         return {
@@ -732,7 +744,7 @@ class KnowledgeBase(ABC):
 
     @staticmethod
     def _build_find_file_windows(
-        content: str,
+        content: str | MarkdownDocument,
         *,
         patterns: list[str],
         use_regex: bool = False,
@@ -744,7 +756,7 @@ class KnowledgeBase(ABC):
         if not patterns:
             raise ValueError("请提供至少一个 pattern")
 
-        lines = content.splitlines()
+        document = content if isinstance(content, MarkdownDocument) else MarkdownDocument.from_text(content)
         flags = 0 if case_sensitive else re.IGNORECASE
         if use_regex:
             matchers = [re.compile(pattern, flags) for pattern in patterns]
@@ -759,7 +771,10 @@ class KnowledgeBase(ABC):
                 haystack = line if case_sensitive else line.lower()
                 return any(pattern in haystack for pattern in normalized_patterns)
 
-        matched_indexes = [index for index, line in enumerate(lines) if line_matches(line)]
+        # 大小写敏感的关键词可以直接在原始字节上定位候选行。
+        literal_needles = patterns if case_sensitive and not use_regex else None
+        matched_indexes = document.match_line_indexes(line_matches, literal_needles=literal_needles)
+        total_lines = document.total_lines
         windows: list[FindWindowSchema] = []
         covered_until = -1
         normalized_window_size = min(max(int(window_size), 1), 200)
@@ -769,10 +784,10 @@ class KnowledgeBase(ABC):
             if matched_index < covered_until:
                 continue
             start = max(matched_index - half_window, 0)
-            end = min(start + normalized_window_size, len(lines))
+            end = min(start + normalized_window_size, total_lines)
             start = max(end - normalized_window_size, 0)
             matched_lines = [index + 1 for index in matched_indexes if start <= index < end]
-            selected = lines[start:end]
+            selected = document.lines(start, end)
             windows.append(
                 FindWindowSchema(
                     start_line=start + 1 if selected else 0,
@@ -807,8 +822,8 @@ class KnowledgeBase(ABC):
         if not markdown_file:
             raise Exception(f"文件 {file_id} 没有解析后的 Markdown 内容")
 
-        content = await self._read_markdown_from_minio(markdown_file)
-        return self._build_open_file_window(content, offset=offset, limit=limit)
+        document = await self._load_markdown_document(file_id, markdown_file)
+        return self._build_open_file_window(document, offset=offset, limit=limit)
 
     async def find_file_content(
         self,
@@ -832,9 +847,9 @@ class KnowledgeBase(ABC):
         if not markdown_file:
             raise Exception(f"文件 {file_id} 没有解析后的 Markdown 内容")
 
-        content = await self._read_markdown_from_minio(markdown_file)
+        document = await self._load_markdown_document(file_id, markdown_file)
         return self._build_find_file_windows(
-            content,
+            document,
             patterns=patterns,
             use_regex=use_regex,
             case_sensitive=case_sensitive,
@@ -1006,6 +1021,23 @@ class KnowledgeBase(ABC):
         """
         pass
 
+    async def aquery_many(
+        self,
+        kb_id: str,
+        queries: list[str],
+        *,
+        config: KnowledgeBaseConfig,
+        **kwargs,
+    ) -> list[list[dict]]:
+        """
+        批量查询知识库，返回与 queries 一一对应的结果列表。
+
+        默认并发逐条调用 aquery；支持批量检索的实现应覆盖此方法以合并向量化与检索请求。
+        """
+        return list(
+            await asyncio.gather(*(self.aquery(query_text, kb_id, config=config, **kwargs) for query_text in queries))
+        )
+
     @abstractmethod
     def get_query_params_config(self, kb_id: str, **kwargs) -> dict:
         """
@@ -0,0 +1,242 @@
+"""知识库级批量解析 / 入库调度。
+
+按文件状态游标分页拉取待处理文件，解析与入库两个阶段各用一组独立的 worker 并发执行，阶段之间通过有界队列衔接：
+- 解析阶段（文档转换、OCR，偏 CPU）并发上限 KB_BULK_PARSE_WORKERS；
+- 入库阶段（读取 Markdown、分块、embedding、写入向量库，以 I/O 等待为主）并发上限 KB_BULK_INDEX_WORKERS；
+  embedding 请求另受按服务共享的 AIMD 并发窗口与速率上限约束（见 ``yuxi.models.embed_batching``），
+  多个文件同时入库时由它统一限流；
+- 单个文件失败只记录错误并继续，不影响其他文件；
+- 文件状态由 parse_file / index_file 落库，处理中的文件持有定期续约的处理租约（见 ``yuxi.knowledge.file_claims``）。
+  任务开始时只把租约已过期、停在 parsing / indexing 的文件回退到待处理状态，其他进程或任务正在处理的文件不受影响；
+  再次提交任务即按持久化的文件状态续跑，已完成的文件不会重复处理。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from yuxi.utils import logger
+
+if TYPE_CHECKING:
+    from yuxi.knowledge.manager import KnowledgeBaseManager
+    from yuxi.services.task_service import TaskContext
+
+KB_BULK_PARSE_WORKERS = max(1, int(os.getenv("KB_BULK_PARSE_WORKERS") or min(os.cpu_count() or 4, 8)))
+KB_BULK_INDEX_WORKERS = max(1, int(os.getenv("KB_BULK_INDEX_WORKERS") or 8))
+KB_BULK_PROGRESS_INTERVAL_SECONDS = max(0.0, float(os.getenv("KB_BULK_PROGRESS_INTERVAL_SECONDS") or 1.0))
+
+PARSE_STAGE = "parse"
+INDEX_STAGE = "index"
+STAGE_LABELS = {PARSE_STAGE: "解析", INDEX_STAGE: "入库"}
+
+_DONE = object()
+
+
+class KBBulkIndexingScheduler:
+    """单个知识库的批量解析 / 入库任务。
+
+    Args:
+        manager: 知识库管理器，需提供 list_document_file_ids_by_statuses / parse_file / index_file /
+            update_file_params / recover_interrupted_files
+        stages: 依次执行的阶段，如 ("parse",)、("index",) 或 ("parse", "index")
+        statuses: 各入口阶段拉取的文件状态，如 {"parse": ["uploaded"], "index": ["parsed", "error_indexing"]}；
+            处于后一阶段入口状态的文件直接从该阶段开始
+        initial_total: 预估的待处理文件数，仅用于进度估算
+        on_result: 每个文件结束时回调 (stage, item)，失败时 item 为 {"file_id", "status": "failed", "error"}
+    """
+
+    def __init__(
+        self,
+        manager: KnowledgeBaseManager,
+        kb_id: str,
+        *,
+        stages: tuple[str, ...],
+        statuses: dict[str, list[str]],
+        operator_id: str | None = None,
+        params: dict | None = None,
+        initial_total: int = 0,
+        context: TaskContext | None = None,
+        on_result: Callable[[str, dict], None] | None = None,
+        parse_workers: int | None = None,
+        index_workers: int | None = None,
+        page_size: int = 500,
+    ) -> None:
+        if not stages or any(stage not in STAGE_LABELS for stage in stages):
+            raise ValueError(f"Unsupported bulk indexing stages: {stages}")
+        if stages[0] not in (statuses or {}) or any(stage not in stages for stage in statuses):
+            raise ValueError(f"Entry statuses must map to stages {stages}: {statuses}")
+        self.manager = manager
+        self.kb_id = kb_id
+        self.stages = tuple(stages)
+        self.statuses = statuses
+        self.operator_id = operator_id
+        self.params = params or {}
+        self.initial_total = max(int(initial_total or 0), 0)
+        self.context = context
+        self.on_result = on_result
+        self.page_size = page_size
+        self.workers = {
+            PARSE_STAGE: max(int(parse_workers or KB_BULK_PARSE_WORKERS), 1),
+            INDEX_STAGE: max(int(index_workers or KB_BULK_INDEX_WORKERS), 1),
+        }
+
+        self.discovered = 0
+        self.processed = 0
+        self.failed = 0
+        self.recovered = 0
+        self.in_flight = {stage: 0 for stage in self.stages}
+        self.completed = {stage: 0 for stage in self.stages}
+        self._seen: set[str] = set()
+        self._units_total = 0
+        self._units_done = 0
+        self._last_progress = 5.0
+        self._last_report_at = 0.0
+
+    @property
+    def total(self) -> int:
+        return max(self.initial_total, self.discovered)
+
+    async def run(self) -> dict[str, Any]:
+        await self._recover_interrupted_files()
+
+        queues = {stage: asyncio.Queue(maxsize=self.workers[stage] * 2) for stage in self.stages}
+        # 每个阶段队列的上游：入口状态的拉取协程，以及上一阶段（全部 worker 退出后才算结束）
+        feeders = {stage: int(stage in self.statuses) + int(index > 0) for index, stage in enumerate(self.stages)}
+        remaining_workers = dict(self.workers)
+
+        async def close_feeder(stage: str) -> None:
+            feeders[stage] -= 1
+            if feeders[stage] == 0:
+                for _ in range(self.workers[stage]):
+                    await queues[stage].put(_DONE)
+
+        async def produce(stage: str) -> None:
+            await self._produce(stage, queues[stage])
+            await close_feeder(stage)
+
+        async def stage_worker(index: int) -> None:
+            stage = self.stages[index]
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            while (file_id := await queues[stage].get()) is not _DONE:
+                if await self._process(stage, file_id) and next_stage is not None:
+                    await queues[next_stage].put(file_id)
+            remaining_workers[stage] -= 1
+            if next_stage is not None and remaining_workers[stage] == 0:
+                await close_feeder(next_stage)
+
+        tasks = [asyncio.create_task(produce(stage)) for stage in self.stages if stage in self.statuses]
+        for index, stage in enumerate(self.stages):
+            tasks.extend(asyncio.create_task(stage_worker(index)) for _ in range(self.workers[stage]))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        await self._report_progress(force=True)
+        return self.get_summary()
+
+    def get_summary(self) -> dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "recovered": self.recovered,
+            "stages": {stage: self.completed[stage] for stage in self.stages},
+        }
+
+    async def _recover_interrupted_files(self) -> None:
+        try:
+            self.recovered = await self.manager.recover_interrupted_files(self.kb_id)
+        except Exception as e:
+            logger.warning(f"Recover interrupted files failed for {self.kb_id}: {e}")
+
+    async def _produce(self, stage: str, queue: asyncio.Queue) -> None:
+        """按 file_id 游标拉取处于该阶段入口状态的文件；本次任务内已入队的文件不再重复处理。"""
+        after_file_id = None
+        while True:
+            file_ids = await self.manager.list_document_file_ids_by_statuses(
+                self.kb_id,
+                statuses=self.statuses[stage],
+                after_file_id=after_file_id,
+                limit=self.page_size,
+            )
+            if not file_ids:
+                break
+            for file_id in file_ids:
+                await self._raise_if_cancelled()
+                after_file_id = file_id
+                if file_id in self._seen:
+                    continue
+                self._seen.add(file_id)
+                self.discovered += 1
+                self._units_total += len(self.stages) - self.stages.index(stage)
+                await queue.put(file_id)
+
+    async def _process(self, stage: str, file_id: str) -> bool:
+        """执行单个文件的一个阶段，返回是否继续进入下一阶段。"""
+        await self._raise_if_cancelled()
+        self.in_flight[stage] += 1
+        try:
+            if stage == PARSE_STAGE:
+                result = await self.manager.parse_file(self.kb_id, file_id, operator_id=self.operator_id)
+            else:
+                if self.params:
+                    await self.manager.update_file_params(
+                        self.kb_id, file_id, self.params, operator_id=self.operator_id
+                    )
+                result = await self.manager.index_file(
+                    self.kb_id, file_id, operator_id=self.operator_id, params=self.params
+                )
+        except Exception as e:
+            logger.error(f"Bulk {stage} failed for {file_id}: {e}")
+            self.failed += 1
+            self._finish(stage, {"file_id": file_id, "status": "failed", "error": str(e)})
+            await self._report_progress()
+            return False
+        finally:
+            self.in_flight[stage] -= 1
+
+        self.completed[stage] += 1
+        has_next = stage != self.stages[-1] and (result or {}).get("status") == "parsed"
+        if has_next:
+            self._units_done += 1
+        else:
+            self._finish(stage, result)
+        await self._report_progress()
+        return has_next
+
+    def _finish(self, stage: str, item: dict) -> None:
+        """文件在当前阶段结束（已完成最后阶段、无需继续或失败），未执行的后续阶段一并计入进度。"""
+        self.processed += 1
+        self._units_done += len(self.stages) - self.stages.index(stage)
+        if self.on_result is not None:
+            self.on_result(stage, item)
+
+    async def _raise_if_cancelled(self) -> None:
+        if self.context is not None:
+            await self.context.raise_if_cancelled()
+
+    async def _report_progress(self, *, force: bool = False) -> None:
+        if self.context is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_report_at < KB_BULK_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_report_at = now
+        total = self.total
+        units = max(self._units_total, self.initial_total * len(self.stages))
+        progress = 5.0 + (self._units_done / units) * 90.0 if units else 95.0
+        # 待处理总量随拉取逐步确定，进度只增不减
+        self._last_progress = progress = max(self._last_progress, min(progress, 95.0))
+        parts = [f"{STAGE_LABELS[stage]} {self.completed[stage]}" for stage in self.stages]
+        in_flight = sum(self.in_flight.values())
+        message = (
+            f"已处理 {self.processed}/{total} 个文档（{'，'.join(parts)}，失败 {self.failed}，进行中 {in_flight}）"
+        )
+        await self.context.set_progress(progress, message)
@@ -0,0 +1,386 @@
+"""按内容寻址的 Chunk 向量存储。
+
+免责声明、页眉页脚、重复的 FAQ 条目以及上传到多个知识库的同一文件会产生大量内容相同的 chunk，
+入库时先按 (embedding 模型 spec, 规范化文本的 SHA-256) 查找已有向量，只有未命中的 chunk 才调用模型，
+新向量写回存储供后续文件与知识库复用。读取时只复用与模型当前配置维度一致的向量，
+同一 spec 调整维度后旧向量不会混入新集合。
+
+- 后端：PostgreSQL（``chunk_embeddings`` 表）；LITE_MODE 下使用本地 SQLite 文件；
+- 容量：条目数超过上限时按最近使用时间淘汰到上限的 90%；
+- 向量以 float32 存储，与 Milvus FLOAT_VECTOR 的精度一致；
+- 存储不可用时短暂旁路，直接调用模型，不影响入库。
+
+环境变量：
+- ``CHUNK_EMBEDDING_STORE_BACKEND``：``auto``（默认）/ ``postgres`` / ``file`` / ``off``；
+- ``CHUNK_EMBEDDING_STORE_PATH``：file 后端的 SQLite 文件路径；
+- ``CHUNK_EMBEDDING_STORE_MAX_ENTRIES``：条目数上限；
+- ``CHUNK_EMBEDDING_STORE_GC_INTERVAL``：每写入多少条检查一次容量。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections.abc import Awaitable, Callable, Iterator
+from pathlib import Path
+from typing import Any, Protocol
+
+from yuxi.utils.fallback import FailureBypass
+from yuxi.utils.logging_config import logger
+
+CHUNK_EMBEDDING_STORE_BACKEND = (os.getenv("CHUNK_EMBEDDING_STORE_BACKEND") or "auto").strip().lower()
+CHUNK_EMBEDDING_STORE_PATH = os.getenv("CHUNK_EMBEDDING_STORE_PATH", "")
+CHUNK_EMBEDDING_STORE_MAX_ENTRIES = max(1, int(os.getenv("CHUNK_EMBEDDING_STORE_MAX_ENTRIES") or 500_000))
+CHUNK_EMBEDDING_STORE_GC_INTERVAL = max(1, int(os.getenv("CHUNK_EMBEDDING_STORE_GC_INTERVAL") or 10_000))
+CHUNK_EMBEDDING_STORE_GC_LOW_WATERMARK = 0.9
+SQLITE_IN_BATCH_SIZE = 500
+
+EmbedFunction = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+def normalize_chunk_text(text: str) -> str:
+    """统一 Unicode 形式与换行，去掉行尾空白；不折叠行内空白，保留 Markdown 表格等结构。"""
+    normalized = unicodedata.normalize("NFC", str(text or "")).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in normalized.split("\n")).strip()
+
+
+def chunk_text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_chunk_text(text).encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: list[float]) -> bytes:
+    values = array("f", vector)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def decode_vector(data: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tolist()
+
+
+class ChunkEmbeddingBackend(Protocol):
+    def is_ready(self) -> bool: ...
+
+    async def get_many(
+        self, model_spec: str, content_hashes: list[str], dimension: int | None = None
+    ) -> dict[str, bytes]: ...
+
+    async def insert_many(self, model_spec: str, vectors: dict[str, tuple[int, bytes]]) -> None: ...
+
+    async def count(self) -> int: ...
+
+    async def delete_least_recently_used(self, keep: int) -> int: ...
+
+
+class PostgresChunkEmbeddingBackend:
+    """基于 ``chunk_embeddings`` 表，在 API 与 Worker 之间共享。"""
+
+    def __init__(self) -> None:
+        from yuxi.repositories.chunk_embedding_repository import ChunkEmbeddingRepository
+
+        self._repo = ChunkEmbeddingRepository()
+
+    def is_ready(self) -> bool:
+        from yuxi.storage.postgres.manager import pg_manager
+
+        return pg_manager._initialized
+
+    async def get_many(
+        self, model_spec: str, content_hashes: list[str], dimension: int | None = None
+    ) -> dict[str, bytes]:
+        return await self._repo.get_many(model_spec, content_hashes, dimension)
+
+    async def insert_many(self, model_spec: str, vectors: dict[str, tuple[int, bytes]]) -> None:
+        await self._repo.insert_many(model_spec, vectors)
+
+    async def count(self) -> int:
+        return await self._repo.count()
+
+    async def delete_least_recently_used(self, keep: int) -> int:
+        return await self._repo.delete_least_recently_used(keep)
+
+
+class SqliteChunkEmbeddingBackend:
+    """单文件 SQLite 存储，供 LITE_MODE 等没有 PostgreSQL 的部署使用；操作在线程中串行执行。"""
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        self._path = Path(path) if path else None
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            if CHUNK_EMBEDDING_STORE_PATH:
+                self._path = Path(CHUNK_EMBEDDING_STORE_PATH)
+            else:
+                from yuxi import config as sys_config
+
+                self._path = Path(sys_config.save_dir) / "cache" / "chunk_embeddings.sqlite3"
+        return self._path
+
+    def is_ready(self) -> bool:
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+                "model_spec TEXT NOT NULL, content_hash TEXT NOT NULL, dimension INTEGER NOT NULL, "
+                "embedding BLOB NOT NULL, last_used_at REAL NOT NULL, PRIMARY KEY (model_spec, content_hash))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_chunk_embeddings_last_used_at ON chunk_embeddings (last_used_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _iter_batches(items: list[str]) -> Iterator[list[str]]:
+        for index in range(0, len(items), SQLITE_IN_BATCH_SIZE):
+            yield items[index : index + SQLITE_IN_BATCH_SIZE]
+
+    def _get_many(self, model_spec: str, content_hashes: list[str], dimension: int | None) -> dict[str, bytes]:
+        vectors: dict[str, bytes] = {}
+        dimension_filter, dimension_params = ("AND dimension = ? ", [dimension]) if dimension else ("", [])
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            for batch in self._iter_batches(content_hashes):
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    "SELECT content_hash, embedding FROM chunk_embeddings "
+                    f"WHERE model_spec = ? {dimension_filter}AND content_hash IN ({placeholders})",
+                    [model_spec, *dimension_params, *batch],
+                ).fetchall()
+                vectors.update({content_hash: bytes(embedding) for content_hash, embedding in rows})
+            hits = list(vectors)
+            for batch in self._iter_batches(hits):
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(
+                    "UPDATE chunk_embeddings SET last_used_at = ? "
+                    f"WHERE model_spec = ? AND content_hash IN ({placeholders})",
+                    [now, model_spec, *batch],
+                )
+            conn.commit()
+        return vectors
+
+    def _insert_many(self, model_spec: str, vectors: dict[str, tuple[int, bytes]]) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO chunk_embeddings "
+                "(model_spec, content_hash, dimension, embedding, last_used_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (model_spec, content_hash) DO UPDATE SET dimension = excluded.dimension, "
+                "embedding = excluded.embedding, last_used_at = excluded.last_used_at "
+                "WHERE dimension != excluded.dimension",
+                [
+                    (model_spec, content_hash, dimension, embedding, now)
+                    for content_hash, (dimension, embedding) in vectors.items()
+                ],
+            )
+            conn.commit()
+
+    def _count(self) -> int:
+        with self._lock:
+            return int(self._connect().execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0])
+
+    def _delete_least_recently_used(self, keep: int) -> int:
+        with self._lock:
+            conn = self._connect()
+            total = int(conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0])
+            excess = total - max(int(keep), 0)
+            if excess <= 0:
+                return 0
+            cursor = conn.execute(
+                "DELETE FROM chunk_embeddings WHERE rowid IN "
+                "(SELECT rowid FROM chunk_embeddings ORDER BY last_used_at ASC, rowid ASC LIMIT ?)",
+                (excess,),
+            )
+            conn.commit()
+            return int(cursor.rowcount or 0)
+
+    async def get_many(
+        self, model_spec: str, content_hashes: list[str], dimension: int | None = None
+    ) -> dict[str, bytes]:
+        if not content_hashes:
+            return {}
+        return await asyncio.to_thread(self._get_many, model_spec, content_hashes, dimension)
+
+    async def insert_many(self, model_spec: str, vectors: dict[str, tuple[int, bytes]]) -> None:
+        if vectors:
+            await asyncio.to_thread(self._insert_many, model_spec, vectors)
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._count)
+
+    async def delete_least_recently_used(self, keep: int) -> int:
+        return await asyncio.to_thread(self._delete_least_recently_used, keep)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_chunk_embedding_backend(mode: str = CHUNK_EMBEDDING_STORE_BACKEND) -> ChunkEmbeddingBackend | None:
+    """按配置选择后端；auto 模式下 LITE_MODE 使用本地文件，否则使用 PostgreSQL。"""
+    if mode in {"off", "none", "false", "0"}:
+        return None
+    if mode == "auto":
+        mode = "file" if os.environ.get("LITE_MODE", "").lower() in ("true", "1") else "postgres"
+    if mode in {"file", "sqlite"}:
+        return SqliteChunkEmbeddingBackend()
+    return PostgresChunkEmbeddingBackend()
+
+
+class ChunkEmbeddingStore:
+    """入库时复用内容相同 chunk 的向量。"""
+
+    def __init__(
+        self,
+        backend: ChunkEmbeddingBackend | None = None,
+        *,
+        mode: str = CHUNK_EMBEDDING_STORE_BACKEND,
+        max_entries: int = CHUNK_EMBEDDING_STORE_MAX_ENTRIES,
+        gc_interval: int = CHUNK_EMBEDDING_STORE_GC_INTERVAL,
+    ) -> None:
+        self._backend = backend
+        self._backend_resolved = backend is not None
+        self.mode = mode
+        self.max_entries = max(int(max_entries), 1)
+        self.gc_interval = max(int(gc_interval), 1)
+        self._bypass = FailureBypass("Chunk embedding store")
+        self._inserted_since_gc = 0
+        self._gc_lock = asyncio.Lock()
+        self.requested = 0
+        self.deduplicated = 0
+        self.hits = 0
+        self.embedded = 0
+        self.evicted = 0
+
+    def _get_backend(self) -> ChunkEmbeddingBackend | None:
+        if not self._backend_resolved:
+            self._backend = create_chunk_embedding_backend(self.mode)
+            self._backend_resolved = True
+        backend = self._backend
+        # 故障时短暂旁路，避免每个批次都等待存储超时
+        if backend is None or self._bypass.bypassed or not backend.is_ready():
+            return None
+        return backend
+
+    async def get_or_embed_many(
+        self, embedding_model_spec: str, texts: list[str], embed: EmbedFunction, *, dimension: int | None = None
+    ) -> list[list[float]]:
+        """返回 texts 的向量；同批内容相同的 chunk 只嵌入一次，存储中已有的向量直接复用。
+
+        dimension 为模型当前配置的向量维度，给定时只复用该维度的向量。
+        """
+        hashes = [chunk_text_hash(text) for text in texts]
+        unique_texts: dict[str, str] = {}
+        for content_hash, text in zip(hashes, texts, strict=True):
+            unique_texts.setdefault(content_hash, text)
+        self.requested += len(texts)
+        self.deduplicated += len(texts) - len(unique_texts)
+
+        vectors: dict[str, list[float]] = {}
+        backend = self._get_backend()
+        if backend is not None:
+            try:
+                stored = await backend.get_many(embedding_model_spec, list(unique_texts), dimension)
+                for content_hash, data in stored.items():
+                    vector = decode_vector(data)
+                    if not dimension or len(vector) == dimension:
+                        vectors[content_hash] = vector
+            except Exception as exc:  # noqa: BLE001
+                self._bypass.mark_unavailable(exc)
+                backend = None
+        self.hits += len(vectors)
+
+        missing = [content_hash for content_hash in unique_texts if content_hash not in vectors]
+        if missing:
+            embeddings = await embed([unique_texts[content_hash] for content_hash in missing])
+            self.embedded += len(missing)
+            fresh = {
+                content_hash: [float(value) for value in embedding]
+                for content_hash, embedding in zip(missing, embeddings, strict=True)
+            }
+            vectors.update(fresh)
+            if backend is not None:
+                await self._save(backend, embedding_model_spec, fresh)
+
+        return [vectors[content_hash] for content_hash in hashes]
+
+    async def _save(
+        self, backend: ChunkEmbeddingBackend, embedding_model_spec: str, vectors: dict[str, list[float]]
+    ) -> None:
+        try:
+            await backend.insert_many(
+                embedding_model_spec,
+                {content_hash: (len(vector), encode_vector(vector)) for content_hash, vector in vectors.items()},
+            )
+        except Exception as exc:  # noqa: BLE001
+            self._bypass.mark_unavailable(exc)
+            return
+        self._inserted_since_gc += len(vectors)
+        if self._inserted_since_gc >= self.gc_interval:
+            await self.gc()
+
+    async def gc(self) -> int:
+        """条目数超过上限时淘汰最久未使用的向量，返回淘汰数量。"""
+        backend = self._get_backend()
+        if backend is None or self._gc_lock.locked():
+            return 0
+        async with self._gc_lock:
+            self._inserted_since_gc = 0
+            try:
+                if await backend.count() <= self.max_entries:
+                    return 0
+                removed = await backend.delete_least_recently_used(
+                    int(self.max_entries * CHUNK_EMBEDDING_STORE_GC_LOW_WATERMARK)
+                )
+            except Exception as exc:  # noqa: BLE001
+                self._bypass.mark_unavailable(exc)
+                return 0
+        self.evicted += removed
+        logger.info(f"Chunk embedding store evicted {removed} least recently used vectors")
+        return removed
+
+    def get_stats(self) -> dict[str, Any]:
+        reused = self.deduplicated + self.hits
+        return {
+            "requested": self.requested,
+            "deduplicated": self.deduplicated,
+            "hits": self.hits,
+            "embedded": self.embedded,
+            "evicted": self.evicted,
+            "reuse_ratio": reused / self.requested if self.requested else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        self.requested = 0
+        self.deduplicated = 0
+        self.hits = 0
+        self.embedded = 0
+        self.evicted = 0
+
+
+chunk_embedding_store = ChunkEmbeddingStore()
@@ -0,0 +1,324 @@
+"""解析后 Markdown 文档的本地缓存与行索引。
+
+Agent 工具按行窗口翻页或搜索同一文档时，不必每次都从 MinIO 下载全文再重新切行。
+缓存 key 为 (file_id, Markdown 对象 ETag)，文档重新解析后 ETag 变化，自然落到新 key。
+
+- 内存层：LRU 保存较小文档的字节内容与行索引；
+- 磁盘层：保存文档副本与持久化的行偏移索引，按总大小 LRU 淘汰，大文档通过 mmap 读取。
+
+行索引与 ``str.splitlines`` 的切分语义一致，窗口内容与直接切分全文的结果相同。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import mmap
+import os
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+from yuxi.utils import hashstr
+from yuxi.utils.logging_config import logger
+
+DOCUMENT_CACHE_MEMORY_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MEMORY_MAX_BYTES", str(128 * 1024 * 1024)))
+DOCUMENT_CACHE_MEMORY_MAX_DOC_BYTES = int(os.getenv("DOCUMENT_CACHE_MEMORY_MAX_DOC_BYTES", str(8 * 1024 * 1024)))
+DOCUMENT_CACHE_DISK_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "")
+
+_DATA_SUFFIX = ".md"
+_INDEX_SUFFIX = ".lines"
+
+
+def build_line_index(data: bytes) -> tuple[array, array]:
+    """返回每行内容的起止字节偏移（不含换行符），行划分与 ``str.splitlines`` 一致。"""
+    starts = array("Q")
+    ends = array("Q")
+    position = 0
+    for line in data.decode("utf-8").splitlines(keepends=True):
+        line_bytes = len(line.encode("utf-8"))
+        content_bytes = len(line.splitlines()[0].encode("utf-8"))
+        starts.append(position)
+        ends.append(position + content_bytes)
+        position += line_bytes
+    return starts, ends
+
+
+class MarkdownDocument:
+    """按行读取的只读文档视图，底层可以是内存字节或 mmap。"""
+
+    def __init__(self, buffer: bytes | mmap.mmap, starts: array, ends: array):
+        self._buffer = buffer
+        self._starts = starts
+        self._ends = ends
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> MarkdownDocument:
+        starts, ends = build_line_index(data)
+        return cls(data, starts, ends)
+
+    @classmethod
+    def from_text(cls, text: str) -> MarkdownDocument:
+        return cls.from_bytes(text.encode("utf-8"))
+
+    @classmethod
+    def open_mapped(cls, data_path: Path, index_path: Path) -> MarkdownDocument:
+        index = array("Q")
+        with open(index_path, "rb") as index_file:
+            index.frombytes(index_file.read())
+        line_count = len(index) // 2
+        starts, ends = index[:line_count], index[line_count:]
+        with open(data_path, "rb") as data_file:
+            if os.fstat(data_file.fileno()).st_size == 0:
+                return cls(b"", starts, ends)
+            # mmap 创建后与文件描述符无关，关闭文件不影响读取；被淘汰后由 GC 回收映射。
+            buffer = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, starts, ends)
+
+    @property
+    def total_lines(self) -> int:
+        return len(self._starts)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def is_mapped(self) -> bool:
+        return isinstance(self._buffer, mmap.mmap)
+
+    @property
+    def memory_bytes(self) -> int:
+        """内存层计费大小：mmap 文档只计索引，内容由页缓存承担。"""
+        index_bytes = (len(self._starts) + len(self._ends)) * self._starts.itemsize
+        return index_bytes if self.is_mapped else self.nbytes + index_bytes
+
+    def line(self, index: int) -> str:
+        return self._buffer[self._starts[index] : self._ends[index]].decode("utf-8")
+
+    def lines(self, start: int, stop: int) -> list[str]:
+        start = max(start, 0)
+        stop = min(stop, self.total_lines)
+        return [self.line(index) for index in range(start, stop)]
+
+    def iter_lines(self) -> Iterator[tuple[int, str]]:
+        for index in range(self.total_lines):
+            yield index, self.line(index)
+
+    def _candidate_lines(self, needles: list[bytes]) -> list[int]:
+        candidates: set[int] = set()
+        for needle in needles:
+            position = self._buffer.find(needle)
+            while position != -1:
+                line_index = bisect_right(self._starts, position) - 1
+                candidates.add(line_index)
+                if line_index + 1 >= self.total_lines:
+                    break
+                position = self._buffer.find(needle, self._starts[line_index + 1])
+        return sorted(candidates)
+
+    def match_line_indexes(
+        self,
+        line_matches: Callable[[str], bool],
+        *,
+        literal_needles: list[str] | None = None,
+    ) -> list[int]:
+        """返回满足 ``line_matches`` 的行号（0 起）。
+
+        提供大小写敏感的字面量时，先在原始字节上定位候选行，再逐行校验。
+        """
+        if literal_needles:
+            candidates = self._candidate_lines([needle.encode("utf-8") for needle in literal_needles])
+            return [index for index in candidates if line_matches(self.line(index))]
+        return [index for index, line in self.iter_lines() if line_matches(line)]
+
+
+class MarkdownDocumentCache:
+    """按 (file_id, ETag) 缓存 MinIO 中的解析结果。"""
+
+    def __init__(
+        self,
+        *,
+        cache_dir: str | Path | None = None,
+        memory_max_bytes: int = DOCUMENT_CACHE_MEMORY_MAX_BYTES,
+        memory_max_doc_bytes: int = DOCUMENT_CACHE_MEMORY_MAX_DOC_BYTES,
+        disk_max_bytes: int = DOCUMENT_CACHE_DISK_MAX_BYTES,
+        minio_client_factory: Callable[[], Any] | None = None,
+    ) -> None:
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+        self.memory_max_bytes = max(int(memory_max_bytes), 0)
+        self.memory_max_doc_bytes = max(int(memory_max_doc_bytes), 0)
+        self.disk_max_bytes = max(int(disk_max_bytes), 0)
+        self._minio_client_factory = minio_client_factory
+        self._memory: OrderedDict[tuple[str, str], MarkdownDocument] = OrderedDict()
+        self._memory_bytes = 0
+        self._load_locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.downloads = 0
+
+    @property
+    def cache_dir(self) -> Path:
+        if self._cache_dir is None:
+            if DOCUMENT_CACHE_DIR:
+                self._cache_dir = Path(DOCUMENT_CACHE_DIR)
+            else:
+                from yuxi import config as sys_config
+
+                self._cache_dir = Path(sys_config.save_dir) / "cache" / "markdown"
+        return self._cache_dir
+
+    def _minio_client(self):
+        if self._minio_client_factory is not None:
+            return self._minio_client_factory()
+        from yuxi.storage.minio import get_minio_client
+
+        return get_minio_client()
+
+    def _paths(self, key: tuple[str, str]) -> tuple[Path, Path]:
+        stem = hashstr(f"{key[0]}:{key[1]}", 32)
+        return self.cache_dir / f"{stem}{_DATA_SUFFIX}", self.cache_dir / f"{stem}{_INDEX_SUFFIX}"
+
+    def _get_memory(self, key: tuple[str, str]) -> MarkdownDocument | None:
+        document = self._memory.get(key)
+        if document is not None:
+            self._memory.move_to_end(key)
+        return document
+
+    def _set_memory(self, key: tuple[str, str], document: MarkdownDocument) -> None:
+        size = document.memory_bytes
+        if size > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.memory_bytes
+        self._memory[key] = document
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.memory_bytes
+
+    def _open_disk(self, key: tuple[str, str]) -> MarkdownDocument | None:
+        data_path, index_path = self._paths(key)
+        if not data_path.exists() or not index_path.exists():
+            return None
+        try:
+            document = MarkdownDocument.open_mapped(data_path, index_path)
+            now = time.time()
+            os.utime(data_path, (now, now))
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Markdown document cache entry unreadable, reloading: {data_path}: {exc}")
+            return None
+        return document
+
+    def _write_disk(self, key: tuple[str, str], data: bytes, starts: array, ends: array) -> bool:
+        data_path, index_path = self._paths(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # 先写索引再写内容：读取方以内容文件存在为准，避免读到缺索引的条目。
+            for path, payload in ((index_path, (starts + ends).tobytes()), (data_path, data)):
+                with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as tmp_file:
+                    tmp_file.write(payload)
+                os.replace(tmp_file.name, path)
+            self._evict_disk()
+            return True
+        except OSError as exc:
+            logger.warning(f"Failed to persist markdown document cache entry: {exc}")
+            return False
+
+    def _evict_disk(self) -> None:
+        entries = []
+        total = 0
+        for data_path in self.cache_dir.glob(f"*{_DATA_SUFFIX}"):
+            index_path = data_path.with_suffix(_INDEX_SUFFIX)
+            try:
+                size = data_path.stat().st_size + (index_path.stat().st_size if index_path.exists() else 0)
+                entries.append((data_path.stat().st_mtime, data_path, index_path, size))
+            except FileNotFoundError:
+                continue
+            total += size
+        for _, data_path, index_path, size in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            data_path.unlink(missing_ok=True)
+            index_path.unlink(missing_ok=True)
+            total -= size
+
+    async def _download(self, bucket_name: str, object_name: str) -> tuple[bytes, str | None]:
+        self.downloads += 1
+        return await self._minio_client().adownload_file_with_etag(bucket_name, object_name)
+
+    async def get_document(self, file_id: str, markdown_file: str) -> MarkdownDocument:
+        """返回解析结果的文档视图；命中缓存时只发起一次对象元数据请求。"""
+        from yuxi.knowledge.utils.kb_utils import is_minio_url, parse_minio_url
+
+        if not markdown_file or not is_minio_url(markdown_file):
+            raise ValueError(f"Invalid MinIO path format: {markdown_file}")
+        bucket_name, object_name = parse_minio_url(markdown_file)
+
+        etag = await self._minio_client().aget_object_etag(bucket_name, object_name)
+        if etag is None:
+            # 对象不存在时交给下载路径抛出存储层异常，保持原有错误语义。
+            data, _ = await self._download(bucket_name, object_name)
+            return await asyncio.to_thread(MarkdownDocument.from_bytes, data)
+
+        key = (file_id, etag)
+        document = self._get_memory(key)
+        if document is not None:
+            self.memory_hits += 1
+            return document
+
+        lock = self._load_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                document = self._get_memory(key)
+                if document is not None:
+                    self.memory_hits += 1
+                    return document
+                document = await asyncio.to_thread(self._open_disk, key)
+                if document is not None:
+                    self.disk_hits += 1
+                    self._set_memory(key, document)
+                    return document
+                loaded_key, document = await self._load(key, bucket_name, object_name)
+                self._set_memory(loaded_key, document)
+                return document
+        finally:
+            if not lock.locked() and self._load_locks.get(key) is lock:
+                self._load_locks.pop(key, None)
+
+    async def _load(
+        self, key: tuple[str, str], bucket_name: str, object_name: str
+    ) -> tuple[tuple[str, str], MarkdownDocument]:
+        data, downloaded_etag = await self._download(bucket_name, object_name)
+        if downloaded_etag and downloaded_etag != key[1]:
+            # 元数据请求与下载之间对象被覆盖，按实际内容的 ETag 落盘。
+            key = (key[0], downloaded_etag)
+        starts, ends = await asyncio.to_thread(build_line_index, data)
+        persisted = await asyncio.to_thread(self._write_disk, key, data, starts, ends)
+        if persisted and len(data) > self.memory_max_doc_bytes:
+            document = await asyncio.to_thread(self._open_disk, key)
+            if document is not None:
+                return key, document
+        return key, MarkdownDocument(data, starts, ends)
+
+    def clear_memory(self) -> None:
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "downloads": self.downloads,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+markdown_document_cache = MarkdownDocumentCache()
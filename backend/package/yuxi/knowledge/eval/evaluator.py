@@ -1,6 +1,7 @@
-from collections.abc import Callable
+from collections.abc import Awaitable, Callable
 from typing import Any
 
+from yuxi.knowledge.eval.executor import EvaluationStageLimits, RetrievalBatcher, StageRateLimiter, limit_stage
 from yuxi.knowledge.eval.metrics import EvaluationMetricsCalculator
 from yuxi.knowledge.runtime import knowledge_base as kb_manager
 from yuxi.utils import logger
@@ -38,6 +39,7 @@ async def generate_answer_if_needed(
     retrieved_chunks: list[dict[str, Any]],
     retrieval_config: dict[str, Any],
     select_model_fn: Callable[..., Any],
+    llm_limiter: StageRateLimiter | None = None,
 ) -> str:
     if generated_answer:
         return generated_answer
@@ -47,7 +49,8 @@ async def generate_answer_if_needed(
     logger.debug(f"使用 LLM {retrieval_config.get('answer_llm')} 生成答案...")
     try:
         llm = select_model_fn(model_spec=retrieval_config["answer_llm"])
-        response = await llm.call(build_answer_prompt(query, retrieved_chunks), stream=False)
+        async with limit_stage(llm_limiter):
+            response = await llm.call(build_answer_prompt(query, retrieved_chunks), stream=False)
         generated_answer = response.content if response else ""
         logger.debug(f"LLM 生成的答案长度: {len(generated_answer) if generated_answer else 0}")
         return generated_answer
@@ -56,6 +59,14 @@ async def generate_answer_if_needed(
         return ""
 
 
+def create_retrieval_batcher(kb_id: str, retrieval_config: dict[str, Any], *, max_batch: int) -> RetrievalBatcher:
+    """并发题目的检索合并为一次 aquery_many，共享向量化与 Milvus 检索往返。"""
+    return RetrievalBatcher(
+        lambda queries: kb_manager.aquery_many(kb_id, queries, **retrieval_config),
+        max_batch=max_batch,
+    )
+
+
 async def evaluate_question(
     *,
     kb_id: str,
@@ -65,9 +76,17 @@ async def evaluate_question(
     has_gold_answers: bool,
     judge_llm: Any | None,
     select_model_fn: Callable[..., Any],
+    stage_limits: EvaluationStageLimits | None = None,
+    retrieve: Callable[[str], Awaitable[Any]] | None = None,
 ) -> dict[str, Any]:
+    """评估单个题目；传入 ``retrieve`` 时由其执行检索（如批量检索合并器）。"""
+    stage_limits = stage_limits or EvaluationStageLimits()
     query = question_data["query"]
-    query_result = await kb_manager.aquery(query, kb_id, **retrieval_config)
+    async with limit_stage(stage_limits.retrieval):
+        if retrieve is not None:
+            query_result = await retrieve(query)
+        else:
+            query_result = await kb_manager.aquery(query, kb_id, **retrieval_config)
     generated_answer, retrieved_chunks = normalize_query_result(query_result)
     generated_answer = await generate_answer_if_needed(
         query=query,
@@ -75,6 +94,7 @@ async def evaluate_question(
         retrieved_chunks=retrieved_chunks,
         retrieval_config=retrieval_config,
         select_model_fn=select_model_fn,
+        llm_limiter=stage_limits.llm,
     )
 
     current_metrics = {}
@@ -89,12 +109,13 @@ async def evaluate_question(
 
     if has_gold_answers and question_data.get("gold_answer"):
         if judge_llm:
-            answer_scores = await EvaluationMetricsCalculator.calculate_answer_metrics(
-                query=query,
-                generated_answer=generated_answer,
-                gold_answer=question_data["gold_answer"],
-                judge_llm=judge_llm,
-            )
+            async with limit_stage(stage_limits.llm):
+                answer_scores = await EvaluationMetricsCalculator.calculate_answer_metrics(
+                    query=query,
+                    generated_answer=generated_answer,
+                    gold_answer=question_data["gold_answer"],
+                    judge_llm=judge_llm,
+                )
             current_metrics.update(answer_scores)
         else:
             logger.warning("需要计算答案指标但未配置 Judge LLM")
@@ -0,0 +1,213 @@
+"""评估运行的并发执行器。
+
+多个 worker 并发评估题目，检索与 LLM（生成答案、评判）分别限速；结果按数量或时间
+攒批后交给回调统一落库，回调即进度检查点，中断后可跳过已落库的题目继续评估。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any
+
+from yuxi.utils import logger
+
+DEFAULT_EVALUATION_CONCURRENCY = max(1, int(os.getenv("EVAL_RUN_CONCURRENCY") or 4))
+MAX_EVALUATION_CONCURRENCY = 32
+# 每秒请求数，0 表示不限速
+EVAL_RETRIEVAL_RATE_LIMIT = float(os.getenv("EVAL_RETRIEVAL_RATE_LIMIT") or 0)
+EVAL_LLM_RATE_LIMIT = float(os.getenv("EVAL_LLM_RATE_LIMIT") or 0)
+EVAL_RESULT_BATCH_SIZE = max(1, int(os.getenv("EVAL_RESULT_BATCH_SIZE") or 5))
+EVAL_CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("EVAL_CHECKPOINT_INTERVAL_SECONDS") or 10)
+# 并发 worker 的检索请求在等待窗口内合并为一次批量检索
+EVAL_RETRIEVAL_BATCH_SIZE = max(1, int(os.getenv("EVAL_RETRIEVAL_BATCH_SIZE") or 16))
+EVAL_RETRIEVAL_BATCH_WAIT_SECONDS = float(os.getenv("EVAL_RETRIEVAL_BATCH_WAIT_MS") or 20) / 1000
+
+
+def normalize_evaluation_concurrency(value: Any) -> int:
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_EVALUATION_CONCURRENCY
+    return min(max(concurrency, 1), MAX_EVALUATION_CONCURRENCY)
+
+
+class StageRateLimiter:
+    """令牌桶限速器，按到达顺序放行；``rate_per_second`` 不大于 0 时不限速。"""
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self.rate = float(rate_per_second)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._tokens = 1.0
+                self._updated_at = time.monotonic()
+            self._tokens -= 1
+
+    async def __aenter__(self) -> StageRateLimiter:
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+
+@dataclass
+class EvaluationStageLimits:
+    """单次评估运行共享的分阶段限速器。"""
+
+    retrieval: StageRateLimiter | None = None
+    llm: StageRateLimiter | None = None
+
+    @classmethod
+    def from_env(cls) -> EvaluationStageLimits:
+        return cls(
+            retrieval=StageRateLimiter(EVAL_RETRIEVAL_RATE_LIMIT) if EVAL_RETRIEVAL_RATE_LIMIT > 0 else None,
+            llm=StageRateLimiter(EVAL_LLM_RATE_LIMIT) if EVAL_LLM_RATE_LIMIT > 0 else None,
+        )
+
+
+class RetrievalBatcher:
+    """将并发的单条检索请求合并为批量检索。
+
+    请求攒满 ``max_batch`` 条或等待超过 ``max_wait_seconds`` 时整批交给 ``run_batch``，
+    ``run_batch`` 需返回与输入一一对应的结果；批量失败或结果数量不符时该批所有请求抛出同一异常。
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[str]], Awaitable[list[Any]]],
+        *,
+        max_batch: int = EVAL_RETRIEVAL_BATCH_SIZE,
+        max_wait_seconds: float = EVAL_RETRIEVAL_BATCH_WAIT_SECONDS,
+    ):
+        self._run_batch = run_batch
+        self.max_batch = max(int(max_batch), 1)
+        self.max_wait_seconds = max(float(max_wait_seconds), 0.0)
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+
+    async def aquery(self, query: str) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_seconds, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        error: Exception | None = None
+        try:
+            results = await self._run_batch([query for query, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch retrieval returned {len(results)} results for {len(batch)} queries")
+            for (_, future), result in zip(batch, results, strict=True):
+                # 等待方已取消时丢弃结果
+                if not future.done():
+                    future.set_result(result)
+        except Exception as exc:
+            error = exc
+        finally:
+            # 批量失败或批任务被取消时，仍在等待的请求不能一直挂起
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.cancel()
+
+
+def limit_stage(limiter: StageRateLimiter | None):
+    """返回可用于 ``async with`` 的限速上下文；未配置时为空操作。"""
+    return limiter if limiter is not None else nullcontext()
+
+
+async def run_concurrent_evaluation[ItemT, ResultT](
+    items: Iterable[ItemT],
+    evaluate: Callable[[ItemT], Awaitable[ResultT]],
+    *,
+    on_batch: Callable[[list[tuple[ItemT, ResultT]]], Awaitable[None]],
+    concurrency: int = DEFAULT_EVALUATION_CONCURRENCY,
+    batch_size: int | None = None,
+    flush_interval_seconds: float | None = None,
+    cancel_cb: Callable[[], Awaitable[None]] | None = None,
+) -> None:
+    """并发评估 ``items``，攒满 ``batch_size`` 条或距上次落库超过间隔时调用 ``on_batch``。
+
+    ``on_batch`` 串行调用；任一题目失败或任务被取消时，其余 worker 停止，
+    已完成但未落库的结果仍会尽力落库，便于之后恢复。
+    """
+    batch_size = batch_size or EVAL_RESULT_BATCH_SIZE
+    flush_interval_seconds = (
+        EVAL_CHECKPOINT_INTERVAL_SECONDS if flush_interval_seconds is None else flush_interval_seconds
+    )
+    iterator = iter(items)
+    buffer: list[tuple[ItemT, ResultT]] = []
+    flush_lock = asyncio.Lock()
+    last_flush_at = time.monotonic()
+
+    async def flush(force: bool = False) -> None:
+        nonlocal last_flush_at
+        async with flush_lock:
+            if not buffer:
+                return
+            if not force and len(buffer) < batch_size and time.monotonic() - last_flush_at < flush_interval_seconds:
+                return
+            batch = buffer.copy()
+            await on_batch(batch)
+            # 落库成功后再移出缓冲区；等待期间其他 worker 只会在末尾追加
+            del buffer[: len(batch)]
+            last_flush_at = time.monotonic()
+
+    async def worker() -> None:
+        for item in iterator:
+            if cancel_cb is not None:
+                await cancel_cb()
+            result = await evaluate(item)
+            buffer.append((item, result))
+            await flush()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(int(concurrency), 1))]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        try:
+            await flush(force=True)
+        except Exception:
+            logger.exception("保存评估检查点失败")
+        raise
+    await flush(force=True)
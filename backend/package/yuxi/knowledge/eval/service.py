@@ -10,7 +10,13 @@ from yuxi.knowledge.eval.benchmark_generation import (
     iter_generated_benchmark_items,
     normalize_generation_concurrency_count,
 )
-from yuxi.knowledge.eval.evaluator import aggregate_metrics, evaluate_question
+from yuxi.knowledge.eval.evaluator import aggregate_metrics, create_retrieval_batcher, evaluate_question
+from yuxi.knowledge.eval.executor import (
+    EVAL_RETRIEVAL_BATCH_SIZE,
+    EvaluationStageLimits,
+    normalize_evaluation_concurrency,
+    run_concurrent_evaluation,
+)
 from yuxi.knowledge.runtime import knowledge_base as kb_manager
 from yuxi.models import select_model
 from yuxi.repositories.evaluation_repository import EvaluationRepository
@@ -565,6 +571,7 @@ class EvaluationService:
         name: str | None = None,
         model_config: dict[str, Any] = None,
         created_by: str = "system",
+        concurrency: int | None = None,
     ) -> str:
         try:
             run_id = f"run_{uuid.uuid4().hex[:8]}"
@@ -617,6 +624,7 @@ class EvaluationService:
                     "dataset_id": dataset_id,
                     "retrieval_config": retrieval_config,
                     "created_by": created_by,
+                    "concurrency": normalize_evaluation_concurrency(concurrency),
                 },
                 coroutine=self._run_evaluation_task,
             )
@@ -625,6 +633,44 @@ class EvaluationService:
             logger.error(f"启动评估失败: {e}")
             raise
 
+    @staticmethod
+    def _split_run_item_metrics(metrics: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+        """将逐题 metrics 拆回检索指标（recall@k 等）与答案评判指标。"""
+        retrieval_scores = {key: value for key, value in metrics.items() if "@" in key}
+        answer_scores = {key: metrics[key] for key in ("score", "reasoning") if key in metrics}
+        return retrieval_scores, answer_scores
+
+    async def resume_evaluation(
+        self, kb_id: str, run_id: str, created_by: str, concurrency: int | None = None
+    ) -> dict[str, Any]:
+        row = await self.eval_repo.get_run(run_id)
+        if row is None or row.kb_id != kb_id:
+            raise ValueError("Run not found")
+        if row.status == "completed":
+            raise ValueError("评估已完成，无需恢复")
+
+        run_name = self._run_name_from_row(row)
+        task, created = await tasker.enqueue_unique_by_payload(
+            name=f"RAG评估({run_name})",
+            task_type="rag_evaluation",
+            payload={
+                "run_id": run_id,
+                "name": run_name,
+                "kb_id": kb_id,
+                "dataset_id": row.dataset_id,
+                "retrieval_config": row.retrieval_config or {},
+                "created_by": created_by,
+                "concurrency": normalize_evaluation_concurrency(concurrency),
+            },
+            coroutine=self._run_evaluation_task,
+            payload_match={"run_id": run_id},
+            statuses={"pending", "running"},
+        )
+        if not created:
+            return {"run_id": run_id, "task_id": task.id, "message": "已有进行中的评估任务"}
+        await self.eval_repo.update_run(run_id, {"status": "running", "metrics": {}, "completed_at": None})
+        return {"run_id": run_id, "task_id": task.id, "message": "评估任务已恢复"}
+
     async def _run_evaluation_task(self, context: TaskContext):
         try:
             payload = context.payload
@@ -652,9 +698,22 @@ class EvaluationService:
                     except Exception as e:
                         logger.error(f"Failed to load judge LLM: {e}")
 
-            all_retrieval_metrics = []
-            all_answer_metrics = []
             total_items = len(dataset_items)
+            retrieval_metrics_by_index: dict[int, dict[str, Any]] = {}
+            answer_metrics_by_index: dict[int, dict[str, Any]] = {}
+
+            def collect_metrics(index: int, item, retrieval_scores: dict, answer_scores: dict) -> None:
+                if dataset_row.has_gold_chunks and item.gold_chunk_ids:
+                    retrieval_metrics_by_index[index] = retrieval_scores
+                if dataset_row.has_gold_answers and item.gold_answer and judge_llm:
+                    answer_metrics_by_index[index] = answer_scores
+
+            def current_metrics(include_overall_score: bool = False):
+                return aggregate_metrics(
+                    [retrieval_metrics_by_index[index] for index in sorted(retrieval_metrics_by_index)],
+                    [answer_metrics_by_index[index] for index in sorted(answer_metrics_by_index)],
+                    include_overall_score=include_overall_score,
+                )
 
             async def update_run_db(status=None, completed=None, metrics=None, final_score=None):
                 data = {}
@@ -671,48 +730,74 @@ class EvaluationService:
                 if data:
                     await self.eval_repo.update_run(run_id, data)
 
-            for index, item in enumerate(dataset_items):
-                await context.raise_if_cancelled()
-                progress = 10 + (index / total_items) * 80
-                await context.set_progress(progress, f"评估 {index + 1}/{total_items}")
+            # 检查点：已落库的逐题结果直接复用，只评估剩余题目
+            completed_indexes: set[int] = set()
+            for index, metrics in await self.eval_repo.list_run_item_metrics(run_id):
+                if 0 <= index < total_items:
+                    completed_indexes.add(index)
+                    retrieval_scores, answer_scores = self._split_run_item_metrics(metrics)
+                    collect_metrics(index, dataset_items[index], retrieval_scores, answer_scores)
+            if completed_indexes:
+                logger.info(f"评估 {run_id} 从检查点恢复: 已完成 {len(completed_indexes)}/{total_items}")
+
+            stage_limits = EvaluationStageLimits.from_env()
+            concurrency = normalize_evaluation_concurrency(payload.get("concurrency"))
+            pending = [(index, item) for index, item in enumerate(dataset_items) if index not in completed_indexes]
+            await context.set_progress(
+                10 + len(completed_indexes) / total_items * 80, f"评估 {len(completed_indexes)}/{total_items}"
+            )
 
-                question_data = {
-                    "query": item.query_text,
-                    "gold_chunk_ids": item.gold_chunk_ids or [],
-                    "gold_answer": item.gold_answer,
-                }
-                question_result = await evaluate_question(
+            retrieval_batcher = create_retrieval_batcher(
+                kb_id, retrieval_config, max_batch=min(concurrency, EVAL_RETRIEVAL_BATCH_SIZE)
+            )
+
+            async def evaluate(entry):
+                _, item = entry
+                return await evaluate_question(
                     kb_id=kb_id,
-                    question_data=question_data,
+                    question_data={
+                        "query": item.query_text,
+                        "gold_chunk_ids": item.gold_chunk_ids or [],
+                        "gold_answer": item.gold_answer,
+                    },
                     retrieval_config=retrieval_config,
                     has_gold_chunks=dataset_row.has_gold_chunks,
                     has_gold_answers=dataset_row.has_gold_answers,
                     judge_llm=judge_llm,
                     select_model_fn=select_model,
+                    stage_limits=stage_limits,
+                    retrieve=retrieval_batcher.aquery,
                 )
 
-                if dataset_row.has_gold_chunks and question_data.get("gold_chunk_ids"):
-                    all_retrieval_metrics.append(question_result["retrieval_scores"])
-                if dataset_row.has_gold_answers and question_data.get("gold_answer") and judge_llm:
-                    all_answer_metrics.append(question_result["answer_scores"])
-
-                await self.eval_repo.upsert_run_item(
-                    run_id=run_id,
-                    item_index=index,
-                    data={"dataset_item_id": item.item_id, **question_result["detail"]},
+            async def save_checkpoint(batch) -> None:
+                await self.eval_repo.upsert_run_items(
+                    run_id,
+                    [
+                        (index, {"dataset_item_id": item.item_id, **question_result["detail"]})
+                        for (index, item), question_result in batch
+                    ],
                 )
-
-                if (index + 1) % 5 == 0 or (index + 1) == total_items:
-                    current_metrics, _ = aggregate_metrics(all_retrieval_metrics, all_answer_metrics)
-                    await context.set_result(
-                        {"current_metrics": current_metrics, "completed_items": index + 1, "total_items": total_items}
-                    )
-                    await update_run_db(completed=index + 1)
+                for (index, item), question_result in batch:
+                    completed_indexes.add(index)
+                    collect_metrics(index, item, question_result["retrieval_scores"], question_result["answer_scores"])
+                completed = len(completed_indexes)
+                metrics, _ = current_metrics()
+                await context.set_result(
+                    {"current_metrics": metrics, "completed_items": completed, "total_items": total_items}
+                )
+                await update_run_db(completed=completed)
+                await context.set_progress(10 + completed / total_items * 80, f"评估 {completed}/{total_items}")
+
+            await run_concurrent_evaluation(
+                pending,
+                evaluate,
+                on_batch=save_checkpoint,
+                concurrency=concurrency,
+                cancel_cb=context.raise_if_cancelled,
+            )
 
             await context.set_progress(95, "计算最终指标")
-            overall_metrics, overall_score = aggregate_metrics(
-                all_retrieval_metrics, all_answer_metrics, include_overall_score=True
-            )
+            overall_metrics, overall_score = current_metrics(include_overall_score=True)
             await update_run_db(
                 status="completed",
                 completed=total_items,
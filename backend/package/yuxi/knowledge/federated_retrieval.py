@@ -0,0 +1,128 @@
+"""跨知识库联邦检索。
+
+智能体启用多个知识库时，对各知识库的检索并发发起：进程内所有联邦检索共享一个并发预算（由知识库管理器持有），
+限制同时在途的知识库检索数量，
+单次请求有截止时间，超时未返回的知识库被取消并在结果中标记为部分结果。
+各知识库的结果列表按 RRF（Reciprocal Rank Fusion）合并，可选再以一次跨知识库重排序精排。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import nullcontext
+from typing import Any
+
+from yuxi.utils import logger
+
+FEDERATED_RETRIEVAL_CONCURRENCY = max(1, int(os.getenv("FEDERATED_RETRIEVAL_CONCURRENCY") or 8))
+FEDERATED_RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("FEDERATED_RETRIEVAL_TIMEOUT_SECONDS") or 10)
+FEDERATED_RRF_K = 60.0
+
+RetrieveFunction = Callable[[str], Awaitable[Any]]
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: dict[str, list[dict[str, Any]]],
+    *,
+    rrf_k: float = FEDERATED_RRF_K,
+    limit: int | None = None,
+) -> list[dict[str, Any]]:
+    """按 RRF 合并各知识库的检索结果，结果项需为 ``build_search_output`` 的统一结构。"""
+    fused: dict[tuple[str, str], dict[str, Any]] = {}
+    for kb_id, results in ranked_lists.items():
+        for rank, result in enumerate(results, start=1):
+            key = (str(result.get("kb_id") or kb_id), str(result.get("id") or rank))
+            existing = fused.get(key)
+            if existing is None:
+                existing = {**result, "fusion_score": 0.0}
+                fused[key] = existing
+            existing["fusion_score"] += 1.0 / (rrf_k + rank)
+
+    merged = sorted(fused.values(), key=lambda item: item["fusion_score"], reverse=True)
+    return merged[:limit] if limit is not None else merged
+
+
+async def fan_out_retrieval(
+    kb_ids: list[str],
+    retrieve: RetrieveFunction,
+    *,
+    budget: asyncio.Semaphore | None = None,
+    max_concurrency: int | None = None,
+    timeout: float = FEDERATED_RETRIEVAL_TIMEOUT_SECONDS,
+) -> tuple[dict[str, list[dict[str, Any]]], dict[str, dict[str, Any]]]:
+    """并发检索多个知识库，返回 (各知识库结果, 各知识库状态)。
+
+    ``budget`` 为跨请求共享的全局并发预算，``max_concurrency`` 可再限制本次请求的并发数。
+    截止时间到达时仍未完成的知识库（包括仍在等待并发预算的）被取消，状态记为 ``timeout``；
+    单个知识库失败只影响自身，状态记为 ``error``。
+    """
+    request_limit = asyncio.Semaphore(max(int(max_concurrency), 1)) if max_concurrency else None
+    started_at = time.perf_counter()
+    statuses: dict[str, dict[str, Any]] = {kb_id: {"status": "timeout"} for kb_id in kb_ids}
+
+    async def run(kb_id: str) -> list[dict[str, Any]]:
+        # 先占本次请求的名额再排队全局预算，避免等待中的请求占用全局名额
+        async with request_limit or nullcontext(), budget or nullcontext():
+            kb_started_at = time.perf_counter()
+            output = await retrieve(kb_id)
+            statuses[kb_id]["elapsed_ms"] = round((time.perf_counter() - kb_started_at) * 1000, 3)
+        return output.get("results", []) if isinstance(output, dict) else []
+
+    if not kb_ids:
+        return {}, statuses
+    tasks = {asyncio.create_task(run(kb_id)): kb_id for kb_id in kb_ids}
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=max(float(timeout), 0.0))
+    finally:
+        # 截止时间到达或调用方被取消时，未完成的检索一并取消
+        unfinished = [task for task in tasks if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    results: dict[str, list[dict[str, Any]]] = {}
+    for task in done:
+        kb_id = tasks[task]
+        exc = task.exception()
+        if exc is not None:
+            logger.warning(f"Federated retrieval failed for {kb_id}: {exc}")
+            statuses[kb_id].update(status="error", error=str(exc))
+            continue
+        results[kb_id] = task.result()
+        statuses[kb_id].update(status="ok", count=len(results[kb_id]))
+
+    for task in pending:
+        kb_id = tasks[task]
+        statuses[kb_id]["elapsed_ms"] = round((time.perf_counter() - started_at) * 1000, 3)
+        logger.warning(f"Federated retrieval for {kb_id} exceeded {timeout}s deadline, cancelled")
+
+    # 保持调用方给定的知识库顺序，RRF 对同分项的排序稳定
+    return {kb_id: results[kb_id] for kb_id in kb_ids if kb_id in results}, statuses
+
+
+async def rerank_fused_results(
+    query_text: str, results: list[dict[str, Any]], reranker_model: str
+) -> list[dict[str, Any]]:
+    """对合并后的结果做一次跨知识库重排序；重排序失败时保持 RRF 顺序。"""
+    if not results:
+        return results
+    try:
+        from yuxi.models.rerank import get_shared_reranker
+
+        reranker = get_shared_reranker(reranker_model)
+        scores = await reranker.acompute_score(
+            [query_text, [result.get("content", "") for result in results]],
+            normalize=True,
+            chunk_ids=[f"{result.get('kb_id')}:{result.get('id')}" for result in results],
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(f"Cross-KB reranking failed: {exc}, keeping fused order")
+        return results
+
+    for result, score in zip(results, scores):
+        result["rerank_score"] = float(score)
+    return sorted(results, key=lambda item: item.get("rerank_score", 0.0), reverse=True)
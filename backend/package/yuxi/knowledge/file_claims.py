@@ -0,0 +1,53 @@
+"""文件解析 / 入库的处理租约。
+
+parse_file / index_file 认领文件（进入 parsing / indexing）时写入 claimed_by 与 claim_expires_at，
+处理期间由心跳任务定期续约，结束时清除。只有租约过期仍停在中间状态的文件才视为中断，
+可被任一调度器回退到待处理状态；多个进程、多个批量任务同时运行时不会回退彼此正在处理的文件。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import uuid
+from datetime import timedelta
+from typing import Any
+
+from yuxi.utils import logger
+from yuxi.utils.datetime_utils import utc_now_naive
+
+FILE_CLAIM_LEASE_SECONDS = max(1, int(os.getenv("KB_FILE_CLAIM_LEASE_SECONDS") or 300))
+FILE_CLAIM_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# 处理结束时与最终状态一起写入
+RELEASED_CLAIM = {"claimed_by": None, "claim_expires_at": None}
+
+
+def claim_fields() -> dict[str, Any]:
+    """认领文件时与中间状态一起写入的租约字段。"""
+    return {
+        "claimed_by": FILE_CLAIM_OWNER,
+        "claim_expires_at": utc_now_naive() + timedelta(seconds=FILE_CLAIM_LEASE_SECONDS),
+    }
+
+
+async def _heartbeat(kb_id: str, file_id: str) -> None:
+    from yuxi.repositories.knowledge_file_repository import KnowledgeFileRepository
+
+    file_repo = KnowledgeFileRepository()
+    while True:
+        await asyncio.sleep(FILE_CLAIM_LEASE_SECONDS / 3)
+        try:
+            renewed = await file_repo.renew_claim(kb_id=kb_id, file_id=file_id, **claim_fields())
+        except Exception as e:
+            logger.warning(f"Renew claim of {file_id} failed: {e}")
+            continue
+        if not renewed:
+            logger.warning(f"Claim of {file_id} is no longer held by {FILE_CLAIM_OWNER}")
+            return
+
+
+def start_claim_heartbeat(kb_id: str, file_id: str) -> asyncio.Task:
+    """为已认领的文件启动续约任务，处理结束后需 cancel。"""
+    return asyncio.create_task(_heartbeat(kb_id, file_id))
@@ -91,60 +91,63 @@ def build_graph_payload(normalized_result: dict[str, Any]) -> dict[str, Any]:
 
 
 # ─── Cypher 模板 ────────────────────────────────────────────────
-# 将大段 Cypher 字符串集中管理，提升 write_chunk_graph 的可读性。
+# 将大段 Cypher 字符串集中管理，写入按批次 UNWIND，一个事务覆盖一批 chunk。
 
 
-def cypher_merge_chunk(db_label: str) -> str:
-    """MERGE Chunk 节点并写入元数据。"""
+def cypher_merge_chunks(db_label: str) -> str:
+    """批量 MERGE Chunk 节点并写入元数据。"""
     return f"""
-    MERGE (c:Chunk:MilvusKB:`{db_label}` {{chunk_id: $chunk_id}})
-    SET c.file_id = $file_id,
+    UNWIND $rows AS row
+    MERGE (c:Chunk:MilvusKB:`{db_label}` {{chunk_id: row.chunk_id}})
+    SET c.file_id = row.file_id,
         c.kb_id = $kb_id,
-        c.chunk_index = $chunk_index,
-        c.content_preview = $content_preview,
-        c.start_char_pos = $start_char_pos,
-        c.end_char_pos = $end_char_pos
+        c.chunk_index = row.chunk_index,
+        c.content_preview = row.content_preview,
+        c.start_char_pos = row.start_char_pos,
+        c.end_char_pos = row.end_char_pos
     """
 
 
-def cypher_merge_entity_mention(db_label: str) -> str:
-    """MERGE Entity 节点并创建 Chunk → Entity 的 MENTIONS 关系。"""
+def cypher_merge_entity_mentions(db_label: str) -> str:
+    """批量 MERGE Entity 节点并创建 Chunk → Entity 的 MENTIONS 关系。"""
     return f"""
-    MATCH (c:Chunk:MilvusKB:`{db_label}` {{chunk_id: $chunk_id}})
+    UNWIND $rows AS row
+    MATCH (c:Chunk:MilvusKB:`{db_label}` {{chunk_id: row.chunk_id}})
     MERGE (e:Entity:MilvusKB:`{db_label}` {{
         kb_id: $kb_id,
-        normalized_name: $normalized_name,
-        label: $entity_label
+        normalized_name: row.normalized_name,
+        label: row.entity_label
     }})
-    SET e.entity_id = $entity_id,
-        e.name = $name,
-        e.attributes = $attributes
-    MERGE (c)-[m:MENTIONS {{chunk_id: $chunk_id, file_id: $file_id, kb_id: $kb_id}}]->(e)
+    SET e.entity_id = row.entity_id,
+        e.name = row.name,
+        e.attributes = row.attributes
+    MERGE (c)-[m:MENTIONS {{chunk_id: row.chunk_id, file_id: row.file_id, kb_id: $kb_id}}]->(e)
     """
 
 
-def cypher_merge_relation(db_label: str) -> str:
-    """MERGE 两个 Entity 之间的 RELATION 边。"""
+def cypher_merge_relations(db_label: str) -> str:
+    """批量 MERGE 两个 Entity 之间的 RELATION 边。"""
     return f"""
+    UNWIND $rows AS row
     MATCH (source:Entity:MilvusKB:`{db_label}` {{
         kb_id: $kb_id,
-        normalized_name: $source_name,
-        label: $source_label
+        normalized_name: row.source_name,
+        label: row.source_label
     }})
     MATCH (target:Entity:MilvusKB:`{db_label}` {{
         kb_id: $kb_id,
-        normalized_name: $target_name,
-        label: $target_label
+        normalized_name: row.target_name,
+        label: row.target_label
     }})
     MERGE (source)-[r:RELATION {{
         kb_id: $kb_id,
-        chunk_id: $chunk_id,
-        source_name: $source_name,
-        target_name: $target_name,
-        type: $relation_type
+        chunk_id: row.chunk_id,
+        source_name: row.source_name,
+        target_name: row.target_name,
+        type: row.relation_type
     }}]->(target)
-    SET r.triple_id = $triple_id,
-        r.text = $text,
-        r.file_id = $file_id,
-        r.extractor_type = $extractor_type
+    SET r.triple_id = row.triple_id,
+        r.text = row.text,
+        r.file_id = row.file_id,
+        r.extractor_type = row.extractor_type
     """
@@ -2,21 +2,27 @@ from __future__ import annotations
 
 import asyncio
 import json
+import os
 import time
 import weakref
 from typing import Any
 
+import numpy as np
+
 from yuxi.knowledge.graphs.extractors import GraphExtractor, GraphExtractorFactory, normalize_extraction_result
 from yuxi.knowledge.graphs.graph_utils import (
     build_graph_payload,
     compute_entity_id,
     compute_triple_id,
-    cypher_merge_chunk,
-    cypher_merge_entity_mention,
-    cypher_merge_relation,
+    cypher_merge_chunks,
+    cypher_merge_entity_mentions,
+    cypher_merge_relations,
     normalize_entity_name,
 )
 from yuxi.knowledge.graphs.milvus_graph_vector_store import MilvusGraphVectorStore
+from yuxi.knowledge.graphs.ppr import build_adjacency, personalized_pagerank
+from yuxi.knowledge.graphs.write_batching import EntityLockStripes, collect_write_batch
+from yuxi.knowledge.retrieval_cache import bump_kb_content_version
 from yuxi.repositories.knowledge_base_repository import KnowledgeBaseRepository
 from yuxi.repositories.knowledge_chunk_repository import KnowledgeChunkRepository
 from yuxi.repositories.knowledge_graph_repository import KnowledgeGraphRepository
@@ -43,6 +49,12 @@ GRAPH_VECTOR_BATCH_SIZE = 100
 GRAPH_VECTOR_LEASE_SECONDS = 300
 GRAPH_VECTOR_FLUSH_INTERVAL_SECONDS = 0.2
 GRAPH_EXTRACTION_MAX_ATTEMPTS = 3
+# 写入阶段按数量或等待时间聚合批次，每批一个 Neo4j 事务和一次 PG 批量 upsert；
+# 多个写入协程并行提交，涉及相同实体的批次由实体分段锁串行化。
+GRAPH_WRITE_BATCH_SIZE = int(os.getenv("GRAPH_WRITE_BATCH_SIZE", "32"))
+GRAPH_WRITE_BATCH_MAX_WAIT_SECONDS = float(os.getenv("GRAPH_WRITE_BATCH_MAX_WAIT_SECONDS", "0.5"))
+GRAPH_WRITE_WORKER_COUNT = int(os.getenv("GRAPH_WRITE_WORKER_COUNT", "2"))
+GRAPH_WRITE_LOCK_STRIPES = 64
 GRAPH_EXTRACTION_RETRY_DELAYS_SECONDS = (2.0, 10.0)
 _neo4j_query_offload_semaphore_refs: dict[
     int,
@@ -228,11 +240,20 @@ class MilvusGraphService:
         return {"kb_id": kb_id, "samples": samples}
 
     async def build_pending_chunks(self, kb_id: str, *, context=None) -> dict[str, Any]:
+        try:
+            return await self._build_pending_chunks(kb_id, context=context)
+        finally:
+            # 图谱写入会改变图谱检索结果，中途失败时已写入的部分同样生效
+            await bump_kb_content_version(kb_id)
+
+    async def _build_pending_chunks(self, kb_id: str, *, context=None) -> dict[str, Any]:
         kb = await self._get_milvus_kb(kb_id)
         config = self._get_locked_config(kb.additional_params or {})
         extractor_options = self._runtime_extractor_options(config)
         extractor = GraphExtractorFactory.create(config["extractor_type"], extractor_options)
         worker_count = self._get_worker_count(config)
+        write_worker_count = max(GRAPH_WRITE_WORKER_COUNT, 1)
+        write_batch_size = max(GRAPH_WRITE_BATCH_SIZE, 1)
         total_pending = await self.chunk_repo.count_graph_pending_by_kb_id(kb_id)
         initially_indexed = await self.chunk_repo.count_graph_indexed_by_kb_id(kb_id)
         processed = 0
@@ -243,7 +264,11 @@ class MilvusGraphService:
         active_extractions = 0
         fetch_size = max(GRAPH_BUILD_FETCH_MIN_SIZE, min(worker_count * 2, GRAPH_BUILD_FETCH_MAX_SIZE))
         extraction_queue: asyncio.Queue[Any | None] = asyncio.Queue(maxsize=max(worker_count * 2, 1))
-        write_queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=max(worker_count * 2, 1))
+        write_queue: asyncio.Queue[tuple[Any, dict[str, Any]] | None] = asyncio.Queue(
+            maxsize=max(worker_count * 2, write_batch_size)
+        )
+        batch_queue: asyncio.Queue[list[tuple[Any, dict[str, Any]]] | None] = asyncio.Queue(maxsize=write_worker_count)
+        entity_locks = EntityLockStripes(GRAPH_WRITE_LOCK_STRIPES)
         reporter_stop = asyncio.Event()
         structure_done = asyncio.Event()
         vector_wakeup = asyncio.Event()
@@ -251,7 +276,8 @@ class MilvusGraphService:
 
         logger.info(
             f"图谱构建开始 kb_id={kb_id} pending={total_pending} "
-            f"extraction_concurrency={worker_count} fetch_size={fetch_size}"
+            f"extraction_concurrency={worker_count} fetch_size={fetch_size} "
+            f"write_workers={write_worker_count} write_batch_size={write_batch_size}"
         )
 
         async def put_queue_item(queue: asyncio.Queue, item) -> None:
@@ -276,8 +302,8 @@ class MilvusGraphService:
                     active_extractions += 1
                     extraction_started_at = time.monotonic()
                     try:
-                        await self._get_chunk_extraction_result(kb_id, chunk, extractor)
-                        await put_queue_item(write_queue, chunk.chunk_id)
+                        extraction_result = await self._get_chunk_extraction_result(kb_id, chunk, extractor)
+                        await put_queue_item(write_queue, (chunk, extraction_result))
                     except Exception as exc:
                         extraction_failed += 1
                         logger.error(
@@ -293,51 +319,92 @@ class MilvusGraphService:
                 finally:
                     extraction_queue.task_done()
 
-        async def write_worker() -> None:
+        async def batch_collector() -> None:
+            while True:
+                batch, finished = await collect_write_batch(
+                    write_queue,
+                    max_size=write_batch_size,
+                    max_wait_seconds=GRAPH_WRITE_BATCH_MAX_WAIT_SECONDS,
+                )
+                if batch:
+                    await put_queue_item(batch_queue, batch)
+                if finished:
+                    for _ in range(write_worker_count):
+                        await put_queue_item(batch_queue, None)
+                    return
+
+        async def write_prepared_batch(prepared_graphs: list[dict[str, Any]]) -> None:
+            entity_ids = {entity["entity_id"] for prepared in prepared_graphs for entity in prepared["entities"]}
+            async with entity_locks.hold(entity_ids):
+                await asyncio.to_thread(self.write_chunk_graph_batch, kb_id, prepared_graphs)
+                await self.graph_repo.upsert_chunk_graphs(
+                    kb_id=kb_id,
+                    chunk_graphs=[
+                        {
+                            "file_id": prepared["file_id"],
+                            "chunk_id": prepared["chunk_id"],
+                            "entities": prepared["entities"],
+                            "triples": prepared["triples"],
+                        }
+                        for prepared in prepared_graphs
+                    ],
+                )
+            await self.chunk_repo.mark_graph_structure_indexed_batch(
+                {
+                    prepared["chunk_id"]: [entity["entity_id"] for entity in prepared["entities"]]
+                    for prepared in prepared_graphs
+                }
+            )
+
+        async def write_worker(worker_index: int) -> None:
             nonlocal processed, write_failed, write_completed
             while True:
-                chunk_id = await write_queue.get()
+                batch = await batch_queue.get()
                 try:
-                    if chunk_id is None:
+                    if batch is None:
                         return
                     if context is not None:
                         await context.raise_if_cancelled()
-                    chunk = await self.chunk_repo.get_by_chunk_id(chunk_id)
-                    if chunk is None:
-                        raise ValueError(f"图谱写入找不到 chunk: {chunk_id}")
-                    extraction_result = await self._get_chunk_extraction_result(kb_id, chunk, extractor)
                     write_started_at = time.monotonic()
-                    entities, triples = await asyncio.to_thread(
-                        self.write_chunk_graph,
-                        kb_id,
-                        chunk,
-                        extraction_result,
-                    )
-                    await self.graph_repo.upsert_chunk_graph(
-                        kb_id=kb_id,
-                        file_id=chunk.file_id,
-                        chunk_id=chunk.chunk_id,
-                        entities=entities,
-                        triples=triples,
-                    )
-                    await self.chunk_repo.mark_graph_structure_indexed(
-                        chunk.chunk_id,
-                        ent_ids=[entity["entity_id"] for entity in entities],
-                    )
-                    vector_wakeup.set()
-                    processed += 1
+                    prepared_graphs = []
+                    for chunk, extraction_result in batch:
+                        try:
+                            prepared_graphs.append(self.prepare_chunk_graph(kb_id, chunk, extraction_result))
+                        except Exception as exc:
+                            write_failed += 1
+                            write_completed += 1
+                            logger.error(f"Chunk 图谱写入失败 kb_id={kb_id} chunk_id={chunk.chunk_id}: {exc}")
+                    if not prepared_graphs:
+                        continue
+                    try:
+                        await write_prepared_batch(prepared_graphs)
+                        succeeded = prepared_graphs
+                    except Exception as exc:
+                        # 批次失败时逐个重试，把失败隔离到具体 chunk；Neo4j/PG 写入均为幂等 MERGE/upsert。
+                        logger.warning(
+                            f"图谱批量写入失败，改为逐个写入 kb_id={kb_id} size={len(prepared_graphs)}: {exc}"
+                        )
+                        succeeded = []
+                        for prepared in prepared_graphs:
+                            try:
+                                await write_prepared_batch([prepared])
+                                succeeded.append(prepared)
+                            except Exception as item_exc:
+                                write_failed += 1
+                                logger.error(
+                                    f"Chunk 图谱写入失败 kb_id={kb_id} chunk_id={prepared['chunk_id']}: {item_exc}"
+                                )
+                    processed += len(succeeded)
+                    write_completed += len(prepared_graphs)
+                    if succeeded:
+                        vector_wakeup.set()
                     logger.debug(
-                        f"Chunk 图谱写入结束 kb_id={kb_id} chunk_id={chunk.chunk_id} "
-                        f"entities={len(entities)} triples={len(triples)} "
+                        f"图谱批次写入结束 kb_id={kb_id} worker={worker_index} chunks={len(prepared_graphs)} "
+                        f"failed={len(prepared_graphs) - len(succeeded)} "
                         f"duration={time.monotonic() - write_started_at:.2f}s"
                     )
-                except Exception as exc:
-                    write_failed += 1
-                    logger.error(f"Chunk 图谱写入失败 kb_id={kb_id} chunk_id={chunk_id}: {exc}")
                 finally:
-                    if chunk_id is not None:
-                        write_completed += 1
-                    write_queue.task_done()
+                    batch_queue.task_done()
 
         async def index_vector_batch(record_type: str) -> int:
             lock_token, records = await self.graph_repo.claim_vector_records(
@@ -438,7 +505,11 @@ class MilvusGraphService:
             asyncio.create_task(extraction_worker(index + 1), name=f"graph-extractor-{index + 1}")
             for index in range(worker_count)
         ]
-        writer_task = asyncio.create_task(write_worker(), name="graph-writer")
+        collector_task = asyncio.create_task(batch_collector(), name="graph-write-batcher")
+        writer_tasks = [
+            asyncio.create_task(write_worker(index + 1), name=f"graph-writer-{index + 1}")
+            for index in range(write_worker_count)
+        ]
         vector_task = asyncio.create_task(vector_worker(), name="graph-vector-indexer")
         reporter_task = asyncio.create_task(report_progress(), name="graph-progress-reporter")
 
@@ -462,7 +533,8 @@ class MilvusGraphService:
                         vector_wakeup.set()
                     elif chunk.extraction_result:
                         extraction_completed += 1
-                        await put_queue_item(write_queue, chunk.chunk_id)
+                        extraction_result = await self._get_chunk_extraction_result(kb_id, chunk, extractor)
+                        await put_queue_item(write_queue, (chunk, extraction_result))
                     else:
                         await put_queue_item(extraction_queue, chunk)
 
@@ -470,14 +542,16 @@ class MilvusGraphService:
                 await put_queue_item(extraction_queue, None)
             await asyncio.gather(*extraction_workers)
             await put_queue_item(write_queue, None)
-            await writer_task
+            await collector_task
+            await asyncio.gather(*writer_tasks)
             structure_done.set()
             vector_wakeup.set()
             await vector_task
         except BaseException:
-            for task in [*extraction_workers, writer_task, vector_task]:
+            background_tasks = [*extraction_workers, collector_task, *writer_tasks, vector_task]
+            for task in background_tasks:
                 task.cancel()
-            await asyncio.gather(*extraction_workers, writer_task, vector_task, return_exceptions=True)
+            await asyncio.gather(*background_tasks, return_exceptions=True)
             raise
         finally:
             reporter_stop.set()
@@ -558,91 +632,108 @@ class MilvusGraphService:
 
         raise RuntimeError(f"Chunk 图谱抽取未返回结果: {chunk.chunk_id}")
 
-    def write_chunk_graph(
-        self,
-        kb_id: str,
-        chunk,
-        normalized_result: dict[str, Any],
-    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
-        """将单个 chunk 的抽取结果写入 Neo4j。"""
-        label = safe_neo4j_label(kb_id)
+    def prepare_chunk_graph(self, kb_id: str, chunk, normalized_result: dict[str, Any]) -> dict[str, Any]:
+        """把单个 chunk 的抽取结果转换为 PG 记录与 Neo4j UNWIND 行。"""
         graph_payload = build_graph_payload(normalized_result)
         relation_extractor_type = graph_payload["metadata"].get("extractor_type", "unknown")
         entities = graph_payload["entities"]
         relations = graph_payload["relations"]
-        entity_by_id = {entity["id"]: entity for entity in entities}
         entity_records = self._build_entity_records(kb_id, entities)
         entity_record_by_local_id = {
             entity["id"]: record for entity, record in zip(entities, entity_records, strict=True)
         }
         triple_records = self._build_triple_records(kb_id, relations, entity_record_by_local_id, graph_payload)
-        content_preview = (chunk.content or "")[:300]
-
-        # 预构建 Cypher 模板（同一 chunk 内复用）
-        merge_chunk_cypher = cypher_merge_chunk(label)
-        merge_entity_cypher = cypher_merge_entity_mention(label)
-        merge_relation_cypher = cypher_merge_relation(label)
 
-        def query(tx):
-            # 1. MERGE Chunk 节点
-            tx.run(
-                merge_chunk_cypher,
-                chunk_id=chunk.chunk_id,
-                file_id=chunk.file_id,
-                kb_id=kb_id,
-                chunk_index=chunk.chunk_index,
-                content_preview=content_preview,
-                start_char_pos=chunk.start_char_pos,
-                end_char_pos=chunk.end_char_pos,
+        mention_rows = [
+            {
+                "chunk_id": chunk.chunk_id,
+                "file_id": chunk.file_id,
+                "entity_id": entity_record_by_local_id[entity["id"]]["entity_id"],
+                "normalized_name": normalize_entity_name(entity["text"]),
+                "entity_label": entity.get("label") or "Entity",
+                "name": entity["text"],
+                "attributes": json.dumps(entity.get("attributes") or [], ensure_ascii=False),
+            }
+            for entity in entities
+        ]
+        relation_rows = []
+        for relation in relations:
+            source_record = entity_record_by_local_id[relation["source"]]
+            target_record = entity_record_by_local_id[relation["target"]]
+            relation_type = relation.get("label") or "RELATED_TO"
+            relation_rows.append(
+                {
+                    "chunk_id": chunk.chunk_id,
+                    "file_id": chunk.file_id,
+                    "source_name": source_record["normalized_name"],
+                    "source_label": source_record["label"],
+                    "target_name": target_record["normalized_name"],
+                    "target_label": target_record["label"],
+                    "relation_type": relation_type,
+                    "triple_id": compute_triple_id(
+                        kb_id,
+                        source_record["normalized_name"],
+                        source_record["label"],
+                        relation_type,
+                        target_record["normalized_name"],
+                        target_record["label"],
+                    ),
+                    "text": relation["text"],
+                    "extractor_type": relation_extractor_type,
+                }
             )
+        return {
+            "chunk_id": chunk.chunk_id,
+            "file_id": chunk.file_id,
+            "chunk_row": {
+                "chunk_id": chunk.chunk_id,
+                "file_id": chunk.file_id,
+                "chunk_index": chunk.chunk_index,
+                "content_preview": (chunk.content or "")[:300],
+                "start_char_pos": chunk.start_char_pos,
+                "end_char_pos": chunk.end_char_pos,
+            },
+            "mention_rows": mention_rows,
+            "relation_rows": relation_rows,
+            "entities": entity_records,
+            "triples": triple_records,
+        }
 
-            # 2. MERGE Entity 节点 + Chunk→Entity (MENTIONS)
-            for entity in entities:
-                entity_record = entity_record_by_local_id[entity["id"]]
-                tx.run(
-                    merge_entity_cypher,
-                    chunk_id=chunk.chunk_id,
-                    file_id=chunk.file_id,
-                    kb_id=kb_id,
-                    entity_id=entity_record["entity_id"],
-                    normalized_name=normalize_entity_name(entity["text"]),
-                    entity_label=entity.get("label") or "Entity",
-                    name=entity["text"],
-                    attributes=json.dumps(entity.get("attributes") or [], ensure_ascii=False),
-                )
+    def write_chunk_graph_batch(self, kb_id: str, prepared_graphs: list[dict[str, Any]]) -> None:
+        """在一个 Neo4j 事务中用 UNWIND 写入一批 chunk 的图结构。"""
+        if not prepared_graphs:
+            return
+        label = safe_neo4j_label(kb_id)
+        chunk_rows = [prepared["chunk_row"] for prepared in prepared_graphs]
+        # 行按实体排序，使并发事务以相同顺序获取节点锁。
+        mention_rows = sorted(
+            (row for prepared in prepared_graphs for row in prepared["mention_rows"]),
+            key=lambda row: (row["entity_id"], row["chunk_id"]),
+        )
+        relation_rows = sorted(
+            (row for prepared in prepared_graphs for row in prepared["relation_rows"]),
+            key=lambda row: (row["triple_id"], row["chunk_id"]),
+        )
 
-            # 3. MERGE Entity→Entity (RELATION) 边
-            for relation in relations:
-                source = entity_by_id[relation["source"]]
-                target = entity_by_id[relation["target"]]
-                source_record = entity_record_by_local_id[relation["source"]]
-                target_record = entity_record_by_local_id[relation["target"]]
-                relation_type = relation.get("label") or "RELATED_TO"
-                triple_id = compute_triple_id(
-                    kb_id,
-                    source_record["normalized_name"],
-                    source_record["label"],
-                    relation_type,
-                    target_record["normalized_name"],
-                    target_record["label"],
-                )
-                tx.run(
-                    merge_relation_cypher,
-                    kb_id=kb_id,
-                    chunk_id=chunk.chunk_id,
-                    file_id=chunk.file_id,
-                    source_name=normalize_entity_name(source["text"]),
-                    source_label=source.get("label") or "Entity",
-                    target_name=normalize_entity_name(target["text"]),
-                    target_label=target.get("label") or "Entity",
-                    relation_type=relation_type,
-                    triple_id=triple_id,
-                    text=relation["text"],
-                    extractor_type=relation_extractor_type,
-                )
+        def query(tx):
+            tx.run(cypher_merge_chunks(label), kb_id=kb_id, rows=chunk_rows)
+            if mention_rows:
+                tx.run(cypher_merge_entity_mentions(label), kb_id=kb_id, rows=mention_rows)
+            if relation_rows:
+                tx.run(cypher_merge_relations(label), kb_id=kb_id, rows=relation_rows)
 
         neo4j_write(self.driver, query)
-        return entity_records, triple_records
+
+    def write_chunk_graph(
+        self,
+        kb_id: str,
+        chunk,
+        normalized_result: dict[str, Any],
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        """将单个 chunk 的抽取结果写入 Neo4j。"""
+        prepared = self.prepare_chunk_graph(kb_id, chunk, normalized_result)
+        self.write_chunk_graph_batch(kb_id, [prepared])
+        return prepared["entities"], prepared["triples"]
 
     def _build_entity_records(self, kb_id: str, entities: list[dict[str, Any]]) -> list[dict[str, Any]]:
         records = []
@@ -712,6 +803,7 @@ class MilvusGraphService:
             additional_params = dict(kb.additional_params or {})
             additional_params.pop(GRAPH_CONFIG_KEY, None)
             await self.kb_repo.update(kb_id, {"additional_params": additional_params})
+        await bump_kb_content_version(kb_id)
         return {
             "message": "图谱构建状态已重置",
             "status": "success",
@@ -726,6 +818,7 @@ class MilvusGraphService:
         if all_vectors:
             graph_vector_store = await self.get_graph_vector_store()
             await asyncio.to_thread(graph_vector_store.drop_graph_collections, kb_id)
+        await bump_kb_content_version(kb_id)
         return {
             "kb_id": kb_id,
             "mode": "all_vectors" if all_vectors else "failed",
@@ -922,12 +1015,22 @@ class MilvusGraphService:
         top_k: int,
         damping: float,
     ) -> list[tuple[str, float]]:
+        return MilvusGraphService.rank_chunks_by_ppr_batch(subgraph, [seed_weights], top_k=top_k, damping=damping)[0]
+
+    @staticmethod
+    def rank_chunks_by_ppr_batch(
+        subgraph: dict[str, Any],
+        seed_weight_sets: list[dict[str, float]],
+        *,
+        top_k: int,
+        damping: float,
+    ) -> list[list[tuple[str, float]]]:
+        """在同一子图上对多组种子一次性计算 PPR，按输入顺序返回各组的 chunk 排名。"""
+        results: list[list[tuple[str, float]]] = [[] for _ in seed_weight_sets]
         nodes = subgraph.get("nodes") or []
         edges = subgraph.get("edges") or []
-        if not nodes:
-            return []
-
-        import networkx as nx
+        if not nodes or not seed_weight_sets:
+            return results
 
         node_ids = [node["id"] for node in nodes]
         index_by_id = {node_id: index for index, node_id in enumerate(node_ids)}
@@ -937,37 +1040,45 @@ class MilvusGraphService:
             if edge.get("source_id") in index_by_id and edge.get("target_id") in index_by_id
         ]
         if not edge_indices:
-            return []
+            return results
 
-        # networkx 节点 id 直接用节点索引（与 igraph 的 reset 向量语义对齐）。
-        graph = nx.Graph()
-        graph.add_nodes_from(range(len(nodes)))
-        graph.add_edges_from(edge_indices)
-        reset = [0.0] * len(nodes)
         chunk_node_indexes: list[tuple[int, str]] = []
+        entity_node_indexes: list[tuple[int, str]] = []
         for index, node in enumerate(nodes):
             properties = node.get("properties") or {}
             if node.get("type") == "Chunk" and properties.get("chunk_id"):
                 chunk_node_indexes.append((index, properties["chunk_id"]))
-                continue
-            entity_id = properties.get("entity_id")
-            if entity_id in seed_weights:
-                reset[index] = seed_weights[entity_id]
-
-        reset_total = sum(reset)
-        if reset_total <= 0 or not chunk_node_indexes:
-            return []
-        reset = [value / reset_total for value in reset]
-        # networkx 的 personalization 必须覆盖全部节点（缺节点会抛错），0 值节点贡献为 0；
-        # 默认 dangling=None 时跳转分布使用 personalization，与 igraph 的 reset 语义一致。
-        personalization = {index: value for index, value in enumerate(reset)}
-        scores = nx.pagerank(graph, alpha=min(max(damping, 0.1), 0.99), personalization=personalization)
-        ranked = sorted(
-            ((chunk_id, float(scores[index])) for index, chunk_id in chunk_node_indexes),
-            key=lambda item: item[1],
-            reverse=True,
+            elif properties.get("entity_id") is not None:
+                entity_node_indexes.append((index, properties["entity_id"]))
+        if not chunk_node_indexes:
+            return results
+
+        # reset 矩阵每列对应一组种子；权重和为 0 的组不参与迭代。
+        reset = np.zeros((len(nodes), len(seed_weight_sets)), dtype=np.float64)
+        for column, seed_weights in enumerate(seed_weight_sets):
+            for index, entity_id in entity_node_indexes:
+                if entity_id in seed_weights:
+                    reset[index, column] = seed_weights[entity_id]
+        active_columns = [column for column in range(reset.shape[1]) if reset[:, column].sum() > 0]
+        if not active_columns:
+            return results
+
+        scores = personalized_pagerank(
+            build_adjacency(len(nodes), edge_indices),
+            reset[:, active_columns],
+            alpha=min(max(damping, 0.1), 0.99),
         )
-        return ranked[:top_k]
+        chunk_indexes = np.array([index for index, _ in chunk_node_indexes], dtype=np.int64)
+        chunk_ids = [chunk_id for _, chunk_id in chunk_node_indexes]
+        for position, column in enumerate(active_columns):
+            chunk_scores = scores[chunk_indexes, position]
+            ranked = sorted(
+                zip(chunk_ids, chunk_scores.tolist(), strict=True),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            results[column] = ranked[:top_k]
+        return results
 
     async def get_labels(self, kb_id: str | None = None) -> list[str]:
         effective_kb_id = kb_id or self.kb_id
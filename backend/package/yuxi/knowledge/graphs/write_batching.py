@@ -0,0 +1,74 @@
+"""图谱写入阶段的批次聚合与实体锁。
+
+抽取结果先按数量和时间聚合成小批次，每批一个 Neo4j 事务；多个写入协程并行时，
+按实体 id 分段加锁，保证共享实体的批次串行写入，避免并发 MERGE 同一节点时死锁。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from typing import Any
+
+
+async def collect_write_batch(
+    queue: asyncio.Queue,
+    *,
+    max_size: int,
+    max_wait_seconds: float,
+) -> tuple[list[Any], bool]:
+    """从队列聚合一个批次，返回 (批次, 是否读到结束标记 None)。
+
+    阻塞等待第一条；之后凑满 ``max_size`` 条或距第一条超过 ``max_wait_seconds`` 即返回。
+    """
+    first = await queue.get()
+    queue.task_done()
+    if first is None:
+        return [], True
+
+    batch = [first]
+    deadline = time.monotonic() + max_wait_seconds
+    while len(batch) < max_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout=remaining)
+        except TimeoutError:
+            break
+        queue.task_done()
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+class EntityLockStripes:
+    """按实体 id 哈希分段的异步锁。
+
+    一个批次持有其涉及实体所在的全部分段；分段按序号升序获取，因此任意两个批次之间
+    不会出现循环等待。asyncio.Lock 按等待顺序唤醒，共享实体的批次保持提交顺序。
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [asyncio.Lock() for _ in range(max(int(stripes), 1))]
+
+    def stripe_of(self, entity_id: str) -> int:
+        return zlib.crc32(entity_id.encode("utf-8")) % len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, entity_ids: Iterable[str]) -> AsyncIterator[None]:
+        stripes = sorted({self.stripe_of(entity_id) for entity_id in entity_ids})
+        acquired: list[asyncio.Lock] = []
+        try:
+            for stripe in stripes:
+                lock = self._locks[stripe]
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
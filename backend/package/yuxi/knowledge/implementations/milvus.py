@@ -3,6 +3,8 @@ import os
 import time
 import traceback
 import weakref
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from dataclasses import MISSING, dataclass, field, fields
 from functools import partial
 from typing import Any
@@ -20,12 +22,61 @@ from pymilvus import (
     db,
     utility,
 )
+from pymilvus.client.types import LoadState
 
 from yuxi.knowledge.base import FileStatus, KnowledgeBase
 from yuxi.knowledge.chunking.ragflow_like.dispatcher import chunk_markdown
+from yuxi.knowledge.chunk_embedding_store import chunk_embedding_store
 from yuxi.knowledge.chunking.ragflow_like.nlp import count_tokens
+from yuxi.knowledge.file_claims import RELEASED_CLAIM, claim_fields, start_claim_heartbeat
+from yuxi.knowledge.implementations.milvus_filter import (
+    COPY_FIELDS,
+    FOLDER_ID_FIELD,
+    LEGACY_COLLECTION_SUFFIX,
+    MILVUS_FILE_PARTITIONS,
+    MILVUS_MIGRATION_BATCH_SIZE,
+    ROOT_FOLDER_ID,
+    SHADOW_COLLECTION_SUFFIX,
+    CollectionSwitchGate,
+    FileFilter,
+    build_file_filter,
+    build_filter_fields,
+    collection_supports_file_filter,
+    copy_all_rows,
+    create_scalar_indexes,
+    expand_folder_ids,
+    replay_files,
+    set_file_folder,
+)
+from yuxi.knowledge.implementations.milvus_index import (
+    DEFAULT_INDEX_PROFILE,
+    INDEX_PROFILE_KEY,
+    INDEX_PROFILES,
+    SearchParamTuner,
+    applied_index_profile,
+    apply_index_profile,
+    build_vector_search_params,
+    rebuild_vector_index,
+    describe_vector_index,
+    normalize_index_profile_name,
+    resolve_index_profile,
+)
+from yuxi.knowledge.implementations.milvus_async import (
+    MilvusAsyncClientUnavailableError,
+    MilvusAsyncQueryPool,
+    create_milvus_query_pool,
+)
+from yuxi.knowledge.implementations.milvus_residency import (
+    PIN_COLLECTION_KEY,
+    CollectionResidencyManager,
+    SharedResidencyLeases,
+)
+from yuxi.knowledge.query_embedding_cache import query_embedding_cache
 from yuxi.knowledge.read_models import KnowledgeBaseConfig
+from yuxi.knowledge.retrieval_trace import trace_stage
+from yuxi.knowledge.utils.chunk_diff import POSITION_FIELDS, diff_chunks
 from yuxi.knowledge.utils.kb_utils import resolve_processing_params
+from yuxi.models.embed_batching import pack_by_token_budget
 from yuxi.models.providers.cache import model_cache
 from yuxi.repositories.knowledge_chunk_repository import KnowledgeChunkRepository
 from yuxi.repositories.knowledge_file_repository import KnowledgeFileRepository
@@ -38,7 +89,14 @@ CONTENT_SPARSE_FIELD = "content_sparse"
 CONTENT_ANALYZER_PARAMS = {"type": "chinese"}
 VECTOR_METRIC_TYPE = "COSINE"
 MILVUS_CHUNK_EMBED_BATCH_SIZE = 200
-MILVUS_QUERY_OFFLOAD_LIMIT = 8
+# 单个嵌入/写入批次的估算 token 上限，长 chunk 组成的批次会少于 MILVUS_CHUNK_EMBED_BATCH_SIZE 条
+MILVUS_CHUNK_EMBED_BATCH_TOKENS = max(1, int(os.getenv("MILVUS_CHUNK_EMBED_BATCH_TOKENS") or 100_000))
+# 已完成 embedding、等待写入的批次上限；越大越能吸收 embedding 与写入的耗时抖动，但占用更多内存
+MILVUS_EMBED_PIPELINE_DEPTH = max(1, int(os.getenv("MILVUS_EMBED_PIPELINE_DEPTH") or 2))
+# 重建索引时按内容哈希复用未变化 chunk 的向量；单次请求可通过 params.incremental_reindex 覆盖
+MILVUS_INCREMENTAL_REINDEX = os.getenv("MILVUS_INCREMENTAL_REINDEX", "true").lower() not in ("0", "false", "no")
+INCREMENTAL_REINDEX_KEY = "incremental_reindex"
+MILVUS_QUERY_OFFLOAD_LIMIT = max(1, int(os.getenv("MILVUS_QUERY_OFFLOAD_LIMIT") or 8))
 _milvus_query_offload_semaphore_refs: dict[
     int,
     tuple[weakref.ReferenceType[asyncio.AbstractEventLoop], weakref.ReferenceType[asyncio.Semaphore]],
@@ -288,6 +346,10 @@ class MilvusKB(KnowledgeBase):
     kb_type = "milvus"
     name = "Milvus"
     description = "基于 Milvus 的生产级向量知识库，适合高性能部署"
+    query_pool: MilvusAsyncQueryPool | None = None
+    residency: CollectionResidencyManager | None = None
+    switch_gates: dict[str, CollectionSwitchGate] | None = None
+    index_locks: dict[str, asyncio.Lock] | None = None
 
     def __init__(self, work_dir: str, **kwargs):
         """
@@ -314,9 +376,23 @@ class MilvusKB(KnowledgeBase):
 
         # 存储集合映射 {kb_id: Collection}
         self.collections: dict[str, Any] = {}
+        # 集合向量索引的 (实际索引类型, 请求的配置档) {kb_id: (index_type, profile)}，缺失时从 Milvus 读取
+        self.vector_indexes: dict[str, tuple[str | None, str | None]] = {}
+        # 按 LRU 释放冷集合，限制 Milvus 加载内存；加载状态由各进程共享，配置上限时通过 Redis 租约协调释放
+        self.residency = CollectionResidencyManager()
+        if self.residency.limited:
+            self.residency.shared = SharedResidencyLeases()
+        # schema 迁移切换集合时协调本进程内的检索与写入 {kb_id: gate}
+        self.switch_gates = {}
+        # 向量索引切换按知识库串行 {kb_id: lock}
+        self.index_locks = {}
 
         # 初始化连接
         self._init_connection()
+        if self.residency.limited:
+            self._seed_residency()
+        # 检索请求优先走原生异步客户端，未启用时回退到线程卸载
+        self.query_pool = create_milvus_query_pool(self.milvus_uri, self.milvus_token, self.milvus_db)
 
         logger.info("MilvusKB initialized")
 
@@ -354,6 +430,7 @@ class MilvusKB(KnowledgeBase):
         collection_name = kb_id
 
         try:
+            self._finish_interrupted_swap(kb_id)
             # 检查集合是否存在
             if utility.has_collection(collection_name, using=self.connection_alias):
                 collection = Collection(name=collection_name, using=self.connection_alias)
@@ -389,12 +466,34 @@ class MilvusKB(KnowledgeBase):
             logger.debug(f"Traceback: {traceback.format_exc()}")
             raise
 
+    def _finish_interrupted_swap(self, kb_id: str) -> None:
+        """处理迁移换名中途退出留下的集合，避免随后按 kb_id 新建空集合而遮住已有数据。
+
+        换名前新集合已完成复制与重放：旧集合已改名而新集合未改名时补完换名，新集合缺失时回滚；
+        两次换名均已完成时只需删除残留的旧集合。
+        """
+        legacy_name = f"{kb_id}{LEGACY_COLLECTION_SUFFIX}"
+        shadow_name = f"{kb_id}{SHADOW_COLLECTION_SUFFIX}"
+        if not utility.has_collection(legacy_name, using=self.connection_alias):
+            return
+        if utility.has_collection(kb_id, using=self.connection_alias):
+            logger.warning(f"Dropping leftover legacy collection {legacy_name} of a finished migration")
+            utility.drop_collection(legacy_name, using=self.connection_alias)
+        elif utility.has_collection(shadow_name, using=self.connection_alias):
+            logger.warning(f"Completing interrupted file-filter migration swap of {kb_id}")
+            utility.rename_collection(shadow_name, kb_id, using=self.connection_alias)
+            utility.drop_collection(legacy_name, using=self.connection_alias)
+        else:
+            logger.warning(f"Rolling back interrupted file-filter migration swap of {kb_id}")
+            utility.rename_collection(legacy_name, kb_id, using=self.connection_alias)
+
     def _create_new_collection(self, collection_name: str, embedding_info: Any, kb_id: str) -> Collection:
         """创建新的 Milvus 集合"""
         embedding_dim = embedding_info.dimension or 1024
         model_name = embedding_info.model_id
 
-        # 定义集合Schema
+        # 定义集合Schema；file_id 为 partition key，folder_id 记录文件所在目录，均建立标量索引用于过滤
+        file_id_field, folder_id_field = build_filter_fields()
         fields = [
             FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
             FieldSchema(
@@ -405,10 +504,11 @@ class MilvusKB(KnowledgeBase):
                 analyzer_params=CONTENT_ANALYZER_PARAMS,
             ),
             FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, max_length=100),
-            FieldSchema(name="file_id", dtype=DataType.VARCHAR, max_length=100),
+            file_id_field,
             FieldSchema(name="chunk_index", dtype=DataType.INT64),
             FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=embedding_dim),
             FieldSchema(name=CONTENT_SPARSE_FIELD, dtype=DataType.SPARSE_FLOAT_VECTOR),
+            folder_id_field,
         ]
         bm25_function = Function(
             name="content_bm25",
@@ -424,17 +524,19 @@ class MilvusKB(KnowledgeBase):
         )
 
         # 创建集合
-        collection = Collection(name=collection_name, schema=schema, using=self.connection_alias)
+        collection = Collection(
+            name=collection_name, schema=schema, using=self.connection_alias, num_partitions=MILVUS_FILE_PARTITIONS
+        )
 
-        # 创建索引
-        index_params = {"metric_type": VECTOR_METRIC_TYPE, "index_type": "IVF_FLAT", "params": {"nlist": 1024}}
-        collection.create_index("embedding", index_params)
+        # 创建索引；知识库指定的索引配置档在索引文件时切换
+        collection.create_index("embedding", INDEX_PROFILES[DEFAULT_INDEX_PROFILE].index_params(VECTOR_METRIC_TYPE))
         sparse_index_params = {
             "metric_type": "BM25",
             "index_type": "SPARSE_INVERTED_INDEX",
             "params": {"inverted_index_algo": "DAAT_MAXSCORE"},
         }
         collection.create_index(CONTENT_SPARSE_FIELD, sparse_index_params)
+        create_scalar_indexes(collection)
 
         logger.info(f"Created new Milvus collection: {collection_name} '{model_name=}', {embedding_dim=}")
 
@@ -461,6 +563,163 @@ class MilvusKB(KnowledgeBase):
                 return True
         return False
 
+    @classmethod
+    def validate_additional_params(cls, additional_params: dict | None) -> dict:
+        params = dict(additional_params or {})
+        if PIN_COLLECTION_KEY in params:
+            params[PIN_COLLECTION_KEY] = bool(params[PIN_COLLECTION_KEY])
+        if params.get(INDEX_PROFILE_KEY) is not None:
+            params[INDEX_PROFILE_KEY] = normalize_index_profile_name(params[INDEX_PROFILE_KEY])
+        return params
+
+    async def _ensure_index_profile(
+        self, kb_id: str, collection: Collection, additional_params: dict[str, Any]
+    ) -> None:
+        """按知识库配置切换向量索引类型；未显式配置时保持默认索引。"""
+        if not additional_params.get(INDEX_PROFILE_KEY):
+            return
+        profile = resolve_index_profile(additional_params)
+        cached = self.vector_indexes.get(kb_id)
+        if cached is not None and cached[1] == profile.name:
+            return
+        if self.index_locks is None:
+            self.index_locks = {}
+        # 并发入库同时发现需要切换时只重建一次，其余等待后复用结果
+        async with self.index_locks.setdefault(kb_id, asyncio.Lock()):
+            cached = self.vector_indexes.get(kb_id)
+            if cached is not None and cached[1] == profile.name:
+                return
+            # 先读取 Milvus 中的现有索引，已按该配置档建过（含回退）时不会重建
+            applied = await asyncio.to_thread(applied_index_profile, collection, profile)
+            if applied is None:
+                if self.residency is not None:
+                    # 经驻留管理器释放与加载，其他进程按释放代数重新加载
+                    async with self.residency.unloaded(kb_id, collection):
+                        applied = await asyncio.to_thread(rebuild_vector_index, collection, profile, VECTOR_METRIC_TYPE)
+                else:
+                    applied = await asyncio.to_thread(apply_index_profile, collection, profile, VECTOR_METRIC_TYPE)
+            self.vector_indexes[kb_id] = (applied, profile.name)
+        logger.info(f"Vector index profile for {kb_id}: requested={profile.name}, applied={applied}")
+
+    async def _get_vector_index_type(self, kb_id: str, collection: Collection) -> str | None:
+        """返回集合上实际创建的向量索引类型，用于生成检索参数；读取失败时按知识库配置档推断。"""
+        cached = self.vector_indexes.get(kb_id)
+        if cached is None:
+            try:
+                cached = await asyncio.to_thread(describe_vector_index, collection)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"Failed to describe vector index of {kb_id}: {e}")
+                return None
+            self.vector_indexes[kb_id] = cached
+        return cached[0]
+
+    async def tune_search_params(
+        self,
+        kb_id: str,
+        *,
+        embedding_model_spec: str | None,
+        additional_params: dict[str, Any],
+        k: int = 10,
+        target_recall: float = 0.95,
+        sample_size: int = 100,
+    ) -> dict[str, Any]:
+        """离线调优向量检索参数，返回满足目标 recall@k 的最低开销参数（不负责持久化）。"""
+        collection = await self._get_or_create_milvus_collection(kb_id, embedding_model_spec)
+        if not collection:
+            raise ValueError(f"Failed to get Milvus collection for {kb_id}")
+        await self._ensure_index_profile(kb_id, collection, additional_params)
+        # 配置档不可用而回退默认索引时，按实际索引类型调优
+        index_type = await self._get_vector_index_type(kb_id, collection)
+
+        tuner = SearchParamTuner(
+            collection,
+            INDEX_PROFILES.get(index_type or "") or resolve_index_profile(additional_params),
+            metric_type=VECTOR_METRIC_TYPE,
+            k=k,
+            target_recall=target_recall,
+            sample_size=sample_size,
+        )
+        async with self._collection_lease(kb_id, collection):
+            return await asyncio.to_thread(tuner.run)
+
+    async def migrate_file_filter_schema(
+        self,
+        kb_id: str,
+        *,
+        embedding_model_spec: str | None,
+        additional_params: dict[str, Any],
+        batch_size: int = MILVUS_MIGRATION_BATCH_SIZE,
+    ) -> dict[str, Any]:
+        """把旧 schema 的集合在线重建为支持文件/目录过滤的新集合。
+
+        迁移期间检索与写入继续使用旧集合，写入过的文件由切换闸门记录；全量复制后暂停写入，
+        按文件从旧集合重放这些写入（含删除），再暂停检索完成两次换名，切换后写入直接落到新集合。
+        闸门只协调本进程内的读写，其他进程需遵循单进程持有知识库写入的约定。
+        """
+        collection = await self._get_or_create_milvus_collection(kb_id, embedding_model_spec)
+        if not collection:
+            raise ValueError(f"Failed to get Milvus collection for {kb_id}")
+        if collection_supports_file_filter(collection):
+            return {"kb_id": kb_id, "status": "up_to_date"}
+
+        embedding_info = model_cache.get_model_info(embedding_model_spec)
+        folder_by_file = await KnowledgeFileRepository().list_parent_ids(kb_id=kb_id)
+        shadow_name = f"{kb_id}{SHADOW_COLLECTION_SUFFIX}"
+        legacy_name = f"{kb_id}{LEGACY_COLLECTION_SUFFIX}"
+
+        def prepare_shadow() -> Collection:
+            # 清理上次中断迁移留下的新集合
+            if utility.has_collection(shadow_name, using=self.connection_alias):
+                utility.drop_collection(shadow_name, using=self.connection_alias)
+            shadow = self._create_new_collection(shadow_name, embedding_info, kb_id)
+            if additional_params.get(INDEX_PROFILE_KEY):
+                apply_index_profile(shadow, resolve_index_profile(additional_params), VECTOR_METRIC_TYPE)
+            shadow.load()
+            return shadow
+
+        def swap() -> Collection:
+            utility.rename_collection(kb_id, legacy_name, using=self.connection_alias)
+            utility.rename_collection(shadow_name, kb_id, using=self.connection_alias)
+            target = Collection(name=kb_id, using=self.connection_alias)
+            self.collections[kb_id] = target
+            self.vector_indexes.pop(kb_id, None)
+            if self.residency is not None:
+                self.residency.forget(kb_id)
+            logger.info(f"Swapped Milvus collection {kb_id} to file-filter schema")
+            return target
+
+        gate = self._switch_gate(kb_id)
+        started_at = time.perf_counter()
+        gate.touched_files = set()
+        try:
+            async with self._collection_lease(kb_id, collection):
+                shadow = await asyncio.to_thread(prepare_shadow)
+                copied = await asyncio.to_thread(
+                    copy_all_rows, collection, shadow, folder_by_file, batch_size=batch_size
+                )
+                async with gate.paused("write"):
+                    touched = sorted(gate.touched_files)
+                    # 复制期间可能有新文件或移动目录，按最新的目录归属重放
+                    folder_by_file = await KnowledgeFileRepository().list_parent_ids(kb_id=kb_id)
+                    replayed = await asyncio.to_thread(
+                        replay_files, collection, shadow, folder_by_file, touched, batch_size=batch_size
+                    )
+                    async with gate.paused("read"):
+                        await asyncio.to_thread(swap)
+        finally:
+            gate.touched_files = None
+        if await asyncio.to_thread(utility.has_collection, legacy_name, using=self.connection_alias):
+            await asyncio.to_thread(utility.drop_collection, legacy_name, using=self.connection_alias)
+
+        stats = {"copied": copied, "replayed_files": len(touched), "replayed": replayed}
+        logger.info(f"Migrated Milvus collection {kb_id} to file-filter schema: {stats}")
+        return {
+            "kb_id": kb_id,
+            "status": "migrated",
+            **stats,
+            "elapsed_seconds": round(time.perf_counter() - started_at, 3),
+        }
+
     async def _initialize_kb_instance(self, instance: Any) -> None:
         """初始化 Milvus 集合（加载到内存）"""
         try:
@@ -478,15 +737,43 @@ class MilvusKB(KnowledgeBase):
         method = model.batch_encode if sync else model.abatch_encode
         return partial(method, batch_size=batch_size)
 
+    def _get_chunk_embedding_function(self, embedding_model_spec: str):
+        """获取入库用的 embedding 函数：内容相同的 chunk 复用已存储的同维度向量，未命中的才调用模型。"""
+        embedding_info = model_cache.get_model_info(embedding_model_spec)
+        return partial(
+            chunk_embedding_store.get_or_embed_many,
+            embedding_model_spec,
+            embed=self._get_embedding_function(embedding_model_spec),
+            dimension=int(embedding_info.dimension) if embedding_info and embedding_info.dimension else None,
+        )
+
+    async def _embed_queries(self, query_texts: list[str], embedding_model_spec: str) -> list[list[float]]:
+        """批量获取 Query 向量，缓存未命中的 Query 合并为一次 embedding 请求。"""
+
+        async def embed(texts: list[str]) -> list[list[float]]:
+            with trace_stage("embedding_request", candidates=len(texts)):
+                embedding_function = self._get_embedding_function(embedding_model_spec, sync=True)
+                return await _run_milvus_query_io(embedding_function, texts)
+
+        with trace_stage("query_embedding", queries=len(query_texts)):
+            return await query_embedding_cache.get_or_embed_many(embedding_model_spec, query_texts, embed)
+
     async def _get_or_create_milvus_collection(self, kb_id: str, embedding_model_spec: str | None):
         """获取或创建 Milvus 集合"""
         if kb_id in self.collections:
-            return self.collections[kb_id]
+            collection = self.collections[kb_id]
+            # 冷集合可能已被释放，访问时透明地重新加载
+            if self.residency is not None:
+                await self.residency.ensure_loaded(kb_id, collection)
+            return collection
 
         try:
             # 创建集合
             collection = await self._create_kb_instance(kb_id, embedding_model_spec)
-            await self._initialize_kb_instance(collection)
+            if self.residency is not None:
+                await self.residency.ensure_loaded(kb_id, collection)
+            else:
+                await self._initialize_kb_instance(collection)
 
             self.collections[kb_id] = collection
             return collection
@@ -496,6 +783,46 @@ class MilvusKB(KnowledgeBase):
             logger.error(f"Traceback: {traceback.format_exc()}")
             return None
 
+    @asynccontextmanager
+    async def _collection_lease(self, kb_id: str | None, collection: Any) -> AsyncIterator[None]:
+        """使用期间保证集合已加载且不会被驻留管理器释放；kb_id 缺省时取集合名。"""
+        if self.residency is None:
+            yield
+            return
+        async with self.residency.lease(kb_id or collection.name, collection):
+            yield
+
+    @staticmethod
+    def _is_chunk_collection(name: str, collection: Any) -> bool:
+        """是否为本类按 kb_id 命名管理的 chunk 集合；图谱集合与迁移中的新旧集合不由驻留管理器释放。"""
+        if name.endswith((SHADOW_COLLECTION_SUFFIX, LEGACY_COLLECTION_SUFFIX)):
+            return False
+        return str(collection.description or "").startswith(f"Knowledge base collection for {name} using ")
+
+    def _seed_residency(self) -> None:
+        """以 Milvus 中已加载的知识库集合作为驻留初始状态，进程重启前加载的集合同样受预算约束。"""
+        try:
+            for name in utility.list_collections(using=self.connection_alias):
+                if utility.load_state(name, using=self.connection_alias) != LoadState.Loaded:
+                    continue
+                collection = Collection(name=name, using=self.connection_alias)
+                if not self._is_chunk_collection(name, collection):
+                    continue
+                self.residency.seed_loaded(name, collection, self.residency.size_estimator(collection))
+        except Exception as e:
+            logger.warning(f"Failed to read Milvus load state: {e}")
+
+    def _switch_gate(self, kb_id: str) -> CollectionSwitchGate:
+        if self.switch_gates is None:
+            self.switch_gates = {}
+        if kb_id not in self.switch_gates:
+            self.switch_gates[kb_id] = CollectionSwitchGate()
+        return self.switch_gates[kb_id]
+
+    def _sync_collection_pin(self, kb_id: str, additional_params: dict[str, Any] | None) -> None:
+        if self.residency is not None:
+            self.residency.set_pinned(kb_id, bool((additional_params or {}).get(PIN_COLLECTION_KEY)))
+
     def _get_existing_milvus_collection(self, kb_id: str) -> Collection | None:
         """获取已存在的集合，不因删除操作创建新集合。"""
         collection = self.collections.get(kb_id)
@@ -509,6 +836,12 @@ class MilvusKB(KnowledgeBase):
         """将文本分割成块"""
         return chunk_markdown(text, file_id, filename, params)
 
+    @staticmethod
+    def _assign_chunk_folder(chunks: list[dict], file_meta: dict) -> None:
+        folder_id = file_meta.get("parent_id") or ROOT_FOLDER_ID
+        for chunk in chunks:
+            chunk[FOLDER_ID_FIELD] = folder_id
+
     def _calculate_chunk_stats(self, chunks: list[dict]) -> dict[str, int]:
         return {
             "chunk_count": len(chunks),
@@ -546,36 +879,41 @@ class MilvusKB(KnowledgeBase):
         if not chunks:
             return
 
-        entities = [
-            [chunk["id"] for chunk in chunks],
-            [chunk["content"] for chunk in chunks],
-            [chunk["chunk_id"] for chunk in chunks],
-            [chunk["file_id"] for chunk in chunks],
-            [chunk["chunk_index"] for chunk in chunks],
-            embeddings,
-        ]
-        chunk_repo = KnowledgeChunkRepository()
-
-        def _insert_milvus_records():
-            collection.insert(entities)
-
-        pg_task = chunk_repo.batch_upsert(self._build_chunk_pg_records(kb_id, chunks))
-        milvus_task = asyncio.to_thread(_insert_milvus_records)
-        results = await asyncio.gather(pg_task, milvus_task, return_exceptions=True)
-        errors = [result for result in results if isinstance(result, Exception)]
-        if not errors:
-            return
+        async with self._switch_gate(kb_id).writing(file_id):
+            # 等待迁移切换期间集合可能已换成新 schema
+            collection = self.collections.get(kb_id, collection)
+            entities = [
+                [chunk["id"] for chunk in chunks],
+                [chunk["content"] for chunk in chunks],
+                [chunk["chunk_id"] for chunk in chunks],
+                [chunk["file_id"] for chunk in chunks],
+                [chunk["chunk_index"] for chunk in chunks],
+                embeddings,
+            ]
+            if collection_supports_file_filter(collection):
+                entities.append([chunk.get(FOLDER_ID_FIELD) or ROOT_FOLDER_ID for chunk in chunks])
+            chunk_repo = KnowledgeChunkRepository()
+
+            def _insert_milvus_records():
+                collection.insert(entities)
+
+            pg_task = chunk_repo.batch_upsert(self._build_chunk_pg_records(kb_id, chunks))
+            milvus_task = asyncio.to_thread(_insert_milvus_records)
+            results = await asyncio.gather(pg_task, milvus_task, return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            if not errors:
+                return
 
-        logger.error(f"Chunk double-write failed for file {file_id}, rolling back PostgreSQL and Milvus chunks")
-        try:
-            await chunk_repo.delete_by_file_id(file_id)
-        except Exception as cleanup_error:
-            logger.error(f"Failed to rollback PostgreSQL chunks for {file_id}: {cleanup_error}")
-        try:
-            await self._delete_file_chunks_from_milvus(collection, file_id)
-        except Exception as cleanup_error:
-            logger.error(f"Failed to rollback Milvus chunks for {file_id}: {cleanup_error}")
-        raise errors[0]
+            logger.error(f"Chunk double-write failed for file {file_id}, rolling back PostgreSQL and Milvus chunks")
+            try:
+                await chunk_repo.delete_by_file_id(file_id)
+            except Exception as cleanup_error:
+                logger.error(f"Failed to rollback PostgreSQL chunks for {file_id}: {cleanup_error}")
+            try:
+                await self._delete_file_chunks_from_milvus(collection, file_id)
+            except Exception as cleanup_error:
+                logger.error(f"Failed to rollback Milvus chunks for {file_id}: {cleanup_error}")
+            raise errors[0]
 
     async def _embed_and_store_chunks(
         self,
@@ -586,23 +924,171 @@ class MilvusKB(KnowledgeBase):
         embedding_function,
         *,
         chunk_batch_size: int = MILVUS_CHUNK_EMBED_BATCH_SIZE,
+        chunk_batch_tokens: int = MILVUS_CHUNK_EMBED_BATCH_TOKENS,
+        pipeline_depth: int = MILVUS_EMBED_PIPELINE_DEPTH,
     ) -> None:
-        """对 chunks 进行分批嵌入并存储到 Milvus 和 PostgreSQL"""
+        """对 chunks 按条数与估算 token 上限分批嵌入，并存储到 Milvus 和 PostgreSQL。
+
+        嵌入与写入流水线执行：写入第 N 批时继续嵌入后续批次，最多 pipeline_depth 个已嵌入批次等待写入。
+        写入按批次顺序串行，单批写入失败时由 _insert_chunks_to_stores 回滚，并取消尚未完成的嵌入。
+        """
         if not chunks:
             return
 
-        chunk_batch_size = max(int(chunk_batch_size), 1)
-        for start in range(0, len(chunks), chunk_batch_size):
-            batch_chunks = chunks[start : start + chunk_batch_size]
-            texts = [chunk["content"] for chunk in batch_chunks]
-            embeddings = await embedding_function(texts)
-            await self._insert_chunks_to_stores(
-                kb_id,
-                file_id,
-                collection,
-                batch_chunks,
-                embeddings,
+        batches = [
+            chunks[start:end]
+            for start, end in pack_by_token_budget(
+                [chunk["content"] for chunk in chunks], max_tokens=chunk_batch_tokens, max_items=chunk_batch_size
             )
+        ]
+        embedded: asyncio.Queue[tuple[list[dict], list] | Exception] = asyncio.Queue(
+            maxsize=max(int(pipeline_depth), 1)
+        )
+
+        async def embed_batches() -> None:
+            try:
+                for batch_chunks in batches:
+                    embeddings = await embedding_function([chunk["content"] for chunk in batch_chunks])
+                    await embedded.put((batch_chunks, embeddings))
+            except Exception as exc:  # noqa: BLE001
+                # 已嵌入的批次先写完，再在消费端抛出嵌入错误，与逐批执行时的结果一致
+                await embedded.put(exc)
+
+        producer = asyncio.create_task(embed_batches())
+        try:
+            for _ in batches:
+                item = await embedded.get()
+                if isinstance(item, Exception):
+                    raise item
+                batch_chunks, embeddings = item
+                await self._insert_chunks_to_stores(
+                    kb_id,
+                    file_id,
+                    collection,
+                    batch_chunks,
+                    embeddings,
+                )
+        finally:
+            if not producer.done():
+                producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    async def _replace_file_chunks(
+        self,
+        kb_id: str,
+        file_id: str,
+        collection: Collection,
+        chunks: list[dict],
+        embedding_function,
+        *,
+        incremental: bool,
+        previous_chunk_count: int,
+    ) -> dict[str, Any]:
+        """用新 chunks 替换文件已有的 chunks，返回复用统计；已入库过的文件优先增量重建。"""
+        if incremental and chunks and previous_chunk_count > 0:
+            stats = await self._reindex_file_incrementally(kb_id, file_id, collection, chunks, embedding_function)
+            if stats is not None:
+                return stats
+
+        await self.delete_file_chunks_only(kb_id, file_id)
+        if chunks:
+            await self._embed_and_store_chunks(kb_id, file_id, collection, chunks, embedding_function)
+        return {
+            "mode": "full",
+            "reused": 0,
+            "embedded": len(chunks),
+            "removed": previous_chunk_count,
+            "reuse_ratio": 0.0,
+        }
+
+    async def _reindex_file_incrementally(
+        self,
+        kb_id: str,
+        file_id: str,
+        collection: Collection,
+        chunks: list[dict],
+        embedding_function,
+    ) -> dict[str, Any] | None:
+        """按内容哈希增量重建索引：删除消失的 chunk，只嵌入新增/修改的 chunk，未变化的 chunk 原地更新位置。
+
+        文件没有已存储 chunk，或其 chunk 已构建图谱（图谱按 chunk 关联，需随全量重建一并清理）时返回 None，
+        由调用方走全量重建。返回复用统计。
+        """
+        chunk_repo = KnowledgeChunkRepository()
+        stored = await chunk_repo.list_by_file_id(file_id)
+        if not stored or any(chunk.graph_indexed for chunk in stored):
+            return None
+
+        diff = diff_chunks(chunks, [(chunk.chunk_id, chunk.content) for chunk in stored])
+        async with self._switch_gate(kb_id).writing(file_id):
+            collection = self.collections.get(kb_id, collection)
+            async with self._collection_lease(kb_id, collection):
+                stored_rows = await asyncio.to_thread(
+                    self._query_milvus_rows, collection, [chunk["chunk_id"] for chunk in diff.reused]
+                )
+                diff.mark_unavailable(set(stored_rows))
+
+                if diff.removed_ids:
+                    # 先删 Milvus：PostgreSQL 删除失败时，下次重建会把缺少向量的旧 chunk 视为删除或重新嵌入
+                    await asyncio.to_thread(self._delete_milvus_rows, collection, diff.removed_ids)
+                    await chunk_repo.delete_by_chunk_ids(diff.removed_ids)
+
+                if diff.reused:
+                    await chunk_repo.batch_upsert(
+                        [
+                            {
+                                "chunk_id": chunk["chunk_id"],
+                                "file_id": file_id,
+                                "kb_id": kb_id,
+                                "content": chunk["content"],
+                                **{name: chunk.get(name) for name in POSITION_FIELDS},
+                            }
+                            for chunk in diff.reused
+                        ]
+                    )
+                    moved = self._build_moved_milvus_rows(collection, diff.reused, stored_rows)
+                    if moved:
+                        await asyncio.to_thread(collection.upsert, moved)
+
+        if diff.added:
+            await self._embed_and_store_chunks(kb_id, file_id, collection, diff.added, embedding_function)
+        return diff.to_stats()
+
+    @staticmethod
+    def _query_milvus_rows(collection: Collection, ids: list[str]) -> dict[str, dict]:
+        rows: dict[str, dict] = {}
+        for start in range(0, len(ids), MILVUS_MIGRATION_BATCH_SIZE):
+            batch = ids[start : start + MILVUS_MIGRATION_BATCH_SIZE]
+            output_fields = COPY_FIELDS + ([FOLDER_ID_FIELD] if collection_supports_file_filter(collection) else [])
+            for row in collection.query(expr="id in {ids}", expr_params={"ids": batch}, output_fields=output_fields):
+                rows[str(row["id"])] = row
+        return rows
+
+    @staticmethod
+    def _delete_milvus_rows(collection: Collection, ids: list[str]) -> None:
+        for start in range(0, len(ids), MILVUS_MIGRATION_BATCH_SIZE):
+            collection.delete(expr="id in {ids}", expr_params={"ids": ids[start : start + MILVUS_MIGRATION_BATCH_SIZE]})
+
+    @staticmethod
+    def _build_moved_milvus_rows(
+        collection: Collection, chunks: list[dict], stored_rows: dict[str, dict]
+    ) -> list[dict[str, Any]]:
+        """位置或目录变化的复用 chunk，沿用已存储的向量生成 upsert 行。"""
+        with_folder = collection_supports_file_filter(collection)
+        moved = []
+        for chunk in chunks:
+            row = stored_rows[chunk["chunk_id"]]
+            folder_id = chunk.get(FOLDER_ID_FIELD) or ROOT_FOLDER_ID
+            if row["chunk_index"] == chunk["chunk_index"] and (
+                not with_folder or row.get(FOLDER_ID_FIELD) == folder_id
+            ):
+                continue
+            updated = {name: row[name] for name in COPY_FIELDS}
+            updated["chunk_index"] = chunk["chunk_index"]
+            if with_folder:
+                updated[FOLDER_ID_FIELD] = folder_id
+            moved.append(updated)
+        return moved
 
     async def _delete_file_chunks_from_milvus(self, collection: Collection, file_id: str) -> None:
         expr = f'file_id == "{file_id}"'
@@ -632,21 +1118,33 @@ class MilvusKB(KnowledgeBase):
                 continue
             metadata["source"] = filenames.get(str(metadata.get("file_id") or ""), "") or "未知来源"
 
-    async def _build_file_name_expr(self, kb_id: str, file_name: str | None) -> str | None:
-        if not file_name:
+    async def _build_file_filter(
+        self,
+        kb_id: str,
+        collection: Collection,
+        *,
+        file_name: str | None = None,
+        folder_id: str | None = None,
+    ) -> FileFilter | None:
+        """按文件名关键词和目录（含子目录）生成过滤条件。
+
+        新 schema 的集合按 folder_id 字段过滤目录；旧集合回退为目录下文件的 file_id 列表。
+        """
+        if not file_name and not folder_id:
             return None
 
-        matched_file_ids = await KnowledgeFileRepository().list_file_ids_by_filename_contains(
-            kb_id=kb_id,
-            filename_pattern=file_name,
-        )
-        if not matched_file_ids:
-            return 'file_id == "__no_matching_file__"'
-        escaped_ids = [file_id.replace('"', '\\"') for file_id in matched_file_ids]
-        if len(escaped_ids) == 1:
-            return f'file_id == "{escaped_ids[0]}"'
-        joined_ids = '", "'.join(escaped_ids)
-        return f'file_id in ["{joined_ids}"]'
+        file_repo = KnowledgeFileRepository()
+        file_ids = None
+        folder_ids = None
+        if file_name:
+            file_ids = await file_repo.list_file_ids_by_filename_contains(kb_id=kb_id, filename_pattern=file_name)
+        if folder_id:
+            folder_ids = expand_folder_ids(folder_id, await file_repo.list_parent_ids(kb_id=kb_id, folders_only=True))
+            if not collection_supports_file_filter(collection):
+                folder_file_ids = await file_repo.list_file_ids_by_parent_ids(kb_id=kb_id, parent_ids=folder_ids)
+                file_ids = folder_file_ids if file_ids is None else sorted(set(file_ids).intersection(folder_file_ids))
+                folder_ids = None
+        return build_file_filter(file_ids=file_ids, folder_ids=folder_ids)
 
     async def index_file(
         self,
@@ -671,11 +1169,14 @@ class MilvusKB(KnowledgeBase):
             Updated file metadata
         """
         # Get/Create collection
+        self._sync_collection_pin(kb_id, additional_params)
         collection = await self._get_or_create_milvus_collection(kb_id, embedding_model_spec)
         if not collection:
             raise ValueError(f"Failed to get Milvus collection for {kb_id}")
+        await self._ensure_index_profile(kb_id, collection, additional_params)
 
-        embedding_function = self._get_embedding_function(embedding_model_spec)
+        embedding_function = self._get_chunk_embedding_function(embedding_model_spec)
+        incremental = bool((params or {}).get(INCREMENTAL_REINDEX_KEY, MILVUS_INCREMENTAL_REINDEX))
 
         file_meta = await self._load_file_meta(kb_id, file_id)
         allowed_statuses = {
@@ -694,6 +1195,7 @@ class MilvusKB(KnowledgeBase):
             "status": FileStatus.INDEXING,
             "processing_params": params,
             "error_message": None,
+            **claim_fields(),
         }
         if operator_id:
             claim_data["updated_by"] = operator_id
@@ -719,6 +1221,7 @@ class MilvusKB(KnowledgeBase):
 
         logger.debug(f"[index_file] file_id={file_id}, processing_params={params}")
 
+        heartbeat = start_claim_heartbeat(kb_id, file_id)
         try:
             # Read markdown
             markdown_content = await self._read_markdown_from_minio(file_meta["markdown_file"])
@@ -726,6 +1229,7 @@ class MilvusKB(KnowledgeBase):
 
             # Split
             chunks = self._split_text_into_chunks(markdown_content, file_id, filename, params)
+            self._assign_chunk_folder(chunks, file_meta)
             logger.info(
                 f"Split {filename} into {len(chunks)} chunks with params: "
                 f"chunk_preset_id={params.get('chunk_preset_id')}, "
@@ -734,16 +1238,20 @@ class MilvusKB(KnowledgeBase):
 
             chunk_stats = self._calculate_chunk_stats(chunks)
 
-            # Clean up existing chunks if any (for re-indexing)
-            await self.delete_file_chunks_only(kb_id, file_id)
-
-            if chunks:
-                await self._embed_and_store_chunks(kb_id, file_id, collection, chunks, embedding_function)
+            reindex_stats = await self._replace_file_chunks(
+                kb_id,
+                file_id,
+                collection,
+                chunks,
+                embedding_function,
+                incremental=incremental,
+                previous_chunk_count=int(file_meta.get("chunk_count") or 0),
+            )
 
-            logger.info(f"Indexed file {file_id} into Milvus")
+            logger.info(f"Indexed file {file_id} into Milvus: {reindex_stats}")
 
             # Update status
-            update_data = {"status": FileStatus.INDEXED, "error_message": None, **chunk_stats}
+            update_data = {"status": FileStatus.INDEXED, "error_message": None, **chunk_stats, **RELEASED_CLAIM}
             if operator_id:
                 update_data["updated_by"] = operator_id
             updated_record = await KnowledgeFileRepository().update_fields(
@@ -761,6 +1269,7 @@ class MilvusKB(KnowledgeBase):
                     "error": None,
                 }
             )
+            result["reindex"] = reindex_stats
 
             return result
 
@@ -771,11 +1280,13 @@ class MilvusKB(KnowledgeBase):
                     current_task.uncancel()
             error_msg = "File indexing was cancelled" if isinstance(e, asyncio.CancelledError) else str(e)
             logger.error(f"Indexing failed for {file_id}: {error_msg}")
-            update_data = {"status": FileStatus.ERROR_INDEXING, "error_message": error_msg}
+            update_data = {"status": FileStatus.ERROR_INDEXING, "error_message": error_msg, **RELEASED_CLAIM}
             if operator_id:
                 update_data["updated_by"] = operator_id
             await KnowledgeFileRepository().update_fields(file_id=file_id, kb_id=kb_id, data=update_data)
             raise
+        finally:
+            heartbeat.cancel()
 
     async def update_content(
         self,
@@ -787,15 +1298,18 @@ class MilvusKB(KnowledgeBase):
         additional_params: dict[str, Any],
     ) -> list[dict]:
         """更新内容 - 根据file_ids重新解析文件并更新向量库"""
+        self._sync_collection_pin(kb_id, additional_params)
         collection = await self._get_or_create_milvus_collection(kb_id, embedding_model_spec)
         if not collection:
             raise ValueError(f"Failed to get Milvus collection for {kb_id}")
+        await self._ensure_index_profile(kb_id, collection, additional_params)
 
-        embedding_function = self._get_embedding_function(embedding_model_spec)
+        embedding_function = self._get_chunk_embedding_function(embedding_model_spec)
 
         # 处理默认参数
         if params is None:
             params = {}
+        incremental = bool(params.get(INCREMENTAL_REINDEX_KEY, MILVUS_INCREMENTAL_REINDEX))
         processed_items_info = []
 
         for file_id in file_ids:
@@ -812,6 +1326,7 @@ class MilvusKB(KnowledgeBase):
                 logger.warning(f"File path not found for {file_id}, skipping")
                 continue
 
+            heartbeat = None
             try:
                 # 更新状态为处理中
                 resolved_params = resolve_processing_params(
@@ -824,8 +1339,9 @@ class MilvusKB(KnowledgeBase):
                 await KnowledgeFileRepository().update_fields(
                     file_id=file_id,
                     kb_id=kb_id,
-                    data={"status": FileStatus.INDEXING, "processing_params": resolved_params},
+                    data={"status": FileStatus.INDEXING, "processing_params": resolved_params, **claim_fields()},
                 )
+                heartbeat = start_claim_heartbeat(kb_id, file_id)
 
                 # 重新解析文件为 markdown
                 parse_params = {**resolved_params, "image_bucket": "public", "image_prefix": f"{kb_id}/kb-images"}
@@ -833,16 +1349,22 @@ class MilvusKB(KnowledgeBase):
 
                 # 重新生成 chunks
                 chunks = self._split_text_into_chunks(markdown_content, file_id, filename, resolved_params)
+                self._assign_chunk_folder(chunks, file_meta)
                 logger.info(f"Split {filename} into {len(chunks)} chunks")
                 chunk_stats = self._calculate_chunk_stats(chunks)
 
-                # 先删除现有 chunks，保留文件元数据
-                await self.delete_file_chunks_only(kb_id, file_id)
-
-                if chunks:
-                    await self._embed_and_store_chunks(kb_id, file_id, collection, chunks, embedding_function)
+                # 替换现有 chunks，保留文件元数据
+                reindex_stats = await self._replace_file_chunks(
+                    kb_id,
+                    file_id,
+                    collection,
+                    chunks,
+                    embedding_function,
+                    incremental=incremental,
+                    previous_chunk_count=int(file_meta.get("chunk_count") or 0),
+                )
 
-                logger.info(f"Updated file {file_path} in Milvus. Done.")
+                logger.info(f"Updated file {file_path} in Milvus. Done. {reindex_stats}")
 
                 # 更新元数据状态
                 file_meta["status"] = FileStatus.INDEXED
@@ -850,13 +1372,14 @@ class MilvusKB(KnowledgeBase):
                 await KnowledgeFileRepository().update_fields(
                     file_id=file_id,
                     kb_id=kb_id,
-                    data={"status": FileStatus.INDEXED, "error_message": None, **chunk_stats},
+                    data={"status": FileStatus.INDEXED, "error_message": None, **chunk_stats, **RELEASED_CLAIM},
                 )
                 # 返回更新后的文件信息
                 updated_file_meta = file_meta.copy()
                 updated_file_meta["status"] = FileStatus.INDEXED
                 updated_file_meta.update(chunk_stats)
                 updated_file_meta["file_id"] = file_id
+                updated_file_meta["reindex"] = reindex_stats
                 processed_items_info.append(updated_file_meta)
 
             except Exception as e:
@@ -864,7 +1387,7 @@ class MilvusKB(KnowledgeBase):
                 await KnowledgeFileRepository().update_fields(
                     file_id=file_id,
                     kb_id=kb_id,
-                    data={"status": FileStatus.ERROR_INDEXING, "error_message": str(e)},
+                    data={"status": FileStatus.ERROR_INDEXING, "error_message": str(e), **RELEASED_CLAIM},
                 )
 
                 # 返回失败的文件信息
@@ -873,6 +1396,9 @@ class MilvusKB(KnowledgeBase):
                 failed_file_meta["error"] = str(e)
                 failed_file_meta["file_id"] = file_id
                 processed_items_info.append(failed_file_meta)
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
 
         return processed_items_info
 
@@ -899,6 +1425,73 @@ class MilvusKB(KnowledgeBase):
             chunk["distance"] = hit.distance
         return chunk
 
+    async def _search_collection(
+        self,
+        collection: Collection,
+        *,
+        data: list,
+        anns_field: str,
+        param: dict,
+        limit: int,
+        expr: str | None,
+        output_fields: list[str],
+        expr_params: dict[str, Any] | None = None,
+    ) -> Any:
+        # 换名切换期间暂停检索，之后按名称取到切换后的集合
+        async with self._switch_gate(collection.name).reading():
+            collection = self.collections.get(collection.name, collection)
+            async with self._collection_lease(None, collection):
+                pool = self.query_pool
+                if pool is not None and pool.available:
+                    try:
+                        return await pool.search(
+                            collection.name,
+                            data=data,
+                            anns_field=anns_field,
+                            search_params=param,
+                            limit=limit,
+                            filter=expr or "",
+                            filter_params=expr_params or {},
+                            output_fields=output_fields,
+                        )
+                    except MilvusAsyncClientUnavailableError:
+                        pass
+                return await _run_milvus_query_io(
+                    collection.search,
+                    data=data,
+                    anns_field=anns_field,
+                    param=param,
+                    limit=limit,
+                    expr=expr,
+                    expr_params=expr_params or {},
+                    output_fields=output_fields,
+                )
+
+    async def _hybrid_search_collection(
+        self,
+        collection: Collection,
+        *,
+        reqs: list[AnnSearchRequest],
+        rerank: WeightedRanker,
+        limit: int,
+        output_fields: list[str],
+    ) -> Any:
+        # 换名切换期间暂停检索，之后按名称取到切换后的集合
+        async with self._switch_gate(collection.name).reading():
+            collection = self.collections.get(collection.name, collection)
+            async with self._collection_lease(None, collection):
+                pool = self.query_pool
+                if pool is not None and pool.available:
+                    try:
+                        return await pool.hybrid_search(
+                            collection.name, reqs=reqs, ranker=rerank, limit=limit, output_fields=output_fields
+                        )
+                    except MilvusAsyncClientUnavailableError:
+                        pass
+                return await _run_milvus_query_io(
+                    collection.hybrid_search, reqs=reqs, rerank=rerank, limit=limit, output_fields=output_fields
+                )
+
     async def aquery(
         self,
         query_text: str,
@@ -909,14 +1502,62 @@ class MilvusKB(KnowledgeBase):
         **kwargs,
     ) -> list[dict]:
         """异步查询知识库"""
+        results = await self.aquery_many(kb_id, [query_text], config=config, agent_call=agent_call, **kwargs)
+        return results[0]
+
+    async def _rerank_chunks(self, query_text: str, kb_id: str, chunks: list[dict], reranker_model: str) -> None:
+        """就地写入 rerank_score 并按其排序；重排序失败时保留原检索顺序。"""
+        try:
+            from yuxi.models.rerank import RerankerUnavailableError, get_shared_reranker
+
+            # 共享实例复用长连接会话，由进程退出时统一关闭
+            reranker = get_shared_reranker(reranker_model)
+            rerank_start = time.time()
+            documents_text = [chunk["content"] for chunk in chunks]
+            chunk_ids = [chunk.get("metadata", {}).get("chunk_id") for chunk in chunks]
+            rerank_scores = await reranker.acompute_score(
+                [query_text, documents_text], normalize=True, chunk_ids=chunk_ids
+            )
+
+            for chunk, rerank_score in zip(chunks, rerank_scores):
+                chunk["rerank_score"] = float(rerank_score)
+
+            chunks.sort(key=lambda item: item.get("rerank_score", item.get("score", 0.0)), reverse=True)
+            elapsed = time.time() - rerank_start
+            logger.info(f"Reranking completed for {kb_id} in {elapsed:.3f}s with model {reranker_model}")
+
+        except RerankerUnavailableError as exc:
+            logger.warning(f"{exc}, falling back to retrieval scores")
+        except Exception as exc:  # noqa: BLE001
+            logger.error(f"Reranking failed: {exc}, falling back to vector scores")
+
+    async def aquery_many(
+        self,
+        kb_id: str,
+        queries: list[str],
+        *,
+        config: KnowledgeBaseConfig,
+        agent_call: bool = False,
+        **kwargs,
+    ) -> list[list[dict]]:
+        """批量检索知识库，结果与逐条调用 aquery 一致。
+
+        Query 向量一次批量计算，向量/BM25/混合检索均以 nq=len(queries) 发起单次 Milvus 请求，
+        文件名回填合并为一次查询，重排序按 Query 并发执行。
+        """
+        if not queries:
+            return []
         embedding_model_spec = config.embedding_model_spec
-        collection = await self._get_or_create_milvus_collection(kb_id, embedding_model_spec)
+        self._sync_collection_pin(kb_id, config.additional_params)
+        with trace_stage("load_collection"):
+            collection = await self._get_or_create_milvus_collection(kb_id, embedding_model_spec)
         if not collection:
             raise ValueError(f"Database {kb_id} not found")
 
         # 合并查询参数：kwargs（临时参数）优先级高于 query_params（持久化参数）
         # 这样允许用户在单次查询中临时覆盖持久化配置
         merged_kwargs = {**config.query_options, **kwargs}
+        queries = list(queries)
 
         try:
             # 查询参数（从 merged_kwargs 读取）
@@ -938,30 +1579,45 @@ class MilvusKB(KnowledgeBase):
             else:
                 recall_top_k = final_top_k
 
-            file_expr = await self._build_file_name_expr(kb_id, merged_kwargs.get("file_name"))
-            if file_expr:
+            with trace_stage("file_filter") as span:
+                file_filter = await self._build_file_filter(
+                    kb_id,
+                    collection,
+                    file_name=merged_kwargs.get("file_name"),
+                    folder_id=merged_kwargs.get("folder_id"),
+                )
+                if file_filter:
+                    span.set(candidates=len(file_filter.params.get("file_ids", [])))
+            file_expr = file_filter.expr if file_filter else None
+            file_expr_params = file_filter.params if file_filter else None
+            if file_filter:
                 logger.debug(f"Using filter expression: {file_expr}")
 
             output_fields = ["content", "chunk_id", "file_id", "chunk_index"]
-            retrieved_chunks: list[dict] = []
+            retrieved_by_query: list[list[dict]] = [[] for _ in queries]
             if search_mode == "vector":
-                embedding_function = self._get_embedding_function(embedding_model_spec, sync=True)
-                query_embedding = await _run_milvus_query_io(embedding_function, [query_text])
+                query_embeddings = await self._embed_queries(queries, embedding_model_spec)
 
-                search_params = {"metric_type": metric_type, "params": {"nprobe": 10}}
-
-                results = await _run_milvus_query_io(
-                    collection.search,
-                    data=query_embedding,
-                    anns_field="embedding",
-                    param=search_params,
-                    limit=recall_top_k,
-                    expr=file_expr,
-                    output_fields=output_fields,
+                index_type = await self._get_vector_index_type(kb_id, collection)
+                search_params = build_vector_search_params(
+                    config.additional_params, recall_top_k, metric_type, index_type
                 )
 
-                if results and len(results) > 0 and len(results[0]) > 0:
-                    for hit in results[0]:
+                with trace_stage("milvus_search", mode=search_mode, limit=recall_top_k) as span:
+                    results = await self._search_collection(
+                        collection,
+                        data=query_embeddings,
+                        anns_field="embedding",
+                        param=search_params,
+                        limit=recall_top_k,
+                        expr=file_expr,
+                        expr_params=file_expr_params,
+                        output_fields=output_fields,
+                    )
+                    span.set(candidates=sum(len(hits) for hits in results or []))
+
+                for retrieved_chunks, hits in zip(retrieved_by_query, results or []):
+                    for hit in hits:
                         similarity = hit.distance if metric_type == VECTOR_METRIC_TYPE else 1 / (1 + hit.distance)
                         if similarity < similarity_threshold:
                             continue
@@ -969,7 +1625,8 @@ class MilvusKB(KnowledgeBase):
                         retrieved_chunks.append(self._build_chunk_from_hit(hit, similarity, include_distances))
 
                 logger.debug(
-                    f"Milvus vector query response: {len(retrieved_chunks)} chunks found (after similarity filtering)"
+                    f"Milvus vector query response: {sum(map(len, retrieved_by_query))} chunks found "
+                    f"for {len(queries)} queries (after similarity filtering)"
                 )
 
             elif search_mode == "keyword":
@@ -981,41 +1638,45 @@ class MilvusKB(KnowledgeBase):
                     "params": {"drop_ratio_search": bm25_drop_ratio_search},
                 }
 
-                results = await _run_milvus_query_io(
-                    collection.search,
-                    data=[query_text],
-                    anns_field=CONTENT_SPARSE_FIELD,
-                    param=bm25_search_params,
-                    limit=bm25_top_k,
-                    expr=file_expr,
-                    output_fields=output_fields,
-                )
+                with trace_stage("milvus_search", mode=search_mode, limit=bm25_top_k) as span:
+                    results = await self._search_collection(
+                        collection,
+                        data=queries,
+                        anns_field=CONTENT_SPARSE_FIELD,
+                        param=bm25_search_params,
+                        limit=bm25_top_k,
+                        expr=file_expr,
+                        expr_params=file_expr_params,
+                        output_fields=output_fields,
+                    )
+                    span.set(candidates=sum(len(hits) for hits in results or []))
 
-                if results and len(results) > 0 and len(results[0]) > 0:
-                    for hit in results[0]:
+                for retrieved_chunks, hits in zip(retrieved_by_query, results or []):
+                    for hit in hits:
                         retrieved_chunks.append(
                             self._build_chunk_from_hit(hit, hit.distance, include_distances, score_field="bm25_score")
                         )
 
-                logger.debug(f"Milvus BM25 query response: {len(retrieved_chunks)} chunks found")
+                logger.debug(f"Milvus BM25 query response: {sum(map(len, retrieved_by_query))} chunks found")
             else:
-                embedding_function = self._get_embedding_function(embedding_model_spec, sync=True)
-                query_embedding = await _run_milvus_query_io(embedding_function, [query_text])
+                query_embeddings = await self._embed_queries(queries, embedding_model_spec)
                 bm25_top_k = int(merged_kwargs.get("bm25_top_k", recall_top_k))
                 bm25_top_k = max(bm25_top_k, 1)
                 bm25_drop_ratio_search = float(merged_kwargs.get("bm25_drop_ratio_search", 0.0))
                 vector_weight = float(merged_kwargs.get("vector_weight", 0.7))
                 bm25_weight = float(merged_kwargs.get("bm25_weight", 0.3))
 
+                index_type = await self._get_vector_index_type(kb_id, collection)
                 vector_request = AnnSearchRequest(
-                    data=query_embedding,
+                    data=query_embeddings,
                     anns_field="embedding",
-                    param={"metric_type": metric_type, "params": {"nprobe": 10}},
+                    param=build_vector_search_params(config.additional_params, recall_top_k, metric_type, index_type),
                     limit=recall_top_k,
                     expr=file_expr,
+                    expr_params=file_expr_params,
                 )
                 bm25_request = AnnSearchRequest(
-                    data=[query_text],
+                    data=queries,
                     anns_field=CONTENT_SPARSE_FIELD,
                     param={
                         "metric_type": "BM25",
@@ -1023,16 +1684,19 @@ class MilvusKB(KnowledgeBase):
                     },
                     limit=bm25_top_k,
                     expr=file_expr,
+                    expr_params=file_expr_params,
                 )
-                results = await _run_milvus_query_io(
-                    collection.hybrid_search,
-                    reqs=[vector_request, bm25_request],
-                    rerank=WeightedRanker(vector_weight, bm25_weight),
-                    limit=recall_top_k,
-                    output_fields=output_fields,
-                )
-                if results and len(results) > 0 and len(results[0]) > 0:
-                    for hit in results[0]:
+                with trace_stage("milvus_search", mode=search_mode, limit=recall_top_k) as span:
+                    results = await self._hybrid_search_collection(
+                        collection,
+                        reqs=[vector_request, bm25_request],
+                        rerank=WeightedRanker(vector_weight, bm25_weight),
+                        limit=recall_top_k,
+                        output_fields=output_fields,
+                    )
+                    span.set(candidates=sum(len(hits) for hits in results or []))
+                for retrieved_chunks, hits in zip(retrieved_by_query, results or []):
+                    for hit in hits:
                         score = float(hit.distance or 0.0)
                         if score < similarity_threshold:
                             continue
@@ -1040,65 +1704,63 @@ class MilvusKB(KnowledgeBase):
                             self._build_chunk_from_hit(hit, score, include_distances, score_field="hybrid_score")
                         )
 
-                logger.debug(f"Milvus hybrid query response: {len(retrieved_chunks)} chunks found")
+                logger.debug(f"Milvus hybrid query response: {sum(map(len, retrieved_by_query))} chunks found")
 
             if use_graph_retrieval:
-                graph_chunks = await self._retrieve_graph_chunks(
-                    query_text,
-                    kb_id,
-                    retrieved_chunks,
-                    merged_kwargs,
-                    embedding_model_spec,
-                )
-                if graph_chunks:
-                    graph_weight = float(merged_kwargs.get("graph_weight", 1.0))
-                    retrieved_chunks = self._fuse_chunk_rankings(retrieved_chunks, graph_chunks, graph_weight)
-
-            if not retrieved_chunks:
-                return []
-
-            await self._hydrate_chunk_sources(kb_id, retrieved_chunks)
-
-            if not use_reranker:
-                return retrieved_chunks[:final_top_k]
-
-            # 使用重排序模型
-            reranker_model = merged_kwargs.get("reranker_model")
-            if not reranker_model:
-                raise ValueError(
-                    "Reranker model must be specified when use_reranker=True. "
-                    "Please provide reranker_model in query parameters."
-                )
-
-            try:
-                from yuxi.models.rerank import get_reranker
-
-                reranker = get_reranker(reranker_model)
-                try:
-                    rerank_start = time.time()
-                    documents_text = [chunk["content"] for chunk in retrieved_chunks]
-                    rerank_scores = await reranker.acompute_score([query_text, documents_text], normalize=True)
-
-                    for chunk, rerank_score in zip(retrieved_chunks, rerank_scores):
-                        chunk["rerank_score"] = float(rerank_score)
-
-                    retrieved_chunks.sort(
-                        key=lambda item: item.get("rerank_score", item.get("score", 0.0)), reverse=True
+                graph_weight = float(merged_kwargs.get("graph_weight", 1.0))
+                with trace_stage("graph_retrieval") as span:
+                    graph_results = await asyncio.gather(
+                        *(
+                            self._retrieve_graph_chunks(
+                                query_text,
+                                kb_id,
+                                retrieved_chunks,
+                                merged_kwargs,
+                                embedding_model_spec,
+                            )
+                            for query_text, retrieved_chunks in zip(queries, retrieved_by_query)
+                        )
+                    )
+                    span.set(candidates=sum(map(len, graph_results)))
+                with trace_stage("rank_fusion") as span:
+                    retrieved_by_query = [
+                        self._fuse_chunk_rankings(retrieved_chunks, graph_chunks, graph_weight)
+                        if graph_chunks
+                        else retrieved_chunks
+                        for retrieved_chunks, graph_chunks in zip(retrieved_by_query, graph_results)
+                    ]
+                    span.set(candidates=sum(map(len, retrieved_by_query)))
+
+            all_chunks = [chunk for retrieved_chunks in retrieved_by_query for chunk in retrieved_chunks]
+            if not all_chunks:
+                return [[] for _ in queries]
+
+            with trace_stage("hydrate_sources", candidates=len(all_chunks)):
+                await self._hydrate_chunk_sources(kb_id, all_chunks)
+
+            if use_reranker:
+                # 使用重排序模型
+                reranker_model = merged_kwargs.get("reranker_model")
+                if not reranker_model:
+                    raise ValueError(
+                        "Reranker model must be specified when use_reranker=True. "
+                        "Please provide reranker_model in query parameters."
+                    )
+                with trace_stage("rerank", model=reranker_model, candidates=len(all_chunks)):
+                    await asyncio.gather(
+                        *(
+                            self._rerank_chunks(query_text, kb_id, retrieved_chunks, reranker_model)
+                            for query_text, retrieved_chunks in zip(queries, retrieved_by_query)
+                            if retrieved_chunks
+                        )
                     )
-                    elapsed = time.time() - rerank_start
-                    logger.info(f"Reranking completed for {kb_id} in {elapsed:.3f}s with model {reranker_model}")
-                finally:
-                    await reranker.aclose()
-
-            except Exception as exc:  # noqa: BLE001
-                logger.error(f"Reranking failed: {exc}, falling back to vector scores")
 
             # 统一返回结果
-            return retrieved_chunks[:final_top_k]
+            return [retrieved_chunks[:final_top_k] for retrieved_chunks in retrieved_by_query]
 
         except Exception as e:
             logger.error(f"Milvus query error: {e}, {traceback.format_exc()}")
-            return []
+            return [[] for _ in queries]
 
     async def _retrieve_graph_chunks(
         self,
@@ -1252,14 +1914,15 @@ class MilvusKB(KnowledgeBase):
             except Exception as e:
                 logger.error(f"Failed to delete graph data for file {file_id}: {e}")
         await chunk_repo.delete_by_file_id(file_id)
-        collection = self._get_existing_milvus_collection(kb_id)
-
-        if collection:
-            # 先查询文件是否存在，避免不必要的删除操作
-            try:
-                await self._delete_file_chunks_from_milvus(collection, file_id)
-            except Exception as e:
-                logger.error(f"Error checking file existence in Milvus: {e}")
+        async with self._switch_gate(kb_id).writing(file_id):
+            collection = self._get_existing_milvus_collection(kb_id)
+            if collection:
+                # 先查询文件是否存在，避免不必要的删除操作
+                try:
+                    async with self._collection_lease(kb_id, collection):
+                        await self._delete_file_chunks_from_milvus(collection, file_id)
+                except Exception as e:
+                    logger.error(f"Error checking file existence in Milvus: {e}")
         await KnowledgeFileRepository().update_fields(
             file_id=file_id,
             kb_id=kb_id,
@@ -1273,6 +1936,20 @@ class MilvusKB(KnowledgeBase):
 
         await KnowledgeFileRepository().delete(file_id)
 
+    async def move_file(self, kb_id: str, file_id: str, new_parent_id: str | None) -> dict:
+        """移动文件后同步其 chunk 的 folder_id；目录移动不改变其下文件的直接父目录，无需改写。"""
+        meta = await super().move_file(kb_id, file_id, new_parent_id)
+        if meta.get("is_folder"):
+            return meta
+
+        # 迁移中的旧集合没有 folder_id，登记后由迁移按最新目录重放
+        async with self._switch_gate(kb_id).writing(file_id):
+            collection = self._get_existing_milvus_collection(kb_id)
+            if collection is not None and collection_supports_file_filter(collection):
+                async with self._collection_lease(kb_id, collection):
+                    await asyncio.to_thread(set_file_folder, collection, file_id, new_parent_id or ROOT_FOLDER_ID)
+        return meta
+
     async def get_file_basic_info(self, kb_id: str, file_id: str) -> dict:
         """获取文件基本信息（仅元数据）"""
         return {"meta": await self._load_file_meta(kb_id, file_id)}
@@ -1336,12 +2013,22 @@ class MilvusKB(KnowledgeBase):
                     logger.info(f"Milvus collection {kb_id} does not exist, skipping")
             except Exception as e:
                 logger.error(f"Failed to drop Milvus collection {kb_id}: {e}")
+            # 中断的 schema 迁移可能留下的集合
+            for leftover in (f"{kb_id}{SHADOW_COLLECTION_SUFFIX}", f"{kb_id}{LEGACY_COLLECTION_SUFFIX}"):
+                try:
+                    if utility.has_collection(leftover, using=self.connection_alias):
+                        utility.drop_collection(leftover, using=self.connection_alias)
+                except Exception as e:
+                    logger.error(f"Failed to drop Milvus collection {leftover}: {e}")
 
             from yuxi.knowledge.graphs.milvus_graph_vector_store import MilvusGraphVectorStore
 
             MilvusGraphVectorStore().drop_graph_collections(kb_id)
 
         await asyncio.to_thread(delete_milvus_collections)
+        self.vector_indexes.pop(kb_id, None)
+        if self.residency is not None:
+            self.residency.forget(kb_id)
 
         return await super().cleanup_database_resources(kb_id)
 
@@ -0,0 +1,167 @@
+"""Milvus 检索的原生异步访问层。
+
+同步 pymilvus 调用经 ``asyncio.to_thread`` 卸载时，并发受线程池与卸载信号量限制；
+``AsyncMilvusClient`` 基于 gRPC aio，检索请求直接在事件循环上复用长连接。
+连接池按事件循环维护若干客户端轮询使用，并以信号量限制单个循环的在途请求数。
+
+通过 ``MILVUS_QUERY_IO_MODE`` 选择访问方式：``async``（默认）或 ``thread``（回退到线程卸载）。
+Milvus Lite（本地文件 URI）不支持异步客户端，自动使用线程卸载。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from yuxi.utils import logger
+
+MILVUS_QUERY_IO_MODE = (os.getenv("MILVUS_QUERY_IO_MODE") or "async").strip().lower()
+MILVUS_ASYNC_POOL_SIZE = max(1, int(os.getenv("MILVUS_ASYNC_POOL_SIZE") or 4))
+MILVUS_ASYNC_MAX_INFLIGHT = max(1, int(os.getenv("MILVUS_ASYNC_MAX_INFLIGHT") or 128))
+_REMOTE_URI_SCHEMES = ("http://", "https://", "tcp://", "grpc://", "unix:")
+
+_query_pools: weakref.WeakSet[MilvusAsyncQueryPool] = weakref.WeakSet()
+
+
+class MilvusAsyncClientUnavailableError(RuntimeError):
+    """异步客户端无法创建，调用方应回退到线程卸载。"""
+
+
+@dataclass
+class _LoopClients:
+    loop_ref: weakref.ReferenceType[asyncio.AbstractEventLoop]
+    clients: list[Any]
+    semaphore: asyncio.Semaphore
+    next_index: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    requests: int = 0
+
+    def pick(self) -> Any:
+        client = self.clients[self.next_index % len(self.clients)]
+        self.next_index += 1
+        return client
+
+
+def _default_client_factory(uri: str, token: str, db_name: str) -> Callable[[], Any]:
+    def factory() -> Any:
+        from pymilvus import AsyncMilvusClient
+
+        return AsyncMilvusClient(uri=uri, token=token, db_name=db_name)
+
+    return factory
+
+
+class MilvusAsyncQueryPool:
+    """按事件循环维护的 ``AsyncMilvusClient`` 连接池，只承载检索类请求。"""
+
+    def __init__(
+        self,
+        uri: str = "",
+        token: str = "",
+        db_name: str = "",
+        *,
+        size: int = MILVUS_ASYNC_POOL_SIZE,
+        max_inflight: int = MILVUS_ASYNC_MAX_INFLIGHT,
+        client_factory: Callable[[], Any] | None = None,
+    ) -> None:
+        self.uri = uri
+        self.size = max(int(size), 1)
+        self.max_inflight = max(int(max_inflight), 1)
+        self.disabled = False
+        self._client_factory = client_factory or _default_client_factory(uri, token, db_name)
+        self._loops: dict[int, _LoopClients] = {}
+
+    @property
+    def available(self) -> bool:
+        return not self.disabled
+
+    def _loop_clients(self) -> _LoopClients:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(id(loop))
+        if state is not None and state.loop_ref() is loop:
+            return state
+
+        # gRPC aio 通道绑定创建时的事件循环，已结束循环的客户端直接丢弃
+        self._loops = {loop_id: item for loop_id, item in self._loops.items() if item.loop_ref() is not None}
+        try:
+            clients = [self._client_factory() for _ in range(self.size)]
+        except Exception as exc:
+            self.disabled = True
+            logger.warning(f"AsyncMilvusClient unavailable for {self.uri}, falling back to thread offload: {exc}")
+            raise MilvusAsyncClientUnavailableError(str(exc)) from exc
+
+        state = _LoopClients(
+            loop_ref=weakref.ref(loop),
+            clients=clients,
+            semaphore=asyncio.Semaphore(self.max_inflight),
+        )
+        self._loops[id(loop)] = state
+        return state
+
+    async def _call(self, method: str, collection_name: str, **kwargs) -> Any:
+        state = self._loop_clients()
+        async with state.semaphore:
+            client = state.pick()
+            state.requests += 1
+            state.in_flight += 1
+            state.peak_in_flight = max(state.peak_in_flight, state.in_flight)
+            try:
+                return await getattr(client, method)(collection_name, **kwargs)
+            finally:
+                state.in_flight -= 1
+
+    async def search(self, collection_name: str, **kwargs) -> Any:
+        return await self._call("search", collection_name, **kwargs)
+
+    async def hybrid_search(self, collection_name: str, **kwargs) -> Any:
+        return await self._call("hybrid_search", collection_name, **kwargs)
+
+    def get_stats(self) -> dict[str, Any]:
+        states = list(self._loops.values())
+        return {
+            "mode": "thread" if self.disabled else "async",
+            "clients": sum(len(state.clients) for state in states),
+            "in_flight": sum(state.in_flight for state in states),
+            "peak_in_flight": max((state.peak_in_flight for state in states), default=0),
+            "requests": sum(state.requests for state in states),
+        }
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的客户端；其他循环的客户端随循环结束释放。"""
+        loop = asyncio.get_running_loop()
+        state = self._loops.pop(id(loop), None)
+        if state is None or state.loop_ref() is not loop:
+            return
+        results = await asyncio.gather(*(client.close() for client in state.clients), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to close AsyncMilvusClient: {result}")
+
+
+def create_milvus_query_pool(
+    uri: str,
+    token: str = "",
+    db_name: str = "",
+    *,
+    mode: str | None = None,
+) -> MilvusAsyncQueryPool | None:
+    """按配置创建检索连接池；返回 None 表示使用线程卸载路径。"""
+    mode = (mode or MILVUS_QUERY_IO_MODE).lower()
+    if mode != "async":
+        return None
+    if not uri.lower().startswith(_REMOTE_URI_SCHEMES):
+        logger.info(f"Milvus URI {uri} is not a server endpoint, using thread offload for queries")
+        return None
+    pool = MilvusAsyncQueryPool(uri, token, db_name)
+    _query_pools.add(pool)
+    return pool
+
+
+async def close_milvus_query_pools() -> None:
+    for pool in list(_query_pools):
+        await pool.aclose()
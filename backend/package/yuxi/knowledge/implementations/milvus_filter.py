@@ -0,0 +1,239 @@
+"""Milvus chunk 集合的文件/目录过滤。
+
+新建集合以 ``file_id`` 作为 partition key，并为 ``file_id``、``folder_id``（文件所在目录）建立 INVERTED 标量索引。
+文件名、目录过滤统一生成模板化表达式（``file_id in {file_ids}`` + ``expr_params``），
+候选 id 以类型化数组随请求发送，不再拼接进表达式字符串，避免超长表达式的解析开销与长度上限。
+旧 schema 的集合在后台全量复制到新集合；复制期间的写入按文件记录在 ``CollectionSwitchGate`` 中，
+暂停写入后由 ``replay_files`` 按文件重放，再暂停检索并换名切换，切换后不再回头同步旧集合。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from pymilvus import DataType, FieldSchema
+
+from yuxi.utils import logger
+
+FILE_ID_FIELD = "file_id"
+FOLDER_ID_FIELD = "folder_id"
+ROOT_FOLDER_ID = ""
+NO_MATCH_FILE_ID = "__no_matching_file__"
+SCALAR_INDEX_PARAMS = {"index_type": "INVERTED"}
+MILVUS_FILE_PARTITIONS = max(1, int(os.getenv("MILVUS_FILE_PARTITIONS") or 16))
+MILVUS_MIGRATION_BATCH_SIZE = max(1, int(os.getenv("MILVUS_MIGRATION_BATCH_SIZE") or 1000))
+SHADOW_COLLECTION_SUFFIX = "__filter_v2"
+LEGACY_COLLECTION_SUFFIX = "__legacy"
+
+# 迁移时从旧集合复制的字段；BM25 稀疏向量由新集合的 Function 重新生成
+COPY_FIELDS = ["id", "content", "chunk_id", "file_id", "chunk_index", "embedding"]
+
+
+@dataclass(frozen=True)
+class FileFilter:
+    """Milvus 过滤表达式及其模板参数。"""
+
+    expr: str
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+def build_file_filter(
+    *,
+    file_ids: list[str] | None = None,
+    folder_ids: list[str] | None = None,
+) -> FileFilter | None:
+    """生成模板化过滤表达式；传入空列表表示没有匹配项。"""
+    clauses: list[str] = []
+    params: dict[str, Any] = {}
+    if file_ids is not None:
+        clauses.append(f"{FILE_ID_FIELD} in {{file_ids}}")
+        params["file_ids"] = list(dict.fromkeys(file_ids)) or [NO_MATCH_FILE_ID]
+    if folder_ids is not None:
+        clauses.append(f"{FOLDER_ID_FIELD} in {{folder_ids}}")
+        params["folder_ids"] = list(dict.fromkeys(folder_ids)) or [NO_MATCH_FILE_ID]
+    if not clauses:
+        return None
+    expr = clauses[0] if len(clauses) == 1 else " and ".join(f"({clause})" for clause in clauses)
+    return FileFilter(expr, params)
+
+
+def expand_folder_ids(folder_id: str, folder_parents: dict[str, str | None]) -> list[str]:
+    """返回目录及其全部子目录的 id，folder_parents 为 folder_id -> parent_id 映射。"""
+    children: dict[str, list[str]] = {}
+    for child_id, parent_id in folder_parents.items():
+        if parent_id:
+            children.setdefault(parent_id, []).append(child_id)
+
+    expanded: list[str] = []
+    pending = [folder_id]
+    seen: set[str] = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        expanded.append(current)
+        pending.extend(children.get(current, []))
+    return expanded
+
+
+def build_filter_fields() -> list[FieldSchema]:
+    """新集合的 file_id（partition key）与 folder_id 字段。"""
+    return [
+        FieldSchema(name=FILE_ID_FIELD, dtype=DataType.VARCHAR, max_length=100, is_partition_key=True),
+        FieldSchema(name=FOLDER_ID_FIELD, dtype=DataType.VARCHAR, max_length=100, default_value=ROOT_FOLDER_ID),
+    ]
+
+
+def create_scalar_indexes(collection: Any) -> None:
+    for field_name in (FILE_ID_FIELD, FOLDER_ID_FIELD):
+        collection.create_index(field_name, SCALAR_INDEX_PARAMS, index_name=f"{field_name}_inverted")
+
+
+def collection_supports_file_filter(collection: Any) -> bool:
+    """集合是否为带 folder_id 字段与 file_id partition key 的新 schema。"""
+    schema = getattr(collection, "schema", None)
+    if schema is None:
+        return False
+    fields = {item.name: item for item in schema.fields}
+    file_field = fields.get(FILE_ID_FIELD)
+    return FOLDER_ID_FIELD in fields and bool(getattr(file_field, "is_partition_key", False))
+
+
+def _with_folder(rows: list[dict[str, Any]], folder_by_file: dict[str, str | None]) -> list[dict[str, Any]]:
+    return [
+        {
+            **{name: row[name] for name in COPY_FIELDS},
+            FOLDER_ID_FIELD: folder_by_file.get(str(row[FILE_ID_FIELD])) or ROOT_FOLDER_ID,
+        }
+        for row in rows
+    ]
+
+
+def copy_all_rows(
+    source: Any,
+    target: Any,
+    folder_by_file: dict[str, str | None],
+    *,
+    batch_size: int = MILVUS_MIGRATION_BATCH_SIZE,
+) -> int:
+    """全量复制 source 的 chunk 到 target，返回复制的行数。"""
+    copied = 0
+    iterator = source.query_iterator(batch_size=batch_size, expr='id != ""', output_fields=COPY_FIELDS)
+    try:
+        while rows := iterator.next():
+            target.insert(_with_folder(rows, folder_by_file))
+            copied += len(rows)
+    finally:
+        iterator.close()
+    return copied
+
+
+def replay_files(
+    source: Any,
+    target: Any,
+    folder_by_file: dict[str, str | None],
+    file_ids: list[str],
+    *,
+    batch_size: int = MILVUS_MIGRATION_BATCH_SIZE,
+) -> int:
+    """以 source 为准重建 target 中这些文件的 chunk，返回重放的行数。
+
+    先删除 target 中该文件的全部 chunk 再从 source 复制，复制期间被删除的文件（墓碑）在 target 中随之清空。
+    需在暂停写入后调用。
+    """
+    replayed = 0
+    for start in range(0, len(file_ids), batch_size):
+        batch = file_ids[start : start + batch_size]
+        target.delete(expr=f"{FILE_ID_FIELD} in {{file_ids}}", expr_params={"file_ids": batch})
+        iterator = source.query_iterator(
+            batch_size=batch_size,
+            expr=f"{FILE_ID_FIELD} in {{file_ids}}",
+            expr_params={"file_ids": batch},
+            output_fields=COPY_FIELDS,
+        )
+        try:
+            while rows := iterator.next():
+                target.insert(_with_folder(rows, folder_by_file))
+                replayed += len(rows)
+        finally:
+            iterator.close()
+    if file_ids:
+        logger.info(f"Replayed migration writes: files={len(file_ids)}, rows={replayed}")
+    return replayed
+
+
+def set_file_folder(
+    collection: Any, file_id: str, folder_id: str, *, batch_size: int = MILVUS_MIGRATION_BATCH_SIZE
+) -> int:
+    """文件移动目录后改写其 chunk 的 folder_id（按主键 upsert），返回改写的 chunk 数。"""
+    updated = 0
+    escaped_id = file_id.replace('"', '\\"')
+    iterator = collection.query_iterator(
+        batch_size=batch_size, expr=f'{FILE_ID_FIELD} == "{escaped_id}"', output_fields=COPY_FIELDS
+    )
+    try:
+        while rows := iterator.next():
+            collection.upsert(_with_folder(rows, {file_id: folder_id}))
+            updated += len(rows)
+    finally:
+        iterator.close()
+    return updated
+
+
+class CollectionSwitchGate:
+    """单个知识库集合的读写闸门，配合 schema 迁移的在线切换（仅协调本进程内的读写）。
+
+    平时检索与写入互不阻塞；迁移开始后记录写入过的文件（含删除，即墓碑），
+    重放这些文件前暂停写入，换名期间再暂停检索，请求不会落在换名间隙中不存在的集合名上。
+    """
+
+    def __init__(self) -> None:
+        self._condition = asyncio.Condition()
+        self._active = {"read": 0, "write": 0}
+        self._paused = {"read": False, "write": False}
+        self.touched_files: set[str] | None = None
+
+    @asynccontextmanager
+    async def _enter(self, kind: str) -> AsyncIterator[None]:
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._paused[kind])
+            self._active[kind] += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._active[kind] -= 1
+                self._condition.notify_all()
+
+    def reading(self):
+        return self._enter("read")
+
+    @asynccontextmanager
+    async def writing(self, file_id: str) -> AsyncIterator[None]:
+        async with self._enter("write"):
+            try:
+                yield
+            finally:
+                # 结束时登记，开始记录前已在途的写入同样会被重放
+                if self.touched_files is not None:
+                    self.touched_files.add(str(file_id))
+
+    @asynccontextmanager
+    async def paused(self, kind: str) -> AsyncIterator[None]:
+        """阻止新的读或写进入，并等待在途的读或写结束。"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._paused[kind])
+            self._paused[kind] = True
+            await self._condition.wait_for(lambda: self._active[kind] == 0)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._paused[kind] = False
+                self._condition.notify_all()
@@ -0,0 +1,298 @@
+"""Milvus 向量索引配置档与检索参数自动调优。
+
+知识库在 ``additional_params.index_profile`` 中选择向量索引类型（IVF_FLAT / IVF_SQ8 / HNSW / DISKANN），
+检索时按集合上实际创建的索引类型生成对应的检索参数（nprobe / ef / search_list）。
+``SearchParamTuner`` 离线抽样已入库的 chunk 向量作为 Query，以暴力检索结果为基准
+从小到大扫描检索参数，选出满足目标 recall@k 的最低开销参数，结果保存在
+``additional_params.tuned_search_params`` 中，仅在索引类型与调优时一致时生效。
+集合行数超过 ``max_corpus`` 时只读取前 ``max_corpus`` 行作为基准，ANN 检索也限定在这些 id 内，两者口径一致。
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from yuxi.utils import logger
+from yuxi.utils.datetime_utils import utc_isoformat
+
+INDEX_PROFILE_KEY = "index_profile"
+TUNED_SEARCH_PARAMS_KEY = "tuned_search_params"
+DEFAULT_INDEX_PROFILE = "IVF_FLAT"
+VECTOR_FIELD = "embedding"
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """一种向量索引的建索引参数与可调的检索参数。"""
+
+    name: str
+    build_params: dict[str, Any] = field(default_factory=dict)
+    search_param: str = "nprobe"
+    default_search_value: int = 10
+    sweep_values: tuple[int, ...] = ()
+    # HNSW 的 ef、DISKANN 的 search_list 不能小于 limit
+    search_value_at_least_limit: bool = False
+
+    def index_params(self, metric_type: str) -> dict[str, Any]:
+        return {"metric_type": metric_type, "index_type": self.name, "params": dict(self.build_params)}
+
+    def search_params(self, metric_type: str, limit: int, value: int | None = None) -> dict[str, Any]:
+        value = int(value if value is not None else self.default_search_value)
+        if self.search_value_at_least_limit:
+            value = max(value, int(limit))
+        return {"metric_type": metric_type, "params": {self.search_param: value}}
+
+
+_IVF_SWEEP = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+INDEX_PROFILES: dict[str, IndexProfile] = {
+    "IVF_FLAT": IndexProfile("IVF_FLAT", {"nlist": 1024}, "nprobe", 10, _IVF_SWEEP),
+    "IVF_SQ8": IndexProfile("IVF_SQ8", {"nlist": 1024}, "nprobe", 10, _IVF_SWEEP),
+    "HNSW": IndexProfile(
+        "HNSW", {"M": 16, "efConstruction": 200}, "ef", 64, (16, 32, 48, 64, 96, 128, 192, 256, 384, 512), True
+    ),
+    # DISKANN 依赖 Milvus 单机/集群的磁盘索引能力，Milvus Lite 等环境下建索引失败时回退默认配置档
+    "DISKANN": IndexProfile("DISKANN", {}, "search_list", 100, (16, 32, 48, 64, 100, 150, 200, 300), True),
+}
+
+
+def normalize_index_profile_name(value: Any) -> str:
+    name = str(value or DEFAULT_INDEX_PROFILE).strip().upper()
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"不支持的向量索引类型: {value}，可选: {', '.join(INDEX_PROFILES)}")
+    return name
+
+
+def resolve_index_profile(additional_params: dict[str, Any] | None) -> IndexProfile:
+    return INDEX_PROFILES[normalize_index_profile_name((additional_params or {}).get(INDEX_PROFILE_KEY))]
+
+
+def build_vector_search_params(
+    additional_params: dict[str, Any] | None, limit: int, metric_type: str, index_type: str | None = None
+) -> dict[str, Any]:
+    """生成向量检索参数，优先使用与当前索引类型一致的调优结果。
+
+    index_type 为集合上实际创建的索引类型，配置档不可用而回退默认索引时按实际类型生成参数；
+    未知时按知识库配置档推断。
+    """
+    params = additional_params or {}
+    profile = INDEX_PROFILES.get(str(index_type or "").upper()) or resolve_index_profile(params)
+    tuned = params.get(TUNED_SEARCH_PARAMS_KEY)
+    value = None
+    if isinstance(tuned, dict) and tuned.get("profile") == profile.name:
+        value = (tuned.get("params") or {}).get(profile.search_param)
+    return profile.search_params(metric_type, limit, value)
+
+
+def _vector_index_name(profile_name: str) -> str:
+    return f"{VECTOR_FIELD}_{profile_name.lower()}"
+
+
+def describe_vector_index(collection: Any) -> tuple[str | None, str | None]:
+    """返回集合向量字段当前的 (索引类型, 请求的配置档)。
+
+    请求的配置档记录在索引名中，回退默认索引时二者不同；未按配置档命名的索引视为请求即实际类型。
+    """
+    for index in getattr(collection, "indexes", None) or []:
+        if index.field_name != VECTOR_FIELD:
+            continue
+        index_type = str((index.params or {}).get("index_type") or "").upper() or None
+        requested = next((name for name in INDEX_PROFILES if index.index_name == _vector_index_name(name)), None)
+        return index_type, requested or index_type
+    return None, None
+
+
+def get_vector_index_type(collection: Any) -> str | None:
+    """返回集合向量字段当前的索引类型。"""
+    return describe_vector_index(collection)[0]
+
+
+def applied_index_profile(collection: Any, profile: IndexProfile) -> str | None:
+    """集合已按该配置档建过索引（含回退默认索引）时返回实际索引类型，否则返回 None。"""
+    current, requested = describe_vector_index(collection)
+    return current if requested == profile.name else None
+
+
+def rebuild_vector_index(collection: Any, profile: IndexProfile, metric_type: str) -> str:
+    """删除并按配置档重建向量索引（同步，集合需已释放），返回实际生效的索引类型。"""
+    current, _ = describe_vector_index(collection)
+    logger.info(f"Rebuilding vector index of {collection.name}: {current} -> {profile.name}")
+    if current is not None:
+        collection.drop_index(index_name=next(i.index_name for i in collection.indexes if i.field_name == VECTOR_FIELD))
+    index_name = _vector_index_name(profile.name)
+    try:
+        collection.create_index(VECTOR_FIELD, profile.index_params(metric_type), index_name=index_name)
+        applied = profile.name
+    except Exception as exc:
+        if profile.name == DEFAULT_INDEX_PROFILE:
+            raise
+        logger.warning(f"Index profile {profile.name} unavailable for {collection.name}, using default: {exc}")
+        default_params = INDEX_PROFILES[DEFAULT_INDEX_PROFILE].index_params(metric_type)
+        collection.create_index(VECTOR_FIELD, default_params, index_name=index_name)
+        applied = DEFAULT_INDEX_PROFILE
+    return applied
+
+
+def apply_index_profile(collection: Any, profile: IndexProfile, metric_type: str) -> str:
+    """将集合向量索引切换到指定配置档（同步，需在线程中调用），返回实际生效的索引类型。
+
+    以 Milvus 中现有的索引为准：已按该配置档建过索引（含回退默认索引）时不再重建，进程重启后也不会重复删建。
+    直接释放与加载集合，仅用于不受驻留管理的集合（如迁移中的新集合）。
+    """
+    applied = applied_index_profile(collection, profile)
+    if applied is not None:
+        return applied
+    collection.release()
+    applied = rebuild_vector_index(collection, profile, metric_type)
+    collection.load()
+    return applied
+
+
+class SearchParamTuner:
+    """以暴力检索为基准，扫描检索参数以满足目标 recall@k。
+
+    集合需要提供 ``query_iterator`` 与 ``search``（pymilvus ORM Collection 接口）。
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        profile: IndexProfile,
+        *,
+        metric_type: str,
+        k: int = 10,
+        target_recall: float = 0.95,
+        sample_size: int = 100,
+        max_corpus: int = 200_000,
+        batch_size: int = 1000,
+        seed: int = 0,
+    ) -> None:
+        self.collection = collection
+        self.profile = profile
+        self.metric_type = metric_type
+        self.k = max(int(k), 1)
+        self.target_recall = float(target_recall)
+        self.sample_size = max(int(sample_size), 1)
+        self.max_corpus = max(int(max_corpus), 1)
+        self.batch_size = max(int(batch_size), 1)
+        self.seed = seed
+        # 集合行数超过 max_corpus 时，ANN 检索限定在基准语料的 id 内
+        self.corpus_ids: list[str] | None = None
+
+    def load_vectors(self) -> tuple[list[str], np.ndarray]:
+        ids: list[str] = []
+        vectors: list[list[float]] = []
+        truncated = False
+        iterator = self.collection.query_iterator(batch_size=self.batch_size, output_fields=["id", VECTOR_FIELD])
+        try:
+            while len(ids) < self.max_corpus:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for row in batch:
+                    ids.append(str(row["id"]))
+                    vectors.append(row[VECTOR_FIELD])
+            truncated = len(ids) > self.max_corpus or (len(ids) == self.max_corpus and bool(iterator.next()))
+        finally:
+            iterator.close()
+        ids, vectors = ids[: self.max_corpus], vectors[: self.max_corpus]
+        if truncated:
+            logger.warning(
+                f"Collection {getattr(self.collection, 'name', '')} exceeds max_corpus={self.max_corpus}, "
+                "restricting tuning searches to the sampled corpus"
+            )
+            self.corpus_ids = ids
+        return ids, np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+
+    def _exact_top_k(self, queries: np.ndarray, corpus: np.ndarray, ids: list[str]) -> list[set[str]]:
+        if self.metric_type == "COSINE":
+            corpus = corpus / np.maximum(np.linalg.norm(corpus, axis=1, keepdims=True), 1e-12)
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            scores = queries @ corpus.T
+        elif self.metric_type == "IP":
+            scores = queries @ corpus.T
+        else:
+            scores = -(
+                (queries**2).sum(axis=1, keepdims=True) - 2 * queries @ corpus.T + (corpus**2).sum(axis=1)[None, :]
+            )
+        k = min(self.k, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return [{ids[index] for index in row} for row in top]
+
+    def _measure(self, queries: np.ndarray, truth: list[set[str]], value: int) -> dict[str, Any]:
+        scope: dict[str, Any] = {}
+        if self.corpus_ids is not None:
+            scope = {"expr": "id in {corpus_ids}", "expr_params": {"corpus_ids": self.corpus_ids}}
+        started_at = time.perf_counter()
+        results = self.collection.search(
+            data=queries.tolist(),
+            anns_field=VECTOR_FIELD,
+            param=self.profile.search_params(self.metric_type, self.k, value),
+            limit=self.k,
+            output_fields=[],
+            **scope,
+        )
+        elapsed = time.perf_counter() - started_at
+        recalls = []
+        for hits, expected in zip(results, truth, strict=True):
+            found = {str(hit.id) for hit in hits}
+            recalls.append(len(found & expected) / max(len(expected), 1))
+        return {
+            self.profile.search_param: value,
+            "recall": round(float(np.mean(recalls)), 4),
+            "latency_ms": round(elapsed * 1000 / max(len(truth), 1), 3),
+        }
+
+    def run(self) -> dict[str, Any]:
+        ids, corpus = self.load_vectors()
+        if not ids:
+            raise ValueError("知识库中没有可用于调优的向量")
+
+        rng = random.Random(self.seed)
+        sample = rng.sample(range(len(ids)), min(self.sample_size, len(ids)))
+        queries = corpus[sample]
+        truth = self._exact_top_k(queries, corpus, ids)
+
+        sweep: list[dict[str, Any]] = []
+        chosen: dict[str, Any] | None = None
+        values = sorted(
+            {
+                self.profile.search_params(self.metric_type, self.k, v)["params"][self.profile.search_param]
+                for v in self.profile.sweep_values
+            }
+        )
+        # 参数越大开销越高，从小到大扫描，首个满足目标的即为最低开销参数
+        for value in values:
+            measurement = self._measure(queries, truth, value)
+            sweep.append(measurement)
+            if measurement["recall"] >= self.target_recall:
+                chosen = measurement
+                break
+
+        meets_target = chosen is not None
+        if chosen is None:
+            chosen = max(sweep, key=lambda item: item["recall"])
+            logger.warning(
+                f"Search param sweep for {self.profile.name} did not reach recall {self.target_recall}, "
+                f"best={chosen['recall']}"
+            )
+
+        return {
+            "profile": self.profile.name,
+            "params": {self.profile.search_param: chosen[self.profile.search_param]},
+            "recall": chosen["recall"],
+            "latency_ms": chosen["latency_ms"],
+            "target_recall": self.target_recall,
+            "meets_target": meets_target,
+            "k": self.k,
+            "sample_size": len(sample),
+            "corpus_size": len(ids),
+            "corpus_truncated": self.corpus_ids is not None,
+            "sweep": sweep,
+            "tuned_at": utc_isoformat(),
+        }
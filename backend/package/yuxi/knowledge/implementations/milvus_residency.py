@@ -0,0 +1,383 @@
+"""Milvus 集合的内存驻留管理。
+
+每个知识库对应一个 chunk 集合，全部常驻时 Milvus 内存随知识库总数增长。
+``CollectionResidencyManager`` 记录各集合最近访问时间，超出集合数或估算内存预算时按 LRU 释放冷集合；
+被释放的集合在下次访问时透明地重新加载。固定（pin）的集合与正在检索的集合不会被释放。
+
+Milvus 的加载状态由所有进程共享（API 服务与 arq worker 都会检索），``SharedResidencyLeases`` 通过 Redis 协调：
+每个进程使用集合时登记租约，其他进程在租约有效期内不会释放该集合；释放在 Redis 锁内进行并递增释放代数，
+其他进程下次使用时发现代数变化即重新加载。Redis 不可用时退回仅按本进程状态释放。
+启动时从 Milvus 读取已加载的集合作为初始状态，上次运行加载的集合同样受预算约束。
+
+- ``MILVUS_MAX_LOADED_COLLECTIONS``：最多同时加载的集合数，0 表示不限制；
+- ``MILVUS_LOADED_MEMORY_BUDGET_MB``：已加载集合的估算内存上限，0 表示不限制；
+- ``MILVUS_PINNED_COLLECTIONS``：逗号分隔的常驻集合名，知识库也可通过 ``additional_params.pin_collection`` 固定；
+- ``MILVUS_RESIDENCY_LEASE_SECONDS``：进程使用集合后，其他进程在此时长内不会释放它。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import statistics
+import time
+import uuid
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from yuxi.storage.redis.fallback import RedisFallback
+from yuxi.utils import logger
+from yuxi.utils.datetime_utils import utc_isoformat_from_timestamp
+
+MILVUS_MAX_LOADED_COLLECTIONS = max(0, int(os.getenv("MILVUS_MAX_LOADED_COLLECTIONS") or 0))
+MILVUS_LOADED_MEMORY_BUDGET_MB = max(0, int(os.getenv("MILVUS_LOADED_MEMORY_BUDGET_MB") or 0))
+MILVUS_PINNED_COLLECTIONS = frozenset(
+    name.strip() for name in (os.getenv("MILVUS_PINNED_COLLECTIONS") or "").split(",") if name.strip()
+)
+MILVUS_RESIDENCY_LEASE_SECONDS = max(1, int(os.getenv("MILVUS_RESIDENCY_LEASE_SECONDS") or 600))
+MILVUS_RESIDENCY_RELEASE_LOCK_SECONDS = 60
+MILVUS_RESIDENCY_KEY_PREFIX = "yuxi:milvus_residency:"
+PIN_COLLECTION_KEY = "pin_collection"
+# 估算时每行标量字段（content、chunk_id 等）的平均占用
+ROW_SCALAR_BYTES = 1024
+LOAD_WAIT_SAMPLES = 256
+
+
+def estimate_collection_bytes(collection: Any) -> int:
+    """按行数 × (向量维度 × 4 + 标量估算) 粗略估计集合加载后的内存占用。"""
+    try:
+        dim = 0
+        for item in collection.schema.fields:
+            params = getattr(item, "params", None) or {}
+            dim += int(params.get("dim") or 0)
+        return int(collection.num_entities) * (dim * 4 + ROW_SCALAR_BYTES)
+    except Exception as exc:  # noqa: BLE001
+        logger.debug(f"Failed to estimate size of Milvus collection: {exc}")
+        return 0
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class SharedResidencyLeases:
+    """跨进程的集合使用租约与释放代数，存储在 Redis 中。"""
+
+    def __init__(
+        self,
+        *,
+        lease_seconds: int = MILVUS_RESIDENCY_LEASE_SECONDS,
+        process_id: str | None = None,
+        redis: RedisFallback | None = None,
+    ) -> None:
+        self.lease_seconds = max(int(lease_seconds), 1)
+        self.process_id = process_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._redis = redis or RedisFallback("Milvus residency leases")
+
+    @staticmethod
+    def _keys(name: str) -> tuple[str, str, str]:
+        key = f"{MILVUS_RESIDENCY_KEY_PREFIX}{name}"
+        return f"{key}:leases", f"{key}:generation", f"{key}:release_lock"
+
+    async def acquire(self, name: str) -> int | None:
+        """登记本进程正在使用集合，返回集合当前的释放代数；Redis 不可用时返回 None。
+
+        先登记租约再检查释放锁：释放方在锁内确认无其他租约，登记晚于该确认时必然能看到锁，等待释放完成后取到新代数。
+        """
+        redis = await self._redis.get_client()
+        if redis is None:
+            return None
+        leases_key, generation_key, lock_key = self._keys(name)
+        try:
+            pipe = redis.pipeline(transaction=True)
+            pipe.zadd(leases_key, {self.process_id: time.time() + self.lease_seconds})
+            pipe.expire(leases_key, self.lease_seconds * 2)
+            pipe.exists(lock_key)
+            pipe.get(generation_key)
+            _, _, locked, generation = await pipe.execute()
+            if locked:
+                # 锁带超时，释放方异常退出时也会自动解除
+                while await redis.exists(lock_key):
+                    await asyncio.sleep(0.05)
+                generation = await redis.get(generation_key)
+            return int(_decode(generation)) if generation is not None else 0
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+            return None
+
+    async def renew(self, name: str) -> None:
+        """使用结束时续期租约，覆盖耗时较长的检索。"""
+        redis = await self._redis.get_client()
+        if redis is None:
+            return
+        leases_key, _, _ = self._keys(name)
+        try:
+            await redis.zadd(leases_key, {self.process_id: time.time() + self.lease_seconds})
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+
+    async def bump_generation(self, name: str) -> None:
+        """集合被强制释放（如重建索引）后递增释放代数，其他进程下次使用时重新加载。"""
+        redis = await self._redis.get_client()
+        if redis is None:
+            return
+        _, generation_key, _ = self._keys(name)
+        try:
+            await redis.incr(generation_key)
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+
+    async def release_if_unshared(self, name: str, release: Callable[[], Awaitable[None]]) -> bool:
+        """没有其他进程持有有效租约时执行 release 并递增释放代数，返回是否已释放。"""
+        redis = await self._redis.get_client()
+        if redis is None:
+            await release()
+            return True
+        leases_key, generation_key, lock_key = self._keys(name)
+        try:
+            lock = redis.lock(lock_key, timeout=MILVUS_RESIDENCY_RELEASE_LOCK_SECONDS)
+            if not await lock.acquire(blocking=False):
+                return False
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+            return False
+        try:
+            try:
+                await redis.zremrangebyscore(leases_key, "-inf", time.time())
+                holders = {_decode(member) for member in await redis.zrange(leases_key, 0, -1)}
+            except Exception as exc:
+                self._redis.mark_unavailable(exc)
+                return False
+            if holders - {self.process_id}:
+                logger.debug(f"Milvus collection {name} is leased by other processes, skip release")
+                return False
+            await release()
+            try:
+                await redis.incr(generation_key)
+            except Exception as exc:
+                self._redis.mark_unavailable(exc)
+            return True
+        finally:
+            try:
+                await lock.release()
+            except Exception as exc:  # noqa: BLE001
+                logger.debug(f"Failed to release residency lock of {name}: {exc}")
+
+
+@dataclass
+class _Residency:
+    collection: Any
+    loaded: bool = False
+    size_bytes: int = 0
+    last_access: float = 0.0
+    in_flight: int = 0
+    loads: int = 0
+    # 最近一次看到的跨进程释放代数，未协调时为 None
+    generation: int | None = None
+
+
+class CollectionResidencyManager:
+    """按 LRU 管理已加载的 Milvus 集合。"""
+
+    def __init__(
+        self,
+        *,
+        max_collections: int = MILVUS_MAX_LOADED_COLLECTIONS,
+        memory_budget_bytes: int = MILVUS_LOADED_MEMORY_BUDGET_MB * 1024 * 1024,
+        pinned: frozenset[str] | set[str] = MILVUS_PINNED_COLLECTIONS,
+        size_estimator: Callable[[Any], int] = estimate_collection_bytes,
+        shared: SharedResidencyLeases | None = None,
+    ) -> None:
+        self.max_collections = max(int(max_collections), 0)
+        self.memory_budget_bytes = max(int(memory_budget_bytes), 0)
+        self.size_estimator = size_estimator
+        self.shared = shared
+        self._static_pinned = frozenset(pinned)
+        self._pinned: set[str] = set()
+        # 按最近访问排序，最久未访问的在前
+        self._entries: OrderedDict[str, _Residency] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._load_waits: deque[float] = deque(maxlen=LOAD_WAIT_SAMPLES)
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.max_collections or self.memory_budget_bytes)
+
+    def seed_loaded(self, name: str, collection: Any, size_bytes: int = 0) -> None:
+        """登记启动前已在 Milvus 中加载的集合，作为最久未访问的集合参与释放。"""
+        if name in self._entries:
+            return
+        self._entries[name] = _Residency(collection=collection, loaded=True, size_bytes=size_bytes)
+        self._entries.move_to_end(name, last=False)
+
+    def is_pinned(self, name: str) -> bool:
+        return name in self._static_pinned or name in self._pinned
+
+    def set_pinned(self, name: str, pinned: bool) -> None:
+        if pinned:
+            self._pinned.add(name)
+        else:
+            self._pinned.discard(name)
+
+    def forget(self, name: str) -> None:
+        """集合被删除或换名后移除其驻留记录。"""
+        self._entries.pop(name, None)
+        self._pinned.discard(name)
+
+    def _lock(self, name: str) -> asyncio.Lock:
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+        return lock
+
+    def _touch(self, name: str, collection: Any) -> _Residency:
+        entry = self._entries.get(name)
+        if entry is None or entry.collection is not collection:
+            entry = _Residency(collection=collection, loaded=bool(entry and entry.loaded))
+            self._entries[name] = entry
+        entry.last_access = time.time()
+        self._entries.move_to_end(name)
+        return entry
+
+    async def ensure_loaded(self, name: str, collection: Any, *, pinned: bool | None = None) -> None:
+        """标记访问并确保集合已加载；未加载时加载，随后按预算释放冷集合。"""
+        if pinned is not None:
+            self.set_pinned(name, pinned)
+        entry = self._touch(name, collection)
+        await self._acquire_shared(name, entry)
+        if entry.loaded:
+            self.hits += 1
+            # 固定取消或检索结束后，之前无法释放的集合在此补做释放
+            if self._over_budget():
+                await self._evict_over_budget(keep=name)
+            return
+
+        started_at = time.perf_counter()
+        async with self._lock(name):
+            if not entry.loaded:
+                await asyncio.to_thread(collection.load)
+                entry.size_bytes = await asyncio.to_thread(self.size_estimator, collection)
+                entry.loaded = True
+                entry.loads += 1
+                self.loads += 1
+                self._load_waits.append(time.perf_counter() - started_at)
+                logger.info(f"Loaded Milvus collection {name} ({entry.size_bytes} bytes estimated)")
+        await self._evict_over_budget(keep=name)
+
+    @asynccontextmanager
+    async def lease(self, name: str, collection: Any, *, pinned: bool | None = None) -> AsyncIterator[None]:
+        """检索期间持有集合，防止被其他集合的加载挤出。"""
+        entry = self._touch(name, collection)
+        entry.in_flight += 1
+        try:
+            await self.ensure_loaded(name, collection, pinned=pinned)
+            yield
+        finally:
+            entry.in_flight -= 1
+            if self.shared is not None:
+                await self.shared.renew(name)
+
+    @asynccontextmanager
+    async def unloaded(self, name: str, collection: Any) -> AsyncIterator[None]:
+        """释放集合执行需要卸载的操作（如重建索引），期间本进程的加载请求等待，结束后重新加载。"""
+        entry = self._touch(name, collection)
+        async with self._lock(name):
+            await asyncio.to_thread(collection.release)
+            entry.loaded = False
+            entry.generation = None
+            if self.shared is not None:
+                await self.shared.bump_generation(name)
+            yield
+        await self.ensure_loaded(name, collection)
+
+    async def _acquire_shared(self, name: str, entry: _Residency) -> None:
+        if self.shared is None:
+            return
+        generation = await self.shared.acquire(name)
+        if generation is None:
+            return
+        if entry.loaded and generation != entry.generation:
+            # 启动时登记或 Redis 不可用期间记录的集合没有代数，无法确认期间是否被释放，重新加载一次校验
+            if entry.generation is None:
+                logger.info(f"Milvus collection {name} has no known release generation, reloading to verify")
+            else:
+                logger.info(f"Milvus collection {name} was released by another process, reloading")
+            entry.loaded = False
+        entry.generation = generation
+
+    async def _release(self, name: str, entry: _Residency) -> bool:
+        def release() -> Awaitable[None]:
+            return asyncio.to_thread(entry.collection.release)
+
+        if self.shared is None:
+            await release()
+            return True
+        released = await self.shared.release_if_unshared(name, release)
+        if released:
+            # 自己释放的代数变化不需要重新加载，下次使用时重新记录
+            entry.generation = None
+        return released
+
+    def _over_budget(self) -> bool:
+        loaded = [entry for entry in self._entries.values() if entry.loaded]
+        if self.max_collections and len(loaded) > self.max_collections:
+            return True
+        return bool(self.memory_budget_bytes) and sum(entry.size_bytes for entry in loaded) > self.memory_budget_bytes
+
+    async def _evict_over_budget(self, *, keep: str) -> None:
+        for name in list(self._entries):
+            if not self._over_budget():
+                return
+            entry = self._entries.get(name)
+            if entry is None or name == keep or not entry.loaded or entry.in_flight or self.is_pinned(name):
+                continue
+            async with self._lock(name):
+                if not entry.loaded or entry.in_flight:
+                    continue
+                try:
+                    if not await self._release(name, entry):
+                        continue
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning(f"Failed to release Milvus collection {name}: {exc}")
+                    continue
+                entry.loaded = False
+                self.evictions += 1
+                logger.info(f"Released cold Milvus collection {name}")
+
+    def get_stats(self) -> dict[str, Any]:
+        waits = sorted(self._load_waits)
+        loaded = [entry for entry in self._entries.values() if entry.loaded]
+        return {
+            "max_collections": self.max_collections,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "loaded_collections": len(loaded),
+            "loaded_bytes": sum(entry.size_bytes for entry in loaded),
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "load_wait_ms": {
+                "samples": len(waits),
+                "p50": round(statistics.median(waits) * 1000, 3) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+                "max": round(waits[-1] * 1000, 3) if waits else 0.0,
+            },
+            "collections": [
+                {
+                    "name": name,
+                    "loaded": entry.loaded,
+                    "pinned": self.is_pinned(name),
+                    "in_flight": entry.in_flight,
+                    "size_bytes": entry.size_bytes,
+                    "loads": entry.loads,
+                    "last_access": utc_isoformat_from_timestamp(entry.last_access or None),
+                }
+                for name, entry in reversed(self._entries.items())
+            ],
+        }
@@ -4,12 +4,13 @@ import secrets
 import string
 from collections.abc import Awaitable
 from dataclasses import replace
+from datetime import timedelta
 from typing import Any
 
 from redis.exceptions import ConnectionError as RedisConnectionError
 from redis.exceptions import TimeoutError as RedisTimeoutError
 
-from yuxi.knowledge.base import KBNameConflictError, KBNotFoundError, KnowledgeBase
+from yuxi.knowledge.base import FileStatus, KBNameConflictError, KBNotFoundError, KnowledgeBase
 from yuxi.knowledge.cache import (
     cache_kb_config,
     get_cached_kb_config,
@@ -18,17 +19,32 @@ from yuxi.knowledge.cache import (
 )
 from yuxi.knowledge.chunking.ragflow_like.presets import deep_merge
 from yuxi.knowledge.factory import KnowledgeBaseFactory
+from yuxi.knowledge.file_claims import FILE_CLAIM_LEASE_SECONDS
+from yuxi.knowledge.federated_retrieval import (
+    FEDERATED_RETRIEVAL_CONCURRENCY,
+    FEDERATED_RETRIEVAL_TIMEOUT_SECONDS,
+    fan_out_retrieval,
+    reciprocal_rank_fusion,
+    rerank_fused_results,
+)
 from yuxi.knowledge.read_models import (
     KnowledgeBaseConfig,
     KnowledgeBaseDetail,
     KnowledgeBaseSummary,
 )
+from yuxi.knowledge.retrieval_cache import (
+    RETRIEVAL_CACHE_OPT_OUT_KEY,
+    bump_kb_content_version,
+    build_retrieval_cache_key,
+    retrieval_result_cache,
+)
+from yuxi.knowledge.retrieval_trace import retrieval_trace, trace_stage
 from yuxi.knowledge.schemas import FindOutputSchema, OpenOutputSchema
 from yuxi.knowledge.utils.security import redact_sensitive_params
 from yuxi.permissions import ResourcePermission, normalize_permission_config, resolve_knowledge_base_permission
 from yuxi.storage.postgres.models_business import User
 from yuxi.utils import logger
-from yuxi.utils.datetime_utils import utc_isoformat
+from yuxi.utils.datetime_utils import utc_isoformat, utc_now_naive
 
 KB_FILE_SEARCH_SCAN_LIMIT = 5000
 
@@ -52,6 +68,8 @@ class KnowledgeBaseManager:
 
         # 知识库实例缓存 {kb_type: kb_instance}
         self.kb_instances: dict[str, KnowledgeBase] = {}
+        # 所有联邦检索请求共享的并发预算，限制同时在途的知识库检索数量
+        self.federated_budget = asyncio.Semaphore(FEDERATED_RETRIEVAL_CONCURRENCY)
 
     async def initialize(self):
         """异步初始化"""
@@ -116,7 +134,8 @@ class KnowledgeBaseManager:
         移动文件/文件夹
         """
         kb_instance = await self.get_kb_executor(kb_id)
-        return await kb_instance.move_file(kb_id, file_id, new_parent_id)
+        # 按目录过滤的检索结果随移动变化
+        return await self._run_content_change(kb_id, kb_instance.move_file(kb_id, file_id, new_parent_id))
 
     async def get_kb_config(self, kb_id: str) -> KnowledgeBaseConfig:
         """读取知识库运行配置，Redis 未命中时回源 PostgreSQL。
@@ -261,6 +280,74 @@ class KnowledgeBaseManager:
         await self._refresh_database_stats(kb_id)
         return result
 
+    async def _run_content_change(self, kb_id: str, operation: Awaitable[Any]) -> Any:
+        """执行会改变检索结果的写操作；无论成功与否都递增内容版本，部分写入也不会命中旧缓存。"""
+        try:
+            return await self._run_with_stats_refresh(kb_id, operation)
+        finally:
+            await bump_kb_content_version(kb_id)
+
+    async def _cached_aquery(
+        self,
+        executor: KnowledgeBase,
+        query_text: str,
+        config: KnowledgeBaseConfig,
+        options: dict[str, Any],
+        *,
+        agent_call: bool = False,
+    ) -> Any:
+        """带内容版本缓存的检索；单次请求可通过 use_cache=False 跳过。"""
+        results = await self._cached_aquery_many(executor, [query_text], config, options, agent_call=agent_call)
+        return results[0]
+
+    async def _cached_aquery_many(
+        self,
+        executor: KnowledgeBase,
+        queries: list[str],
+        config: KnowledgeBaseConfig,
+        options: dict[str, Any],
+        *,
+        agent_call: bool = False,
+    ) -> list[Any]:
+        """逐条查缓存，未命中的 Query 合并为一次 aquery_many；单条未命中直接走 aquery。"""
+        options = dict(options)
+        use_cache = bool(options.pop(RETRIEVAL_CACHE_OPT_OUT_KEY, True))
+        if agent_call:
+            options["agent_call"] = True
+
+        with retrieval_trace("retrieval", config.kb_id, kb_type=config.kb_type, queries=len(queries)) as span:
+            results: list[Any] = [None] * len(queries)
+            cache_keys: list[Any] = [None] * len(queries)
+            if use_cache and retrieval_result_cache.enabled:
+                with trace_stage("cache_lookup"):
+                    version = await retrieval_result_cache.get_version(config.kb_id)
+                    if version is None:
+                        retrieval_result_cache.bypassed += len(queries)
+                    else:
+                        for index, query_text in enumerate(queries):
+                            cache_keys[index] = build_retrieval_cache_key(
+                                config.kb_id, version, query_text, config, options
+                            )
+                            results[index] = retrieval_result_cache.get(cache_keys[index])
+
+            missing = [index for index, result in enumerate(results) if result is None]
+            span.set(cache_hits=len(queries) - len(missing))
+            if len(missing) == 1:
+                fetched = [await executor.aquery(queries[missing[0]], config.kb_id, config=config, **options)]
+            elif missing:
+                fetched = await executor.aquery_many(
+                    config.kb_id, [queries[index] for index in missing], config=config, **options
+                )
+            else:
+                fetched = []
+
+            for index, result in zip(missing, fetched, strict=True):
+                results[index] = result
+                if cache_keys[index] is not None:
+                    retrieval_result_cache.set(cache_keys[index], result)
+            span.set(candidates=sum(len(result) for result in results if isinstance(result, list)))
+            return results
+
     def _database_read_fields(
         self,
         row: Any,
@@ -546,6 +633,7 @@ class KnowledgeBaseManager:
             kb_instance = await self.get_kb_executor(kb_id)
             result = await kb_instance.cleanup_database_resources(kb_id)
             await KnowledgeBaseRepository().delete(kb_id)
+            await bump_kb_content_version(kb_id)
             return result
         except KBNotFoundError as e:
             logger.warning(f"Database {kb_id} not found during deletion: {e}")
@@ -588,7 +676,7 @@ class KnowledgeBaseManager:
         """Index parsed file"""
         config = await self.get_kb_config(kb_id)
         executor = self._get_or_create_kb_instance(config.kb_type)
-        return await self._run_with_stats_refresh(
+        return await self._run_content_change(
             kb_id,
             executor.index_file(
                 kb_id,
@@ -616,12 +704,13 @@ class KnowledgeBaseManager:
         """异步查询知识库"""
         config = await self.get_kb_config(kb_id)
         executor = self._get_or_create_kb_instance(config.kb_type)
-        return await executor.aquery(
-            query_text,
-            kb_id,
-            config=config,
-            **kwargs,
-        )
+        return await self._cached_aquery(executor, query_text, config, kwargs)
+
+    async def aquery_many(self, kb_id: str, queries: list[str], **kwargs) -> list[Any]:
+        """批量查询知识库，返回与 queries 一一对应的结果。"""
+        config = await self.get_kb_config(kb_id)
+        executor = self._get_or_create_kb_instance(config.kb_type)
+        return await self._cached_aquery_many(executor, queries, config, kwargs)
 
     async def get_kb_query_params_config(self, kb_id: str) -> dict:
         """获取知识库查询参数定义，并合并当前保存值。"""
@@ -642,6 +731,46 @@ class KnowledgeBaseManager:
         if kb is None:
             raise KBNotFoundError(f"Database {kb_id} not found")
 
+    async def tune_search_params(self, kb_id: str, **options) -> dict[str, Any]:
+        """调优向量检索参数，并将结果保存到知识库 additional_params。"""
+        from yuxi.knowledge.implementations.milvus_index import TUNED_SEARCH_PARAMS_KEY
+        from yuxi.repositories.knowledge_base_repository import KnowledgeBaseRepository
+
+        config = await self.get_kb_config(kb_id)
+        executor = self._get_or_create_kb_instance(config.kb_type)
+        if not hasattr(executor, "tune_search_params"):
+            raise ValueError(f"知识库类型 {config.kb_type} 不支持检索参数调优")
+
+        result = await executor.tune_search_params(
+            kb_id,
+            embedding_model_spec=config.embedding_model_spec,
+            additional_params=config.additional_params,
+            **options,
+        )
+
+        kb_repo = KnowledgeBaseRepository()
+        kb = await kb_repo.get_by_kb_id(kb_id)
+        if kb is None:
+            raise KBNotFoundError(f"Database {kb_id} not found")
+        additional_params = dict(kb.additional_params or {})
+        additional_params[TUNED_SEARCH_PARAMS_KEY] = {key: value for key, value in result.items() if key != "sweep"}
+        await kb_repo.update(kb_id, {"additional_params": additional_params})
+        return result
+
+    async def migrate_file_filter_schema(self, kb_id: str, **options) -> dict[str, Any]:
+        """在线重建知识库向量集合，使文件名/目录过滤走 partition key 与标量索引。"""
+        config = await self.get_kb_config(kb_id)
+        executor = self._get_or_create_kb_instance(config.kb_type)
+        if not hasattr(executor, "migrate_file_filter_schema"):
+            raise ValueError(f"知识库类型 {config.kb_type} 不支持文件过滤索引迁移")
+
+        return await executor.migrate_file_filter_schema(
+            kb_id,
+            embedding_model_spec=config.embedding_model_spec,
+            additional_params=config.additional_params,
+            **options,
+        )
+
     async def export_data(self, kb_id: str, format: str = "zip", **kwargs) -> str:
         """导出知识库数据"""
         kb_instance = await self.get_kb_executor(kb_id)
@@ -936,21 +1065,47 @@ class KnowledgeBaseManager:
             limit=limit,
         )
 
+    async def recover_interrupted_files(self, kb_id: str) -> int:
+        """将处理租约已过期、仍停在 parsing / indexing 的文件回退到待处理状态。
+
+        租约由处理中的进程持续续约，过期说明认领它的进程已退出；其他进程正在处理的文件不受影响。
+        """
+        from yuxi.repositories.knowledge_file_repository import KnowledgeFileRepository
+
+        file_repo = KnowledgeFileRepository()
+        now = utc_now_naive()
+        recovered = 0
+        for from_status, to_status in (
+            (FileStatus.PARSING, FileStatus.UPLOADED),
+            (FileStatus.INDEXING, FileStatus.PARSED),
+        ):
+            recovered += await file_repo.reset_expired_claims(
+                kb_id=kb_id,
+                from_status=from_status,
+                to_status=to_status,
+                now=now,
+                unclaimed_before=now - timedelta(seconds=FILE_CLAIM_LEASE_SECONDS),
+            )
+        if recovered:
+            logger.info(f"Recovered {recovered} interrupted files in {kb_id}")
+            await self._refresh_database_stats(kb_id)
+        return recovered
+
     async def delete_folder(self, kb_id: str, folder_id: str) -> None:
         """递归删除文件夹"""
         kb_instance = await self.get_kb_executor(kb_id)
-        await self._run_with_stats_refresh(kb_id, kb_instance.delete_folder(kb_id, folder_id))
+        await self._run_content_change(kb_id, kb_instance.delete_folder(kb_id, folder_id))
 
     async def delete_file(self, kb_id: str, file_id: str) -> None:
         """删除文件"""
         kb_instance = await self.get_kb_executor(kb_id)
-        await self._run_with_stats_refresh(kb_id, kb_instance.delete_file(kb_id, file_id))
+        await self._run_content_change(kb_id, kb_instance.delete_file(kb_id, file_id))
 
     async def update_content(self, kb_id: str, file_ids: list[str], params: dict | None = None) -> list[dict]:
         """更新内容（重新分块）"""
         config = await self.get_kb_config(kb_id)
         executor = self._get_or_create_kb_instance(config.kb_type)
-        return await self._run_with_stats_refresh(
+        return await self._run_content_change(
             kb_id,
             executor.update_content(
                 kb_id,
@@ -1139,15 +1294,53 @@ class KnowledgeBaseManager:
         """按 kb_id 加载最新运行时元数据并执行检索。"""
         config = await self.get_kb_config(kb_id)
         executor = self._get_or_create_kb_instance(config.kb_type)
-        results = await executor.aquery(
-            query,
-            kb_id,
-            config=config,
-            agent_call=True,
-            **options,
-        )
+        results = await self._cached_aquery(executor, query, config, options, agent_call=True)
         return executor.build_search_output(kb_id, results)
 
+    async def retrieve_many(self, kb_id: str, queries: list[str], **options) -> list[dict]:
+        """批量检索多个 Query，共享一次向量化与 Milvus 检索往返。"""
+        config = await self.get_kb_config(kb_id)
+        executor = self._get_or_create_kb_instance(config.kb_type)
+        results = await self._cached_aquery_many(executor, queries, config, options, agent_call=True)
+        return [executor.build_search_output(kb_id, chunks) for chunks in results]
+
+    async def federated_retrieve(
+        self,
+        kb_ids: list[str],
+        query: str,
+        *,
+        top_k: int = 10,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        reranker_model: str | None = None,
+        **options,
+    ) -> dict[str, Any]:
+        """跨多个知识库并发检索，按 RRF 合并结果，可选一次跨知识库重排序。
+
+        超过截止时间的知识库被取消，``partial`` 为 True 且在 ``kbs`` 中标记其状态。
+        """
+        kb_ids = list(dict.fromkeys(str(kb_id) for kb_id in kb_ids if kb_id))
+        ranked_lists, statuses = await fan_out_retrieval(
+            kb_ids,
+            lambda kb_id: self.retrieve(kb_id, query, **options),
+            budget=self.federated_budget,
+            max_concurrency=max_concurrency,
+            timeout=FEDERATED_RETRIEVAL_TIMEOUT_SECONDS if timeout is None else timeout,
+        )
+        top_k = max(int(top_k), 1)
+        if reranker_model:
+            # 重排序候选多取一些，给跨知识库精排留出调整空间
+            results = reciprocal_rank_fusion(ranked_lists, limit=top_k * 3)
+            results = (await rerank_fused_results(query, results, reranker_model))[:top_k]
+        else:
+            results = reciprocal_rank_fusion(ranked_lists, limit=top_k)
+        return {
+            "query": query,
+            "results": results,
+            "kbs": statuses,
+            "partial": any(status["status"] != "ok" for status in statuses.values()),
+        }
+
     async def open_document(
         self,
         kb_id: str,
@@ -1231,6 +1424,11 @@ class KnowledgeBaseManager:
             }
         return info
 
+    def get_milvus_residency_stats(self) -> dict | None:
+        """Milvus 集合的加载驻留状态；未启用 Milvus 知识库时返回 None。"""
+        residency = getattr(self.kb_instances.get("milvus"), "residency", None)
+        return residency.get_stats() if residency is not None else None
+
     async def get_statistics(self) -> dict:
         """获取统计信息"""
         from yuxi.repositories.knowledge_base_repository import KnowledgeBaseRepository
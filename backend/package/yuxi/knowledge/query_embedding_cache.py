@@ -0,0 +1,195 @@
+"""检索 Query 向量的两级缓存。
+
+进程内 LRU 承接同一进程内的重复查询，Redis 层在 API 与 Worker 之间共享结果。
+缓存 key 包含 embedding 模型 spec，知识库切换 embedding 模型后自然落到新的 key 空间。
+"""
+
+from __future__ import annotations
+
+import json
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from yuxi.storage.redis import RedisFallback
+from yuxi.utils import hashstr
+
+QUERY_EMBEDDING_CACHE_KEY_PREFIX = "yuxi:query_embedding:"
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = 24 * 3600
+QUERY_EMBEDDING_CACHE_LOCAL_MAX_ENTRIES = 2048
+
+EmbedFunction = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+def normalize_query_text(query_text: str) -> str:
+    """折叠空白字符，使仅有空格差异的 Query 命中同一缓存项。"""
+    return " ".join(str(query_text or "").split())
+
+
+def _redis_key(embedding_model_spec: str, normalized_query: str) -> str:
+    return f"{QUERY_EMBEDDING_CACHE_KEY_PREFIX}{hashstr(embedding_model_spec, 16)}:{hashstr(normalized_query)}"
+
+
+class QueryEmbeddingCache:
+    """按 (embedding_model_spec, 规范化 Query) 缓存 Query 向量。"""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = QUERY_EMBEDDING_CACHE_LOCAL_MAX_ENTRIES,
+        ttl_seconds: int = QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        redis_enabled: bool = True,
+    ) -> None:
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl_seconds = int(ttl_seconds)
+        self._local: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+        # Redis 故障时短暂旁路，避免每次请求都等待连接超时
+        self._redis = RedisFallback("Query embedding Redis cache", enabled=redis_enabled)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _get_local(self, key: tuple[str, str]) -> list[float] | None:
+        vector = self._local.get(key)
+        if vector is not None:
+            self._local.move_to_end(key)
+        return vector
+
+    def _set_local(self, key: tuple[str, str], vector: list[float]) -> None:
+        self._local[key] = vector
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def _get_redis(self, embedding_model_spec: str, normalized_query: str) -> list[float] | None:
+        redis = await self._redis.get_client()
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(_redis_key(embedding_model_spec, normalized_query))
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+            return None
+        if not raw:
+            return None
+        try:
+            vector = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        return vector if isinstance(vector, list) else None
+
+    async def _set_redis(self, embedding_model_spec: str, normalized_query: str, vector: list[float]) -> None:
+        redis = await self._redis.get_client()
+        if redis is None:
+            return
+        try:
+            await redis.set(
+                _redis_key(embedding_model_spec, normalized_query),
+                json.dumps(vector),
+                ex=self.ttl_seconds,
+            )
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+
+    async def get_or_embed(self, embedding_model_spec: str, query_text: str, embed: EmbedFunction) -> list[float]:
+        """返回 Query 向量；两级缓存均未命中时调用 embed 并回填。"""
+        normalized_query = normalize_query_text(query_text)
+        key = (embedding_model_spec, normalized_query)
+
+        vector = self._get_local(key)
+        if vector is not None:
+            self.local_hits += 1
+            return vector
+
+        vector = await self._get_redis(embedding_model_spec, normalized_query)
+        if vector is not None:
+            self.redis_hits += 1
+            self._set_local(key, vector)
+            return vector
+
+        self.misses += 1
+        embeddings = await embed([normalized_query])
+        vector = [float(value) for value in embeddings[0]]
+        self._set_local(key, vector)
+        await self._set_redis(embedding_model_spec, normalized_query, vector)
+        return vector
+
+    async def _get_redis_many(
+        self, embedding_model_spec: str, normalized_queries: list[str]
+    ) -> list[list[float] | None]:
+        redis = await self._redis.get_client()
+        if redis is None:
+            return [None] * len(normalized_queries)
+        try:
+            raws = await redis.mget([_redis_key(embedding_model_spec, query) for query in normalized_queries])
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+            return [None] * len(normalized_queries)
+        vectors: list[list[float] | None] = []
+        for raw in raws:
+            try:
+                vector = json.loads(raw) if raw else None
+            except json.JSONDecodeError:
+                vector = None
+            vectors.append(vector if isinstance(vector, list) else None)
+        return vectors
+
+    async def get_or_embed_many(
+        self, embedding_model_spec: str, query_texts: list[str], embed: EmbedFunction
+    ) -> list[list[float]]:
+        """批量返回 Query 向量；未命中的 Query 去重后合并为一次 embed 调用。"""
+        normalized_queries = [normalize_query_text(text) for text in query_texts]
+        vectors: dict[str, list[float]] = {}
+        for normalized_query in dict.fromkeys(normalized_queries):
+            vector = self._get_local((embedding_model_spec, normalized_query))
+            if vector is not None:
+                self.local_hits += 1
+                vectors[normalized_query] = vector
+
+        missing = [query for query in dict.fromkeys(normalized_queries) if query not in vectors]
+        if missing:
+            for normalized_query, vector in zip(
+                missing, await self._get_redis_many(embedding_model_spec, missing), strict=True
+            ):
+                if vector is not None:
+                    self.redis_hits += 1
+                    vectors[normalized_query] = vector
+                    self._set_local((embedding_model_spec, normalized_query), vector)
+
+        missing = [query for query in missing if query not in vectors]
+        if missing:
+            self.misses += len(missing)
+            embeddings = await embed(missing)
+            for normalized_query, embedding in zip(missing, embeddings, strict=True):
+                vector = [float(value) for value in embedding]
+                vectors[normalized_query] = vector
+                self._set_local((embedding_model_spec, normalized_query), vector)
+                await self._set_redis(embedding_model_spec, normalized_query, vector)
+
+        return [vectors[normalized_query] for normalized_query in normalized_queries]
+
+    def invalidate(self, embedding_model_spec: str | None = None) -> None:
+        """清理进程内缓存；指定 spec 时只清理该模型的条目。Redis 层依赖 TTL 过期。"""
+        if embedding_model_spec is None:
+            self._local.clear()
+            return
+        for key in [key for key in self._local if key[0] == embedding_model_spec]:
+            self._local.pop(key, None)
+
+    def get_stats(self) -> dict[str, Any]:
+        total = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.local_hits + self.redis_hits) / total if total else 0.0,
+            "local_entries": len(self._local),
+        }
+
+    def reset_stats(self) -> None:
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+
+query_embedding_cache = QueryEmbeddingCache()
@@ -0,0 +1,162 @@
+"""按知识库内容版本失效的检索结果缓存。
+
+看板、``/query-test``、评估重跑与智能体重复提问会以相同参数反复检索同一知识库。
+缓存 key 为 (kb_id, 内容版本, 规范化 Query, 生效检索配置)；内容版本保存在 Redis，
+索引、删除、图谱构建等改变检索结果的写操作会递增版本，旧版本的缓存项不再命中，无需依赖 TTL。
+读取版本失败时不使用缓存，保证不会返回过期结果。
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from yuxi.knowledge.read_models import KnowledgeBaseConfig
+from yuxi.storage.redis import RedisFallback
+from yuxi.utils import hashstr
+from yuxi.utils.logging_config import logger
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+RETRIEVAL_CACHE_MAX_ENTRIES = max(1, int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES") or 1024))
+RETRIEVAL_CACHE_MAX_RESULTS = max(1, int(os.getenv("RETRIEVAL_CACHE_MAX_RESULTS") or 200))
+KB_CONTENT_VERSION_KEY_PREFIX = "yuxi:kb_content_version:"
+# 单次请求可传入 use_cache=False 跳过缓存
+RETRIEVAL_CACHE_OPT_OUT_KEY = "use_cache"
+
+CacheKey = tuple[str, str, str, str]
+
+
+def _version_key(kb_id: str) -> str:
+    return f"{KB_CONTENT_VERSION_KEY_PREFIX}{kb_id}"
+
+
+def _seed_version() -> int:
+    # Redis 清空后版本不能从固定值重新开始，否则进程内以旧版本缓存的结果会再次命中
+    return time.time_ns()
+
+
+def normalize_retrieval_query(query_text: str) -> str:
+    return " ".join(str(query_text or "").split())
+
+
+def build_retrieval_cache_key(
+    kb_id: str,
+    version: str,
+    query_text: str,
+    config: KnowledgeBaseConfig,
+    options: dict[str, Any],
+) -> CacheKey:
+    """以生效的检索配置（持久化查询参数 + 单次覆盖参数 + 影响检索的知识库配置）计算缓存 key。"""
+    effective = {
+        "kb_type": config.kb_type,
+        "embedding_model_spec": config.embedding_model_spec,
+        "additional_params": config.additional_params,
+        "options": {**config.query_options, **options},
+    }
+    fingerprint = hashstr(json.dumps(effective, sort_keys=True, ensure_ascii=False, default=str))
+    return (kb_id, version, hashstr(normalize_retrieval_query(query_text)), fingerprint)
+
+
+class RetrievalResultCache:
+    """进程内 LRU 结果缓存；内容版本由 Redis 统一维护，多进程共享失效信号。"""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        max_results: int = RETRIEVAL_CACHE_MAX_RESULTS,
+        enabled: bool = RETRIEVAL_CACHE_ENABLED,
+    ) -> None:
+        self.max_entries = max(int(max_entries), 1)
+        self.max_results = max(int(max_results), 1)
+        self.enabled = enabled
+        self._local: OrderedDict[CacheKey, Any] = OrderedDict()
+        self._redis = RedisFallback("Retrieval cache content version")
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    async def get_version(self, kb_id: str) -> str | None:
+        """读取知识库内容版本；不可用时返回 None，调用方应绕过缓存。"""
+        redis = await self._redis.get_client()
+        if redis is None:
+            return None
+        key = _version_key(kb_id)
+        try:
+            raw = await redis.get(key)
+            if raw is None:
+                await redis.set(key, _seed_version(), nx=True)
+                raw = await redis.get(key)
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+            return None
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode()
+        return str(raw)
+
+    async def bump_version(self, kb_id: str) -> None:
+        """递增知识库内容版本，使所有进程中该知识库的缓存结果失效。"""
+        self.invalidate_kb(kb_id)
+        redis = await self._redis.get_client()
+        if redis is None:
+            # Redis 不可用期间各进程读取版本同样失败，缓存整体被绕过
+            return
+        key = _version_key(kb_id)
+        try:
+            await redis.set(key, _seed_version(), nx=True)
+            await redis.incr(key)
+        except Exception as exc:
+            # 版本未能递增时其他进程可能命中旧结果，只能记录告警
+            self._redis.mark_unavailable(exc)
+            logger.warning(f"Failed to bump knowledge content version: kb_id={kb_id}: {exc}")
+
+    def get(self, key: CacheKey) -> Any | None:
+        value = self._local.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._local.move_to_end(key)
+        self.hits += 1
+        # 调用方可能就地修改结果，缓存内外各持一份副本
+        return copy.deepcopy(value)
+
+    def set(self, key: CacheKey, value: Any) -> None:
+        # 空结果可能来自检索异常降级，过大的结果不值得占用缓存
+        if not value or (isinstance(value, list) and len(value) > self.max_results):
+            return
+        self._local[key] = copy.deepcopy(value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def invalidate_kb(self, kb_id: str) -> None:
+        for key in [key for key in self._local if key[0] == kb_id]:
+            self._local.pop(key, None)
+
+    def get_stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "local_entries": len(self._local),
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+
+retrieval_result_cache = RetrievalResultCache()
+
+
+async def bump_kb_content_version(kb_id: str) -> None:
+    await retrieval_result_cache.bump_version(kb_id)
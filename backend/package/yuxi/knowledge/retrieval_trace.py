@@ -0,0 +1,330 @@
+"""检索链路的分阶段耗时追踪。
+
+每次检索生成一棵 span 树（根为一次检索请求，子节点为 Query 向量化、Milvus 检索、文件过滤、图谱检索、
+来源回填、排序融合、重排序等阶段），记录耗时与候选数量：
+
+- span 通过 contextvars 传递，``asyncio.gather`` 派生的子任务自动挂到当前 span 下；
+- 每个阶段的耗时按 (阶段, 知识库) 计入 Prometheus 风格的直方图，由 ``/system/metrics/retrieval`` 导出；
+- 启用导出时，完成的 span 树导出到 OpenTelemetry（配置了 OTLP collector 时），否则追加写入本地 JSON Lines 文件，
+  文件超过上限后轮转。
+
+- ``RETRIEVAL_TRACE_SINK``：``off``（默认）/ ``auto`` / ``otel`` / ``json``；
+- ``RETRIEVAL_TRACE_JSON_PATH``：JSON sink 的文件路径；
+- ``RETRIEVAL_TRACE_JSON_MAX_MB`` / ``RETRIEVAL_TRACE_JSON_BACKUPS``：单个文件大小上限与保留的轮转文件数；
+- ``RETRIEVAL_TRACE_SAMPLE_RATE``：导出采样率（0~1），直方图始终记录。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from yuxi.utils.datetime_utils import utc_isoformat_from_timestamp
+from yuxi.utils.logging_config import SAVE_DIR, logger
+from yuxi.utils.prometheus import format_labels, metric_header, render_lines
+
+RETRIEVAL_TRACE_SINK = (os.getenv("RETRIEVAL_TRACE_SINK") or "off").strip().lower()
+RETRIEVAL_TRACE_JSON_PATH = os.getenv("RETRIEVAL_TRACE_JSON_PATH") or f"{SAVE_DIR}/logs/retrieval-traces.jsonl"
+RETRIEVAL_TRACE_JSON_MAX_BYTES = max(1, int(os.getenv("RETRIEVAL_TRACE_JSON_MAX_MB") or 100)) * 1024 * 1024
+RETRIEVAL_TRACE_JSON_BACKUPS = max(0, int(os.getenv("RETRIEVAL_TRACE_JSON_BACKUPS") or 3))
+RETRIEVAL_TRACE_SAMPLE_RATE = min(max(float(os.getenv("RETRIEVAL_TRACE_SAMPLE_RATE") or 1.0), 0.0), 1.0)
+OTEL_ENDPOINT_ENVS = ("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "OTEL_EXPORTER_OTLP_ENDPOINT")
+# 秒；覆盖缓存命中（亚毫秒）到冷集合加载（数秒）
+STAGE_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_METRIC_NAME = "yuxi_retrieval_stage_duration_seconds"
+
+
+@dataclass
+class TraceSpan:
+    name: str
+    kb_id: str | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    children: list[TraceSpan] = field(default_factory=list)
+    started_at: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "kb_id": self.kb_id,
+            "started_at": utc_isoformat_from_timestamp(self.started_at),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _NoopSpan:
+    """没有活动追踪时的占位 span。"""
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[TraceSpan | None] = ContextVar("retrieval_trace_span", default=None)
+
+
+class StageLatencyHistogram:
+    """按 (阶段, 知识库) 累计的耗时直方图，输出 Prometheus 文本格式。"""
+
+    def __init__(self, buckets: tuple[float, ...] = STAGE_LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # (stage, kb_id) -> [各桶计数..., 总数, 总耗时]
+        self._series: dict[tuple[str, str], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, kb_id: str | None, seconds: float) -> None:
+        key = (stage, kb_id or "")
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def get_stats(self) -> list[dict[str, Any]]:
+        with self._lock:
+            items = sorted(self._series.items())
+        return [
+            {"stage": stage, "kb_id": kb_id, "count": int(series[-2]), "sum_seconds": round(series[-1], 6)}
+            for (stage, kb_id), series in items
+        ]
+
+    def render_prometheus(self) -> str:
+        lines = metric_header(
+            STAGE_METRIC_NAME, "histogram", "Retrieval pipeline stage latency by stage and knowledge base."
+        )
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for (stage, kb_id), series in items:
+            for index, bound in enumerate(self.buckets):
+                labels = format_labels(stage=stage, kb_id=kb_id, le=bound)
+                lines.append(f"{STAGE_METRIC_NAME}_bucket{labels} {int(series[index])}")
+            labels = format_labels(stage=stage, kb_id=kb_id, le="+Inf")
+            lines.append(f"{STAGE_METRIC_NAME}_bucket{labels} {int(series[-2])}")
+            labels = format_labels(stage=stage, kb_id=kb_id)
+            lines.append(f"{STAGE_METRIC_NAME}_sum{labels} {series[-1]:.6f}")
+            lines.append(f"{STAGE_METRIC_NAME}_count{labels} {int(series[-2])}")
+        return render_lines(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class JsonLinesTraceSink:
+    """后台线程追加写入 JSON Lines，不阻塞事件循环；文件超过 max_bytes 时轮转为 .1、.2 …，最多保留 backups 个。"""
+
+    def __init__(
+        self,
+        path: str | Path = RETRIEVAL_TRACE_JSON_PATH,
+        *,
+        max_bytes: int = RETRIEVAL_TRACE_JSON_MAX_BYTES,
+        backups: int = RETRIEVAL_TRACE_JSON_BACKUPS,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max(int(max_bytes), 1)
+        self.backups = max(int(backups), 0)
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def export(self, span: TraceSpan) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="retrieval-trace-sink", daemon=True)
+                    self._thread.start()
+        self._queue.put(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            lines = [self._queue.get()]
+            while not self._queue.empty():
+                lines.append(self._queue.get())
+            payload = [line for line in lines if line is not None]
+            if payload:
+                try:
+                    data = "\n".join(payload) + "\n"
+                    self._rotate_if_needed(len(data.encode("utf-8")))
+                    with self.path.open("a", encoding="utf-8") as file:
+                        file.write(data)
+                except OSError as exc:
+                    logger.warning(f"Failed to write retrieval traces to {self.path}: {exc}")
+            if len(payload) != len(lines):
+                return
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backups == 0:
+            self.path.unlink()
+            return
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+
+    def close(self, timeout: float = 5.0) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+            self._thread = None
+
+
+class OpenTelemetryTraceSink:
+    """将完成的 span 树按原始起止时间重放为 OpenTelemetry span。"""
+
+    def __init__(self, tracer: Any) -> None:
+        self.tracer = tracer
+
+    def export(self, span: TraceSpan, parent_context: Any = None) -> None:
+        from opentelemetry import trace
+
+        attributes = {
+            key: value for key, value in span.attributes.items() if isinstance(value, str | bool | int | float)
+        }
+        if span.kb_id:
+            attributes["kb_id"] = span.kb_id
+        start_ns = int(span.started_at * 1e9)
+        otel_span = self.tracer.start_span(
+            f"retrieval.{span.name}", context=parent_context, start_time=start_ns, attributes=attributes
+        )
+        context = trace.set_span_in_context(otel_span)
+        for child in span.children:
+            self.export(child, context)
+        otel_span.end(end_time=start_ns + int(span.duration_ms * 1e6))
+
+    def close(self, timeout: float = 5.0) -> None:
+        from opentelemetry import trace
+
+        force_flush = getattr(trace.get_tracer_provider(), "force_flush", None)
+        if force_flush is not None:
+            force_flush(int(timeout * 1000))
+
+
+def _create_otel_sink() -> OpenTelemetryTraceSink | None:
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+
+    if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+        # 进程内尚未配置 TracerProvider 时，按 OTEL_* 环境变量创建 OTLP/HTTP 导出
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            return None
+        provider = TracerProvider()
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+    return OpenTelemetryTraceSink(trace.get_tracer("yuxi.retrieval"))
+
+
+def create_trace_sink(mode: str = RETRIEVAL_TRACE_SINK) -> Any | None:
+    """按配置选择导出目标；auto 模式下配置了 OTLP endpoint 时用 OpenTelemetry，否则写 JSON 文件。"""
+    if mode in {"off", "none", "false", "0"}:
+        return None
+    if mode == "otel" or (mode == "auto" and any(os.getenv(name) for name in OTEL_ENDPOINT_ENVS)):
+        sink = _create_otel_sink()
+        if sink is not None:
+            return sink
+        logger.warning("OpenTelemetry SDK unavailable, falling back to JSON retrieval trace sink")
+    return JsonLinesTraceSink()
+
+
+stage_latency = StageLatencyHistogram()
+_sink: Any | None = None
+_sink_resolved = False
+
+
+def get_trace_sink() -> Any | None:
+    global _sink, _sink_resolved
+    if not _sink_resolved:
+        _sink = create_trace_sink()
+        _sink_resolved = True
+    return _sink
+
+
+def close_trace_sink() -> None:
+    """进程退出前写完排队中的追踪并关闭 sink，下次导出时按配置重新创建。"""
+    global _sink, _sink_resolved
+    sink, _sink, _sink_resolved = _sink, None, False
+    close = getattr(sink, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(f"Failed to close retrieval trace sink: {exc}")
+
+
+def _export(root: TraceSpan) -> None:
+    if RETRIEVAL_TRACE_SAMPLE_RATE < 1.0 and random.random() >= RETRIEVAL_TRACE_SAMPLE_RATE:
+        return
+    sink = get_trace_sink()
+    if sink is None:
+        return
+    try:
+        sink.export(root)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(f"Failed to export retrieval trace: {exc}")
+
+
+@contextmanager
+def retrieval_trace(name: str, kb_id: str | None = None, **attributes: Any) -> Iterator[TraceSpan]:
+    """开始一段检索追踪；已有活动追踪时作为其子 span，否则作为根 span 并在结束时导出。"""
+    parent = _current_span.get()
+    span = TraceSpan(name=name, kb_id=kb_id or (parent.kb_id if parent else None), attributes=attributes)
+    if parent is not None:
+        parent.children.append(span)
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as exc:
+        span.set(error=type(exc).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        span.duration_ms = elapsed * 1000
+        _current_span.reset(token)
+        stage_latency.observe(name, span.kb_id, elapsed)
+        if parent is None:
+            _export(span)
+
+
+@contextmanager
+def trace_stage(name: str, **attributes: Any) -> Iterator[TraceSpan | _NoopSpan]:
+    """在当前追踪下记录一个阶段；没有活动追踪时不记录。"""
+    if _current_span.get() is None:
+        yield _NOOP_SPAN
+        return
+    with retrieval_trace(name, **attributes) as span:
+        yield span
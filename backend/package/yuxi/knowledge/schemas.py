@@ -9,6 +9,24 @@ class SearchInputSchema(BaseModel):
     file_name: str | None = Field(default=None, description="可选文件名关键词过滤，非必要不要使用")
 
 
+class MultiSearchInputSchema(BaseModel):
+    kb_id: str = Field(description="知识库资源 ID，也就是 kb_id")
+    queries: list[str] = Field(
+        min_length=1,
+        max_length=8,
+        description="多个检索关键词，用于将复杂问题拆成若干子问题后一次性检索",
+    )
+    file_name: str | None = Field(default=None, description="可选文件名关键词过滤，非必要不要使用")
+
+
+class FederatedSearchInputSchema(BaseModel):
+    query_text: str = Field(description="检索关键词，应提炼为有助于召回答案的关键词或短语")
+    kb_ids: list[str] | None = Field(
+        default=None,
+        description="要同时检索的知识库资源 ID 列表；不提供时检索当前会话启用的全部知识库",
+    )
+
+
 class SearchResultSchema(BaseModel):
     id: str = Field(description="检索结果 ID，通常对应 chunk_id")
     kb_id: str = Field(description="知识库资源 ID，也就是 kb_id")
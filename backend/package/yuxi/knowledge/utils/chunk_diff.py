@@ -0,0 +1,87 @@
+"""按内容哈希比对新旧 chunk，用于文档的增量重建索引。
+
+chunk id 按位置生成（``{file_id}_chunk_{index}``），文档中间插入或删除段落会使后续 id 整体偏移，
+因此以 chunk 内容的 SHA-256 作为稳定标识：内容相同的新 chunk 沿用旧 chunk 的 id 与向量，只更新位置信息；
+新增或修改的 chunk 重新嵌入，旧文档中不再出现的 chunk 被删除。
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any
+
+# 复用 chunk 需要更新的位置字段
+POSITION_FIELDS = ("chunk_index", "start_char_pos", "end_char_pos", "start_token_pos", "end_token_pos")
+
+
+def chunk_content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ChunkDiff:
+    """新 chunk 集合相对已存储 chunk 的差异；reused 中的 chunk 已改用旧 id。"""
+
+    reused: list[dict[str, Any]] = field(default_factory=list)
+    added: list[dict[str, Any]] = field(default_factory=list)
+    removed_ids: list[str] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return len(self.reused) + len(self.added)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return round(len(self.reused) / self.total, 4) if self.total else 0.0
+
+    def mark_unavailable(self, available_ids: set[str]) -> None:
+        """向量缺失的复用 chunk 改为重新嵌入。"""
+        missing = [chunk for chunk in self.reused if chunk["chunk_id"] not in available_ids]
+        if missing:
+            self.reused = [chunk for chunk in self.reused if chunk["chunk_id"] in available_ids]
+            self.added.extend(missing)
+
+    def to_stats(self) -> dict[str, Any]:
+        return {
+            "mode": "incremental",
+            "reused": len(self.reused),
+            "embedded": len(self.added),
+            "removed": len(self.removed_ids),
+            "reuse_ratio": self.reuse_ratio,
+        }
+
+
+def diff_chunks(new_chunks: list[dict[str, Any]], stored_chunks: list[tuple[str, str]]) -> ChunkDiff:
+    """比对新 chunk 与按 chunk_index 排序的已存储 (chunk_id, content)，内容重复的 chunk 按出现顺序一一配对。
+
+    会就地改写新 chunk 的 id / chunk_id：复用的沿用旧 id，新增的保留位置 id，与复用 id 冲突时追加内容哈希后缀。
+    """
+    pending: dict[str, deque[str]] = defaultdict(deque)
+    for chunk_id, content in stored_chunks:
+        pending[chunk_content_hash(content)].append(chunk_id)
+
+    diff = ChunkDiff()
+    hashes: dict[int, str] = {}
+    for chunk in new_chunks:
+        content_hash = hashes[id(chunk)] = chunk_content_hash(chunk["content"])
+        candidates = pending.get(content_hash)
+        if candidates:
+            chunk["id"] = chunk["chunk_id"] = candidates.popleft()
+            diff.reused.append(chunk)
+        else:
+            diff.added.append(chunk)
+    diff.removed_ids = [chunk_id for candidates in pending.values() for chunk_id in candidates]
+
+    taken = {chunk["chunk_id"] for chunk in diff.reused}
+    for chunk in diff.added:
+        chunk_id = chunk["chunk_id"]
+        if chunk_id in taken:
+            base_id = f"{chunk_id}_{hashes[id(chunk)][:8]}"
+            chunk_id, suffix = base_id, 1
+            while chunk_id in taken:
+                chunk_id, suffix = f"{base_id}_{suffix}", suffix + 1
+        chunk["id"] = chunk["chunk_id"] = chunk_id
+        taken.add(chunk_id)
+    return diff
@@ -10,6 +10,7 @@ _DROPPED_PROCESSING_PARAM_KEYS = {
     "auto_index",
     "content_hashes",
     "file_sizes",
+    "incremental_reindex",
     "enable_ocr",
     "ocr_engine_config",
 }
@@ -1,12 +1,21 @@
 import asyncio
+import importlib.util
 import os
 import time
+import weakref
 from abc import ABC, abstractmethod
 
 import httpx
 import numpy as np
 import requests
 
+from yuxi.models.embed_batching import (
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_MAX_REQUESTS_PER_SECOND,
+    get_concurrency_controller,
+    pack_by_token_budget,
+    parse_retry_after,
+)
 from yuxi.models.providers.cache import model_cache
 from yuxi.utils import get_docker_safe_url, hashstr, logger
 
@@ -14,6 +23,71 @@ EMBEDDING_RATE_LIMIT_MAX_RETRIES = 10
 EMBEDDING_TRANSIENT_MAX_RETRIES = 2
 EMBEDDING_RETRY_MAX_DELAY_SECONDS = 10.0
 EMBEDDING_RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_HTTP_POOL_SIZE = int(os.getenv("EMBEDDING_HTTP_POOL_SIZE", "16"))
+EMBEDDING_HTTP_KEEPALIVE_SECONDS = float(os.getenv("EMBEDDING_HTTP_KEEPALIVE_SECONDS", "60"))
+EMBEDDING_HTTP_TIMEOUT_SECONDS = 60
+
+# {base_url: (event loop, client)}；httpx 连接绑定事件循环，跨循环时重建客户端。
+_async_http_clients: dict[str, tuple[weakref.ReferenceType[asyncio.AbstractEventLoop], httpx.AsyncClient]] = {}
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+async def _close_stale_http_client(base_url: str, loop_ref, client: httpx.AsyncClient) -> None:
+    """关闭绑定在其他事件循环上的旧客户端，避免重建时泄漏连接池。"""
+    if client.is_closed:
+        return
+    old_loop = loop_ref()
+    if old_loop is not None and old_loop.is_running():
+        # 旧循环仍在其他线程中运行，交回该循环关闭
+        asyncio.run_coroutine_threadsafe(client.aclose(), old_loop)
+        return
+    try:
+        await client.aclose()
+    except Exception as e:
+        # 旧循环已关闭时连接无法优雅关闭，客户端仍会被标记为已关闭
+        logger.debug(f"Close stale embedding http client for {base_url}: {e}")
+
+
+async def _get_async_http_client(base_url: str) -> httpx.AsyncClient:
+    """获取 base_url 对应的长连接客户端，同一事件循环内复用连接池。"""
+    loop = asyncio.get_running_loop()
+    entry = _async_http_clients.get(base_url)
+    if entry is not None:
+        loop_ref, client = entry
+        if loop_ref() is loop and not client.is_closed:
+            return client
+        _async_http_clients.pop(base_url, None)
+        await _close_stale_http_client(base_url, loop_ref, client)
+
+    pool_size = max(EMBEDDING_HTTP_POOL_SIZE, 1)
+    client = httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=EMBEDDING_HTTP_KEEPALIVE_SECONDS,
+        ),
+        timeout=EMBEDDING_HTTP_TIMEOUT_SECONDS,
+    )
+    _async_http_clients[base_url] = (weakref.ref(loop), client)
+    return client
+
+
+async def close_embedding_http_clients() -> None:
+    """关闭当前事件循环持有的 embedding 长连接客户端。"""
+    loop = asyncio.get_running_loop()
+    for base_url, (loop_ref, client) in list(_async_http_clients.items()):
+        if loop_ref() is not loop and loop_ref() is not None:
+            continue
+        _async_http_clients.pop(base_url, None)
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close embedding http client for {base_url}: {e}")
 
 
 def sigmoid(x):
@@ -31,6 +105,9 @@ class BaseEmbeddingModel(ABC):
         api_key=None,
         model_id=None,
         batch_size=40,
+        max_concurrency=None,
+        max_batch_tokens=None,
+        max_requests_per_second=None,
     ):
         base_url = base_url or url
         self.model = model or name or model_id
@@ -38,8 +115,21 @@ class BaseEmbeddingModel(ABC):
         self.base_url = get_docker_safe_url(base_url)
         self.api_key = os.getenv(api_key, api_key)
         self.batch_size = int(batch_size or 40)
+        self.max_concurrency = max(int(max_concurrency or EMBEDDING_MAX_CONCURRENCY), 1)
+        self.max_batch_tokens = max(int(max_batch_tokens or EMBEDDING_MAX_BATCH_TOKENS), 1)
+        self.max_requests_per_second = max(float(max_requests_per_second or EMBEDDING_MAX_REQUESTS_PER_SECOND), 0.0)
         self.embed_state = {}
 
+    @property
+    def concurrency(self):
+        """同一 (模型, base_url) 共享的 AIMD 并发窗口（上限 max_concurrency）与请求速率上限。"""
+        return get_concurrency_controller(
+            f"{self.model}@{self.base_url}", self.max_concurrency, self.max_requests_per_second
+        )
+
+    def _pack_batches(self, messages: list[str], batch_size: int) -> list[tuple[int, int]]:
+        return pack_by_token_budget(messages, max_tokens=self.max_batch_tokens, max_items=batch_size)
+
     @abstractmethod
     def encode(self, message: list[str] | str) -> list[list[float]]:
         raise NotImplementedError("Subclasses must implement this method")
@@ -62,13 +152,13 @@ class BaseEmbeddingModel(ABC):
             task_id = hashstr(messages)
             self.embed_state[task_id] = {"status": "in-progress", "total": len(messages), "progress": 0}
 
-        for i in range(0, len(messages), batch_size):
-            group_msg = messages[i : i + batch_size]
-            logger.info(f"Encoding [{i}/{len(messages)}] messages (bsz={batch_size})")
+        for start, end in self._pack_batches(messages, batch_size):
+            group_msg = messages[start:end]
+            logger.info(f"Encoding [{start}/{len(messages)}] messages (bsz={len(group_msg)})")
             response = self.encode(group_msg)
             data.extend(response)
             if task_id:
-                self.embed_state[task_id]["progress"] = i + len(group_msg)
+                self.embed_state[task_id]["progress"] = end
 
         if task_id:
             self.embed_state[task_id]["status"] = "completed"
@@ -76,21 +166,33 @@ class BaseEmbeddingModel(ABC):
         return data
 
     async def abatch_encode(self, messages: list[str], batch_size: int | None = None) -> list[list[float]]:
+        """按 token 预算打包批次并发编码，在途请求数由 AIMD 窗口控制，结果保持输入顺序。"""
         batch_size = batch_size or self.batch_size
-        data = []
         task_id = None
         if len(messages) > batch_size:
             task_id = hashstr(messages)
             self.embed_state[task_id] = {"status": "in-progress", "total": len(messages), "progress": 0}
 
-        for i in range(0, len(messages), batch_size):
-            group_msg = messages[i : i + batch_size]
-            logger.info(f"Async encoding [{i}/{len(messages)}] messages (bsz={batch_size})")
+        async def encode_group(start: int, end: int) -> list[list[float]]:
+            group_msg = messages[start:end]
+            logger.info(f"Async encoding [{start}/{len(messages)}] messages (bsz={len(group_msg)})")
             res = await self.aencode(group_msg)
-            data.extend(res)
             if task_id:
-                self.embed_state[task_id]["progress"] = i + len(group_msg)
+                self.embed_state[task_id]["progress"] += len(group_msg)
+            return res
 
+        tasks = [
+            asyncio.create_task(encode_group(start, end)) for start, end in self._pack_batches(messages, batch_size)
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        data = [embedding for group in results for embedding in group]
         if task_id:
             self.embed_state[task_id]["status"] = "completed"
 
@@ -122,11 +224,9 @@ class OtherEmbedding(BaseEmbeddingModel):
 
     @staticmethod
     def _retry_delay_seconds(retry_index: int, retry_after: str | None = None) -> float:
-        if retry_after:
-            try:
-                return min(float(retry_after), EMBEDDING_RETRY_MAX_DELAY_SECONDS)
-            except ValueError:
-                pass
+        seconds = parse_retry_after(retry_after)
+        if seconds is not None:
+            return min(seconds, EMBEDDING_RETRY_MAX_DELAY_SECONDS)
         return min(float(2 ** (retry_index - 1)), EMBEDDING_RETRY_MAX_DELAY_SECONDS)
 
     def _prepare_retry(
@@ -200,32 +300,38 @@ class OtherEmbedding(BaseEmbeddingModel):
 
     async def aencode(self, message: list[str] | str) -> list[list[float]]:
         payload = self.build_payload(message)
-        async with httpx.AsyncClient() as client:
-            retry_index = 0
-            while True:
+        client = await _get_async_http_client(self.base_url)
+        concurrency = self.concurrency
+        retry_index = 0
+        while True:
+            # 每次尝试占用一个并发槽位，重试等待期间释放
+            async with concurrency.slot() as started_at:
                 try:
                     response = await client.post(self.base_url, json=payload, headers=self.headers, timeout=60)
                     response.raise_for_status()
-                    return self._extract_embeddings(response.json())
                 except httpx.HTTPStatusError as e:
-                    retry = self._prepare_retry(
-                        message,
-                        retry_index=retry_index,
-                        response=e.response,
-                        error=e,
-                    )
-                    if retry:
-                        retry_index, delay = retry
-                        await asyncio.sleep(delay)
-                        continue
-                    raise
+                    if e.response.status_code in EMBEDDING_RETRYABLE_STATUS_CODES:
+                        concurrency.on_throttle(started_at, parse_retry_after(e.response.headers.get("Retry-After")))
+                    error = e
                 except httpx.RequestError as e:
-                    retry = self._prepare_retry(message, retry_index=retry_index, error=e)
-                    if retry:
-                        retry_index, delay = retry
-                        await asyncio.sleep(delay)
-                        continue
-                    raise ValueError(f"Embedding async request failed: {e}, {payload}, {self.base_url=}")
+                    error = e
+                else:
+                    concurrency.on_success()
+                    return self._extract_embeddings(response.json())
+
+            retry = self._prepare_retry(
+                message,
+                retry_index=retry_index,
+                response=error.response if isinstance(error, httpx.HTTPStatusError) else None,
+                error=error,
+            )
+            if retry:
+                retry_index, delay = retry
+                await asyncio.sleep(delay)
+                continue
+            if isinstance(error, httpx.HTTPStatusError):
+                raise error
+            raise ValueError(f"Embedding async request failed: {error}, {payload}, {self.base_url=}")
 
 
 def get_embedding_model_info_by_id(model_id: str) -> dict:
@@ -0,0 +1,223 @@
+"""Embedding 请求的自适应批处理与并发控制。
+
+- 按估算 token 数打包批次：长 chunk 组成的批次不超过服务端 token 上限，短 chunk 在条数上限内尽量装满；
+- AIMD 并发窗口：请求成功时窗口加性增长（每轮约 +1），遇到 429 / 5xx 时乘性减半，
+  同一轮拥塞只减一次；响应带 Retry-After 时，在该时间之前暂停派发新请求；
+- 可选的请求速率上限（EMBEDDING_MAX_REQUESTS_PER_SECOND，GCRA 令牌桶），用于服务端按 RPM 计费/限流的场景；
+- 窗口按 (模型, base_url) 在进程内共享，同一服务的所有调用方共同适应限流。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from yuxi.utils.prometheus import format_labels, metric_header, render_lines
+
+EMBEDDING_MAX_BATCH_TOKENS = max(1, int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS") or 16_384))
+EMBEDDING_MAX_REQUESTS_PER_SECOND = max(0.0, float(os.getenv("EMBEDDING_MAX_REQUESTS_PER_SECOND") or 0))
+EMBEDDING_RATE_BURST = max(1, int(os.getenv("EMBEDDING_RATE_BURST") or 4))
+EMBEDDING_AIMD_MIN_WINDOW = 1.0
+EMBEDDING_AIMD_DECREASE_FACTOR = 0.5
+EMBEDDING_RETRY_AFTER_MAX_SECONDS = 60.0
+
+# 中日韩字符约 1 token/字，其余按约 4 字符/token 估算
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    text = str(text or "")
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4 + 1
+
+
+def pack_by_token_budget(texts: list[str], *, max_tokens: int, max_items: int) -> list[tuple[int, int]]:
+    """按输入顺序切分为 [start, end) 区间，每批不超过 max_items 条与 max_tokens 估算 token；超长的单条独占一批。"""
+    max_tokens = max(int(max_tokens), 1)
+    max_items = max(int(max_items), 1)
+    batches: list[tuple[int, int]] = []
+    start = 0
+    tokens = 0
+    for index, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if index > start and (index - start >= max_items or tokens + cost > max_tokens):
+            batches.append((start, index))
+            start, tokens = index, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """解析 Retry-After（秒数或 HTTP 日期），返回需要等待的秒数。"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), EMBEDDING_RETRY_AFTER_MAX_SECONDS)
+
+
+class AIMDConcurrencyController:
+    """加性增、乘性减的并发窗口，窗口取整后即允许同时在途的请求数。"""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_window: int,
+        min_window: float = EMBEDDING_AIMD_MIN_WINDOW,
+        max_rate: float = 0.0,
+        burst: int = EMBEDDING_RATE_BURST,
+    ) -> None:
+        self.name = name
+        self.min_window = max(float(min_window), 1.0)
+        self.max_window = max(float(max_window), self.min_window)
+        self.window = self.max_window
+        self.in_flight = 0
+        self.max_rate = max(float(max_rate or 0.0), 0.0)
+        self.burst = max(int(burst), 1)
+        # GCRA 的理论到达时间：下一个请求最早可在 tat - (burst - 1) * interval 时派发
+        self._tat = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease_at = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+        self.successes = 0
+        self.throttled = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return max(int(self.window), int(self.min_window))
+
+    def set_max_window(self, max_window: int) -> None:
+        self.max_window = max(float(max_window), self.min_window)
+        self.window = min(self.window, self.max_window)
+
+    def _rate_delay(self, now: float) -> float:
+        if self.max_rate <= 0:
+            return 0.0
+        return self._tat - (self.burst - 1) / self.max_rate - now
+
+    async def acquire(self) -> float:
+        """等待可用并发槽位（及速率令牌），返回请求开始时间（monotonic）。"""
+        while True:
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, self._rate_delay(now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                if self.max_rate > 0:
+                    self._tat = max(self._tat, now) + 1.0 / self.max_rate
+                return time.monotonic()
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # 已被唤醒却在恢复前取消，把名额转给下一个等待者
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        self.in_flight = max(self.in_flight - 1, 0)
+        self._wake()
+
+    def _wake(self) -> None:
+        available = self.limit - self.in_flight
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                available -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        started_at = await self.acquire()
+        try:
+            yield started_at
+        finally:
+            self.release()
+
+    def on_success(self) -> None:
+        self.successes += 1
+        self.window = min(self.max_window, self.window + 1.0 / self.window)
+        self._wake()
+
+    def on_throttle(self, started_at: float, retry_after: float | None = None) -> None:
+        """记录一次限流；拥塞发生前已发出的请求再失败时不重复减窗。"""
+        self.throttled += 1
+        now = time.monotonic()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        if started_at >= self._last_decrease_at:
+            self.window = max(self.min_window, self.window * EMBEDDING_AIMD_DECREASE_FACTOR)
+            self._last_decrease_at = now
+            self.decreases += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "window": round(self.window, 3),
+            "max_window": self.max_window,
+            "max_rate": self.max_rate,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "blocked_for_seconds": round(max(self._blocked_until - time.monotonic(), 0.0), 3),
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "decreases": self.decreases,
+        }
+
+
+_controllers: dict[str, AIMDConcurrencyController] = {}
+
+
+def get_concurrency_controller(
+    name: str, max_window: int, max_rate: float = EMBEDDING_MAX_REQUESTS_PER_SECOND
+) -> AIMDConcurrencyController:
+    """按服务名获取进程内共享的控制器；同一服务的所有文件、知识库共用一个并发窗口与速率上限。"""
+    controller = _controllers.get(name)
+    if controller is None:
+        controller = _controllers[name] = AIMDConcurrencyController(name, max_window=max_window, max_rate=max_rate)
+    else:
+        controller.set_max_window(max_window)
+        controller.max_rate = max(float(max_rate or 0.0), 0.0)
+    return controller
+
+
+def get_concurrency_stats() -> list[dict[str, Any]]:
+    return [controller.get_stats() for _, controller in sorted(_controllers.items())]
+
+
+def render_prometheus() -> str:
+    metrics = (
+        ("yuxi_embedding_concurrency_window", "gauge", "Current AIMD concurrency window.", "window"),
+        ("yuxi_embedding_in_flight_requests", "gauge", "Embedding requests currently in flight.", "in_flight"),
+        ("yuxi_embedding_throttled_total", "counter", "Embedding requests rejected with 429/5xx.", "throttled"),
+    )
+    stats = get_concurrency_stats()
+    lines = []
+    for metric, metric_type, description, key in metrics:
+        lines.extend(metric_header(metric, metric_type, description))
+        for item in stats:
+            lines.append(f"{metric}{format_labels(endpoint=item['name'])} {item[key]}")
+    return render_lines(lines)
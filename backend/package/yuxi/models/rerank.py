@@ -1,4 +1,8 @@
 import asyncio
+import json
+import os
+import time
+import weakref
 from abc import ABC, abstractmethod
 from collections.abc import Iterable, Sequence
 from typing import Any
@@ -7,13 +11,72 @@ import aiohttp
 import numpy as np
 
 from yuxi.models.providers.cache import model_cache
-from yuxi.utils import get_docker_safe_url, logger
+from yuxi.models.rerank_cache import RERANK_SCORE_CACHE_ENABLED, build_rerank_cache_key, rerank_score_cache
+from yuxi.utils import get_docker_safe_url, hashstr, logger
+
+RERANK_MAX_CONCURRENCY = max(1, int(os.getenv("RERANK_MAX_CONCURRENCY") or 4))
+RERANK_HTTP_POOL_SIZE = max(1, int(os.getenv("RERANK_HTTP_POOL_SIZE") or 16))
+RERANK_HTTP_KEEPALIVE_SECONDS = float(os.getenv("RERANK_HTTP_KEEPALIVE_SECONDS") or 60)
+# 连续失败达到阈值后熔断，冷却期内直接跳过重排序；冷却结束放行一次探测请求
+RERANK_CIRCUIT_FAILURE_THRESHOLD = max(1, int(os.getenv("RERANK_CIRCUIT_FAILURE_THRESHOLD") or 3))
+RERANK_CIRCUIT_RESET_SECONDS = float(os.getenv("RERANK_CIRCUIT_RESET_SECONDS") or 30)
 
 
 def sigmoid(x):
     return 1 / (1 + np.exp(-x))
 
 
+class RerankerUnavailableError(RuntimeError):
+    """重排序服务不可用（请求失败或处于熔断期），调用方应跳过重排序。"""
+
+
+class RerankCircuitBreaker:
+    """按 reranker 统计连续失败次数的熔断器：closed → open → half-open → closed。"""
+
+    def __init__(
+        self,
+        failure_threshold: int = RERANK_CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = RERANK_CIRCUIT_RESET_SECONDS,
+    ):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_seconds = float(reset_seconds)
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self._probing or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """探测请求未得出结果（如被取消）时归还探测名额，下一次请求重新探测。"""
+        self._probing = False
+
+
 class BaseReranker(ABC):
     def __init__(self, model_name, api_key, base_url, **kwargs):
         self.url = get_docker_safe_url(base_url)
@@ -21,12 +84,62 @@ class BaseReranker(ABC):
         self.api_key = api_key
         self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         self.session: aiohttp.ClientSession | None = None
+        self._session_loop: weakref.ReferenceType[asyncio.AbstractEventLoop] | None = None
         self.timeout = aiohttp.ClientTimeout(total=30)
         self.parameters: dict[str, Any] = dict(kwargs.get("parameters", {}))
+        self.max_concurrency = max(int(kwargs.get("max_concurrency") or RERANK_MAX_CONCURRENCY), 1)
+        self.circuit_breaker = RerankCircuitBreaker()
+        self.score_cache = rerank_score_cache if RERANK_SCORE_CACHE_ENABLED else None
+
+    @property
+    def cache_namespace(self) -> str:
+        """分数缓存的模型维度：同名模型部署在不同服务上时分数不通用。"""
+        return f"{self.model}@{self.url}"
+
+    def cache_scorer(self, max_length: int) -> str:
+        """分数缓存的打分维度：模型、服务地址、协议、截断长度与请求参数任一不同，分数都不通用。"""
+        parameters = json.dumps(self.parameters, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{self.cache_namespace}|{type(self).__name__}|{max_length}|{parameters}"
 
     async def _ensure_session(self) -> None:
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout)
+        """复用长连接会话；aiohttp 会话绑定事件循环，跨循环时重建。"""
+        loop = asyncio.get_running_loop()
+        if (
+            self.session is not None
+            and not self.session.closed
+            and self._session_loop is not None
+            and self._session_loop() is loop
+        ):
+            return
+        await self._close_stale_session()
+        connector = aiohttp.TCPConnector(
+            limit=RERANK_HTTP_POOL_SIZE,
+            limit_per_host=RERANK_HTTP_POOL_SIZE,
+            keepalive_timeout=RERANK_HTTP_KEEPALIVE_SECONDS,
+        )
+        self.session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout, connector=connector)
+        self._session_loop = weakref.ref(loop)
+
+    async def _close_stale_session(self) -> None:
+        """关闭绑定在其他事件循环上的旧会话，避免跨循环重建时泄漏连接器。"""
+        session, session_loop = self.session, self._session_loop
+        self.session = None
+        self._session_loop = None
+        if session is None or session.closed:
+            return
+        old_loop = session_loop() if session_loop is not None else None
+        if old_loop is not None and old_loop.is_running():
+            # 旧循环仍在其他线程中运行，交回该循环关闭
+            asyncio.run_coroutine_threadsafe(session.close(), old_loop)
+            return
+        # 旧循环已停止或关闭：连接器同步关闭连接，会话解除连接器后即为关闭状态
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            try:
+                await connector.close()
+            except RuntimeError as e:
+                logger.debug(f"Close stale reranker connector of {self.model}: {e}")
 
     @abstractmethod
     def _build_payload(self, query: str, documents: list[str], max_length: int) -> dict[str, Any]:
@@ -42,7 +155,13 @@ class BaseReranker(ABC):
         batch_size: int = 32,
         max_length: int = 512,
         normalize: bool = True,
+        chunk_ids: Sequence[str | None] | None = None,
     ) -> list[float]:
+        """计算 Query 与各文档的相关性分数。
+
+        传入与文档一一对应的 chunk_ids 时启用分数缓存，只有未命中的文档会发送到重排序服务；
+        chunk_id 为空的文档不参与缓存。
+        """
         if not sentence_pairs or len(sentence_pairs) < 2:
             return []
 
@@ -52,26 +171,100 @@ class BaseReranker(ABC):
         if not documents:
             return []
 
+        if self.score_cache is None or chunk_ids is None:
+            all_scores = await self._score_documents(query, documents, batch_size, max_length)
+        else:
+            all_scores = await self._score_documents_cached(query, documents, chunk_ids, batch_size, max_length)
+
+        if normalize:
+            all_scores = [float(sigmoid(score)) for score in all_scores]
+
+        return all_scores
+
+    async def _score_documents_cached(
+        self,
+        query: str,
+        documents: list[str],
+        chunk_ids: Sequence[str | None],
+        batch_size: int,
+        max_length: int,
+    ) -> list[float]:
+        if len(chunk_ids) != len(documents):
+            raise ValueError(f"Got {len(chunk_ids)} chunk ids for {len(documents)} documents")
+        assert self.score_cache is not None
+
+        cacheable = [position for position, chunk_id in enumerate(chunk_ids) if chunk_id]
+        scorer = self.cache_scorer(max_length)
+        keys = [
+            build_rerank_cache_key(scorer, query, str(chunk_ids[position]), documents[position])
+            for position in cacheable
+        ]
+        scores: list[float | None] = [None] * len(documents)
+        for position, score in zip(cacheable, await self.score_cache.get_many(keys), strict=True):
+            scores[position] = score
+
+        missing = [position for position, score in enumerate(scores) if score is None]
+        if missing:
+            fresh_scores = await self._score_documents(
+                query, [documents[position] for position in missing], batch_size, max_length
+            )
+            for position, score in zip(missing, fresh_scores, strict=True):
+                scores[position] = score
+            key_by_position = dict(zip(cacheable, keys, strict=True))
+            await self.score_cache.set_many(
+                [(key_by_position[position], scores[position]) for position in missing if position in key_by_position]
+            )
+
+        logger.debug(
+            f"Rerank score cache: {len(documents) - len(missing)}/{len(documents)} hits, "
+            f"hit_ratio={self.score_cache.get_stats()['hit_ratio']:.2%}"
+        )
+        return [float(score) for score in scores]
+
+    async def _score_documents(self, query: str, documents: list[str], batch_size: int, max_length: int) -> list[float]:
+        """按批次并发调用重排序服务，返回与 documents 对齐的原始分数。"""
+        # 熔断器非 closed 时放行的只可能是 half-open 探测请求
+        is_probe = self.circuit_breaker.state != "closed"
+        if not self.circuit_breaker.allow_request():
+            raise RerankerUnavailableError(f"Reranker {self.model} is unhealthy, skipping rerank")
+
         await self._ensure_session()
 
-        all_scores: list[float] = []
         batch_size = max(1, int(batch_size))
-        total_batches = (len(documents) + batch_size - 1) // batch_size
+        starts = list(range(0, len(documents), batch_size))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        for batch_no, start in enumerate(range(0, len(documents), batch_size), start=1):
+        async def rerank_batch(batch_no: int, start: int) -> list[float]:
             batch = documents[start : start + batch_size]
-            try:
+            async with semaphore:
                 scores = await self._batch_rerank(query, batch, max_length=max_length)
-                all_scores.extend(scores)
-                logger.debug(f"Reranking batch {batch_no}/{total_batches} completed")
-            except Exception as exc:
-                logger.error(f"Reranking batch {batch_no} failed: {exc}")
-                all_scores.extend([0.5] * len(batch))
+            if len(scores) != len(batch):
+                raise ValueError(f"Reranker returned {len(scores)} scores for {len(batch)} documents")
+            logger.debug(f"Reranking batch {batch_no}/{len(starts)} completed")
+            return scores
 
-        if normalize:
-            all_scores = [float(sigmoid(score)) for score in all_scores]
-
-        return all_scores
+        # 各批次并发请求，gather 按提交顺序返回，结果与输入文档一一对应
+        tasks = [asyncio.create_task(rerank_batch(batch_no, start)) for batch_no, start in enumerate(starts, start=1)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 探测被取消时结果未知，归还探测名额，否则熔断器会一直停在 half-open 拒绝请求
+            if is_probe:
+                self.circuit_breaker.release_probe()
+            raise
+        except Exception as exc:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.circuit_breaker.record_failure()
+            logger.error(f"Reranking failed ({self.circuit_breaker.state}): {exc}")
+            raise RerankerUnavailableError(f"Reranker {self.model} request failed: {exc}") from exc
+
+        self.circuit_breaker.record_success()
+        return [score for scores in results for score in scores]
 
     async def _batch_rerank(self, query: str, documents: Iterable[str], max_length: int) -> list[float]:
         docs = list(documents)
@@ -192,3 +385,72 @@ def get_reranker(model_id: str, **kwargs):
         base_url=info.base_url,
         **reranker_kwargs,
     )
+
+
+class RerankerRegistry:
+    """进程级 reranker 注册表：每个模型 spec 复用一个带连接池的长连接实例。
+
+    模型配置（地址、密钥、参数）变化时按新配置重建实例；进程退出时统一关闭会话。
+    """
+
+    def __init__(self) -> None:
+        self._rerankers: dict[str, tuple[str, BaseReranker]] = {}
+
+    @staticmethod
+    def _config_signature(model_id: str) -> str:
+        info = model_cache.get_model_info(model_id)
+        if not info:
+            return ""
+        payload = {
+            "model_id": info.model_id,
+            "base_url": info.base_url,
+            "api_key": info.api_key,
+            "extra": info.extra,
+        }
+        return hashstr(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str), 16)
+
+    def get(self, model_id: str) -> BaseReranker:
+        signature = self._config_signature(model_id)
+        entry = self._rerankers.get(model_id)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        reranker = get_reranker(model_id)
+        self._rerankers[model_id] = (signature, reranker)
+        if entry is not None:
+            logger.info(f"Reranker {model_id} configuration changed, session rebuilt")
+            _close_in_background(entry[1])
+        return reranker
+
+    async def aclose(self) -> None:
+        rerankers = [reranker for _, reranker in self._rerankers.values()]
+        self._rerankers.clear()
+        for reranker in rerankers:
+            try:
+                await reranker.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close reranker session for {reranker.model}: {e}")
+
+
+def _close_in_background(reranker: BaseReranker) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(reranker.aclose())
+    _background_close_tasks.add(task)
+    task.add_done_callback(_background_close_tasks.discard)
+
+
+_background_close_tasks: set[asyncio.Task] = set()
+reranker_registry = RerankerRegistry()
+
+
+def get_shared_reranker(model_id: str) -> BaseReranker:
+    """获取进程内共享的 reranker；调用方不要关闭它，由 ``close_reranker_sessions`` 统一关闭。"""
+    return reranker_registry.get(model_id)
+
+
+async def close_reranker_sessions() -> None:
+    """关闭注册表中所有 reranker 的长连接会话。"""
+    await reranker_registry.aclose()
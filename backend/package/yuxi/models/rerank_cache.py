@@ -0,0 +1,140 @@
+"""重排序分数的两级缓存。
+
+Agent 多轮检索时 Query 往往只做细微改写，召回的候选 chunk 与上一轮高度重叠。
+按 (reranker 模型及打分参数, Query 原文, chunk_id, chunk 内容 hash) 缓存原始分数，
+只把未命中的文档发给重排序服务；进程内 LRU 承接同进程重复，Redis 层在 API 与 Worker 之间共享。
+缓存 key 含内容 hash，chunk 内容被编辑后自然落到新的 key。
+"""
+
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from typing import Any
+
+from yuxi.storage.redis import RedisFallback
+from yuxi.utils import hashstr
+
+RERANK_SCORE_CACHE_ENABLED = os.getenv("RERANK_SCORE_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+RERANK_SCORE_CACHE_KEY_PREFIX = "yuxi:rerank_score:"
+RERANK_SCORE_CACHE_TTL_SECONDS = int(os.getenv("RERANK_SCORE_CACHE_TTL_SECONDS") or 6 * 3600)
+RERANK_SCORE_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("RERANK_SCORE_CACHE_LOCAL_MAX_ENTRIES") or 20000)
+RERANK_SCORE_CACHE_REDIS_ENABLED = os.getenv("RERANK_SCORE_CACHE_REDIS_ENABLED", "true").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+
+CacheKey = tuple[str, str, str, str]
+
+
+def build_rerank_cache_key(scorer: str, query_text: str, chunk_id: str, content: str) -> CacheKey:
+    """scorer 为模型与全部影响分数的参数签名；Query 不做规范化，大小写或空白不同都可能改变分数。"""
+    return (scorer, hashstr(str(query_text or "")), str(chunk_id), hashstr(content))
+
+
+def _redis_key(key: CacheKey) -> str:
+    scorer, query_hash, chunk_id, content_hash = key
+    return f"{RERANK_SCORE_CACHE_KEY_PREFIX}{hashstr(scorer, 16)}:{query_hash}:{hashstr(chunk_id, 16)}:{content_hash}"
+
+
+class RerankScoreCache:
+    """按 (模型, Query, chunk) 缓存重排序原始分数（归一化前）。"""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = RERANK_SCORE_CACHE_LOCAL_MAX_ENTRIES,
+        ttl_seconds: int = RERANK_SCORE_CACHE_TTL_SECONDS,
+        redis_enabled: bool = RERANK_SCORE_CACHE_REDIS_ENABLED,
+    ) -> None:
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl_seconds = int(ttl_seconds)
+        self._local: OrderedDict[CacheKey, float] = OrderedDict()
+        # Redis 故障时短暂旁路，避免每次请求都等待连接超时
+        self._redis = RedisFallback("Rerank score Redis cache", enabled=redis_enabled)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _set_local(self, key: CacheKey, score: float) -> None:
+        self._local[key] = score
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get_many(self, keys: list[CacheKey]) -> list[float | None]:
+        """批量查询分数，未命中的位置为 None；Redis 命中会回填进程内缓存。"""
+        scores: list[float | None] = []
+        remote_positions: list[int] = []
+        for position, key in enumerate(keys):
+            score = self._local.get(key)
+            if score is not None:
+                self._local.move_to_end(key)
+                self.local_hits += 1
+            else:
+                remote_positions.append(position)
+            scores.append(score)
+
+        if remote_positions:
+            remote_scores = await self._get_redis_many([keys[position] for position in remote_positions])
+            for position, score in zip(remote_positions, remote_scores, strict=True):
+                if score is None:
+                    self.misses += 1
+                    continue
+                self.redis_hits += 1
+                scores[position] = score
+                self._set_local(keys[position], score)
+        return scores
+
+    async def _get_redis_many(self, keys: list[CacheKey]) -> list[float | None]:
+        redis = await self._redis.get_client()
+        if redis is None:
+            return [None] * len(keys)
+        try:
+            raw_values = await redis.mget([_redis_key(key) for key in keys])
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+            return [None] * len(keys)
+        scores: list[float | None] = []
+        for raw in raw_values:
+            try:
+                scores.append(float(raw) if raw is not None else None)
+            except (TypeError, ValueError):
+                scores.append(None)
+        return scores
+
+    async def set_many(self, items: list[tuple[CacheKey, float]]) -> None:
+        if not items:
+            return
+        for key, score in items:
+            self._set_local(key, float(score))
+
+        redis = await self._redis.get_client()
+        if redis is None:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, score in items:
+                    pipe.set(_redis_key(key), repr(float(score)), ex=self.ttl_seconds)
+                await pipe.execute()
+        except Exception as exc:
+            self._redis.mark_unavailable(exc)
+
+    def get_stats(self) -> dict[str, Any]:
+        total = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.local_hits + self.redis_hits) / total if total else 0.0,
+            "local_entries": len(self._local),
+        }
+
+    def reset_stats(self) -> None:
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+
+rerank_score_cache = RerankScoreCache()
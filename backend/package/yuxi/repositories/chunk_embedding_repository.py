@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from yuxi.storage.postgres.manager import pg_manager
+from yuxi.storage.postgres.models_knowledge import ChunkEmbedding
+from yuxi.utils.datetime_utils import utc_now_naive
+
+SQL_IN_BATCH_SIZE = 10_000
+INSERT_BATCH_SIZE = 1_000
+
+
+class ChunkEmbeddingRepository:
+    @staticmethod
+    def _iter_batches(items: list, batch_size: int = SQL_IN_BATCH_SIZE) -> Iterator[list]:
+        for index in range(0, len(items), batch_size):
+            yield items[index : index + batch_size]
+
+    async def get_many(
+        self, model_spec: str, content_hashes: list[str], dimension: int | None = None
+    ) -> dict[str, bytes]:
+        """返回命中的 {content_hash: 向量字节}，并刷新命中条目的 last_used_at；给定 dimension 时只返回该维度的向量。"""
+        if not content_hashes:
+            return {}
+
+        vectors: dict[str, bytes] = {}
+        async with pg_manager.get_async_session_context() as session:
+            for batch in self._iter_batches(content_hashes):
+                conditions = [ChunkEmbedding.model_spec == model_spec, ChunkEmbedding.content_hash.in_(batch)]
+                if dimension:
+                    conditions.append(ChunkEmbedding.dimension == dimension)
+                result = await session.execute(
+                    select(ChunkEmbedding.content_hash, ChunkEmbedding.embedding).where(*conditions)
+                )
+                vectors.update({content_hash: bytes(embedding) for content_hash, embedding in result.all()})
+            hits = list(vectors)
+            for batch in self._iter_batches(hits):
+                await session.execute(
+                    update(ChunkEmbedding)
+                    .where(ChunkEmbedding.model_spec == model_spec, ChunkEmbedding.content_hash.in_(batch))
+                    .values(last_used_at=utc_now_naive())
+                )
+        return vectors
+
+    async def insert_many(self, model_spec: str, vectors: dict[str, tuple[int, bytes]]) -> None:
+        """写入 {content_hash: (维度, 向量字节)}，已存在的同维度条目保持不变，维度不同时覆盖。"""
+        if not vectors:
+            return
+
+        now = utc_now_naive()
+        rows = [
+            {
+                "model_spec": model_spec,
+                "content_hash": content_hash,
+                "dimension": dimension,
+                "embedding": embedding,
+                "created_at": now,
+                "last_used_at": now,
+            }
+            for content_hash, (dimension, embedding) in vectors.items()
+        ]
+        async with pg_manager.get_async_session_context() as session:
+            for batch in self._iter_batches(rows, INSERT_BATCH_SIZE):
+                stmt = insert(ChunkEmbedding).values(batch)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["model_spec", "content_hash"],
+                        set_={
+                            "dimension": stmt.excluded.dimension,
+                            "embedding": stmt.excluded.embedding,
+                            "last_used_at": stmt.excluded.last_used_at,
+                        },
+                        where=ChunkEmbedding.dimension != stmt.excluded.dimension,
+                    )
+                )
+
+    async def count(self) -> int:
+        async with pg_manager.get_async_session_context() as session:
+            result = await session.execute(select(func.count()).select_from(ChunkEmbedding))
+            return int(result.scalar() or 0)
+
+    async def delete_least_recently_used(self, keep: int) -> int:
+        """按 last_used_at 删除最久未使用的条目，保留 keep 条，返回删除数量。"""
+        async with pg_manager.get_async_session_context() as session:
+            total = int((await session.execute(select(func.count()).select_from(ChunkEmbedding))).scalar() or 0)
+            excess = total - max(int(keep), 0)
+            if excess <= 0:
+                return 0
+            stale_ids = (
+                select(ChunkEmbedding.id)
+                .order_by(ChunkEmbedding.last_used_at.asc(), ChunkEmbedding.id.asc())
+                .limit(excess)
+                .scalar_subquery()
+            )
+            result = await session.execute(delete(ChunkEmbedding).where(ChunkEmbedding.id.in_(stale_ids)))
+            return int(result.rowcount or 0)
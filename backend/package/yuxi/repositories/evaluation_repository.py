@@ -147,6 +147,38 @@ class EvaluationRepository:
                 setattr(record, key, value)
             return record
 
+    async def upsert_run_items(self, run_id: str, items: list[tuple[int, dict[str, Any]]]) -> None:
+        """在同一事务内批量写入逐题结果，按 item_index 覆盖已有记录。"""
+        if not items:
+            return
+        async with pg_manager.get_async_session_context() as session:
+            result = await session.execute(
+                select(EvaluationRunItem).where(
+                    (EvaluationRunItem.run_id == run_id)
+                    & (EvaluationRunItem.item_index.in_([item_index for item_index, _ in items]))
+                )
+            )
+            existing = {record.item_index: record for record in result.scalars().all()}
+            for item_index, data in items:
+                record = existing.get(item_index)
+                if record is None:
+                    record = EvaluationRunItem(run_id=run_id, item_index=item_index, **data)
+                    session.add(record)
+                    existing[item_index] = record
+                    continue
+                for key, value in data.items():
+                    setattr(record, key, value)
+
+    async def list_run_item_metrics(self, run_id: str) -> list[tuple[int, dict[str, Any]]]:
+        """返回已完成题目的 (item_index, metrics)，用于恢复评估时重建汇总指标。"""
+        async with pg_manager.get_async_session_context() as session:
+            result = await session.execute(
+                select(EvaluationRunItem.item_index, EvaluationRunItem.metrics)
+                .where(EvaluationRunItem.run_id == run_id)
+                .order_by(EvaluationRunItem.item_index.asc())
+            )
+            return [(int(item_index), metrics or {}) for item_index, metrics in result.all()]
+
     async def list_run_items(self, run_id: str, offset: int = 0, limit: int = 100) -> list[EvaluationRunItem]:
         async with pg_manager.get_async_session_context() as session:
             result = await session.execute(
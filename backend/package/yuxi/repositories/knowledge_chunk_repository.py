@@ -3,7 +3,7 @@ from __future__ import annotations
 from collections.abc import Iterator
 from typing import Any
 
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import bindparam, delete, func, select, update
 
 from yuxi.storage.postgres.manager import pg_manager
 from yuxi.storage.postgres.models_knowledge import KnowledgeChunk
@@ -130,6 +130,16 @@ class KnowledgeChunkRepository:
             result = await session.execute(delete(KnowledgeChunk).where(KnowledgeChunk.file_id == file_id))
             return int(result.rowcount or 0)
 
+    async def delete_by_chunk_ids(self, chunk_ids: list[str]) -> int:
+        if not chunk_ids:
+            return 0
+        deleted = 0
+        async with pg_manager.get_async_session_context() as session:
+            for batch in self._iter_batches(chunk_ids):
+                result = await session.execute(delete(KnowledgeChunk).where(KnowledgeChunk.chunk_id.in_(batch)))
+                deleted += int(result.rowcount or 0)
+        return deleted
+
     async def delete_by_kb_id(self, kb_id: str) -> int:
         async with pg_manager.get_async_session_context() as session:
             result = await session.execute(delete(KnowledgeChunk).where(KnowledgeChunk.kb_id == kb_id))
@@ -287,6 +297,25 @@ class KnowledgeChunkRepository:
                 .values(graph_structure_indexed=True, ent_ids=ent_ids)
             )
 
+    async def mark_graph_structure_indexed_batch(self, ent_ids_by_chunk_id: dict[str, list[str]]) -> None:
+        """批量标记图结构已写入，每个 chunk 写入各自的 ent_ids。"""
+        if not ent_ids_by_chunk_id:
+            return
+        table = KnowledgeChunk.__table__
+        stmt = (
+            update(table)
+            .where(table.c.chunk_id == bindparam("target_chunk_id"))
+            .values(graph_structure_indexed=True, ent_ids=bindparam("target_ent_ids"))
+        )
+        async with pg_manager.get_async_session_context() as session:
+            await session.execute(
+                stmt,
+                [
+                    {"target_chunk_id": chunk_id, "target_ent_ids": ent_ids}
+                    for chunk_id, ent_ids in sorted(ent_ids_by_chunk_id.items())
+                ],
+            )
+
     async def reset_graph_state_by_kb_id(self, kb_id: str, clear_extraction_result: bool) -> int:
         values: dict[str, Any] = {"graph_structure_indexed": False, "graph_indexed": False}
         if clear_extraction_result:
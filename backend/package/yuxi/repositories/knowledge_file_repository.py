@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from collections.abc import Iterator
+from datetime import datetime
 from types import SimpleNamespace
 from typing import Any
 
@@ -34,6 +35,8 @@ class KnowledgeFileRepository:
         "processing_params",
         "is_folder",
         "error_message",
+        "claimed_by",
+        "claim_expires_at",
         "created_by",
         "updated_by",
     }
@@ -204,6 +207,54 @@ class KnowledgeFileRepository:
             )
             return [str(file_id) for file_id in result.scalars().all()]
 
+    async def list_parent_ids(self, *, kb_id: str, folders_only: bool = False) -> dict[str, str | None]:
+        """返回 file_id -> parent_id 映射，用于在内存中展开目录树。"""
+        filters = [KnowledgeFile.kb_id == kb_id]
+        if folders_only:
+            filters.append(KnowledgeFile.is_folder.is_(True))
+
+        async with pg_manager.get_async_session_context() as session:
+            result = await session.execute(select(KnowledgeFile.file_id, KnowledgeFile.parent_id).where(*filters))
+            return {str(file_id): (str(parent_id) if parent_id else None) for file_id, parent_id in result.all()}
+
+    async def list_file_ids_by_parent_ids(
+        self,
+        *,
+        kb_id: str,
+        parent_ids: list[str],
+        page_size: int = SQL_IN_BATCH_SIZE,
+    ) -> list[str]:
+        """返回目录下的全部文件 id，按 file_id 游标分页读取，不截断。"""
+        normalized_ids = [parent_id for parent_id in parent_ids if parent_id]
+        if not normalized_ids:
+            return []
+
+        page_size = max(int(page_size), 1)
+        file_ids: list[str] = []
+        async with pg_manager.get_async_session_context() as session:
+            for batch in self._iter_batches(normalized_ids):
+                after_file_id = None
+                while True:
+                    filters = [
+                        KnowledgeFile.kb_id == kb_id,
+                        KnowledgeFile.is_folder.is_(False),
+                        KnowledgeFile.parent_id.in_(batch),
+                    ]
+                    if after_file_id is not None:
+                        filters.append(KnowledgeFile.file_id > after_file_id)
+                    result = await session.execute(
+                        select(KnowledgeFile.file_id)
+                        .where(*filters)
+                        .order_by(KnowledgeFile.file_id.asc())
+                        .limit(page_size)
+                    )
+                    page = [str(file_id) for file_id in result.scalars().all()]
+                    file_ids.extend(page)
+                    if len(page) < page_size:
+                        break
+                    after_file_id = page[-1]
+        return sorted(file_ids)
+
     async def exists_by_content_hash(self, *, kb_id: str, content_hash: str) -> bool:
         normalized_hash = content_hash.strip()
         if not normalized_hash:
@@ -600,6 +651,49 @@ class KnowledgeFileRepository:
             )
             return result.scalar_one_or_none()
 
+    async def renew_claim(self, *, kb_id: str, file_id: str, claimed_by: str, claim_expires_at: datetime) -> bool:
+        """延长仍由 claimed_by 持有的处理租约，租约已被清除或转给他人时返回 False。"""
+        async with pg_manager.get_async_session_context() as session:
+            result = await session.execute(
+                update(KnowledgeFile)
+                .where(
+                    KnowledgeFile.kb_id == kb_id,
+                    KnowledgeFile.file_id == file_id,
+                    KnowledgeFile.claimed_by == claimed_by,
+                )
+                .values(claim_expires_at=claim_expires_at)
+            )
+            return bool(result.rowcount)
+
+    async def reset_expired_claims(
+        self,
+        *,
+        kb_id: str,
+        from_status: str,
+        to_status: str,
+        now: datetime,
+        unclaimed_before: datetime,
+    ) -> int:
+        """把停留在中间状态且租约已过期的文件回退到 to_status，返回回退数量。
+
+        没有租约记录的旧数据按 updated_at 早于 unclaimed_before 判定过期。
+        """
+        async with pg_manager.get_async_session_context() as session:
+            result = await session.execute(
+                update(KnowledgeFile)
+                .where(
+                    KnowledgeFile.kb_id == kb_id,
+                    KnowledgeFile.is_folder.is_(False),
+                    KnowledgeFile.status == from_status,
+                    or_(
+                        KnowledgeFile.claim_expires_at < now,
+                        KnowledgeFile.claim_expires_at.is_(None) & (KnowledgeFile.updated_at < unclaimed_before),
+                    ),
+                )
+                .values(status=to_status, claimed_by=None, claim_expires_at=None, updated_at=utc_now_naive())
+            )
+            return int(result.rowcount or 0)
+
     async def delete(self, file_id: str) -> None:
         async with pg_manager.get_async_session_context() as session:
             result = await session.execute(select(KnowledgeFile).where(KnowledgeFile.file_id == file_id))
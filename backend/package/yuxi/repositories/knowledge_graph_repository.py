@@ -223,10 +223,50 @@ class KnowledgeGraphRepository:
         entities: list[dict[str, Any]],
         triples: list[dict[str, Any]],
     ) -> None:
+        await self.upsert_chunk_graphs(
+            kb_id=kb_id,
+            chunk_graphs=[{"file_id": file_id, "chunk_id": chunk_id, "entities": entities, "triples": triples}],
+        )
+
+    async def upsert_chunk_graphs(self, *, kb_id: str, chunk_graphs: list[dict[str, Any]]) -> None:
+        """在一个事务内批量写入多个 chunk 的实体、三元组及其 mention。
+
+        同一条 INSERT ... ON CONFLICT DO UPDATE 不能两次命中同一行，因此实体与三元组先按 id
+        去重；行按 id 排序，使并发写入以相同顺序加行锁。
+        """
+        entity_rows: dict[str, dict[str, Any]] = {}
+        entity_mentions: dict[tuple[str, str], dict[str, Any]] = {}
+        triple_rows: dict[str, dict[str, Any]] = {}
+        triple_mentions: dict[tuple[str, str], dict[str, Any]] = {}
+        for chunk_graph in chunk_graphs:
+            file_id = chunk_graph["file_id"]
+            chunk_id = chunk_graph["chunk_id"]
+            for entity in chunk_graph.get("entities") or []:
+                entity_rows[entity["entity_id"]] = {key: value for key, value in entity.items() if key != "content"}
+                entity_mentions[(entity["entity_id"], chunk_id)] = {
+                    "entity_id": entity["entity_id"],
+                    "kb_id": kb_id,
+                    "file_id": file_id,
+                    "chunk_id": chunk_id,
+                }
+            for triple in chunk_graph.get("triples") or []:
+                triple_rows[triple["triple_id"]] = {
+                    key: value for key, value in triple.items() if key not in {"text", "extractor_type"}
+                }
+                triple_mentions[(triple["triple_id"], chunk_id)] = {
+                    "triple_id": triple["triple_id"],
+                    "kb_id": kb_id,
+                    "file_id": file_id,
+                    "chunk_id": chunk_id,
+                    "text": triple.get("text"),
+                    "extractor_type": triple.get("extractor_type"),
+                }
+        if not entity_rows and not triple_rows:
+            return
+
         async with pg_manager.get_async_session_context() as session:
-            if entities:
-                entity_rows = [{key: value for key, value in entity.items() if key != "content"} for entity in entities]
-                entity_stmt = insert(KnowledgeGraphEntity).values(entity_rows)
+            if entity_rows:
+                entity_stmt = insert(KnowledgeGraphEntity).values([entity_rows[key] for key in sorted(entity_rows)])
                 await session.execute(
                     entity_stmt.on_conflict_do_update(
                         index_elements=["entity_id"],
@@ -239,26 +279,12 @@ class KnowledgeGraphRepository:
                 )
                 await session.execute(
                     insert(KnowledgeGraphEntityMention)
-                    .values(
-                        [
-                            {
-                                "entity_id": entity["entity_id"],
-                                "kb_id": kb_id,
-                                "file_id": file_id,
-                                "chunk_id": chunk_id,
-                            }
-                            for entity in entities
-                        ]
-                    )
+                    .values([entity_mentions[key] for key in sorted(entity_mentions)])
                     .on_conflict_do_nothing(index_elements=["entity_id", "chunk_id"])
                 )
 
-            if triples:
-                triple_rows = [
-                    {key: value for key, value in triple.items() if key not in {"text", "extractor_type"}}
-                    for triple in triples
-                ]
-                triple_stmt = insert(KnowledgeGraphTriple).values(triple_rows)
+            if triple_rows:
+                triple_stmt = insert(KnowledgeGraphTriple).values([triple_rows[key] for key in sorted(triple_rows)])
                 await session.execute(
                     triple_stmt.on_conflict_do_update(
                         index_elements=["triple_id"],
@@ -271,19 +297,7 @@ class KnowledgeGraphRepository:
                 )
                 await session.execute(
                     insert(KnowledgeGraphTripleMention)
-                    .values(
-                        [
-                            {
-                                "triple_id": triple["triple_id"],
-                                "kb_id": kb_id,
-                                "file_id": file_id,
-                                "chunk_id": chunk_id,
-                                "text": triple.get("text"),
-                                "extractor_type": triple.get("extractor_type"),
-                            }
-                            for triple in triples
-                        ]
-                    )
+                    .values([triple_mentions[key] for key in sorted(triple_mentions)])
                     .on_conflict_do_nothing(index_elements=["triple_id", "chunk_id"])
                 )
 
@@ -16,6 +16,7 @@ from __future__ import annotations
 
 import asyncio
 import json
+import time
 import uuid
 from collections.abc import AsyncIterator
 from dataclasses import dataclass
@@ -37,9 +38,11 @@ from yuxi.services.input_message_service import (
     build_resume_input_message,
 )
 from yuxi.services.run_queue_service import (
+    RunEventStreamError,
     build_run_event_envelope,
     get_arq_pool,
     get_last_run_stream_seq,
+    get_run_event_multiplexer,
     list_recent_run_stream_events,
     list_run_stream_events,
     normalize_after_seq,
@@ -53,7 +56,7 @@ from yuxi.utils.logging_config import logger
 from yuxi.utils.sse_utils import (
     SSE_HEARTBEAT_SECONDS,
     SSE_MAX_CONNECTION_MINUTES,
-    SSE_POLL_INTERVAL_SECONDS,
+    SSE_TERMINAL_RECHECK_SECONDS,
     format_heartbeat,
     format_sse,
 )
@@ -61,6 +64,7 @@ from yuxi.utils.sse_utils import (
 RUN_PROGRESS_RECENT_EVENT_SCAN_LIMIT = 100
 RUN_PROGRESS_MESSAGE_LIMIT = 3
 RUN_PROGRESS_CONTENT_MAX_CHARS = 800
+RUN_SSE_CATCH_UP_BATCH_SIZE = 200
 
 
 def _resolve_agent_run_request_id(
@@ -906,6 +910,52 @@ async def cancel_agent_run_view(*, run_id: str, current_uid: str, db: AsyncSessi
     return {"run": run.to_dict() if run else None}
 
 
+async def _load_stream_run(run_id: str, current_uid: str):
+    async with pg_manager.get_async_session_context() as db:
+        return await AgentRunRepository(db).get_run_for_user(run_id, str(current_uid))
+
+
+def _stream_unavailable_sse(run_id: str, reason: str) -> str:
+    return format_sse(
+        {
+            "run_id": run_id,
+            "message": "运行事件流暂时不可用，请重连",
+            "reason": reason,
+        },
+        event="error",
+    )
+
+
+def _render_run_event_sse(event: dict, *, verbose: bool) -> str | None:
+    seq = str(event.get("seq") or "0-0")
+    event_type = event.get("event_type") or "message"
+    envelope = event.get("payload") or {}
+    if not verbose and isinstance(envelope, dict):
+        envelope = _compact_run_event_envelope(envelope)
+        if envelope is None:
+            return None
+    return format_sse(envelope, event=event_type, event_id=seq)
+
+
+async def _terminal_end_sse(run, *, run_id: str, last_seq: str, verbose: bool) -> str:
+    """run 已终结但流中缺少 end 事件时，根据数据库状态补发 end。"""
+    terminal_seq = last_seq
+    if terminal_seq in {"", "0-0"}:
+        terminal_seq = await get_last_run_stream_seq(run_id)
+    if terminal_seq in {"", "0-0"}:
+        terminal_seq = None
+    terminal_envelope = build_run_event_envelope(
+        run_id=run_id,
+        thread_id=run.conversation_thread_id,
+        event_type="end",
+        payload={"status": run.status, "request_id": run.request_id},
+        created_at=utc_now_naive().isoformat(),
+    )
+    if not verbose:
+        terminal_envelope = _compact_run_event_envelope(terminal_envelope)
+    return format_sse(terminal_envelope, event="end", event_id=terminal_seq)
+
+
 async def stream_agent_run_events(
     *,
     run_id: str,
@@ -913,99 +963,97 @@ async def stream_agent_run_events(
     current_uid: str,
     verbose: bool = True,
 ) -> AsyncIterator[str]:
-    """按 SSE 格式读取 run 事件流；终结事件缺失时根据数据库状态补发 end。"""
-    started_at = utc_now_naive()
-    last_heartbeat_ts = started_at
+    """按 SSE 格式推送 run 事件流。
 
+    建连时读取一次 run 行并用 XRANGE 补齐游标之后的历史事件，之后由进程内多路复用器
+    推送新事件，并以流中的 ``end`` 事件判定终结。只有长时间没有新事件时才回查数据库，
+    兜底 worker 未写入 end 事件就终结的 run。
+    """
+    started_at = time.monotonic()
+    deadline = started_at + SSE_MAX_CONNECTION_MINUTES * 60
+    last_heartbeat_at = started_at
     last_seq = normalize_after_seq(after_seq)
 
     try:
-        while True:
-            try:
-                async with pg_manager.get_async_session_context() as db:
-                    repo = AgentRunRepository(db)
-                    run = await repo.get_run_for_user(run_id, str(current_uid))
-                    if not run:
-                        yield format_sse({"run_id": run_id, "message": "运行任务不存在"}, event="error")
-                        return
-            except asyncio.CancelledError:
-                raise
-            except Exception as e:
-                logger.warning(f"Run SSE DB error for run {run_id}: {e}")
-                yield format_sse(
-                    {
-                        "run_id": run_id,
-                        "message": "运行事件流暂时不可用，请重连",
-                        "reason": "db_error",
-                    },
-                    event="error",
-                )
-                return
+        try:
+            run = await _load_stream_run(run_id, current_uid)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Run SSE DB error for run {run_id}: {e}")
+            yield _stream_unavailable_sse(run_id, "db_error")
+            return
+        if not run:
+            yield format_sse({"run_id": run_id, "message": "运行任务不存在"}, event="error")
+            return
 
+        while True:
             try:
-                events = await list_run_stream_events(run_id, after_seq=last_seq, limit=200)
+                events = await list_run_stream_events(run_id, after_seq=last_seq, limit=RUN_SSE_CATCH_UP_BATCH_SIZE)
             except Exception as e:
                 logger.warning(f"Run SSE redis error for run {run_id}: {e}")
-                yield format_sse(
-                    {
-                        "run_id": run_id,
-                        "message": "运行事件流暂时不可用，请重连",
-                        "reason": "redis_error",
-                    },
-                    event="error",
-                )
+                yield _stream_unavailable_sse(run_id, "redis_error")
                 return
-
-            emitted_terminal = False
             for event in events:
-                seq = str(event.get("seq") or "0-0")
-                last_seq = seq
-                event_type = event.get("event_type") or "message"
-                envelope = event.get("payload") or {}
-                if not verbose and isinstance(envelope, dict):
-                    envelope = _compact_run_event_envelope(envelope)
-                    if envelope is None:
-                        continue
-                yield format_sse(envelope, event=event_type, event_id=seq)
-                if event_type == "end":
-                    emitted_terminal = True
-
-            if emitted_terminal:
-                return
-
-            if run.status in TERMINAL_RUN_STATUSES and not events:
-                terminal_seq = last_seq
-                if terminal_seq in {"", "0-0"}:
-                    terminal_seq = await get_last_run_stream_seq(run_id)
-                if terminal_seq in {"", "0-0"}:
-                    terminal_seq = None
-                terminal_envelope = build_run_event_envelope(
-                    run_id=run_id,
-                    thread_id=run.conversation_thread_id,
-                    event_type="end",
-                    payload={"status": run.status, "request_id": run.request_id},
-                    created_at=utc_now_naive().isoformat(),
-                )
-                if not verbose:
-                    terminal_envelope = _compact_run_event_envelope(terminal_envelope)
-                yield format_sse(
-                    terminal_envelope,
-                    event="end",
-                    event_id=terminal_seq,
+                last_seq = str(event.get("seq") or "0-0")
+                chunk = _render_run_event_sse(event, verbose=verbose)
+                if chunk is not None:
+                    yield chunk
+                if event.get("event_type") == "end":
+                    return
+            if len(events) < RUN_SSE_CATCH_UP_BATCH_SIZE:
+                break
+
+        if run.status in TERMINAL_RUN_STATUSES:
+            yield await _terminal_end_sse(run, run_id=run_id, last_seq=last_seq, verbose=verbose)
+            return
+
+        async with get_run_event_multiplexer().watch(run_id, last_seq) as subscription:
+            last_event_at = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    return
+                wake_at = min(
+                    last_heartbeat_at + SSE_HEARTBEAT_SECONDS,
+                    last_event_at + SSE_TERMINAL_RECHECK_SECONDS,
+                    deadline,
                 )
-                return
-
-            now = utc_now_naive()
-            elapsed_seconds = (now - started_at).total_seconds()
-            heartbeat_elapsed = (now - last_heartbeat_ts).total_seconds()
-            if heartbeat_elapsed >= SSE_HEARTBEAT_SECONDS:
-                yield format_heartbeat()
-                last_heartbeat_ts = now
-
-            if elapsed_seconds >= SSE_MAX_CONNECTION_MINUTES * 60:
-                return
+                try:
+                    events = await subscription.get(timeout=max(wake_at - now, 0))
+                except RunEventStreamError as e:
+                    logger.warning(f"Run SSE stream error for run {run_id}: {e}")
+                    yield _stream_unavailable_sse(run_id, e.reason)
+                    return
+
+                for event in events:
+                    last_seq = str(event.get("seq") or "0-0")
+                    chunk = _render_run_event_sse(event, verbose=verbose)
+                    if chunk is not None:
+                        yield chunk
+                    if event.get("event_type") == "end":
+                        return
 
-            await asyncio.sleep(SSE_POLL_INTERVAL_SECONDS)
+                now = time.monotonic()
+                if events:
+                    last_event_at = now
+                if now - last_heartbeat_at >= SSE_HEARTBEAT_SECONDS:
+                    yield format_heartbeat()
+                    last_heartbeat_at = now
+
+                if not events and now - last_event_at >= SSE_TERMINAL_RECHECK_SECONDS:
+                    last_event_at = now
+                    try:
+                        run = await _load_stream_run(run_id, current_uid)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"Run SSE DB error for run {run_id}: {e}")
+                        yield _stream_unavailable_sse(run_id, "db_error")
+                        return
+                    if run and run.status in TERMINAL_RUN_STATUSES:
+                        yield await _terminal_end_sse(run, run_id=run_id, last_seq=last_seq, verbose=verbose)
+                        return
     except asyncio.CancelledError:
         return
 
@@ -5,16 +5,26 @@ from __future__ import annotations
 import asyncio
 import json
 import os
+from collections.abc import AsyncIterator, Awaitable, Callable
 from contextlib import asynccontextmanager
 from datetime import UTC, datetime
-
-from yuxi.storage.redis import close_async_redis_client, create_arq_redis_pool, get_async_redis_client
+from typing import Any
+
+from yuxi.storage.redis import (
+    close_async_redis_client,
+    create_arq_redis_pool,
+    create_async_redis_client,
+    get_async_redis_client,
+)
 from yuxi.utils.logging_config import logger
 
 RUN_CANCEL_KEY_TTL_SECONDS = int(os.getenv("RUN_CANCEL_KEY_TTL_SECONDS", "1800"))
 RUN_EVENTS_STREAM_TTL_SECONDS = int(os.getenv("RUN_EVENTS_STREAM_TTL_SECONDS", "7200"))
 RUN_EVENTS_STREAM_MAXLEN = int(os.getenv("RUN_EVENTS_STREAM_MAXLEN", "0"))
 RUN_CANCEL_CHANNEL = os.getenv("RUN_CANCEL_CHANNEL", "run:cancel:ch")
+RUN_EVENTS_XREAD_BLOCK_MS = int(os.getenv("RUN_EVENTS_XREAD_BLOCK_MS", "5000"))
+RUN_EVENTS_XREAD_COUNT = int(os.getenv("RUN_EVENTS_XREAD_COUNT", "200"))
+RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE", "1000"))
 
 _arq_pool = None
 
@@ -181,6 +191,33 @@ async def append_run_stream_event(run_id: str, event_type: str, payload: dict, *
     return str(event_id)
 
 
+def _parse_run_stream_entry(run_id: str, event_id: object, fields: dict) -> dict:
+    payload_raw = fields.get("payload") or "{}"
+    try:
+        payload = json.loads(payload_raw)
+    except Exception:
+        payload = {}
+
+    event_type = fields.get("event_type") or "message"
+    if not isinstance(payload, dict) or payload.get("schema_version") != 1:
+        payload = {
+            "schema_version": 1,
+            "run_id": run_id,
+            "thread_id": None,
+            "event": event_type,
+            "payload": payload if isinstance(payload, dict) else {},
+            "created_at": None,
+        }
+
+    ts_value = fields.get("ts")
+    return {
+        "seq": str(event_id),
+        "event_type": event_type,
+        "payload": payload,
+        "ts": int(ts_value) if ts_value else None,
+    }
+
+
 async def list_run_stream_events(
     run_id: str,
     *,
@@ -191,36 +228,7 @@ async def list_run_stream_events(
     key = _event_stream_key(run_id)
     start = "-" if after_seq in {"0-0", ""} else f"({after_seq}"
     rows = await redis.xrange(key, min=start, max="+", count=limit)
-    events = []
-
-    for event_id, fields in rows:
-        payload_raw = fields.get("payload") or "{}"
-        try:
-            payload = json.loads(payload_raw)
-        except Exception:
-            payload = {}
-
-        event_type = fields.get("event_type") or "message"
-        if not isinstance(payload, dict) or payload.get("schema_version") != 1:
-            payload = {
-                "schema_version": 1,
-                "run_id": run_id,
-                "thread_id": None,
-                "event": event_type,
-                "payload": payload if isinstance(payload, dict) else {},
-                "created_at": None,
-            }
-
-        ts_value = fields.get("ts")
-        events.append(
-            {
-                "seq": str(event_id),
-                "event_type": event_type,
-                "payload": payload,
-                "ts": int(ts_value) if ts_value else None,
-            }
-        )
-    return events
+    return [_parse_run_stream_entry(run_id, event_id, fields) for event_id, fields in rows]
 
 
 async def list_recent_run_stream_events(run_id: str, *, limit: int = 100) -> list[dict]:
@@ -228,36 +236,7 @@ async def list_recent_run_stream_events(run_id: str, *, limit: int = 100) -> lis
     redis = await get_redis_client()
     key = _event_stream_key(run_id)
     rows = await redis.xrevrange(key, max="+", min="-", count=limit)
-    events = []
-
-    for event_id, fields in rows:
-        payload_raw = fields.get("payload") or "{}"
-        try:
-            payload = json.loads(payload_raw)
-        except Exception:
-            payload = {}
-
-        event_type = fields.get("event_type") or "message"
-        if not isinstance(payload, dict) or payload.get("schema_version") != 1:
-            payload = {
-                "schema_version": 1,
-                "run_id": run_id,
-                "thread_id": None,
-                "event": event_type,
-                "payload": payload if isinstance(payload, dict) else {},
-                "created_at": None,
-            }
-
-        ts_value = fields.get("ts")
-        events.append(
-            {
-                "seq": str(event_id),
-                "event_type": event_type,
-                "payload": payload,
-                "ts": int(ts_value) if ts_value else None,
-            }
-        )
-    return events
+    return [_parse_run_stream_entry(run_id, event_id, fields) for event_id, fields in rows]
 
 
 async def get_last_run_stream_seq(run_id: str) -> str:
@@ -270,8 +249,201 @@ async def get_last_run_stream_seq(run_id: str) -> str:
     return str(event_id)
 
 
+def _stream_seq_key(seq: str) -> tuple[int, int]:
+    major, _, minor = str(seq).partition("-")
+    try:
+        return int(major), int(minor or 0)
+    except ValueError:
+        return 0, 0
+
+
+class RunEventStreamError(RuntimeError):
+    """多路复用读取失败或订阅者积压过多，调用方应提示客户端重连。"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class RunEventSubscription:
+    """单个 SSE 连接在多路复用器上的订阅，按 seq 去重后缓冲事件批次。"""
+
+    def __init__(self, run_id: str, after_seq: str):
+        self.run_id = run_id
+        self.last_seq = after_seq
+        self._queue: asyncio.Queue[list[dict] | RunEventStreamError] = asyncio.Queue(
+            maxsize=max(RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE, 1)
+        )
+        self._failed = False
+
+    def _deliver(self, events: list[dict]) -> None:
+        if self._failed:
+            return
+        last_key = _stream_seq_key(self.last_seq)
+        fresh = [event for event in events if _stream_seq_key(event["seq"]) > last_key]
+        if not fresh:
+            return
+        try:
+            self._queue.put_nowait(fresh)
+        except asyncio.QueueFull:
+            self._fail(RunEventStreamError("lagging", "订阅者消费过慢，事件已积压"))
+            return
+        self.last_seq = fresh[-1]["seq"]
+
+    def _fail(self, error: RunEventStreamError) -> None:
+        if self._failed:
+            return
+        self._failed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(error)
+
+    async def get(self, timeout: float | None = None) -> list[dict]:
+        """等待下一批事件；超时返回空列表，读取失败时抛出 RunEventStreamError。"""
+        if not self._queue.empty():
+            item = self._queue.get_nowait()
+        else:
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except TimeoutError:
+                return []
+        if isinstance(item, RunEventStreamError):
+            raise item
+        return item
+
+
+class RunEventMultiplexer:
+    """进程内 run 事件多路复用器。
+
+    所有活跃 SSE 连接共享一个后台任务，对全部被订阅的 run stream 发起单个阻塞
+    ``XREAD``，再把读到的条目分发到各订阅者队列。订阅集合变化时中断当前阻塞读并
+    立即按新集合重发，因此新订阅不必等待阻塞超时。
+    """
+
+    def __init__(self, redis_factory: Callable[[], Awaitable[Any]] | None = None):
+        self.loop = asyncio.get_running_loop()
+        self._redis_factory = redis_factory or (lambda: create_async_redis_client(ping=False))
+        self._redis: Any | None = None
+        self._subscriptions: dict[str, set[RunEventSubscription]] = {}
+        self._cursors: dict[str, str] = {}
+        self._changed = asyncio.Event()
+        self._reader_task: asyncio.Task | None = None
+        self.xread_calls = 0
+
+    @property
+    def watched_run_ids(self) -> list[str]:
+        return list(self._subscriptions)
+
+    def subscribe(self, run_id: str, after_seq: str = "0-0") -> RunEventSubscription:
+        subscription = RunEventSubscription(run_id, normalize_after_seq(after_seq))
+        self._subscriptions.setdefault(run_id, set()).add(subscription)
+        cursor = self._cursors.get(run_id)
+        if cursor is None or _stream_seq_key(subscription.last_seq) < _stream_seq_key(cursor):
+            # 回退共享游标以补齐新订阅者缺失的条目，已有订阅者按 seq 去重。
+            self._cursors[run_id] = subscription.last_seq
+        self._changed.set()
+        if self._reader_task is None or self._reader_task.done():
+            self._reader_task = asyncio.create_task(self._read_loop(), name="run-event-multiplexer")
+        return subscription
+
+    def unsubscribe(self, subscription: RunEventSubscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.run_id)
+        if not subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self._subscriptions.pop(subscription.run_id, None)
+            self._cursors.pop(subscription.run_id, None)
+            self._changed.set()
+
+    @asynccontextmanager
+    async def watch(self, run_id: str, after_seq: str = "0-0") -> AsyncIterator[RunEventSubscription]:
+        subscription = self.subscribe(run_id, after_seq)
+        try:
+            yield subscription
+        finally:
+            self.unsubscribe(subscription)
+
+    async def _read_loop(self) -> None:
+        try:
+            while self._subscriptions:
+                self._changed.clear()
+                if self._redis is None:
+                    self._redis = await self._redis_factory()
+                streams = {_event_stream_key(run_id): cursor for run_id, cursor in self._cursors.items()}
+                read_task = asyncio.create_task(
+                    self._redis.xread(streams, count=RUN_EVENTS_XREAD_COUNT, block=RUN_EVENTS_XREAD_BLOCK_MS)
+                )
+                changed_task = asyncio.create_task(self._changed.wait())
+                self.xread_calls += 1
+                try:
+                    done, _ = await asyncio.wait({read_task, changed_task}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    changed_task.cancel()
+                if read_task not in done:
+                    read_task.cancel()
+                    await asyncio.gather(read_task, return_exceptions=True)
+                    continue
+                self._dispatch(read_task.result() or [])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Run event multiplexer read failed: {e}")
+            error = RunEventStreamError("redis_error", str(e))
+            failed, self._subscriptions, self._cursors = self._subscriptions, {}, {}
+            for subscriptions in failed.values():
+                for subscription in subscriptions:
+                    subscription._fail(error)
+            await self._close_redis()
+            if self._subscriptions:
+                # 关闭连接期间有新订阅进入，由新的读取任务接管。
+                self._reader_task = asyncio.create_task(self._read_loop(), name="run-event-multiplexer")
+
+    def _dispatch(self, rows: Any) -> None:
+        items = rows.items() if isinstance(rows, dict) else rows
+        for stream_key, entries in items:
+            run_id = str(stream_key).removeprefix(_event_stream_key(""))
+            if not entries or run_id not in self._subscriptions:
+                continue
+            events = [_parse_run_stream_entry(run_id, event_id, fields) for event_id, fields in entries]
+            self._cursors[run_id] = events[-1]["seq"]
+            for subscription in list(self._subscriptions[run_id]):
+                subscription._deliver(events)
+
+    async def _close_redis(self) -> None:
+        redis, self._redis = self._redis, None
+        if redis is None:
+            return
+        try:
+            await redis.aclose()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        if self._reader_task is not None and not self._reader_task.done():
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._reader_task = None
+        await self._close_redis()
+
+
+_run_event_multiplexer: RunEventMultiplexer | None = None
+
+
+def get_run_event_multiplexer() -> RunEventMultiplexer:
+    """获取当前事件循环的 run 事件多路复用器。"""
+    global _run_event_multiplexer
+    loop = asyncio.get_running_loop()
+    if _run_event_multiplexer is None or _run_event_multiplexer.loop is not loop:
+        _run_event_multiplexer = RunEventMultiplexer()
+    return _run_event_multiplexer
+
+
 async def close_queue_clients() -> None:
-    global _arq_pool
+    global _arq_pool, _run_event_multiplexer
+    if _run_event_multiplexer is not None:
+        await _run_event_multiplexer.close()
+        _run_event_multiplexer = None
     if _arq_pool is not None:
         try:
             await _arq_pool.close()
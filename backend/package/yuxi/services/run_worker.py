@@ -13,6 +13,9 @@ from sqlalchemy.exc import OperationalError
 from yuxi.agents.mcp.service import ensure_builtin_mcp_servers_in_db
 from yuxi.agents.skills.service import init_builtin_skills
 from yuxi.config import config as sys_config
+from yuxi.knowledge.implementations.milvus_async import close_milvus_query_pools
+from yuxi.knowledge.retrieval_trace import close_trace_sink
+from yuxi.models.rerank import close_reranker_sessions
 from yuxi.repositories.agent_run_repository import TERMINAL_RUN_STATUSES, AgentRunRepository
 from yuxi.services.agent_request_queue_service import (
     RUN_STATUS_TO_DELIVERY_STATUS,
@@ -661,9 +664,12 @@ async def _worker_startup(ctx):
 
 
 async def _worker_shutdown(ctx):
-    """关闭 worker 数据库连接。"""
+    """关闭 worker 数据库连接、reranker、Milvus 检索长连接与检索追踪导出。"""
 
     del ctx
+    await close_reranker_sessions()
+    await close_milvus_query_pools()
+    close_trace_sink()
     await pg_manager.close()
 
 
@@ -4,7 +4,14 @@ MinIO 存储模块
 """
 
 # 导出核心功能
-from .client import MinIOClient, StorageError, UploadResult, aupload_file_to_minio, get_minio_client
+from .client import (
+    MinIOClient,
+    StorageError,
+    UploadResult,
+    aupload_file_to_minio,
+    aupload_path_to_minio,
+    get_minio_client,
+)
 from .utils import generate_unique_filename, get_file_size, upload_image_to_minio
 
 # 导出常用函数
@@ -13,6 +20,7 @@ __all__ = [
     "MinIOClient",
     "get_minio_client",
     "aupload_file_to_minio",
+    "aupload_path_to_minio",
     # 异常类
     "StorageError",
     "UploadResult",
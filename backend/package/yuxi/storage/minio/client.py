@@ -19,6 +19,11 @@ from minio import Minio
 from minio.error import S3Error
 
 
+# 分片上传配置：S3 要求分片不小于 5MB
+MINIO_MULTIPART_PART_SIZE = max(int(os.getenv("MINIO_MULTIPART_PART_SIZE", str(16 * 1024 * 1024))), 5 * 1024 * 1024)
+MINIO_MULTIPART_PARALLEL_UPLOADS = max(int(os.getenv("MINIO_MULTIPART_PARALLEL_UPLOADS", "4")), 1)
+
+
 class StorageError(Exception):
     """存储相关异常基类"""
 
@@ -144,12 +149,7 @@ class MinIOClient:
             )
 
             assert result is not None
-            if bucket_name in self.PUBLIC_READ_BUCKETS:
-                url = f"{self.public_base_url}/{bucket_name}/{quote(object_name, safe='/')}"
-            else:
-                url = f"http://{self.public_endpoint}/{bucket_name}/{object_name}"
-
-            return UploadResult(url, bucket_name, object_name)
+            return UploadResult(self._object_url(bucket_name, object_name), bucket_name, object_name)
 
         except S3Error as e:
             error_msg = f"上传文件 '{object_name}' 失败: {e}"
@@ -168,19 +168,66 @@ class MinIOClient:
         )
         return result
 
-    def upload_file_from_path(self, bucket_name: str, object_name: str, file_path: str) -> UploadResult:
-        """从文件路径上传文件"""
-        try:
-            with open(file_path, "rb") as file_data:
-                data = file_data.read()
+    def upload_file_from_path(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str | os.PathLike,
+        content_type: str | None = None,
+        *,
+        part_size: int | None = None,
+        num_parallel_uploads: int | None = None,
+    ) -> UploadResult:
+        """从文件路径流式上传文件
 
-            return self.upload_file(bucket_name, object_name, data)
+        超过 ``part_size`` 的文件走分片上传，分片并发数为 ``num_parallel_uploads``，
+        内存占用约为 part_size * num_parallel_uploads，与文件大小无关。
+        """
+        try:
+            self.ensure_bucket_exists(bucket_name=bucket_name)
+            result = self.client.fput_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                file_path=os.fspath(file_path),
+                content_type=content_type or self._guess_content_type(object_name),
+                part_size=part_size or MINIO_MULTIPART_PART_SIZE,
+                num_parallel_uploads=num_parallel_uploads or MINIO_MULTIPART_PARALLEL_UPLOADS,
+            )
+            assert result is not None
+            return UploadResult(self._object_url(bucket_name, object_name), bucket_name, object_name)
 
         except FileNotFoundError:
             raise StorageError(f"文件 '{file_path}' 不存在")
+        except StorageError:
+            raise
         except Exception as e:
             raise StorageError(f"从路径上传文件失败: {e}")
 
+    async def aupload_file_from_path(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str | os.PathLike,
+        content_type: str | None = None,
+        *,
+        part_size: int | None = None,
+        num_parallel_uploads: int | None = None,
+    ) -> UploadResult:
+        return await asyncio.to_thread(
+            self.upload_file_from_path,
+            bucket_name,
+            object_name,
+            file_path,
+            content_type,
+            part_size=part_size,
+            num_parallel_uploads=num_parallel_uploads,
+        )
+
+    def _object_url(self, bucket_name: str, object_name: str) -> str:
+        if bucket_name in self.PUBLIC_READ_BUCKETS:
+            return f"{self.public_base_url}/{bucket_name}/{quote(object_name, safe='/')}"
+        return f"http://{self.public_endpoint}/{bucket_name}/{object_name}"
+
     def _guess_content_type(self, object_name: str) -> str:
         """根据文件名猜测 MIME 类型"""
         guessed_type, _ = mimetypes.guess_type(object_name)
@@ -245,6 +292,24 @@ class MinIOClient:
                 raise StorageError(f"对象 '{object_name}' 在存储桶 '{bucket_name}' 中不存在")
             raise StorageError(f"下载文件失败: {e}")
 
+    async def adownload_file_with_etag(self, bucket_name: str, object_name: str) -> tuple[bytes, str | None]:
+        """异步下载文件，同时返回响应中的 ETag"""
+        try:
+            response = await asyncio.to_thread(self.client.get_object, bucket_name=bucket_name, object_name=object_name)
+            try:
+                data = await asyncio.to_thread(response.read)
+                etag = (response.headers.get("ETag") or "").strip('"') or None
+            finally:
+                response.close()
+                response.release_conn()
+            logger.info(f"成功下载 '{object_name}' 从存储桶 '{bucket_name}'")
+            return data, etag
+
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise StorageError(f"对象 '{object_name}' 在存储桶 '{bucket_name}' 中不存在")
+            raise StorageError(f"下载文件失败: {e}")
+
     def get_presigned_url(self, bucket_name: str, object_name: str, days=7) -> str:
         """将minio放在内网访问，外部通过返回代理链接访问"""
         res_url = self.client.get_presigned_url(
@@ -350,6 +415,20 @@ class MinIOClient:
         """异步获取文件大小（字节），文件不存在时返回 None"""
         return await asyncio.to_thread(self.stat_file, bucket_name, object_name)
 
+    def get_object_etag(self, bucket_name: str, object_name: str) -> str | None:
+        """获取对象 ETag，对象不存在时返回 None"""
+        try:
+            stat = self.client.stat_object(bucket_name=bucket_name, object_name=object_name)
+            return (stat.etag or "").strip('"') or None
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise StorageError(f"获取文件信息失败: {e}")
+
+    async def aget_object_etag(self, bucket_name: str, object_name: str) -> str | None:
+        """异步获取对象 ETag，对象不存在时返回 None"""
+        return await asyncio.to_thread(self.get_object_etag, bucket_name, object_name)
+
     def _ensure_public_read_access(self, bucket_name: str) -> None:
         """设置存储桶策略，允许公开读取对象"""
         if bucket_name not in self.PUBLIC_READ_BUCKETS:
@@ -483,3 +562,20 @@ async def aupload_file_to_minio(bucket_name: str, file_name: str, data: bytes) -
     client = get_minio_client()
     upload_result = await client.aupload_file(bucket_name, file_name, data)
     return upload_result.url
+
+
+async def aupload_path_to_minio(bucket_name: str, file_name: str, file_path: str | os.PathLike) -> str:
+    """
+    从本地文件流式上传到 MinIO 的异步接口，并返回资源 URL。
+    大文件按 MINIO_MULTIPART_PART_SIZE 分片并发上传。
+
+    Args:
+        bucket_name: bucket_name
+        file_name : filename
+        file_path: 本地文件路径
+    Returns:
+        str: 文件访问 URL
+    """
+    client = get_minio_client()
+    upload_result = await client.aupload_file_from_path(bucket_name, file_name, file_path)
+    return upload_result.url
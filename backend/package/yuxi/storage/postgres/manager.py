@@ -17,6 +17,8 @@ from yuxi.utils.singleton import SingletonMeta
 # 合并两个 Base
 CombinedBase = declarative_base()
 AGENT_RUN_TERMINAL_STATUS_SQL = ", ".join(f"'{status}'" for status in AGENT_RUN_TERMINAL_STATUSES)
+# 文件名模糊匹配（ILIKE '%关键词%'）的 pg_trgm 索引，需要数据库允许创建扩展，默认关闭
+KB_FILENAME_TRGM_INDEX_ENABLED = os.getenv("KB_FILENAME_TRGM_INDEX", "").lower() in ("1", "true", "yes")
 
 # 继承所有表
 for module in [KnowledgeBase, BusinessBase]:
@@ -160,6 +162,8 @@ class PostgresManager(metaclass=SingletonMeta):
             "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS processing_params JSONB",
             "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS is_folder BOOLEAN",
             "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS error_message TEXT",
+            "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(128)",
+            "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMPTZ",
             "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS created_by VARCHAR(64)",
             "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS updated_by VARCHAR(64)",
             "ALTER TABLE IF EXISTS knowledge_files ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ",
@@ -483,6 +487,26 @@ class PostgresManager(metaclass=SingletonMeta):
             for stmt in stmts:
                 await conn.execute(text(stmt))
 
+        if KB_FILENAME_TRGM_INDEX_ENABLED:
+            await self.ensure_filename_trgm_index()
+
+    async def ensure_filename_trgm_index(self) -> bool:
+        """为 lower(filename) 建立 GIN trigram 索引，加速检索时的文件名过滤；无权限创建扩展时跳过。"""
+        self._check_initialized()
+        try:
+            async with self.async_engine.begin() as conn:
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                await conn.execute(
+                    text(
+                        "CREATE INDEX IF NOT EXISTS idx_kf_filename_trgm "
+                        "ON knowledge_files USING gin (lower(filename) gin_trgm_ops)"
+                    )
+                )
+        except Exception as e:
+            logger.warning(f"Skip knowledge_files filename trigram index: {e}")
+            return False
+        return True
+
     async def ensure_business_schema(self):
         """确保业务 schema 包含后续新增字段（运行时 schema 演进）。"""
         self._check_initialized()
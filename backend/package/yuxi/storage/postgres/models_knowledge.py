@@ -10,6 +10,7 @@ from sqlalchemy import (
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     UniqueConstraint,
@@ -71,6 +72,9 @@ class KnowledgeFile(Base):
     processing_params = Column(JSON_VALUE)
     is_folder = Column(Boolean, default=False)
     error_message = Column(Text)
+    # 解析 / 入库期间的处理租约，过期未续约才视为中断
+    claimed_by = Column(String(128))
+    claim_expires_at = Column(DateTime(timezone=True))
     created_by = Column(String(64))
     updated_by = Column(String(64))
     created_at = Column(DateTime(timezone=True), default=utc_now_naive)
@@ -113,6 +117,25 @@ class KnowledgeChunk(Base):
     updated_at = Column(DateTime(timezone=True), default=utc_now_naive, onupdate=utc_now_naive)
 
 
+class ChunkEmbedding(Base):
+    """按内容寻址的 Chunk 向量，跨文件与知识库共享"""
+
+    __tablename__ = "chunk_embeddings"
+    __table_args__ = (
+        UniqueConstraint("model_spec", "content_hash", name="uq_chunk_embeddings_model_spec_content_hash"),
+        Index("ix_chunk_embeddings_last_used_at", "last_used_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    model_spec = Column(String(512), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    dimension = Column(Integer, nullable=False)
+    # float32 小端序
+    embedding = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utc_now_naive)
+    last_used_at = Column(DateTime(timezone=True), default=utc_now_naive, nullable=False)
+
+
 class KnowledgeGraphEntity(Base):
     """知识图谱实体"""
 
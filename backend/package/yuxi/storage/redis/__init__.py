@@ -1,3 +1,4 @@
+from .fallback import RedisFallback
 from .manager import (
     DEFAULT_REDIS_URL,
     RedisConfig,
@@ -22,4 +23,5 @@ __all__ = [
     "get_arq_redis_settings",
     "create_arq_redis_pool",
     "redact_redis_url",
+    "RedisFallback",
 ]
@@ -0,0 +1,28 @@
+"""作为可选加速层使用的 Redis 客户端获取。"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from yuxi.storage.redis.manager import get_async_redis_client
+from yuxi.utils.fallback import FALLBACK_RETRY_SECONDS, FailureBypass
+
+
+class RedisFallback(FailureBypass):
+    """Redis 未启用、连接失败或处于故障冷却期时返回 None，调用方退回进程内缓存或直接计算。
+
+    命令执行失败时调用方应调用 ``mark_unavailable``，在冷却期内不再访问 Redis。
+    """
+
+    def __init__(self, name: str, *, enabled: bool = True, retry_seconds: float = FALLBACK_RETRY_SECONDS) -> None:
+        super().__init__(name, retry_seconds=retry_seconds)
+        self.enabled = enabled
+
+    async def get_client(self) -> Any | None:
+        if not self.enabled or self.bypassed:
+            return None
+        try:
+            return await get_async_redis_client()
+        except Exception as exc:
+            self.mark_unavailable(exc)
+            return None
@@ -0,0 +1,31 @@
+"""可选依赖的短暂故障旁路。
+
+缓存、向量复用等组件把外部存储当作可丢弃的加速层：访问失败后在 retry_seconds 内直接走降级路径，
+避免每次请求都等待连接超时。
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+from yuxi.utils.logging_config import logger
+
+FALLBACK_RETRY_SECONDS = max(0.0, float(os.getenv("FALLBACK_RETRY_SECONDS") or 30.0))
+
+
+class FailureBypass:
+    """记录最近一次故障，冷却期内 ``bypassed`` 为 True。"""
+
+    def __init__(self, name: str, *, retry_seconds: float = FALLBACK_RETRY_SECONDS) -> None:
+        self.name = name
+        self.retry_seconds = float(retry_seconds)
+        self._retry_at = 0.0
+
+    @property
+    def bypassed(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    def mark_unavailable(self, exc: Exception) -> None:
+        self._retry_at = time.monotonic() + self.retry_seconds
+        logger.warning(f"{self.name} unavailable, bypassing: {exc}")
@@ -0,0 +1,27 @@
+"""Prometheus 文本格式（exposition format 0.0.4）的渲染工具，供各模块的 ``/system/metrics/*`` 导出共用。"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def escape_label(value: object) -> str:
+    """转义标签值中的反斜杠、双引号与换行。"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(**labels: object) -> str:
+    """按传入顺序渲染标签，如 ``{stage="embed",kb_id="kb"}``；没有标签时返回空串。"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def metric_header(name: str, metric_type: str, description: str) -> list[str]:
+    return [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+
+
+def render_lines(lines: Iterable[str]) -> str:
+    return "\n".join(lines) + "\n"
@@ -10,6 +10,9 @@ SSE_HEARTBEAT_SECONDS = int(os.getenv("RUN_SSE_HEARTBEAT_SECONDS", "15"))
 # stream cannot block hot reload for this full connection lifetime.
 SSE_MAX_CONNECTION_MINUTES = int(os.getenv("RUN_SSE_MAX_CONNECTION_MINUTES", "30"))
 SSE_POLL_INTERVAL_SECONDS = float(os.getenv("RUN_SSE_POLL_INTERVAL_SECONDS", "1.0"))
+# Run event streams are pushed from Redis; the run row is only re-read after this
+# long without new events, to catch runs that ended without writing an end event.
+SSE_TERMINAL_RECHECK_SECONDS = float(os.getenv("RUN_SSE_TERMINAL_RECHECK_SECONDS", "60"))
 
 
 def format_sse(data: dict, event: str, event_id: str | None = None) -> str:
@@ -1,9 +1,25 @@
+import hashlib
+import os
+import tempfile
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from pathlib import Path
 
 import aiofiles
 from fastapi import UploadFile
 
 MAX_UPLOAD_SIZE_BYTES = 100 * 1024 * 1024
+UPLOAD_STREAM_CHUNK_SIZE = int(os.getenv("UPLOAD_STREAM_CHUNK_SIZE", str(1024 * 1024)))
+
+
+@dataclass(frozen=True)
+class SpooledUpload:
+    """已落盘的上传文件：临时路径、字节数与内容 SHA-256。"""
+
+    path: Path
+    size: int
+    content_hash: str
 
 
 async def write_upload_to_buffer(
@@ -63,3 +79,36 @@ async def write_upload_to_path(
             too_large_message=too_large_message,
             chunk_size=chunk_size,
         )
+
+
+@asynccontextmanager
+async def spool_upload_with_hash(
+    upload: UploadFile,
+    *,
+    max_size_bytes: int,
+    too_large_message: str,
+    spool_dir: str | Path | None = None,
+    chunk_size: int = UPLOAD_STREAM_CHUNK_SIZE,
+) -> AsyncIterator[SpooledUpload]:
+    """分块读取上传内容，边写临时文件边计算哈希，退出上下文时删除临时文件。
+
+    内存占用只与 ``chunk_size`` 有关；超过 ``max_size_bytes`` 立即中止并抛出 ValueError。
+    """
+    suffix = Path(upload.filename or "").suffix
+    fd, temp_name = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=spool_dir)
+    os.close(fd)
+    temp_path = Path(temp_name)
+    try:
+        await upload.seek(0)
+        sha256 = hashlib.sha256()
+        written = 0
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await upload.read(chunk_size):
+                written += len(chunk)
+                if written > max_size_bytes:
+                    raise ValueError(too_large_message)
+                sha256.update(chunk)
+                await buffer.write(chunk)
+        yield SpooledUpload(path=temp_path, size=written, content_hash=sha256.hexdigest())
+    finally:
+        temp_path.unlink(missing_ok=True)
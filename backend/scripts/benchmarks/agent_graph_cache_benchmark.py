@@ -0,0 +1,129 @@
+"""智能助手首事件延迟基准：编译 graph 缓存命中 vs 每次重建。
+
+使用假聊天模型，不访问数据库、MCP 与模型服务；只衡量 get_graph + 首个流式事件的耗时。
+
+用法：
+    uv run python scripts/benchmarks/agent_graph_cache_benchmark.py --runs 50
+    uv run python scripts/benchmarks/agent_graph_cache_benchmark.py --runs 50 --light-middlewares
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+for import_path in (APP_ROOT, APP_ROOT / "package"):
+    import_path_str = str(import_path)
+    if import_path_str not in sys.path:
+        sys.path.insert(0, import_path_str)
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langgraph.checkpoint.memory import InMemorySaver  # noqa: E402
+
+from yuxi.agents.buildin.chatbot import graph as chatbot_graph  # noqa: E402
+from yuxi.agents.buildin.chatbot.context import ChatBotContext  # noqa: E402
+from yuxi.agents.graph_cache import CompiledGraphCache  # noqa: E402
+
+
+class _FakeChatModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def _fake_model(**_kwargs) -> _FakeChatModel:
+    return _FakeChatModel(messages=iter(lambda: AIMessage(content="ok"), None))
+
+
+def _install_fakes(light_middlewares: bool) -> None:
+    async def prepare(context, **_kwargs):
+        return context
+
+    async def no_skills(_context):
+        return None
+
+    async def no_tools(_context):
+        return []
+
+    async def no_mcp_hashes(_names):
+        return {}
+
+    async def no_subagents(_context):
+        return None
+
+    chatbot_graph.prepare_agent_runtime_context = prepare
+    chatbot_graph.sync_agent_context_skills = no_skills
+    chatbot_graph.resolve_configured_runtime_tools = no_tools
+    chatbot_graph.get_mcp_server_config_hashes = no_mcp_hashes
+    chatbot_graph.create_subagent_task_middleware = no_subagents
+    chatbot_graph.resolve_chat_model_spec = lambda model: model or "fake:model"
+    chatbot_graph.load_chat_model = lambda fully_specified_name: _fake_model()
+    if light_middlewares:
+        # 当前环境的 deepagents 版本与文件系统中间件不兼容时使用
+        async def builtin_middlewares(_context):
+            return [chatbot_graph.TodoListMiddleware(), chatbot_graph.PatchToolCallsMiddleware()]
+
+        chatbot_graph._build_middlewares = builtin_middlewares
+
+
+async def _time_to_first_event(agent: chatbot_graph.ChatbotAgent) -> float:
+    context = ChatBotContext(thread_id=str(uuid.uuid4()), run_id=str(uuid.uuid4()), uid="bench-user")
+    started_at = time.perf_counter()
+    graph = await agent.get_graph(context=context)
+    stream = graph.astream(
+        {"messages": [HumanMessage(content="你好")]},
+        config={"configurable": {"thread_id": context.thread_id}},
+        context=context,
+        stream_mode="messages",
+    )
+    await anext(stream)
+    elapsed = time.perf_counter() - started_at
+    await stream.aclose()
+    return elapsed
+
+
+async def run_case(runs: int, cache_entries: int) -> dict:
+    chatbot_graph.compiled_graph_cache = CompiledGraphCache(max_entries=cache_entries, ttl_seconds=3600)
+    agent = chatbot_graph.ChatbotAgent.__new__(chatbot_graph.ChatbotAgent)
+    agent.checkpointer = InMemorySaver()
+
+    timings = [await _time_to_first_event(agent) for _ in range(runs)]
+    # 首次运行包含冷启动构建，缓存场景下单独统计
+    steady = timings[1:] or timings
+    return {
+        "cached": cache_entries > 0,
+        "runs": runs,
+        "first_ms": round(timings[0] * 1000, 3),
+        "p50_ms": round(statistics.median(steady) * 1000, 3),
+        "mean_ms": round(statistics.fmean(steady) * 1000, 3),
+        "max_ms": round(max(steady) * 1000, 3),
+        **chatbot_graph.compiled_graph_cache.get_stats(),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    _install_fakes(args.light_middlewares)
+    uncached = await run_case(args.runs, cache_entries=0)
+    cached = await run_case(args.runs, cache_entries=8)
+    print(json.dumps(uncached))
+    print(json.dumps(cached))
+    print(json.dumps({"speedup_p50": round(uncached["p50_ms"] / max(cached["p50_ms"], 1e-9), 2)}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--light-middlewares", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""内容寻址 Chunk 向量存储的入库基准：有意构造重复内容时 embedding 调用的减少量。
+
+用仓库自带的《红楼梦》语料按章回拆成文件，模拟多个知识库的入库：
+- 共享章回：前 ``--shared-ratio`` 比例的章回上传到每个知识库（同一文件多库上传）；
+- 独有章回：其余章回轮流分配给各知识库；
+- 公共样板：每个知识库都有相同的免责声明与 FAQ 文件，每个章回文件末尾附带相同的版权声明段落。
+
+分别在不使用存储（baseline）与使用本地 SQLite 存储（store）两种情况下，经 ``MilvusKB._embed_and_store_chunks``
+执行全部文件的嵌入，embedding 用确定性的 hash 向量代替模型服务，统计实际送入模型的文本数、请求次数与耗时。
+Milvus / PostgreSQL 写入不在测量范围内。
+
+用法：
+    uv run python scripts/benchmarks/chunk_embedding_benchmark.py
+    uv run python scripts/benchmarks/chunk_embedding_benchmark.py --corpus full --kbs 5 --latency-ms 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+for import_path in (APP_ROOT, APP_ROOT / "package"):
+    import_path_str = str(import_path)
+    if import_path_str not in sys.path:
+        sys.path.insert(0, import_path_str)
+
+from yuxi.knowledge.chunk_embedding_store import ChunkEmbeddingStore, SqliteChunkEmbeddingBackend  # noqa: E402
+from yuxi.knowledge.chunking.ragflow_like.dispatcher import chunk_markdown  # noqa: E402
+from yuxi.knowledge.implementations import milvus as milvus_module  # noqa: E402
+from yuxi.knowledge.implementations.milvus import MilvusKB  # noqa: E402
+
+CORPORA = {
+    "tiny": APP_ROOT / "test" / "data" / "A_Dream_of_Red_Mansions_10hui.txt",
+    "full": APP_ROOT / "test" / "data" / "A_Dream_of_Red_Mansions.txt",
+}
+BENCH_EMBEDDING_SPEC = "bench:hash-embedding"
+CHAPTER_PATTERN = re.compile(r"^\s*第[一二三四五六七八九十百零〇\d]+回", re.MULTILINE)
+COPYRIGHT_NOTICE = "## 版权声明\n\n" + "本资料仅供内部学习与检索测试使用，未经授权不得转载、摘编或用于商业用途。" * 12
+DISCLAIMER = "# 免责声明\n\n" + "知识库中的内容由系统自动整理，仅供参考，不构成任何专业意见，请以原始文献为准。" * 40
+FAQ_ENTRIES = [
+    (
+        f"## 常见问题 {index}\n\n"
+        + f"问：第 {index} 类问题应当如何处理？答：请先查阅对应章节的原文，再结合注释与评点进行理解。" * 8
+    )
+    for index in range(20)
+]
+
+
+class HashEmbedding:
+    """确定性的本地 embedding，``latency_ms`` 模拟模型服务的单次请求耗时。"""
+
+    def __init__(self, dimension: int = 256, latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.texts = 0
+
+    def _encode_one(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for index in range(len(text) - 1):
+            digest = hashlib.blake2b(text[index : index + 2].encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dimension] += 1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    async def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.requests += 1
+        self.texts += len(texts)
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return [self._encode_one(text) for text in texts]
+
+
+def load_chapters(corpus: str) -> list[str]:
+    text = CORPORA[corpus].read_text(encoding="utf-8")
+    starts = [match.start() for match in CHAPTER_PATTERN.finditer(text)] or [0]
+    return [
+        text[start : starts[index + 1] if index + 1 < len(starts) else len(text)].strip()
+        for index, start in enumerate(starts)
+    ]
+
+
+def build_uploads(chapters: list[str], kbs: int, shared_ratio: float) -> list[tuple[str, str, str]]:
+    """返回 [(kb_id, file_id, markdown)]，包含多库共享文件与公共样板。"""
+    shared_count = int(len(chapters) * shared_ratio)
+    uploads = []
+    for kb_index in range(kbs):
+        kb_id = f"kb_{kb_index}"
+        files = [(f"chapter_{index:04d}", chapter) for index, chapter in enumerate(chapters[:shared_count])]
+        files.extend(
+            (f"chapter_{index:04d}", chapter)
+            for index, chapter in enumerate(chapters)
+            if index >= shared_count and index % kbs == kb_index
+        )
+        for file_id, chapter in files:
+            uploads.append((kb_id, f"{kb_id}_{file_id}", f"{chapter}\n\n{COPYRIGHT_NOTICE}"))
+        uploads.append((kb_id, f"{kb_id}_disclaimer", DISCLAIMER))
+        uploads.append((kb_id, f"{kb_id}_faq", "\n\n".join(FAQ_ENTRIES)))
+    return uploads
+
+
+async def ingest(uploads: list[tuple[str, str, str]], embedder: HashEmbedding, store: ChunkEmbeddingStore | None):
+    kb = MilvusKB.__new__(MilvusKB)
+    kb._get_embedding_function = lambda embedding_model_spec: embedder
+
+    async def insert_chunks_to_stores(kb_id, file_id, collection, chunks, embeddings):
+        return None
+
+    kb._insert_chunks_to_stores = insert_chunks_to_stores
+    if store is not None:
+        milvus_module.chunk_embedding_store = store
+    embedding_function = embedder if store is None else kb._get_chunk_embedding_function(BENCH_EMBEDDING_SPEC)
+    chunk_count = 0
+    started_at = time.perf_counter()
+    for kb_id, file_id, markdown in uploads:
+        chunks = chunk_markdown(markdown, file_id, f"{file_id}.md", {})
+        chunk_count += len(chunks)
+        await kb._embed_and_store_chunks(kb_id, file_id, None, chunks, embedding_function)
+    return {
+        "chunks": chunk_count,
+        "embedded_texts": embedder.texts,
+        "embedding_requests": embedder.requests,
+        "elapsed_s": round(time.perf_counter() - started_at, 3),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    uploads = build_uploads(load_chapters(args.corpus), args.kbs, args.shared_ratio)
+    baseline = await ingest(uploads, HashEmbedding(latency_ms=args.latency_ms), None)
+
+    with tempfile.TemporaryDirectory(prefix="chunk-embedding-bench-") as tmp_dir:
+        backend = SqliteChunkEmbeddingBackend(Path(tmp_dir) / "chunk_embeddings.sqlite3")
+        store = ChunkEmbeddingStore(backend, max_entries=args.max_entries)
+        try:
+            with_store = await ingest(uploads, HashEmbedding(latency_ms=args.latency_ms), store)
+            with_store["store"] = {**store.get_stats(), "entries": await backend.count()}
+        finally:
+            backend.close()
+
+    return {
+        "meta": {
+            "corpus": args.corpus,
+            "kbs": args.kbs,
+            "shared_ratio": args.shared_ratio,
+            "files": len(uploads),
+            "latency_ms": args.latency_ms,
+            "max_entries": args.max_entries,
+        },
+        "baseline": baseline,
+        "store": with_store,
+        "embedded_text_reduction": round(1 - with_store["embedded_texts"] / baseline["embedded_texts"], 4)
+        if baseline["embedded_texts"]
+        else 0.0,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=sorted(CORPORA), default="tiny")
+    parser.add_argument("--kbs", type=int, default=3)
+    parser.add_argument("--shared-ratio", type=float, default=0.5, help="上传到每个知识库的章回比例")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟单次 embedding 请求耗时")
+    parser.add_argument("--max-entries", type=int, default=500_000)
+    parser.add_argument("--output", type=Path, default=None)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
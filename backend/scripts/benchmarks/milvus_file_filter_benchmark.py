@@ -0,0 +1,167 @@
+"""Milvus 文件过滤检索基准：候选 file_id 数量增长时的检索延迟。
+
+在真实 Milvus 上构造两份相同数据的集合：
+- legacy：旧 schema，file_id 无标量索引、非 partition key；
+- indexed：新 schema，file_id 为 partition key，并建立 INVERTED 标量索引。
+
+对每个候选 id 数量分别测量不过滤、字面量表达式（``file_id in ["..."]``）与模板化表达式
+（``file_id in {file_ids}`` + expr_params）的检索延迟。需要可访问的 Milvus 实例，运行结束后删除基准集合。
+
+用法：
+    uv run python scripts/benchmarks/milvus_file_filter_benchmark.py --uri http://localhost:19530
+    uv run python scripts/benchmarks/milvus_file_filter_benchmark.py --rows 200000 --candidates 1 100 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+for import_path in (APP_ROOT, APP_ROOT / "package"):
+    import_path_str = str(import_path)
+    if import_path_str not in sys.path:
+        sys.path.insert(0, import_path_str)
+
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections, utility  # noqa: E402
+
+from yuxi.knowledge.implementations.milvus_filter import (  # noqa: E402
+    MILVUS_FILE_PARTITIONS,
+    SCALAR_INDEX_PARAMS,
+    build_file_filter,
+)
+
+ALIAS = "file_filter_bench"
+INSERT_BATCH_SIZE = 5000
+VECTOR_INDEX = {"metric_type": "COSINE", "index_type": "IVF_FLAT", "params": {"nlist": 1024}}
+SEARCH_PARAMS = {"metric_type": "COSINE", "params": {"nprobe": 16}}
+
+
+def create_collection(name: str, dim: int, *, indexed: bool) -> Collection:
+    if utility.has_collection(name, using=ALIAS):
+        utility.drop_collection(name, using=ALIAS)
+    fields = [
+        FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
+        FieldSchema(name="file_id", dtype=DataType.VARCHAR, max_length=100, is_partition_key=indexed),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    kwargs = {"num_partitions": MILVUS_FILE_PARTITIONS} if indexed else {}
+    collection = Collection(name=name, schema=CollectionSchema(fields), using=ALIAS, **kwargs)
+    collection.create_index("embedding", VECTOR_INDEX)
+    if indexed:
+        collection.create_index("file_id", SCALAR_INDEX_PARAMS, index_name="file_id_inverted")
+    return collection
+
+
+def populate(collections: list[Collection], args: argparse.Namespace, rng: np.random.Generator) -> None:
+    for start in range(0, args.rows, INSERT_BATCH_SIZE):
+        count = min(INSERT_BATCH_SIZE, args.rows - start)
+        ids = [f"chunk-{index}" for index in range(start, start + count)]
+        file_ids = [f"file-{index % args.files}" for index in range(start, start + count)]
+        vectors = rng.random((count, args.dim), dtype=np.float32).tolist()
+        for collection in collections:
+            collection.insert([ids, file_ids, vectors])
+    for collection in collections:
+        collection.flush()
+        collection.load()
+
+
+def measure(collection: Collection, queries: list[list[float]], top_k: int, **search_kwargs) -> dict:
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        collection.search(data=[query], anns_field="embedding", param=SEARCH_PARAMS, limit=top_k, **search_kwargs)
+        latencies.append(time.perf_counter() - started_at)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    connections.connect(alias=ALIAS, uri=args.uri, token=args.token)
+    rng = np.random.default_rng(args.seed)
+    collections = {
+        "legacy": create_collection(f"{args.prefix}_legacy", args.dim, indexed=False),
+        "indexed": create_collection(f"{args.prefix}_indexed", args.dim, indexed=True),
+    }
+    try:
+        populate(list(collections.values()), args, rng)
+        queries = rng.random((args.queries, args.dim), dtype=np.float32).tolist()
+        all_file_ids = [f"file-{index}" for index in range(args.files)]
+        results = []
+        for name, collection in collections.items():
+            results.append({"collection": name, "mode": "unfiltered", **measure(collection, queries, args.top_k)})
+            for candidate_count in args.candidates:
+                candidates = random.Random(args.seed).sample(all_file_ids, min(candidate_count, args.files))
+                literal = 'file_id in ["' + '", "'.join(candidates) + '"]'
+                template = build_file_filter(file_ids=candidates)
+                for mode, kwargs in (
+                    ("literal", {"expr": literal}),
+                    ("template", {"expr": template.expr, "expr_params": template.params}),
+                ):
+                    results.append(
+                        {
+                            "collection": name,
+                            "mode": mode,
+                            "candidates": len(candidates),
+                            "expr_chars": len(kwargs["expr"]),
+                            **measure(collection, queries, args.top_k, **kwargs),
+                        }
+                    )
+    finally:
+        if not args.keep:
+            for collection in collections.values():
+                utility.drop_collection(collection.name, using=ALIAS)
+        connections.disconnect(ALIAS)
+
+    return {
+        "meta": {
+            "rows": args.rows,
+            "files": args.files,
+            "dim": args.dim,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "partitions": MILVUS_FILE_PARTITIONS,
+        },
+        "results": results,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=os.getenv("MILVUS_URI") or "http://localhost:19530")
+    parser.add_argument("--token", default=os.getenv("MILVUS_TOKEN") or "")
+    parser.add_argument("--prefix", default="bench_file_filter")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1, 10, 100, 1000, 10_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="保留基准集合，便于重复测量")
+    parser.add_argument("--output", type=Path, default=None)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    report = run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Milvus 检索 I/O 并发基准：线程卸载 vs 原生异步客户端。
+
+通过 MilvusKB.aquery（keyword 模式，不涉及向量化）驱动检索，假 Milvus 以固定延迟模拟服务端耗时：
+- thread：同步 Collection.search 经 ``_run_milvus_query_io`` 卸载到线程（受 MILVUS_QUERY_OFFLOAD_LIMIT 限制）；
+- async：``MilvusAsyncQueryPool`` + 假 AsyncMilvusClient，请求直接在事件循环上等待。
+
+用法：
+    uv run python scripts/benchmarks/milvus_query_io_benchmark.py
+    uv run python scripts/benchmarks/milvus_query_io_benchmark.py --concurrency 8 32 128 --latency-ms 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+for import_path in (APP_ROOT, APP_ROOT / "package"):
+    import_path_str = str(import_path)
+    if import_path_str not in sys.path:
+        sys.path.insert(0, import_path_str)
+
+from yuxi.knowledge.implementations import milvus as milvus_module  # noqa: E402
+from yuxi.knowledge.implementations.milvus_async import MilvusAsyncQueryPool  # noqa: E402
+from yuxi.knowledge.read_models import KnowledgeBaseConfig  # noqa: E402
+from yuxi.utils import logger  # noqa: E402
+
+CONFIG = KnowledgeBaseConfig(kb_id="bench", kb_type="milvus", embedding_model_spec="bench:embedding")
+
+
+class _Hit:
+    def __init__(self, index: int):
+        self.distance = 1.0
+        self.entity = {"content": f"chunk {index}", "chunk_id": f"chunk-{index}", "file_id": "f", "chunk_index": 0}
+
+
+class InFlightGauge:
+    """记录同时在途的模拟检索数及峰值（线程与协程共用）。"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+class FakeCollection:
+    """同步检索接口，阻塞固定延迟。"""
+
+    name = "bench"
+
+    def __init__(self, latency: float, gauge: InFlightGauge):
+        self.latency = latency
+        self.gauge = gauge
+
+    def search(self, **kwargs):
+        with self.gauge:
+            time.sleep(self.latency)
+        return [[_Hit(index) for index in range(kwargs["limit"])]]
+
+
+class FakeAsyncClient:
+    """异步检索接口，等待相同延迟。"""
+
+    def __init__(self, latency: float, gauge: InFlightGauge):
+        self.latency = latency
+        self.gauge = gauge
+
+    async def search(self, collection_name, **kwargs):
+        with self.gauge:
+            await asyncio.sleep(self.latency)
+        return [[_Hit(index) for index in range(kwargs["limit"])]]
+
+    async def close(self):
+        return None
+
+
+def build_kb(
+    mode: str, latency: float, pool_size: int, max_inflight: int, gauge: InFlightGauge
+) -> milvus_module.MilvusKB:
+    kb = milvus_module.MilvusKB.__new__(milvus_module.MilvusKB)
+    kb.collections = {}
+    collection = FakeCollection(latency, gauge)
+
+    async def get_collection(kb_id, embedding_model_spec):
+        return collection
+
+    async def hydrate(kb_id, chunks):
+        return None
+
+    kb._get_or_create_milvus_collection = get_collection
+    kb._hydrate_chunk_sources = hydrate
+    if mode == "async":
+        kb.query_pool = MilvusAsyncQueryPool(
+            size=pool_size, max_inflight=max_inflight, client_factory=lambda: FakeAsyncClient(latency, gauge)
+        )
+    return kb
+
+
+async def run_case(mode: str, concurrency: int, args: argparse.Namespace) -> dict:
+    gauge = InFlightGauge()
+    kb = build_kb(mode, args.latency_ms / 1000, args.pool_size, args.max_inflight, gauge)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            started_at = time.perf_counter()
+            await kb.aquery(f"query {index}", "bench", config=CONFIG, search_mode="keyword", final_top_k=5)
+            latencies.append(time.perf_counter() - started_at)
+
+    total = max(args.queries_per_worker * concurrency, concurrency)
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    if kb.query_pool is not None:
+        await kb.query_pool.aclose()
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "queries": total,
+        "qps": round(total / elapsed, 2),
+        "peak_in_flight": gauge.peak,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    results = [
+        await run_case(mode, concurrency, args) for concurrency in args.concurrency for mode in ("thread", "async")
+    ]
+    speedups = {}
+    for concurrency in args.concurrency:
+        by_mode = {item["mode"]: item for item in results if item["concurrency"] == concurrency}
+        speedups[str(concurrency)] = round(by_mode["async"]["qps"] / max(by_mode["thread"]["qps"], 1e-9), 2)
+    return {
+        "meta": {
+            "latency_ms": args.latency_ms,
+            "offload_limit": milvus_module.MILVUS_QUERY_OFFLOAD_LIMIT,
+            "pool_size": args.pool_size,
+            "max_inflight": args.max_inflight,
+        },
+        "results": results,
+        "qps_speedup": speedups,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="模拟的单次 Milvus 检索耗时")
+    parser.add_argument("--queries-per-worker", type=int, default=5)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--max-inflight", type=int, default=128)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--log-level", default="WARNING")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    report = asyncio.run(run_benchmark(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
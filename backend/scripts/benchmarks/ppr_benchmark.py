@@ -0,0 +1,92 @@
+"""Personalized PageRank 微基准：scipy 稀疏实现对比 networkx 参考实现。
+
+用法：
+    uv run python scripts/benchmarks/ppr_benchmark.py --edges 1000 10000 100000 --batch 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+for import_path in (APP_ROOT, APP_ROOT / "package"):
+    import_path_str = str(import_path)
+    if import_path_str not in sys.path:
+        sys.path.insert(0, import_path_str)
+
+from yuxi.knowledge.graphs.ppr import (  # noqa: E402
+    build_adjacency,
+    networkx_personalized_pagerank,
+    personalized_pagerank,
+)
+
+
+def _synthetic_graph(num_edges: int, rng: np.random.Generator) -> tuple[int, list[tuple[int, int]]]:
+    # 平均度约为 6，与按种子扩展两跳得到的实体/chunk 子图密度接近。
+    num_nodes = max(num_edges // 3, 10)
+    sources = rng.integers(0, num_nodes, size=num_edges)
+    targets = rng.integers(0, num_nodes, size=num_edges)
+    return num_nodes, list(zip(sources.tolist(), targets.tolist(), strict=True))
+
+
+def _best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def run_case(num_edges: int, batch: int, repeat: int, seed: int, skip_networkx: bool) -> dict:
+    rng = np.random.default_rng(seed)
+    num_nodes, edges = _synthetic_graph(num_edges, rng)
+    personalization = np.zeros((num_nodes, batch))
+    for column in range(batch):
+        personalization[rng.choice(num_nodes, size=min(8, num_nodes), replace=False), column] = 1.0
+
+    build_seconds = _best_of(repeat, lambda: build_adjacency(num_nodes, edges))
+    adjacency = build_adjacency(num_nodes, edges)
+    single_seconds = _best_of(repeat, lambda: personalized_pagerank(adjacency, personalization[:, 0]))
+    batch_seconds = _best_of(repeat, lambda: personalized_pagerank(adjacency, personalization))
+
+    result = {
+        "edges": num_edges,
+        "nodes": num_nodes,
+        "batch": batch,
+        "sparse_build_ms": round(build_seconds * 1000, 3),
+        "sparse_single_ms": round(single_seconds * 1000, 3),
+        "sparse_batch_ms": round(batch_seconds * 1000, 3),
+        "sparse_batch_per_seed_ms": round(batch_seconds * 1000 / batch, 3),
+    }
+    if not skip_networkx:
+        networkx_seconds = _best_of(
+            repeat,
+            lambda: networkx_personalized_pagerank(num_nodes, edges, personalization[:, 0]),
+        )
+        result["networkx_single_ms"] = round(networkx_seconds * 1000, 3)
+        result["speedup_single"] = round(networkx_seconds / max(build_seconds + single_seconds, 1e-9), 2)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edges", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-networkx", action="store_true")
+    args = parser.parse_args()
+
+    for num_edges in args.edges:
+        print(json.dumps(run_case(num_edges, args.batch, args.repeat, args.seed, args.skip_networkx)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+"""MilvusKB.aquery 检索性能基准。
+
+用仓库自带的《红楼梦》语料建库，embedding 用确定性的本地 hash 向量代替模型服务，
+按检索模式 × final_top_k × 并发度统计 p50/p95/p99 延迟与 QPS，结果输出为 JSON，
+并可与保存的基线对比，发现回退时以非 0 退出码结束，便于离线做回归检测。
+
+存储后端：
+- memory（默认）：进程内向量 / BM25 集合，实现 aquery 用到的 search 与 hybrid_search，
+  不依赖任何外部服务，测量的是 aquery 自身的调度与后处理开销；
+- milvus：指定 ``--milvus-uri`` 连接真实 Milvus（或 Milvus Lite），建立临时集合，结束后删除。
+
+用法：
+    uv run python scripts/benchmarks/retrieval_benchmark.py --output saves/bench/retrieval.json
+    uv run python scripts/benchmarks/retrieval_benchmark.py --baseline saves/bench/retrieval.json
+    uv run python scripts/benchmarks/retrieval_benchmark.py --store milvus --milvus-uri http://localhost:19530
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import numpy as np
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+for import_path in (APP_ROOT, APP_ROOT / "package"):
+    import_path_str = str(import_path)
+    if import_path_str not in sys.path:
+        sys.path.insert(0, import_path_str)
+
+from yuxi.knowledge.chunking.ragflow_like.dispatcher import chunk_markdown  # noqa: E402
+from yuxi.knowledge.implementations import milvus as milvus_module  # noqa: E402
+from yuxi.knowledge.implementations.milvus import CONTENT_SPARSE_FIELD, MilvusKB  # noqa: E402
+from yuxi.knowledge.query_embedding_cache import QueryEmbeddingCache  # noqa: E402
+from yuxi.knowledge.read_models import KnowledgeBaseConfig  # noqa: E402
+from yuxi.utils import logger  # noqa: E402
+
+CORPORA = {
+    "tiny": APP_ROOT / "test" / "data" / "A_Dream_of_Red_Mansions_10hui.txt",
+    "full": APP_ROOT / "test" / "data" / "A_Dream_of_Red_Mansions.txt",
+}
+BENCH_KB_ID = "bench_red_mansions"
+BENCH_EMBEDDING_SPEC = "bench:hash-embedding"
+CHAPTER_PATTERN = re.compile(r"^\s*第[一二三四五六七八九十百零〇\d]+回", re.MULTILINE)
+SEED_QUERIES = [
+    "贾宝玉初见林黛玉",
+    "甄士隐梦幻识通灵",
+    "冷子兴演说荣国府",
+    "王熙凤协理宁国府",
+    "刘姥姥一进荣国府",
+    "贾雨村葫芦僧判断葫芦案",
+    "通灵宝玉上刻的字",
+    "金陵十二钗正册判词",
+    "秦可卿的丧事",
+    "薛宝钗的金锁",
+]
+# 对比基线时，延迟越大越差、QPS 越小越差
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+HIGHER_IS_BETTER = ("qps",)
+
+
+class HashEmbedding:
+    """确定性的本地 embedding：字符 1/2-gram 经 hash 投影到固定维度并归一化。
+
+    共享字符片段越多的文本向量越接近，足以让向量检索返回有意义的结果；
+    ``latency_ms`` 可模拟模型服务的单次调用耗时。
+    """
+
+    def __init__(self, dimension: int = 256, latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.batch_size = 64
+
+    def _encode_one(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        normalized = "".join(str(text or "").split())
+        features = list(normalized) + [normalized[i : i + 2] for i in range(len(normalized) - 1)]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimension] += 1.0 if value >> 63 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def batch_encode(self, texts: list[str], batch_size: int | None = None) -> list[list[float]]:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        return [self._encode_one(text) for text in texts]
+
+    async def abatch_encode(self, texts: list[str], batch_size: int | None = None) -> list[list[float]]:
+        return await asyncio.to_thread(self.batch_encode, texts, batch_size)
+
+
+def _bigrams(text: str) -> list[str]:
+    normalized = "".join(str(text or "").split())
+    return [normalized[i : i + 2] for i in range(len(normalized) - 1)] or list(normalized)
+
+
+class _Hit:
+    __slots__ = ("entity", "distance")
+
+    def __init__(self, entity: dict, distance: float):
+        self.entity = entity
+        self.distance = distance
+
+
+class InProcessCollection:
+    """进程内的 Milvus 集合替身，覆盖 MilvusKB.aquery 使用的 search / hybrid_search。
+
+    向量检索为 COSINE 暴力计算；全文检索为字符 bigram 的 BM25；混合检索按
+    Milvus WeightedRanker（norm_score）的方式归一化后加权。
+    """
+
+    name = BENCH_KB_ID
+
+    def __init__(self, chunks: list[dict], embeddings: list[list[float]], *, k1: float = 1.2, b: float = 0.75):
+        self.entities = [
+            {
+                "content": chunk["content"],
+                "chunk_id": chunk["chunk_id"],
+                "file_id": chunk["file_id"],
+                "chunk_index": chunk["chunk_index"],
+            }
+            for chunk in chunks
+        ]
+        self.file_ids = np.array([entity["file_id"] for entity in self.entities])
+        self.matrix = np.asarray(embeddings, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for index, entity in enumerate(self.entities):
+            terms = Counter(_bigrams(entity["content"]))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings[term].append((index, tf))
+        self.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if lengths else 0.0
+
+    def _filter_mask(self, expr: str | None) -> np.ndarray | None:
+        if not expr:
+            return None
+        allowed = re.findall(r'"((?:[^"\\]|\\.)*)"', expr)
+        return np.isin(self.file_ids, allowed)
+
+    def _vector_scores(self, vector: list[float]) -> np.ndarray:
+        return self.matrix @ np.asarray(vector, dtype=np.float32)
+
+    def _bm25_scores(self, query_text: str) -> np.ndarray:
+        scores = np.zeros(len(self.entities), dtype=np.float32)
+        total = len(self.entities)
+        for term in set(_bigrams(query_text)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            indexes = np.fromiter((index for index, _ in postings), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter((tf for _, tf in postings), dtype=np.float32, count=len(postings))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[indexes] / max(self.avg_doc_length, 1e-9))
+            scores[indexes] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def _scores(self, data: Any, anns_field: str) -> np.ndarray:
+        if anns_field == CONTENT_SPARSE_FIELD:
+            return self._bm25_scores(data)
+        return self._vector_scores(data)
+
+    def _top(self, scores: np.ndarray, limit: int, mask: np.ndarray | None, *, positive_only: bool) -> list[int]:
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        if positive_only:
+            scores = np.where(scores > 0, scores, -np.inf)
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        candidates = np.argpartition(-scores, limit - 1)[:limit]
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(index) for index in ordered if np.isfinite(scores[index])]
+
+    def search(self, data, anns_field, param, limit, expr=None, output_fields=None, **_kwargs):
+        positive_only = anns_field == CONTENT_SPARSE_FIELD
+        results = []
+        for item in data:
+            scores = self._scores(item, anns_field)
+            top = self._top(scores, limit, self._filter_mask(expr), positive_only=positive_only)
+            results.append([_Hit(self.entities[index], float(scores[index])) for index in top])
+        return results
+
+    @staticmethod
+    def _normalize(score: float, metric_type: str) -> float:
+        if metric_type == "BM25":
+            return 2 * math.atan(score) / math.pi
+        if metric_type == "IP":
+            return 0.5 + math.atan(score) / math.pi
+        return (1 + score) / 2
+
+    def hybrid_search(self, reqs, rerank, limit, output_fields=None, **_kwargs):
+        weights = list(getattr(rerank, "_weights", None) or [1.0] * len(reqs))
+        fused: dict[int, float] = defaultdict(float)
+        for request, weight in zip(reqs, weights, strict=False):
+            anns_field = request.anns_field
+            metric_type = request.param.get("metric_type", "COSINE")
+            scores = self._scores(request.data[0], anns_field)
+            mask = self._filter_mask(request.expr)
+            top = self._top(scores, request.limit, mask, positive_only=anns_field == CONTENT_SPARSE_FIELD)
+            for index in top:
+                fused[index] += weight * self._normalize(float(scores[index]), metric_type)
+        ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [[_Hit(self.entities[index], score) for index, score in ordered]]
+
+
+def load_corpus(corpus: str) -> list[tuple[str, str, str]]:
+    """按章回拆分语料，返回 [(file_id, filename, text)]。"""
+    text = CORPORA[corpus].read_text(encoding="utf-8")
+    starts = [match.start() for match in CHAPTER_PATTERN.finditer(text)] or [0]
+    if starts[0] != 0:
+        starts.insert(0, 0)
+    files = []
+    for index, start in enumerate(starts):
+        end = starts[index + 1] if index + 1 < len(starts) else len(text)
+        chapter = text[start:end].strip()
+        if chapter:
+            files.append((f"file_{index:04d}", f"红楼梦_{index:04d}.txt", chapter))
+    return files
+
+
+def build_chunks(files: list[tuple[str, str, str]]) -> list[dict]:
+    chunks = []
+    for file_id, filename, text in files:
+        chunks.extend(chunk_markdown(text, file_id, filename, {}))
+    return chunks
+
+
+def build_queries(chunks: list[dict], count: int, seed: int) -> list[str]:
+    """种子问题 + 从 chunk 中截取的短句，固定随机种子保证可复现。"""
+    rng = random.Random(seed)
+    queries = list(SEED_QUERIES)
+    while len(queries) < count:
+        content = "".join(rng.choice(chunks)["content"].split())
+        if len(content) < 16:
+            continue
+        start = rng.randrange(0, len(content) - 12)
+        queries.append(content[start : start + rng.randint(6, 12)])
+    rng.shuffle(queries)
+    return queries[:count]
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q)) if values else 0.0
+
+
+class RetrievalBench:
+    """把 MilvusKB 接到 hash embedding 与选定存储上，去掉对 PostgreSQL 与模型服务的依赖。"""
+
+    def __init__(self, kb: MilvusKB, collection: Any, embedder: HashEmbedding, filenames: dict[str, str]):
+        self.kb = kb
+        self.embedder = embedder
+        self.filenames = filenames
+        self.config = KnowledgeBaseConfig(
+            kb_id=BENCH_KB_ID, kb_type="milvus", embedding_model_spec=BENCH_EMBEDDING_SPEC
+        )
+        kb.collections[BENCH_KB_ID] = collection
+        kb._get_embedding_function = self._embedding_function
+        kb._hydrate_chunk_sources = self._hydrate_chunk_sources
+
+    def _embedding_function(self, embedding_model_spec: str, *, sync: bool = False):
+        return self.embedder.batch_encode if sync else self.embedder.abatch_encode
+
+    async def _hydrate_chunk_sources(self, kb_id: str, chunks: list[dict]) -> None:
+        for chunk in chunks:
+            metadata = chunk.get("metadata")
+            if isinstance(metadata, dict):
+                metadata["source"] = self.filenames.get(str(metadata.get("file_id") or ""), "未知来源")
+
+    async def run_case(self, queries: list[str], *, mode: str, top_k: int, concurrency: int, warmup: int) -> dict:
+        # 每个用例使用独立的进程内 Query 向量缓存，避免前一个用例的结果影响本用例
+        milvus_module.query_embedding_cache = QueryEmbeddingCache(redis_enabled=False)
+        options = {"search_mode": mode, "final_top_k": top_k, "similarity_threshold": 0.0}
+        for query in queries[:warmup]:
+            await self.kb.aquery(query, BENCH_KB_ID, config=self.config, **options)
+
+        latencies: list[float] = []
+        empty_results = 0
+        pending = iter(queries)
+
+        async def worker() -> None:
+            nonlocal empty_results
+            for query in pending:
+                started_at = time.perf_counter()
+                result = await self.kb.aquery(query, BENCH_KB_ID, config=self.config, **options)
+                latencies.append(time.perf_counter() - started_at)
+                if not result:
+                    empty_results += 1
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall_seconds = time.perf_counter() - started_at
+        latencies_ms = [value * 1000 for value in latencies]
+        return {
+            "mode": mode,
+            "final_top_k": top_k,
+            "concurrency": concurrency,
+            "queries": len(latencies),
+            "empty_results": empty_results,
+            "p50_ms": round(percentile(latencies_ms, 50), 3),
+            "p95_ms": round(percentile(latencies_ms, 95), 3),
+            "p99_ms": round(percentile(latencies_ms, 99), 3),
+            "mean_ms": round(float(np.mean(latencies_ms)) if latencies_ms else 0.0, 3),
+            "qps": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        }
+
+
+def _create_memory_store(chunks: list[dict], embedder: HashEmbedding) -> tuple[MilvusKB, Any]:
+    kb = object.__new__(MilvusKB)
+    kb.collections = {}
+    kb.vector_indexes = {}
+    embeddings = embedder.batch_encode([chunk["content"] for chunk in chunks])
+    return kb, InProcessCollection(chunks, embeddings)
+
+
+def _create_milvus_store(chunks: list[dict], embedder: HashEmbedding, milvus_uri: str) -> tuple[MilvusKB, Any]:
+    kb = MilvusKB(tempfile.mkdtemp(prefix="retrieval-bench-"), milvus_uri=milvus_uri)
+    collection_name = f"{BENCH_KB_ID}_{int(time.time())}"
+    embedding_info = SimpleNamespace(dimension=embedder.dimension, model_id="hash-embedding")
+    collection = kb._create_new_collection(collection_name, embedding_info, BENCH_KB_ID)
+    batch_size = 500
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start : start + batch_size]
+        collection.insert(
+            [
+                [chunk["id"] for chunk in batch],
+                [chunk["content"] for chunk in batch],
+                [chunk["chunk_id"] for chunk in batch],
+                [chunk["file_id"] for chunk in batch],
+                [chunk["chunk_index"] for chunk in batch],
+                embedder.batch_encode([chunk["content"] for chunk in batch]),
+            ]
+        )
+    collection.flush()
+    collection.load()
+    return kb, collection
+
+
+def compare_with_baseline(current: dict, baseline: dict, tolerance: float) -> dict:
+    """按 (mode, final_top_k, concurrency) 对齐用例，超过容差视为回退。"""
+
+    def case_key(item: dict) -> tuple:
+        return item["mode"], item["final_top_k"], item["concurrency"]
+
+    baseline_cases = {case_key(item): item for item in baseline.get("results", [])}
+    comparisons = []
+    for item in current.get("results", []):
+        reference = baseline_cases.get(case_key(item))
+        if reference is None:
+            continue
+        regressions = []
+        for metric in LOWER_IS_BETTER:
+            if reference.get(metric) and item[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(metric)
+        for metric in HIGHER_IS_BETTER:
+            if reference.get(metric) and item[metric] < reference[metric] * (1 - tolerance):
+                regressions.append(metric)
+        comparisons.append(
+            {
+                "mode": item["mode"],
+                "final_top_k": item["final_top_k"],
+                "concurrency": item["concurrency"],
+                "p95_ratio": round(item["p95_ms"] / reference["p95_ms"], 3) if reference.get("p95_ms") else None,
+                "qps_ratio": round(item["qps"] / reference["qps"], 3) if reference.get("qps") else None,
+                "regressions": regressions,
+            }
+        )
+    return {
+        "tolerance": tolerance,
+        "compared_cases": len(comparisons),
+        "regressed_cases": sum(1 for item in comparisons if item["regressions"]),
+        "cases": comparisons,
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    files = load_corpus(args.corpus)
+    if args.max_files:
+        files = files[: args.max_files]
+    chunks = build_chunks(files)
+    embedder = HashEmbedding(dimension=args.dimension, latency_ms=args.embed_latency_ms)
+
+    build_started_at = time.perf_counter()
+    if args.store == "milvus":
+        kb, collection = _create_milvus_store(chunks, embedder, args.milvus_uri)
+    else:
+        kb, collection = _create_memory_store(chunks, embedder)
+    build_seconds = time.perf_counter() - build_started_at
+
+    bench = RetrievalBench(kb, collection, embedder, {file_id: filename for file_id, filename, _ in files})
+    queries = build_queries(chunks, args.queries, args.seed)
+    results = []
+    try:
+        for mode in args.modes:
+            for top_k in args.top_k:
+                for concurrency in args.concurrency:
+                    result = await bench.run_case(
+                        queries, mode=mode, top_k=top_k, concurrency=concurrency, warmup=args.warmup
+                    )
+                    results.append(result)
+                    print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    finally:
+        if args.store == "milvus":
+            collection.drop()
+
+    return {
+        "meta": {
+            "store": args.store,
+            "corpus": args.corpus,
+            "files": len(files),
+            "chunks": len(chunks),
+            "dimension": args.dimension,
+            "embed_latency_ms": args.embed_latency_ms,
+            "queries_per_case": len(queries),
+            "seed": args.seed,
+            "build_seconds": round(build_seconds, 3),
+            "milvus_query_offload_limit": milvus_module.MILVUS_QUERY_OFFLOAD_LIMIT,
+            "python": platform.python_version(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", choices=["memory", "milvus"], default="memory")
+    parser.add_argument("--milvus-uri", default="http://localhost:19530")
+    parser.add_argument("--corpus", choices=sorted(CORPORA), default="tiny")
+    parser.add_argument("--max-files", type=int, default=0, help="只使用前 N 个章回，0 表示全部")
+    parser.add_argument(
+        "--modes", nargs="+", choices=["vector", "keyword", "hybrid"], default=["vector", "keyword", "hybrid"]
+    )
+    parser.add_argument("--top-k", type=int, nargs="+", default=[5, 10, 50])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=200, help="每个用例的查询数")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="模拟 embedding 服务的单次调用耗时")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="结果 JSON 写入路径")
+    parser.add_argument("--baseline", type=Path, help="对比的基线 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    parser.add_argument("--log-level", default="WARNING", help="逐条查询的 DEBUG 日志本身会拖慢基准")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    report = asyncio.run(run_benchmark(args))
+    if args.baseline:
+        report["comparison"] = compare_with_baseline(
+            report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance
+        )
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(json.dumps(report, ensure_ascii=False))
+    if report.get("comparison", {}).get("regressed_cases"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
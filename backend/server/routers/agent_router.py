@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 from yuxi.agents.buildin import agent_manager
 from yuxi.agents.context import filter_config_by_role
+from yuxi.agents.graph_cache import invalidate_agent_graph_cache
 from yuxi.repositories.agent_repository import (
     AgentRepository,
     is_builtin_agent,
@@ -180,6 +181,7 @@ async def create_agent(
         )
     except ValueError as exc:
         raise HTTPException(status_code=422, detail=str(exc)) from exc
+    invalidate_agent_graph_cache("agent created")
     return {"agent": await _serialize_agent(repo, item, current_user, include_configurable_items=True)}
 
 
@@ -231,6 +233,8 @@ async def update_agent(
         )
     except ValueError as exc:
         raise HTTPException(status_code=422, detail=str(exc)) from exc
+    # 子智能体的定义会编译进父智能体的 graph，配置变更后整体失效
+    invalidate_agent_graph_cache("agent config changed")
     return {"agent": await _serialize_agent(repo, updated, current_user, include_configurable_items=True)}
 
 
@@ -248,6 +252,7 @@ async def delete_agent(
     if is_builtin_agent(item):
         raise HTTPException(status_code=409, detail="内置智能体不能删除")
     await repo.delete(agent=item)
+    invalidate_agent_graph_cache("agent deleted")
     return {"success": True}
 
 
@@ -1,7 +1,7 @@
 from typing import Any, Literal
 from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 from server.utils.auth_middleware import get_admin_user
@@ -14,6 +14,7 @@ from yuxi.knowledge.eval.benchmark_generation import (
     DEFAULT_BENCHMARK_GENERATION_CONCURRENCY,
     MAX_BENCHMARK_GENERATION_CONCURRENCY,
 )
+from yuxi.knowledge.eval.executor import DEFAULT_EVALUATION_CONCURRENCY, MAX_EVALUATION_CONCURRENCY
 from yuxi.knowledge.eval.service import EvaluationService
 from yuxi.permissions import ResourcePermission
 from yuxi.repositories.evaluation_repository import EvaluationRepository
@@ -43,6 +44,7 @@ class RunEvaluationRequest(BaseModel):
     dataset_id: str = Field(..., min_length=1)
     name: str | None = Field(default=None, min_length=1, max_length=100)
     retrieval_config: dict[str, Any] = Field(default_factory=dict, alias="model_config")
+    concurrency: int = Field(default=DEFAULT_EVALUATION_CONCURRENCY, ge=1, le=MAX_EVALUATION_CONCURRENCY)
 
 
 async def _get_evaluation_dataset_or_raise(dataset_id: str) -> Any:
@@ -257,6 +259,7 @@ async def run_evaluation(
             name=request.name,
             model_config=request.retrieval_config,
             created_by=current_user.uid,
+            concurrency=request.concurrency,
         )
         return {"message": "success", "data": {"run_id": run_id}}
     except ValueError as e:
@@ -268,6 +271,29 @@ async def run_evaluation(
         raise HTTPException(status_code=500, detail=f"启动评估失败: {str(e)}")
 
 
+@evaluation.post("/databases/{kb_id}/runs/{run_id}/resume")
+async def resume_evaluation_run(
+    kb_id: str,
+    run_id: str,
+    concurrency: int | None = Query(None, ge=1, le=MAX_EVALUATION_CONCURRENCY),
+    current_user: User = Depends(require_knowledge_base_manage),
+):
+    """从检查点恢复中断的评估运行"""
+    try:
+        service = EvaluationService()
+        result = await service.resume_evaluation(
+            kb_id=kb_id, run_id=run_id, created_by=current_user.uid, concurrency=concurrency
+        )
+        return {"message": "success", "data": result}
+    except ValueError as e:
+        if "not found" in str(e).lower():
+            raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"恢复评估失败: {e}")
+        raise HTTPException(status_code=500, detail=f"恢复评估失败: {str(e)}")
+
+
 @evaluation.get("/databases/{kb_id}/runs")
 async def list_evaluation_runs(
     kb_id: str,
@@ -7,14 +7,16 @@ from urllib.parse import quote, unquote
 
 from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile
 from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from starlette.responses import StreamingResponse
 from yuxi import config
 from yuxi.knowledge.base import KBNameConflictError, KBNotFoundError
+from yuxi.knowledge.bulk_indexing import INDEX_STAGE, PARSE_STAGE, KBBulkIndexingScheduler
 from yuxi.knowledge.chunking.ragflow_like.presets import get_chunk_preset_options
 from yuxi.knowledge.graphs.milvus_graph_service import GRAPH_TASK_TYPE, MilvusGraphService
 from yuxi.knowledge.read_models import KnowledgeBaseDetail
 from yuxi.knowledge.parser.unified import SUPPORTED_FILE_EXTENSIONS, is_supported_file_extension
+from yuxi.knowledge.retrieval_trace import retrieval_trace
 from yuxi.knowledge.runtime import knowledge_base
 from yuxi.knowledge.utils import calculate_content_hash, is_minio_url, parse_minio_url
 from yuxi.knowledge.utils.mindmap_utils import (
@@ -38,10 +40,16 @@ from yuxi.permissions import (
 from yuxi.services.ocr_service import parse_document
 from yuxi.services.task_service import TaskContext, tasker
 from yuxi.services.workspace_service import MAX_WORKSPACE_UPLOAD_SIZE_BYTES, resolve_workspace_file_path
-from yuxi.storage.minio.client import MinIOClient, StorageError, aupload_file_to_minio, get_minio_client
+from yuxi.storage.minio.client import (
+    MinIOClient,
+    StorageError,
+    aupload_file_to_minio,
+    aupload_path_to_minio,
+    get_minio_client,
+)
 from yuxi.storage.postgres.models_business import User
 from yuxi.utils import logger
-from yuxi.utils.upload_utils import MAX_UPLOAD_SIZE_BYTES, read_upload_with_limit, write_upload_to_path
+from yuxi.utils.upload_utils import MAX_UPLOAD_SIZE_BYTES, spool_upload_with_hash, write_upload_to_path
 
 from server.utils.auth_middleware import get_admin_user, get_required_user
 from server.utils.knowledge_response import serialize_knowledge_base, serialize_knowledge_base_list
@@ -55,6 +63,8 @@ knowledge = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
 ACTIVE_GRAPH_BUILD_STATUSES = {"pending", "running"}
 ACTIVE_DOCUMENT_ACTION_TASK_STATUSES = {"pending", "running"}
+INDEX_TUNE_TASK_TYPE = "knowledge_index_tune"
+FILE_FILTER_MIGRATION_TASK_TYPE = "knowledge_file_filter_migration"
 DOCUMENT_ACTION_BATCH_SIZE = 500
 DOCUMENT_ACTION_RESULT_ITEM_LIMIT = 200
 MAX_DIRECT_DOCUMENT_ACTION_FILE_IDS = 1000
@@ -80,10 +90,21 @@ class AddUploadedDocumentsRequest(BaseModel):
     params: dict | None = None
 
 
+class PendingParseDocumentsRequest(BaseModel):
+    auto_index: bool = False
+    params: dict | None = None
+
+
 class PendingIndexDocumentsRequest(BaseModel):
     params: dict | None = None
 
 
+class TuneSearchParamsRequest(BaseModel):
+    target_recall: float = Field(default=0.95, gt=0, le=1)
+    k: int = Field(default=10, ge=1, le=200)
+    sample_size: int = Field(default=100, ge=1, le=2000)
+
+
 media_types = {
     ".pdf": "application/pdf",
     ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
@@ -1012,6 +1033,18 @@ def _is_failed_item(item: dict) -> bool:
     return item.get("status") == "failed" or bool(item.get("error"))
 
 
+def _add_reindex_stats(totals: dict[str, int], item: dict) -> None:
+    """累计单个文件入库的 chunk 复用统计（增量重建索引）。"""
+    stats = item.get("reindex") or {}
+    for key in ("reused", "embedded", "removed"):
+        totals[key] = totals.get(key, 0) + int(stats.get(key) or 0)
+
+
+def _reindex_summary(totals: dict[str, int]) -> dict:
+    chunk_total = totals.get("reused", 0) + totals.get("embedded", 0)
+    return {**totals, "reuse_ratio": round(totals.get("reused", 0) / chunk_total, 4) if chunk_total else 0.0}
+
+
 async def _run_parse_file_ids(
     *,
     context: TaskContext,
@@ -1059,6 +1092,7 @@ async def _run_index_file_ids(
     total = len(file_ids)
     processed_items = []
     param_update_failed = set()
+    reindex_totals: dict[str, int] = {}
 
     if params:
         for file_id in file_ids:
@@ -1082,133 +1116,132 @@ async def _run_index_file_ids(
         try:
             result = await knowledge_base.index_file(kb_id, file_id, operator_id=operator_id, params=params)
             processed_items.append(result)
+            _add_reindex_stats(reindex_totals, result)
         except Exception as e:
             logger.error(f"Index failed for {file_id}: {e}")
             processed_items.append({"file_id": file_id, "status": "failed", "error": str(e)})
 
     failed_count = len([p for p in processed_items if _is_failed_item(p)])
     message = f"入库完成，失败 {failed_count} 个"
-    result_payload = {"items": processed_items, "processed": len(processed_items), "failed": failed_count}
+    result_payload = {
+        "items": processed_items,
+        "processed": len(processed_items),
+        "failed": failed_count,
+        "reindex": _reindex_summary(reindex_totals),
+    }
     await context.set_result(result_payload)
     await context.set_progress(100.0, message)
     return result_payload
 
 
-async def _run_parse_pending_statuses(
+async def _run_pending_statuses(
     *,
     context: TaskContext,
     kb_id: str,
-    statuses: list[str],
+    stages: tuple[str, ...],
+    statuses: dict[str, list[str]],
     initial_total: int,
     operator_id: str,
+    params: dict | None = None,
 ) -> dict:
+    """按文件状态全量处理待解析 / 待入库文档：多个文件并发执行，单个文件失败不影响其他文件。"""
+    label = "入库" if stages[-1] == INDEX_STAGE else "解析"
     await context.set_message("任务初始化")
-    await context.set_progress(5.0, "准备解析待处理文档")
+    await context.set_progress(5.0, f"准备{label}待处理文档")
 
-    processed_count = 0
-    failed_count = 0
     result_items = []
-    after_file_id = None
-
-    while True:
-        file_ids = await knowledge_base.list_document_file_ids_by_statuses(
-            kb_id,
-            statuses=statuses,
-            after_file_id=after_file_id,
-            limit=DOCUMENT_ACTION_BATCH_SIZE,
-        )
-        if not file_ids:
-            break
-
-        for file_id in file_ids:
-            await context.raise_if_cancelled()
-            after_file_id = file_id
-            processed_count += 1
-            progress_total = max(initial_total, processed_count)
-            progress = 5.0 + (processed_count / progress_total) * 90.0
-            await context.set_progress(progress, f"正在解析第 {processed_count}/{progress_total} 个文档")
-
-            try:
-                result = await knowledge_base.parse_file(kb_id, file_id, operator_id=operator_id)
-                _append_document_action_result_sample(result_items, result)
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Parse failed for {file_id}: {e}")
-                _append_document_action_result_sample(
-                    result_items,
-                    {"file_id": file_id, "status": "failed", "error": str(e)},
-                )
+    reindex_totals: dict[str, int] = {}
+
+    def collect(stage: str, item: dict) -> None:
+        _append_document_action_result_sample(result_items, item)
+        if stage == INDEX_STAGE:
+            _add_reindex_stats(reindex_totals, item)
+
+    scheduler = KBBulkIndexingScheduler(
+        knowledge_base,
+        kb_id,
+        stages=stages,
+        statuses=statuses,
+        operator_id=operator_id,
+        params=params,
+        initial_total=initial_total,
+        context=context,
+        on_result=collect,
+        page_size=DOCUMENT_ACTION_BATCH_SIZE,
+    )
+    summary = await scheduler.run()
 
-    message = f"解析完成，失败 {failed_count} 个" if processed_count else "没有待解析文档"
+    processed_count = summary["processed"]
+    failed_count = summary["failed"]
+    message = f"{label}完成，失败 {failed_count} 个" if processed_count else f"没有待{label}文档"
     result_payload = {
         "items": result_items,
         "processed": processed_count,
         "failed": failed_count,
         "result_truncated": processed_count > len(result_items),
+        "recovered": summary["recovered"],
+        "stages": summary["stages"],
     }
+    if INDEX_STAGE in stages:
+        result_payload["reindex"] = _reindex_summary(reindex_totals)
     await context.set_result(result_payload)
     await context.set_progress(100.0, message)
     return result_payload
 
 
-async def _run_index_pending_statuses(
+async def _run_parse_pending_statuses(
     *,
     context: TaskContext,
     kb_id: str,
     statuses: list[str],
     initial_total: int,
     operator_id: str,
-    params: dict,
+    auto_index: bool = False,
+    index_statuses: list[str] | None = None,
+    params: dict | None = None,
 ) -> dict:
-    await context.set_message("任务初始化")
-    await context.set_progress(5.0, "准备入库待处理文档")
-
-    processed_count = 0
-    failed_count = 0
-    result_items = []
-    after_file_id = None
-
-    while True:
-        file_ids = await knowledge_base.list_document_file_ids_by_statuses(
-            kb_id,
-            statuses=statuses,
-            after_file_id=after_file_id,
-            limit=DOCUMENT_ACTION_BATCH_SIZE,
+    """auto_index 时解析与入库流水线执行，已解析待入库的文件（index_statuses）也一并入库。"""
+    if not auto_index:
+        return await _run_pending_statuses(
+            context=context,
+            kb_id=kb_id,
+            stages=(PARSE_STAGE,),
+            statuses={PARSE_STAGE: statuses},
+            initial_total=initial_total,
+            operator_id=operator_id,
         )
-        if not file_ids:
-            break
-
-        for file_id in file_ids:
-            await context.raise_if_cancelled()
-            after_file_id = file_id
-            processed_count += 1
-            progress_total = max(initial_total, processed_count)
-            progress = 5.0 + (processed_count / progress_total) * 90.0
-            await context.set_progress(progress, f"正在入库第 {processed_count}/{progress_total} 个文档")
+    entry_statuses = {PARSE_STAGE: statuses}
+    if index_statuses:
+        entry_statuses[INDEX_STAGE] = index_statuses
+    return await _run_pending_statuses(
+        context=context,
+        kb_id=kb_id,
+        stages=(PARSE_STAGE, INDEX_STAGE),
+        statuses=entry_statuses,
+        initial_total=initial_total,
+        operator_id=operator_id,
+        params=params,
+    )
 
-            try:
-                if params:
-                    await knowledge_base.update_file_params(kb_id, file_id, params, operator_id=operator_id)
-                result = await knowledge_base.index_file(kb_id, file_id, operator_id=operator_id, params=params)
-                _append_document_action_result_sample(result_items, result)
-            except Exception as e:
-                failed_count += 1
-                logger.error(f"Index failed for {file_id}: {e}")
-                _append_document_action_result_sample(
-                    result_items,
-                    {"file_id": file_id, "status": "failed", "error": str(e)},
-                )
 
-    message = f"入库完成，失败 {failed_count} 个" if processed_count else "没有待入库文档"
-    result_payload = {
-        "items": result_items,
-        "processed": processed_count,
-        "failed": failed_count,
-        "result_truncated": processed_count > len(result_items),
-    }
-    await context.set_result(result_payload)
-    await context.set_progress(100.0, message)
-    return result_payload
+async def _run_index_pending_statuses(
+    *,
+    context: TaskContext,
+    kb_id: str,
+    statuses: list[str],
+    initial_total: int,
+    operator_id: str,
+    params: dict,
+) -> dict:
+    return await _run_pending_statuses(
+        context=context,
+        kb_id=kb_id,
+        stages=(INDEX_STAGE,),
+        statuses={INDEX_STAGE: statuses},
+        initial_total=initial_total,
+        operator_id=operator_id,
+        params=params,
+    )
 
 
 async def _enqueue_parse_task(
@@ -1243,10 +1276,17 @@ async def _enqueue_parse_task(
         return {"message": f"提交失败: {e}", "status": "failed"}
 
 
-async def _enqueue_parse_pending_task(kb_id: str, operator_id: str, db_info: KnowledgeBaseDetail) -> dict:
-    """提交管理端按状态全量待解析任务。"""
+async def _enqueue_parse_pending_task(
+    kb_id: str,
+    operator_id: str,
+    db_info: KnowledgeBaseDetail,
+    *,
+    auto_index: bool = False,
+    params: dict | None = None,
+) -> dict:
+    """提交管理端按状态全量待解析任务；auto_index 时解析完成的文件直接进入入库阶段，待入库文件一并入库。"""
     try:
-        pending_count = db_info.pending_parse_count
+        pending_count = db_info.pending_parse_count + (db_info.pending_index_count if auto_index else 0)
         if pending_count <= 0:
             return {"message": "没有待解析文档", "status": "success", "queued_count": 0}
 
@@ -1258,6 +1298,9 @@ async def _enqueue_parse_pending_task(kb_id: str, operator_id: str, db_info: Kno
                     statuses=PENDING_PARSE_STATUSES,
                     initial_total=pending_count,
                     operator_id=operator_id,
+                    auto_index=auto_index,
+                    index_statuses=PENDING_INDEX_STATUSES,
+                    params=params,
                 )
             except Exception as e:
                 logger.exception(f"Pending parse task failed: {e}")
@@ -1272,6 +1315,8 @@ async def _enqueue_parse_pending_task(kb_id: str, operator_id: str, db_info: Kno
                 "action": "parse",
                 "statuses": PENDING_PARSE_STATUSES,
                 "count": pending_count,
+                "auto_index": auto_index,
+                "params": params or {},
             },
             payload_match={"kb_id": kb_id, "scope": "pending", "action": "parse"},
             statuses=ACTIVE_DOCUMENT_ACTION_TASK_STATUSES,
@@ -1386,11 +1431,17 @@ async def parse_documents(
 
 
 @knowledge.post("/databases/{kb_id}/documents/parse-pending")
-async def parse_pending_documents(kb_id: str, current_user: User = Depends(require_knowledge_base_manage)):
-    """按状态手动触发全部待解析文档解析。"""
-    logger.debug(f"Parse pending documents for kb_id {kb_id}")
+async def parse_pending_documents(
+    kb_id: str,
+    payload: PendingParseDocumentsRequest | None = None,
+    current_user: User = Depends(require_knowledge_base_manage),
+):
+    """按状态手动触发全部待解析文档解析，可选解析后自动入库。"""
+    auto_index = bool(payload and payload.auto_index)
+    params = (payload.params if payload else None) or {}
+    logger.debug(f"Parse pending documents for kb_id {kb_id}: {auto_index=} {params=}")
     db_info = await _ensure_database_supports_documents(kb_id, "文档解析")
-    return await _enqueue_parse_pending_task(kb_id, current_user.uid, db_info)
+    return await _enqueue_parse_pending_task(kb_id, current_user.uid, db_info, auto_index=auto_index, params=params)
 
 
 @knowledge.post("/databases/{kb_id}/documents/index")
@@ -1666,10 +1717,15 @@ async def query_test(
     meta: dict = Body(...),
     current_user: User = Depends(require_knowledge_base_read),
 ):
-    """测试查询知识库"""
+    """测试查询知识库；meta.include_trace=True 时同时返回各检索阶段的耗时 span 树。"""
     logger.debug(f"Query test in {kb_id}: {query}")
+    meta = dict(meta)
+    include_trace = bool(meta.pop("include_trace", False))
     try:
-        result = await knowledge_base.aquery(query, kb_id=kb_id, **meta)
+        with retrieval_trace("query_test", kb_id) as trace:
+            result = await knowledge_base.aquery(query, kb_id=kb_id, **meta)
+        if include_trace:
+            return {"results": result, "trace": trace.to_dict()}
         return result
     except Exception as e:
         logger.error(f"测试查询失败 {e}, {traceback.format_exc()}")
@@ -1709,6 +1765,76 @@ async def get_knowledge_base_query_params(kb_id: str, current_user: User = Depen
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@knowledge.post("/databases/{kb_id}/index/tune")
+async def tune_knowledge_base_search_params(
+    kb_id: str,
+    payload: TuneSearchParamsRequest | None = None,
+    current_user: User = Depends(require_knowledge_base_manage),
+):
+    """提交向量检索参数调优任务：抽样 chunk 向量，选出满足目标 recall@k 的最低开销检索参数。"""
+    payload = payload or TuneSearchParamsRequest()
+    database = await knowledge_base.get_database_info(kb_id)
+    if not database:
+        raise HTTPException(status_code=404, detail=f"知识库 {kb_id} 不存在")
+
+    async def run_tune(context: TaskContext):
+        await context.set_progress(5.0, "抽样向量并计算暴力检索基准")
+        result = await knowledge_base.tune_search_params(
+            kb_id, k=payload.k, target_recall=payload.target_recall, sample_size=payload.sample_size
+        )
+        await context.set_result(result)
+        await context.set_progress(
+            100.0, f"调优完成：{result['profile']} {result['params']}，recall@{result['k']}={result['recall']}"
+        )
+        return result
+
+    task, created = await tasker.enqueue_unique_by_payload(
+        name=f"检索参数调优 ({database.name})",
+        task_type=INDEX_TUNE_TASK_TYPE,
+        payload={"kb_id": kb_id, **payload.model_dump()},
+        coroutine=run_tune,
+        payload_match={"kb_id": kb_id},
+        statuses=ACTIVE_DOCUMENT_ACTION_TASK_STATUSES,
+    )
+    if not created:
+        raise HTTPException(status_code=409, detail="该知识库已有正在运行的检索参数调优任务")
+    return {"message": "检索参数调优任务已提交", "status": "queued", "task_id": task.id}
+
+
+@knowledge.post("/databases/{kb_id}/index/migrate-file-filter")
+async def migrate_knowledge_base_file_filter(
+    kb_id: str,
+    current_user: User = Depends(require_knowledge_base_manage),
+):
+    """提交后台任务：把旧向量集合重建为支持按文件/目录过滤的新 schema，迁移期间检索不中断。"""
+    database = await knowledge_base.get_database_info(kb_id)
+    if not database:
+        raise HTTPException(status_code=404, detail=f"知识库 {kb_id} 不存在")
+
+    async def run_migration(context: TaskContext):
+        await context.set_progress(5.0, "复制向量数据到新集合")
+        result = await knowledge_base.migrate_file_filter_schema(kb_id)
+        await context.set_result(result)
+        if result["status"] == "up_to_date":
+            message = "集合已是最新 schema"
+        else:
+            message = f"迁移完成：复制 {result['copied']} 个 chunk，重放 {result['replayed']} 个迁移期间写入的 chunk"
+        await context.set_progress(100.0, message)
+        return result
+
+    task, created = await tasker.enqueue_unique_by_payload(
+        name=f"文件过滤索引迁移 ({database.name})",
+        task_type=FILE_FILTER_MIGRATION_TASK_TYPE,
+        payload={"kb_id": kb_id},
+        coroutine=run_migration,
+        payload_match={"kb_id": kb_id},
+        statuses=ACTIVE_DOCUMENT_ACTION_TASK_STATUSES,
+    )
+    if not created:
+        raise HTTPException(status_code=409, detail="该知识库已有正在运行的文件过滤索引迁移任务")
+    return {"message": "文件过滤索引迁移任务已提交", "status": "queued", "task_id": task.id}
+
+
 # =============================================================================
 # === AI生成示例问题 ===
 # =============================================================================
@@ -1950,34 +2076,35 @@ async def upload_file(
     # 直接使用原始文件名（小写）
     filename = f"{basename}{ext}".lower()
 
+    # 分块落盘并增量计算哈希，内存占用与文件大小无关
     try:
-        file_bytes = await read_upload_with_limit(
+        async with spool_upload_with_hash(
             file,
             max_size_bytes=MAX_UPLOAD_SIZE_BYTES,
             too_large_message="文件过大，当前仅支持 100 MB 以内的文件",
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        ) as spooled:
+            content_hash = spooled.content_hash
+            file_size = spooled.size
 
-    content_hash = await calculate_content_hash(file_bytes)
-
-    file_exists = await knowledge_base.file_existed_in_db(kb_id, content_hash)
-    if file_exists:
-        raise HTTPException(
-            status_code=409,
-            detail="数据库中已经存在了相同内容文件，File with the same content already exists in this database",
-        )
+            file_exists = await knowledge_base.file_existed_in_db(kb_id, content_hash)
+            if file_exists:
+                raise HTTPException(
+                    status_code=409,
+                    detail="数据库中已经存在了相同内容文件，File with the same content already exists in this database",
+                )
 
-    # 直接上传到MinIO，添加时间戳区分版本
-    timestamp = int(time.time() * 1000)
-    minio_filename = f"{basename}_{timestamp}{ext}"
+            # 直接上传到MinIO，添加时间戳区分版本
+            timestamp = int(time.time() * 1000)
+            minio_filename = f"{basename}_{timestamp}{ext}"
 
-    bucket_name = MinIOClient.KB_BUCKETS["documents"]
-    folder = kb_id if kb_id else "unknown"
-    object_name = f"{folder}/upload/{minio_filename}"
+            bucket_name = MinIOClient.KB_BUCKETS["documents"]
+            folder = kb_id if kb_id else "unknown"
+            object_name = f"{folder}/upload/{minio_filename}"
 
-    # 上传到MinIO
-    minio_url = await aupload_file_to_minio(bucket_name, object_name, file_bytes)
+            # 从临时文件分片上传到MinIO
+            minio_url = await aupload_path_to_minio(bucket_name, object_name, spooled.path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # 检测同名文件（基于原始文件名）
     same_name_files = await knowledge_base.get_same_name_files(kb_id, filename)
@@ -1991,7 +2118,7 @@ async def upload_file(
         "content_hash": content_hash,
         "filename": filename,  # 原始文件名（小写）
         "original_filename": basename,  # 原始文件名（去掉后缀）
-        "size": len(file_bytes),
+        "size": file_size,
         "minio_filename": minio_filename,  # MinIO中的文件名（带时间戳）
         "object_name": object_name,
         "bucket_name": bucket_name,  # MinIO存储桶名称
@@ -4,12 +4,13 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, UploadFile
 from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from server.utils.auth_middleware import get_admin_user, get_db, get_required_user
+from yuxi.agents.graph_cache import invalidate_agent_graph_cache
 from yuxi.agents.skills.service import (
     confirm_personal_skill_install_draft,
     confirm_skill_install_draft,
@@ -46,8 +47,16 @@ from yuxi.agents.skills.remote_install import list_remote_skills, search_remote_
 from yuxi.storage.postgres.models_business import User
 from yuxi.utils.logging_config import logger
 
-skills = APIRouter(prefix="/system/skills", tags=["skills"])
-user_skills = APIRouter(prefix="/skills", tags=["skills"])
+
+async def _invalidate_agent_graphs_on_write(request: Request):
+    """Skill 写操作成功后清空已编译的 Agent graph 缓存。"""
+    yield
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        invalidate_agent_graph_cache("skill changed")
+
+
+skills = APIRouter(prefix="/system/skills", tags=["skills"], dependencies=[Depends(_invalidate_agent_graphs_on_write)])
+user_skills = APIRouter(prefix="/skills", tags=["skills"], dependencies=[Depends(_invalidate_agent_graphs_on_write)])
 
 
 class ShareConfigPayload(BaseModel):
@@ -4,11 +4,13 @@ from pathlib import Path
 import aiofiles
 import yaml
 from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from yuxi import config, get_version
 from yuxi.storage.postgres.models_business import User
 from yuxi.utils.logging_config import logger
+from yuxi.utils.prometheus import PROMETHEUS_CONTENT_TYPE
 
 from server.utils.auth_middleware import get_admin_user, get_db, get_required_user
 
@@ -258,3 +260,53 @@ async def get_ocr_health(
     from yuxi.services.ocr_service import check_all_ocr_health
 
     return {"health": await check_all_ocr_health(db)}
+
+
+# =============================================================================
+# === 检索缓存分组 ===
+# =============================================================================
+
+
+@system.get("/retrieval-cache/stats")
+async def get_retrieval_cache_stats(current_user: User = Depends(get_admin_user)):
+    """当前进程内 Query 向量缓存、检索结果缓存与重排序分数缓存的命中统计。"""
+
+    from yuxi.knowledge.query_embedding_cache import query_embedding_cache
+    from yuxi.knowledge.retrieval_cache import retrieval_result_cache
+    from yuxi.models.rerank_cache import rerank_score_cache
+
+    return {
+        "success": True,
+        "data": {
+            "query_embedding": query_embedding_cache.get_stats(),
+            "retrieval_result": retrieval_result_cache.get_stats(),
+            "rerank_score": rerank_score_cache.get_stats(),
+        },
+    }
+
+
+@system.get("/metrics/retrieval")
+async def get_retrieval_stage_metrics(current_user: User = Depends(get_admin_user)):
+    """检索各阶段耗时直方图（按阶段、知识库），Prometheus 文本格式。"""
+
+    from yuxi.knowledge.retrieval_trace import stage_latency
+
+    return PlainTextResponse(stage_latency.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@system.get("/metrics/embedding")
+async def get_embedding_concurrency_metrics(current_user: User = Depends(get_admin_user)):
+    """各 embedding 服务当前的 AIMD 并发窗口、在途请求数与限流次数，Prometheus 文本格式。"""
+
+    from yuxi.models.embed_batching import render_prometheus
+
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@system.get("/milvus/residency")
+async def get_milvus_residency(current_user: User = Depends(get_admin_user)):
+    """Milvus 集合的加载驻留状态：已加载集合、固定集合、LRU 释放次数与加载等待延迟。"""
+
+    from yuxi.knowledge.runtime import knowledge_base
+
+    return {"success": True, "data": knowledge_base.get_milvus_residency_stats()}
@@ -5,6 +5,10 @@ from fastapi import FastAPI
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 
 from yuxi.services.task_service import tasker
+from yuxi.models.embed import close_embedding_http_clients
+from yuxi.models.rerank import close_reranker_sessions
+from yuxi.knowledge.implementations.milvus_async import close_milvus_query_pools
+from yuxi.knowledge.retrieval_trace import close_trace_sink
 from yuxi.agents.mcp.service import ensure_builtin_mcp_servers_in_db
 from yuxi.models.providers.service import ensure_builtin_model_providers_in_db
 from yuxi.services.run_queue_service import close_queue_clients, get_redis_client
@@ -129,5 +133,9 @@ async def lifespan(app: FastAPI):
     await tasker.shutdown()
     shutdown_sandbox_provider()
     await close_queue_clients()
+    await close_embedding_http_clients()
+    await close_reranker_sessions()
+    await close_milvus_query_pools()
+    close_trace_sink()
     close_shared_neo4j_connection()
     await pg_manager.close()
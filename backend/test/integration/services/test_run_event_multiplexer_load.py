@@ -0,0 +1,80 @@
+"""Redis load coverage for run SSE streams sharing one blocking XREAD."""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from yuxi.services import agent_run_service
+from yuxi.services.run_queue_service import RunEventMultiplexer, append_run_stream_event, get_redis_client
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.integration]
+
+RUN_COUNT = 20
+CLIENTS_PER_RUN = 10
+EVENTS_PER_RUN = 30
+
+
+async def test_many_sse_clients_share_reader_with_one_db_read_each(monkeypatch: pytest.MonkeyPatch):
+    try:
+        redis = await get_redis_client()
+        await redis.ping()
+    except Exception as e:
+        pytest.skip(f"Redis unavailable: {e}")
+
+    run_ids = [f"pytest-mux-{uuid.uuid4()}" for _ in range(RUN_COUNT)]
+    db_reads = {"count": 0}
+
+    @asynccontextmanager
+    async def fake_session_ctx():
+        yield object()
+
+    class Repo:
+        def __init__(self, db):
+            self.db = db
+
+        async def get_run_for_user(self, run_id: str, uid: str):
+            del run_id, uid
+            db_reads["count"] += 1
+            return SimpleNamespace(status="running", conversation_thread_id="thread-1", request_id="req-1")
+
+    multiplexer = RunEventMultiplexer()
+    monkeypatch.setattr(agent_run_service.pg_manager, "get_async_session_context", fake_session_ctx)
+    monkeypatch.setattr(agent_run_service, "AgentRunRepository", Repo)
+    monkeypatch.setattr(agent_run_service, "get_run_event_multiplexer", lambda: multiplexer)
+
+    async def consume(run_id: str) -> list[str]:
+        events = []
+        async for chunk in agent_run_service.stream_agent_run_events(
+            run_id=run_id,
+            after_seq="0-0",
+            current_uid="user-1",
+        ):
+            events.append(chunk.split("\n", 1)[0])
+        return events
+
+    async def produce(run_id: str) -> None:
+        for index in range(EVENTS_PER_RUN):
+            await append_run_stream_event(run_id, "messages", {"items": [{"index": index}]})
+            await asyncio.sleep(0.005)
+        await append_run_stream_event(run_id, "end", {"status": "completed"})
+
+    try:
+        clients = [asyncio.create_task(consume(run_id)) for run_id in run_ids for _ in range(CLIENTS_PER_RUN)]
+        while len(multiplexer.watched_run_ids) < RUN_COUNT:
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*(produce(run_id) for run_id in run_ids))
+        results = await asyncio.wait_for(asyncio.gather(*clients), timeout=60)
+    finally:
+        await multiplexer.close()
+        await redis.delete(*(f"run:events:{run_id}" for run_id in run_ids))
+
+    expected = ["event: messages"] * EVENTS_PER_RUN + ["event: end"]
+    assert all(result == expected for result in results)
+    assert db_reads["count"] == RUN_COUNT * CLIENTS_PER_RUN
+    # XREAD 次数只随事件批次和订阅变化增长，与客户端数乘以事件数的轮询量无关。
+    assert multiplexer.xread_calls <= RUN_COUNT * (EVENTS_PER_RUN + 1) + RUN_COUNT * CLIENTS_PER_RUN
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from yuxi.agents.buildin.chatbot import graph as chatbot_graph
+from yuxi.agents.buildin.chatbot.context import ChatBotContext
+from yuxi.agents.graph_cache import CompiledGraphCache, build_graph_fingerprint
+
+pytestmark = pytest.mark.unit
+
+
+def _builder(counter: dict, value: str = "graph"):
+    async def build():
+        counter["builds"] = counter.get("builds", 0) + 1
+        await asyncio.sleep(0.01)
+        return f"{value}-{counter['builds']}"
+
+    return build
+
+
+def test_fingerprint_ignores_run_scoped_fields():
+    first = ChatBotContext(thread_id="t1", run_id="r1", uid="u1", tools=["search"])
+    second = ChatBotContext(thread_id="t2", run_id="r2", uid="u1", tools=["search"])
+
+    assert build_graph_fingerprint(first) == build_graph_fingerprint(second)
+    assert build_graph_fingerprint(first) != build_graph_fingerprint(ChatBotContext(uid="u1", tools=["calculator"]))
+    assert build_graph_fingerprint(first, mcp_config_hashes={"fs": "a"}) != build_graph_fingerprint(
+        first, mcp_config_hashes={"fs": "b"}
+    )
+
+    first._prompt_skills = ["writer"]
+    assert build_graph_fingerprint(first) != build_graph_fingerprint(second)
+
+
+async def test_concurrent_misses_build_once():
+    cache = CompiledGraphCache(max_entries=4, ttl_seconds=60)
+    counter: dict = {}
+
+    graphs = await asyncio.gather(*(cache.get_or_build("k", _builder(counter)) for _ in range(8)))
+
+    assert counter["builds"] == 1
+    assert set(graphs) == {"graph-1"}
+    assert cache.get_stats() == {"entries": 1, "hits": 7, "misses": 1}
+
+
+async def test_lru_ttl_and_invalidation():
+    cache = CompiledGraphCache(max_entries=2, ttl_seconds=60)
+    counter: dict = {}
+    for key in ("a:1", "b:1", "a:1", "c:1"):
+        await cache.get_or_build(key, _builder(counter))
+
+    # b 最久未使用，被淘汰
+    assert list(cache._entries) == ["a:1", "c:1"]
+
+    assert cache.invalidate(prefix="a:") == 1
+    assert list(cache._entries) == ["c:1"]
+
+    created_at, graph = cache._entries["c:1"]
+    cache._entries["c:1"] = (created_at - 61, graph)
+    builds = counter["builds"]
+    await cache.get_or_build("c:1", _builder(counter))
+    assert counter["builds"] == builds + 1
+
+
+async def test_result_built_across_invalidation_is_not_cached():
+    cache = CompiledGraphCache(max_entries=4, ttl_seconds=60)
+
+    async def build_then_invalidate():
+        cache.invalidate()
+        return "stale"
+
+    assert await cache.get_or_build("k", build_then_invalidate) == "stale"
+    assert cache.get_stats()["entries"] == 0
+
+
+async def test_chatbot_get_graph_reuses_compiled_graph_across_threads(monkeypatch):
+    cache = CompiledGraphCache(max_entries=8, ttl_seconds=60)
+    created: list[dict] = []
+    mcp_hashes = {"filesystem": "hash-1"}
+
+    async def prepare(context, **_kwargs):
+        return context
+
+    async def noop(*_args, **_kwargs):
+        return []
+
+    async def config_hashes(names):
+        return {name: mcp_hashes[name] for name in names if name in mcp_hashes}
+
+    def create_agent(**kwargs):
+        created.append(kwargs)
+        return SimpleNamespace(graph_no=len(created))
+
+    monkeypatch.setattr(chatbot_graph, "compiled_graph_cache", cache)
+    monkeypatch.setattr(chatbot_graph, "prepare_agent_runtime_context", prepare)
+    monkeypatch.setattr(chatbot_graph, "sync_agent_context_skills", noop)
+    monkeypatch.setattr(chatbot_graph, "resolve_chat_model_spec", lambda model: model or "fake:model")
+    monkeypatch.setattr(chatbot_graph, "load_chat_model", lambda fully_specified_name: object())
+    monkeypatch.setattr(chatbot_graph, "resolve_configured_runtime_tools", noop)
+    monkeypatch.setattr(chatbot_graph, "_build_middlewares", noop)
+    monkeypatch.setattr(chatbot_graph, "get_mcp_server_config_hashes", config_hashes)
+    monkeypatch.setattr(chatbot_graph, "create_agent", create_agent)
+
+    agent = chatbot_graph.ChatbotAgent.__new__(chatbot_graph.ChatbotAgent)
+    agent.checkpointer = object()
+
+    first = await agent.get_graph(ChatBotContext(thread_id="t1", run_id="r1", uid="u1", mcps=["filesystem"]))
+    second = await agent.get_graph(ChatBotContext(thread_id="t2", run_id="r2", uid="u1", mcps=["filesystem"]))
+    assert first is second
+    assert len(created) == 1
+
+    mcp_hashes["filesystem"] = "hash-2"
+    third = await agent.get_graph(ChatBotContext(thread_id="t3", uid="u1", mcps=["filesystem"]))
+    assert third is not first
+
+    cache.invalidate(prefix=f"{agent.id}:")
+    await agent.get_graph(ChatBotContext(thread_id="t4", uid="u1", mcps=["filesystem"]))
+    assert len(created) == 3
@@ -164,6 +164,18 @@ def test_create_agent_filesystem_middleware_uses_context_scope(monkeypatch):
     assert backend.default._readable_skills == ["worker-skill"]
 
 
+def test_filesystem_middleware_prefers_runtime_context_for_cached_graphs(monkeypatch):
+    monkeypatch.setattr("yuxi.agents.backends.sandbox.backend.get_sandbox_provider", lambda: object())
+    build_context = SimpleNamespace(thread_id="first-thread", uid="user-1", _readable_skills=["old-skill"])
+    run_context = SimpleNamespace(thread_id="second-thread", uid="user-1", _readable_skills=["new-skill"])
+
+    middleware = create_agent_filesystem_middleware(context=build_context)
+    backend = middleware.backend(SimpleNamespace(context=run_context))
+
+    assert backend.default._thread_id == "second-thread"
+    assert backend.default._readable_skills == ["new-skill"]
+
+
 def test_context_backend_construction_does_not_sync_skill_projection(monkeypatch, tmp_path) -> None:
     """每轮模型调用重建 backend 时不得扫描或复制 Skill。"""
     from yuxi.agents.skills import service as skill_service
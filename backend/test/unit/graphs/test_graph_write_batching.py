@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+import yuxi.knowledge.graphs.milvus_graph_service as graph_service_module
+from yuxi.knowledge.graphs.extractors import GraphExtractorFactory
+from yuxi.knowledge.graphs.milvus_graph_service import MilvusGraphService
+from yuxi.knowledge.graphs.write_batching import EntityLockStripes, collect_write_batch
+
+pytestmark = pytest.mark.unit
+
+
+async def test_collect_write_batch_flushes_by_size_time_and_sentinel():
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in range(5):
+        queue.put_nowait(item)
+
+    assert await collect_write_batch(queue, max_size=3, max_wait_seconds=1) == ([0, 1, 2], False)
+
+    started_at = time.monotonic()
+    assert await collect_write_batch(queue, max_size=3, max_wait_seconds=0.05) == ([3, 4], False)
+    assert time.monotonic() - started_at < 0.5
+
+    queue.put_nowait(5)
+    queue.put_nowait(None)
+    assert await collect_write_batch(queue, max_size=3, max_wait_seconds=1) == ([5], True)
+    queue.put_nowait(None)
+    assert await collect_write_batch(queue, max_size=3, max_wait_seconds=1) == ([], True)
+
+
+async def test_entity_lock_stripes_serialize_shared_entities_only():
+    locks = EntityLockStripes(stripes=1024)
+    active: set[str] = set()
+    overlaps: list[str] = []
+    max_parallel = 0
+
+    async def write(entity_ids: list[str]) -> None:
+        nonlocal max_parallel
+        async with locks.hold(entity_ids):
+            overlaps.extend(entity_id for entity_id in entity_ids if entity_id in active)
+            active.update(entity_ids)
+            max_parallel = max(max_parallel, len(active))
+            await asyncio.sleep(0.01)
+            active.difference_update(entity_ids)
+
+    await asyncio.gather(
+        write(["alpha", "beta"]),
+        write(["beta", "alpha"]),
+        write(["gamma"]),
+        write(["delta"]),
+    )
+
+    assert overlaps == []
+    assert max_parallel >= 3
+
+
+async def test_graph_build_coalesces_writes_into_parallel_batches(monkeypatch):
+    chunk_count = 60
+    chunks = [
+        SimpleNamespace(
+            id=index,
+            chunk_id=f"chunk_{index}",
+            file_id="file_1",
+            kb_id="kb_test",
+            chunk_index=index,
+            content=f"content {index}",
+            start_char_pos=0,
+            end_char_pos=10,
+            extraction_result=None,
+            graph_extraction_details={"status": "pending", "attempt_count": 0},
+            graph_structure_indexed=False,
+            graph_indexed=False,
+        )
+        for index in range(1, chunk_count + 1)
+    ]
+    kb = SimpleNamespace(
+        kb_type="milvus",
+        embedding_model_spec="test/embedding",
+        additional_params={
+            "graph_build_config": {
+                "locked": True,
+                "extractor_type": "llm",
+                "extractor_options": {"model_spec": "test/model", "concurrency_count": 8},
+            }
+        },
+    )
+
+    class ChunkRepo:
+        async def count_graph_pending_by_kb_id(self, kb_id):
+            return sum(not chunk.graph_indexed for chunk in chunks)
+
+        async def count_graph_indexed_by_kb_id(self, kb_id):
+            return sum(chunk.graph_indexed for chunk in chunks)
+
+        async def count_graph_extraction_statuses_by_kb_id(self, kb_id):
+            return {"pending": 0, "succeeded": len(chunks), "failed": 0}
+
+        async def list_graph_pending_by_kb_id(self, kb_id, limit, *, after_id=0):
+            return [chunk for chunk in chunks if chunk.id > after_id and not chunk.graph_indexed][:limit]
+
+        async def update_extraction_result(self, chunk_id, extraction_result, attempt_count=1):
+            return None
+
+        async def mark_graph_structure_indexed_batch(self, ent_ids_by_chunk_id):
+            for chunk in chunks:
+                if chunk.chunk_id in ent_ids_by_chunk_id:
+                    chunk.graph_structure_indexed = True
+
+    class Extractor:
+        extractor_type = "llm"
+
+        async def extract(self, text, *, chunk_metadata=None):
+            # 相邻 chunk 共享实体，制造跨批次的 MERGE 冲突。
+            index = chunk_metadata["chunk_index"]
+            await asyncio.sleep(0.001)
+            return {
+                "relations": [
+                    {
+                        "source": {"text": f"实体{index % 7}", "label": "Person"},
+                        "target": {"text": f"实体{(index + 1) % 7}", "label": "Person"},
+                        "text": text,
+                        "label": "KNOWS",
+                    }
+                ]
+            }
+
+    class GraphRepo:
+        def __init__(self):
+            self.upsert_calls = 0
+            self.rows_by_chunk: dict[str, int] = {}
+
+        async def upsert_chunk_graphs(self, *, kb_id, chunk_graphs):
+            self.upsert_calls += 1
+            for chunk_graph in chunk_graphs:
+                self.rows_by_chunk[chunk_graph["chunk_id"]] = len(chunk_graph["entities"])
+
+        async def claim_vector_records(self, **kwargs):
+            return "token", []
+
+        async def count_vector_statuses_by_kb_id(self, kb_id):
+            return {"pending": 0, "processing": 0, "indexed": 0, "failed": 0}
+
+        async def finalize_graph_indexed_chunks(self, kb_id):
+            for chunk in chunks:
+                if chunk.graph_structure_indexed:
+                    chunk.graph_indexed = True
+
+    class InMemoryGraphWriter:
+        """Neo4j 写入替身：记录事务批次，并检查并发事务是否触碰相同实体。"""
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.active_entities: set[str] = set()
+            self.transactions: list[list[str]] = []
+            self.conflicts = 0
+            self.max_active = 0
+            self.active = 0
+
+        def __call__(self, kb_id, prepared_graphs):
+            entity_ids = {row["entity_id"] for prepared in prepared_graphs for row in prepared["mention_rows"]}
+            with self.lock:
+                if entity_ids & self.active_entities:
+                    self.conflicts += 1
+                self.active_entities |= entity_ids
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                self.transactions.append([prepared["chunk_id"] for prepared in prepared_graphs])
+            time.sleep(0.005)
+            with self.lock:
+                self.active_entities -= entity_ids
+                self.active -= 1
+
+    monkeypatch.setattr(GraphExtractorFactory, "create", lambda extractor_type, options: Extractor())
+    monkeypatch.setattr(graph_service_module, "GRAPH_WRITE_BATCH_SIZE", 8)
+    monkeypatch.setattr(graph_service_module, "GRAPH_WRITE_BATCH_MAX_WAIT_SECONDS", 0.02)
+    monkeypatch.setattr(graph_service_module, "GRAPH_WRITE_WORKER_COUNT", 4)
+    graph_repo = GraphRepo()
+    writer = InMemoryGraphWriter()
+    service = MilvusGraphService(
+        kb_repo=SimpleNamespace(get_by_kb_id=AsyncMock(return_value=kb)),
+        chunk_repo=ChunkRepo(),
+        graph_repo=graph_repo,
+        graph_vector_store=SimpleNamespace(upsert_graph_records=AsyncMock()),
+    )
+    monkeypatch.setattr(service, "write_chunk_graph_batch", writer)
+
+    result = await asyncio.wait_for(service.build_pending_chunks("kb_test"), timeout=10)
+
+    assert result["success"] == chunk_count
+    assert result["write_failed"] == 0
+    written = [chunk_id for transaction in writer.transactions for chunk_id in transaction]
+    assert sorted(written) == sorted(chunk.chunk_id for chunk in chunks)
+    assert max(len(transaction) for transaction in writer.transactions) <= 8
+    assert len(writer.transactions) < chunk_count / 2
+    assert graph_repo.upsert_calls == len(writer.transactions)
+    assert set(graph_repo.rows_by_chunk.values()) == {2}
+    assert writer.conflicts == 0
+
+
+async def test_graph_build_isolates_failed_chunk_when_batch_write_fails(monkeypatch):
+    chunks = [
+        SimpleNamespace(
+            id=index,
+            chunk_id=f"chunk_{index}",
+            file_id="file_1",
+            kb_id="kb_test",
+            chunk_index=index,
+            content=f"content {index}",
+            start_char_pos=0,
+            end_char_pos=10,
+            extraction_result={"entities": [{"text": f"实体{index}"}], "relations": []},
+            graph_extraction_details={"status": "succeeded", "attempt_count": 1},
+            graph_structure_indexed=False,
+            graph_indexed=False,
+        )
+        for index in range(1, 5)
+    ]
+    kb = SimpleNamespace(
+        kb_type="milvus",
+        embedding_model_spec="test/embedding",
+        additional_params={
+            "graph_build_config": {
+                "locked": True,
+                "extractor_type": "llm",
+                "extractor_options": {"model_spec": "test/model", "concurrency_count": 1},
+            }
+        },
+    )
+    marked: list[str] = []
+
+    chunk_repo = SimpleNamespace(
+        count_graph_pending_by_kb_id=AsyncMock(side_effect=[4, 1]),
+        count_graph_indexed_by_kb_id=AsyncMock(return_value=0),
+        count_graph_extraction_statuses_by_kb_id=AsyncMock(return_value={"pending": 0, "succeeded": 4, "failed": 0}),
+        list_graph_pending_by_kb_id=AsyncMock(side_effect=[chunks, []]),
+        mark_graph_structure_indexed_batch=AsyncMock(side_effect=lambda ent_ids: marked.extend(ent_ids)),
+    )
+    graph_repo = SimpleNamespace(
+        upsert_chunk_graphs=AsyncMock(),
+        claim_vector_records=AsyncMock(return_value=("token", [])),
+        count_vector_statuses_by_kb_id=AsyncMock(
+            return_value={"pending": 0, "processing": 0, "indexed": 0, "failed": 0}
+        ),
+        finalize_graph_indexed_chunks=AsyncMock(return_value=0),
+    )
+    transactions: list[list[str]] = []
+
+    def flaky_writer(kb_id, prepared_graphs):
+        chunk_ids = [prepared["chunk_id"] for prepared in prepared_graphs]
+        transactions.append(chunk_ids)
+        if "chunk_3" in chunk_ids:
+            raise RuntimeError("neo4j rejected chunk_3")
+
+    monkeypatch.setattr(graph_service_module, "GRAPH_WRITE_BATCH_SIZE", 4)
+    monkeypatch.setattr(graph_service_module, "GRAPH_WRITE_BATCH_MAX_WAIT_SECONDS", 0.02)
+    monkeypatch.setattr(graph_service_module, "GRAPH_WRITE_WORKER_COUNT", 1)
+    service = MilvusGraphService(
+        kb_repo=SimpleNamespace(get_by_kb_id=AsyncMock(return_value=kb)),
+        chunk_repo=chunk_repo,
+        graph_repo=graph_repo,
+        graph_vector_store=SimpleNamespace(),
+    )
+    monkeypatch.setattr(service, "write_chunk_graph_batch", flaky_writer)
+
+    with pytest.raises(RuntimeError, match="write_failed=1"):
+        await service.build_pending_chunks("kb_test")
+
+    assert transactions[0] == ["chunk_1", "chunk_2", "chunk_3", "chunk_4"]
+    assert transactions[1:] == [["chunk_1"], ["chunk_2"], ["chunk_3"], ["chunk_4"]]
+    assert sorted(marked) == ["chunk_1", "chunk_2", "chunk_4"]
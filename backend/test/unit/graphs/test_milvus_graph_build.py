@@ -232,16 +232,14 @@ async def test_graph_build_keeps_extraction_concurrency_full_while_writes_are_bl
                 "last_error": error,
             }
 
-        async def get_by_chunk_id(self, chunk_id):
-            return next(chunk for chunk in chunks if chunk.chunk_id == chunk_id)
-
         async def mark_graph_indexed(self, chunk_id, ent_ids=None):
             chunk = next(chunk for chunk in chunks if chunk.chunk_id == chunk_id)
             chunk.graph_indexed = True
 
-        async def mark_graph_structure_indexed(self, chunk_id, ent_ids=None):
-            chunk = next(chunk for chunk in chunks if chunk.chunk_id == chunk_id)
-            chunk.graph_structure_indexed = True
+        async def mark_graph_structure_indexed_batch(self, ent_ids_by_chunk_id):
+            for chunk in chunks:
+                if chunk.chunk_id in ent_ids_by_chunk_id:
+                    chunk.graph_structure_indexed = True
 
     class Extractor:
         extractor_type = "llm"
@@ -276,7 +274,7 @@ async def test_graph_build_keeps_extraction_concurrency_full_while_writes_are_bl
         await release_writes.wait()
 
     class GraphRepo:
-        upsert_chunk_graph = AsyncMock(side_effect=wait_for_writes)
+        upsert_chunk_graphs = AsyncMock(side_effect=wait_for_writes)
 
         async def claim_vector_records(self, **kwargs):
             return "token", []
@@ -300,7 +298,7 @@ async def test_graph_build_keeps_extraction_concurrency_full_while_writes_are_bl
         graph_repo=graph_repo,
         graph_vector_store=graph_vector_store,
     )
-    monkeypatch.setattr(service, "write_chunk_graph", lambda kb_id, chunk, result: ([], []))
+    monkeypatch.setattr(service, "write_chunk_graph_batch", lambda kb_id, prepared_graphs: None)
 
     build_task = asyncio.create_task(service.build_pending_chunks("kb_test"))
     await asyncio.wait_for(all_extractions_finished.wait(), timeout=1)
@@ -448,18 +446,16 @@ async def test_graph_build_indexes_vectors_after_structure_write(monkeypatch):
         async def list_graph_pending_by_kb_id(self, kb_id, limit, *, after_id=0):
             return [chunk] if chunk.id > after_id and not chunk.graph_indexed else []
 
-        async def get_by_chunk_id(self, chunk_id):
-            return chunk
-
-        async def mark_graph_structure_indexed(self, chunk_id, ent_ids):
-            chunk.graph_structure_indexed = True
+        async def mark_graph_structure_indexed_batch(self, ent_ids_by_chunk_id):
+            if chunk.chunk_id in ent_ids_by_chunk_id:
+                chunk.graph_structure_indexed = True
 
     class GraphRepo:
         def __init__(self):
             self.pending = False
             self.indexed = False
 
-        async def upsert_chunk_graph(self, **kwargs):
+        async def upsert_chunk_graphs(self, **kwargs):
             self.pending = True
 
         async def claim_vector_records(self, *, record_type, **kwargs):
@@ -496,11 +492,7 @@ async def test_graph_build_indexes_vectors_after_structure_write(monkeypatch):
         graph_repo=graph_repo,
         graph_vector_store=vector_store,
     )
-    monkeypatch.setattr(
-        service,
-        "write_chunk_graph",
-        lambda kb_id, chunk, result: ([{"entity_id": "entity_1"}], []),
-    )
+    monkeypatch.setattr(service, "write_chunk_graph_batch", lambda kb_id, prepared_graphs: None)
 
     result = await service.build_pending_chunks("kb_test")
 
@@ -558,17 +550,15 @@ async def test_graph_build_fails_after_three_vector_attempts(monkeypatch):
         async def list_graph_pending_by_kb_id(self, kb_id, limit, *, after_id=0):
             return [chunk] if chunk.id > after_id else []
 
-        async def get_by_chunk_id(self, chunk_id):
-            return chunk
-
-        async def mark_graph_structure_indexed(self, chunk_id, ent_ids):
-            chunk.graph_structure_indexed = True
+        async def mark_graph_structure_indexed_batch(self, ent_ids_by_chunk_id):
+            if chunk.chunk_id in ent_ids_by_chunk_id:
+                chunk.graph_structure_indexed = True
 
     class GraphRepo:
         attempts = 0
         status = "pending"
 
-        async def upsert_chunk_graph(self, **kwargs):
+        async def upsert_chunk_graphs(self, **kwargs):
             return None
 
         async def claim_vector_records(self, *, record_type, **kwargs):
@@ -602,7 +592,7 @@ async def test_graph_build_fails_after_three_vector_attempts(monkeypatch):
         graph_repo=graph_repo,
         graph_vector_store=SimpleNamespace(upsert_graph_records=AsyncMock(side_effect=RuntimeError("embed failed"))),
     )
-    monkeypatch.setattr(service, "write_chunk_graph", lambda kb_id, chunk, result: ([{"entity_id": "e"}], []))
+    monkeypatch.setattr(service, "write_chunk_graph_batch", lambda kb_id, prepared_graphs: None)
 
     with pytest.raises(RuntimeError, match="vector_failed=1"):
         await service.build_pending_chunks("kb_test")
@@ -647,7 +637,7 @@ async def test_graph_reconcile_skips_completed_structure(monkeypatch):
     class GraphRepo:
         pending = True
 
-        async def upsert_chunk_graph(self, **kwargs):
+        async def upsert_chunk_graphs(self, **kwargs):
             raise AssertionError("reconcile must not rewrite graph structure")
 
         async def claim_vector_records(self, *, record_type, **kwargs):
@@ -675,12 +665,12 @@ async def test_graph_reconcile_skips_completed_structure(monkeypatch):
         graph_repo=GraphRepo(),
         graph_vector_store=SimpleNamespace(upsert_graph_records=AsyncMock()),
     )
-    monkeypatch.setattr(service, "write_chunk_graph", MagicMock(side_effect=AssertionError("must not write")))
+    monkeypatch.setattr(service, "write_chunk_graph_batch", MagicMock(side_effect=AssertionError("must not write")))
 
     result = await service.build_pending_chunks("kb_test")
 
     assert result["success"] == 1
-    service.write_chunk_graph.assert_not_called()
+    service.write_chunk_graph_batch.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -845,8 +835,10 @@ def test_milvus_graph_service_writes_chunk_entity_and_relation():
     assert any("MERGE (c:Chunk:MilvusKB:`kb_test`" in query for query in queries)
     assert any("MERGE (e:Entity:MilvusKB:`kb_test`" in query for query in queries)
     assert any("MERGE (source)-[r:RELATION" in query for query in queries)
+    assert all("UNWIND $rows AS row" in query for query in queries)
     entity_call = next(call for call in tx.run.call_args_list if "MERGE (e:Entity" in call.args[0])
-    assert entity_call.kwargs["attributes"] == '[{"text": "工程师", "label": "Occupation"}]'
+    attributes_by_name = {row["name"]: row["attributes"] for row in entity_call.kwargs["rows"]}
+    assert attributes_by_name["张三"] == '[{"text": "工程师", "label": "Occupation"}]'
 
 
 def test_graph_vector_store_uses_idempotent_upsert():
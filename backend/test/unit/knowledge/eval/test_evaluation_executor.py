@@ -0,0 +1,255 @@
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from yuxi.knowledge.eval import evaluator
+from yuxi.knowledge.eval import executor as executor_module
+from yuxi.knowledge.eval import service as eval_service_module
+from yuxi.knowledge.eval.executor import StageRateLimiter, run_concurrent_evaluation
+from yuxi.knowledge.eval.service import EvaluationService
+
+RETRIEVAL_LATENCY = 0.05
+LLM_LATENCY = 0.02
+
+
+class FakeContext:
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.task_id = "task-1"
+        self.cancellation_reason = None
+        self.results: list[dict] = []
+        self.messages: list[str] = []
+
+    async def set_progress(self, progress: float, message: str | None = None) -> None:
+        return None
+
+    async def set_result(self, result: dict) -> None:
+        self.results.append(result)
+
+    async def set_message(self, message: str) -> None:
+        self.messages.append(message)
+
+    async def raise_if_cancelled(self) -> None:
+        return None
+
+    def is_cancel_requested(self) -> bool:
+        return False
+
+
+class FakeEvaluationRepository:
+    def __init__(self, item_count: int):
+        self.dataset = SimpleNamespace(
+            dataset_id="dataset-1", kb_id="kb-1", has_gold_chunks=True, has_gold_answers=True
+        )
+        self.items = [
+            SimpleNamespace(
+                item_id=f"item-{index}", query_text=f"q{index}", gold_chunk_ids=[f"c{index}"], gold_answer="a"
+            )
+            for index in range(item_count)
+        ]
+        self.run_items: dict[int, dict] = {}
+        self.upsert_batches: list[list[int]] = []
+        self.run_updates: list[dict] = []
+
+    async def get_dataset(self, dataset_id: str):
+        return self.dataset
+
+    async def list_all_dataset_items(self, dataset_id: str):
+        return self.items
+
+    async def list_run_item_metrics(self, run_id: str):
+        return [(index, data["metrics"]) for index, data in sorted(self.run_items.items())]
+
+    async def upsert_run_items(self, run_id: str, items: list[tuple[int, dict]]) -> None:
+        await asyncio.sleep(0.001)
+        self.upsert_batches.append([index for index, _ in items])
+        self.run_items.update(dict(items))
+
+    async def update_run(self, run_id: str, data: dict) -> None:
+        self.run_updates.append(data)
+
+
+class FakeLLM:
+    async def call(self, prompt: str, stream: bool = False):
+        await asyncio.sleep(LLM_LATENCY)
+        if "公正的评判者" in prompt:
+            return SimpleNamespace(content='{"score": 1.0, "reasoning": "一致"}')
+        return SimpleNamespace(content="a")
+
+
+def _install_fakes(monkeypatch, *, fail_on: set[int] | None = None, batches: list[int] | None = None) -> list[int]:
+    queried: list[int] = []
+
+    async def fake_aquery(query: str, kb_id: str, **kwargs):
+        index = int(query[1:])
+        queried.append(index)
+        await asyncio.sleep(RETRIEVAL_LATENCY)
+        if fail_on and index in fail_on:
+            raise RuntimeError(f"retrieval failed for {query}")
+        chunk_id = f"c{index}" if index % 2 == 0 else "other"
+        return [{"chunk_id": chunk_id, "content": f"内容 {index}"}]
+
+    async def fake_aquery_many(kb_id: str, queries: list[str], **kwargs):
+        if batches is not None:
+            batches.append(len(queries))
+        return list(await asyncio.gather(*(fake_aquery(query, kb_id, **kwargs) for query in queries)))
+
+    monkeypatch.setattr(evaluator, "kb_manager", SimpleNamespace(aquery=fake_aquery, aquery_many=fake_aquery_many))
+    monkeypatch.setattr(eval_service_module, "select_model", lambda **_: FakeLLM())
+    return queried
+
+
+def _make_service(repo: FakeEvaluationRepository) -> EvaluationService:
+    service = EvaluationService.__new__(EvaluationService)
+    service.eval_repo = repo
+    return service
+
+
+def _payload(concurrency: int) -> dict:
+    return {
+        "run_id": "run-1",
+        "kb_id": "kb-1",
+        "dataset_id": "dataset-1",
+        "retrieval_config": {"answer_llm": "fake:llm"},
+        "concurrency": concurrency,
+    }
+
+
+async def test_run_concurrent_evaluation_batches_every_result_once():
+    batches: list[list[int]] = []
+
+    async def evaluate(item: int) -> int:
+        await asyncio.sleep(0.001 * (item % 3))
+        return item * 10
+
+    async def on_batch(batch):
+        batches.append([item for item, _ in batch])
+        assert all(result == item * 10 for item, result in batch)
+
+    await run_concurrent_evaluation(range(10), evaluate, on_batch=on_batch, concurrency=4, batch_size=3)
+
+    assert sorted(item for batch in batches for item in batch) == list(range(10))
+    assert all(len(batch) <= 3 for batch in batches)
+
+
+async def test_stage_rate_limiter_spaces_requests():
+    limiter = StageRateLimiter(rate_per_second=50)
+
+    started_at = time.monotonic()
+    await asyncio.gather(*(limiter.acquire() for _ in range(6)))
+
+    assert time.monotonic() - started_at >= 5 / 50 * 0.9
+
+
+async def test_concurrent_run_is_faster_than_sequential_latency(monkeypatch):
+    item_count = 24
+    repo = FakeEvaluationRepository(item_count)
+    _install_fakes(monkeypatch)
+    context = FakeContext(_payload(concurrency=8))
+
+    started_at = time.monotonic()
+    await _make_service(repo)._run_evaluation_task(context)
+    elapsed = time.monotonic() - started_at
+
+    sequential_latency = item_count * (RETRIEVAL_LATENCY + 2 * LLM_LATENCY)
+    assert elapsed < sequential_latency / 3
+    assert sorted(repo.run_items) == list(range(item_count))
+    final = repo.run_updates[-1]
+    assert final["status"] == "completed"
+    assert final["completed_items"] == item_count
+    assert final["metrics"]["recall@10"] == pytest.approx(0.5)
+    assert final["metrics"]["answer_correctness"] == pytest.approx(1.0)
+    assert final["overall_score"] == pytest.approx(1.0)
+
+
+async def test_concurrent_retrievals_share_batched_queries(monkeypatch):
+    item_count = 24
+    repo = FakeEvaluationRepository(item_count)
+    batches: list[int] = []
+    queried = _install_fakes(monkeypatch, batches=batches)
+
+    await _make_service(repo)._run_evaluation_task(FakeContext(_payload(concurrency=8)))
+
+    assert sorted(queried) == list(range(item_count))
+    assert sum(batches) == item_count
+    assert len(batches) < item_count / 2
+    assert max(batches) <= 8
+
+
+async def test_retrieval_batcher_flushes_partial_batch_and_propagates_errors():
+    calls: list[list[str]] = []
+
+    async def run_batch(queries: list[str]):
+        calls.append(queries)
+        if "bad" in queries:
+            raise RuntimeError("batch failed")
+        return [f"result:{query}" for query in queries]
+
+    batcher = executor_module.RetrievalBatcher(run_batch, max_batch=4, max_wait_seconds=0.01)
+
+    assert await asyncio.gather(batcher.aquery("a"), batcher.aquery("b")) == ["result:a", "result:b"]
+    assert calls == [["a", "b"]]
+
+    assert await asyncio.gather(*(batcher.aquery(query) for query in "cdef")) == [f"result:{q}" for q in "cdef"]
+    assert calls[-1] == ["c", "d", "e", "f"]
+
+    with pytest.raises(RuntimeError, match="batch failed"):
+        await batcher.aquery("bad")
+
+
+async def test_retrieval_batcher_fails_waiters_on_wrong_result_count_or_cancellation():
+    started = asyncio.Event()
+
+    async def short_batch(queries: list[str]):
+        return [f"result:{query}" for query in queries[:-1]]
+
+    batcher = executor_module.RetrievalBatcher(short_batch, max_batch=3, max_wait_seconds=0.01)
+    results = await asyncio.gather(*(batcher.aquery(query) for query in "abc"), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert "returned 2 results for 3 queries" in str(results[0])
+
+    async def hanging_batch(queries: list[str]):
+        started.set()
+        await asyncio.Event().wait()
+
+    batcher = executor_module.RetrievalBatcher(hanging_batch, max_batch=2, max_wait_seconds=0.01)
+    waiters = [asyncio.create_task(batcher.aquery(query)) for query in "xy"]
+    await started.wait()
+    for task in batcher._tasks:
+        task.cancel()
+    # 批任务被取消时等待方随之取消，而不是一直挂起
+    results = await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True), timeout=1)
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+
+async def test_interrupted_run_resumes_from_checkpoint(monkeypatch):
+    item_count = 20
+    monkeypatch.setattr(executor_module, "EVAL_RESULT_BATCH_SIZE", 2)
+    repo = FakeEvaluationRepository(item_count)
+    _install_fakes(monkeypatch, fail_on={13})
+
+    with pytest.raises(RuntimeError, match="retrieval failed"):
+        await _make_service(repo)._run_evaluation_task(FakeContext(_payload(concurrency=4)))
+
+    assert repo.run_updates[-1]["status"] == "failed"
+    checkpointed = set(repo.run_items)
+    assert 13 not in checkpointed
+    assert len(checkpointed) >= 10
+
+    queried = _install_fakes(monkeypatch)
+    context = FakeContext(_payload(concurrency=4))
+    await _make_service(repo)._run_evaluation_task(context)
+
+    assert sorted(queried) == sorted(set(range(item_count)) - checkpointed)
+    assert sorted(repo.run_items) == list(range(item_count))
+    final = repo.run_updates[-1]
+    assert final["status"] == "completed"
+    assert final["completed_items"] == item_count
+    assert final["metrics"]["recall@10"] == pytest.approx(0.5)
+    assert final["metrics"]["answer_correctness"] == pytest.approx(1.0)
+    assert context.results[-1]["completed_items"] == item_count
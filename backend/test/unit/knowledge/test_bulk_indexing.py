@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from datetime import timedelta
+
+import pytest
+
+import yuxi.knowledge.bulk_indexing as bulk_module
+from yuxi.knowledge.file_claims import FILE_CLAIM_LEASE_SECONDS
+from yuxi.knowledge.bulk_indexing import INDEX_STAGE, PARSE_STAGE, KBBulkIndexingScheduler
+from yuxi.models.embed_batching import AIMDConcurrencyController
+from yuxi.utils.datetime_utils import utc_now_naive
+
+pytestmark = pytest.mark.unit
+
+FILE_COUNT = 1_000
+CHUNKS_PER_FILE = 3
+PARSE_STATUSES = ["uploaded"]
+INDEX_STATUSES = ["parsed", "error_indexing"]
+
+
+class Gauge:
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        self.current -= 1
+
+
+class FakeKnowledgeBase:
+    """以内存字典模拟持久化的文件状态；解析 / 入库只做短暂等待，embedding 走共享的 AIMD 并发窗口。
+
+    认领文件时写入处理租约，处理中的进程视为持续续约；``process`` 返回共享同一份文件状态的另一个进程。
+    """
+
+    def __init__(self, file_count: int, *, broken_pdfs=(), broken_chunks=(), embedding_window: int = 4):
+        self.owner = "process-a"
+        self.files = {f"file_{index:04d}": {"status": "uploaded", "claimed_by": None} for index in range(file_count)}
+        self.broken_pdfs = set(broken_pdfs)
+        self.broken_chunks = set(broken_chunks)
+        self.embedding = AIMDConcurrencyController("fake-embedding", max_window=embedding_window)
+        self.parse_calls = Counter()
+        self.index_calls = Counter()
+        self.parsing = Gauge()
+        self.indexing = Gauge()
+        self.embedding_in_flight = Gauge()
+        self.lost_claims: list[str] = []
+
+    def process(self, owner: str) -> FakeKnowledgeBase:
+        other = object.__new__(FakeKnowledgeBase)
+        other.__dict__.update(self.__dict__)
+        other.owner = owner
+        return other
+
+    def expire_claims(self) -> None:
+        """模拟持有租约的进程退出后租约到期。"""
+        for record in self.files.values():
+            if record["claimed_by"] is not None:
+                record["claim_expires_at"] -= timedelta(seconds=FILE_CLAIM_LEASE_SECONDS + 1)
+
+    def _claim(self, file_id: str, allowed: set[str], status: str) -> None:
+        current = self.files[file_id]["status"]
+        if current not in allowed:
+            raise ValueError(f"Cannot process file with status '{current}'")
+        self.files[file_id] = {
+            "status": status,
+            "claimed_by": self.owner,
+            "claim_expires_at": utc_now_naive() + timedelta(seconds=FILE_CLAIM_LEASE_SECONDS),
+        }
+
+    def _set_status(self, file_id: str, status: str) -> None:
+        if self.files[file_id]["claimed_by"] != self.owner:
+            self.lost_claims.append(file_id)
+        self.files[file_id] = {"status": status, "claimed_by": None}
+
+    async def list_document_file_ids_by_statuses(self, kb_id, *, statuses, after_file_id=None, limit=500):
+        file_ids = sorted(
+            file_id
+            for file_id, record in self.files.items()
+            if record["status"] in statuses and (after_file_id is None or file_id > after_file_id)
+        )
+        return file_ids[:limit]
+
+    async def parse_file(self, kb_id, file_id, operator_id=None):
+        self._claim(file_id, {"uploaded", "error_parsing"}, "parsing")
+        self.parse_calls[file_id] += 1
+        with self.parsing:
+            await asyncio.sleep(0.001)
+        if file_id in self.broken_pdfs:
+            self._set_status(file_id, "error_parsing")
+            raise ValueError("broken pdf")
+        self._set_status(file_id, "parsed")
+        return {"file_id": file_id, "status": "parsed"}
+
+    async def update_file_params(self, kb_id, file_id, params, operator_id=None):
+        return None
+
+    async def index_file(self, kb_id, file_id, operator_id=None, params=None):
+        self._claim(file_id, {"parsed", "error_indexing", "indexed"}, "indexing")
+        self.index_calls[file_id] += 1
+        with self.indexing:
+            async with self.embedding.slot():
+                with self.embedding_in_flight:
+                    await asyncio.sleep(0.001)
+                self.embedding.on_success()
+        if file_id in self.broken_chunks:
+            self._set_status(file_id, "error_indexing")
+            raise RuntimeError("milvus insert failed")
+        self._set_status(file_id, "indexed")
+        return {
+            "file_id": file_id,
+            "status": "indexed",
+            "reindex": {"reused": 0, "embedded": CHUNKS_PER_FILE, "removed": 0},
+        }
+
+    async def recover_interrupted_files(self, kb_id):
+        recovered = 0
+        now = utc_now_naive()
+        for file_id, record in self.files.items():
+            target = {"parsing": "uploaded", "indexing": "parsed"}.get(record["status"])
+            if target and record["claim_expires_at"] < now:
+                self.files[file_id] = {"status": target, "claimed_by": None}
+                recovered += 1
+        return recovered
+
+    def statuses(self) -> Counter:
+        return Counter(record["status"] for record in self.files.values())
+
+
+class FakeTaskContext:
+    def __init__(self, cancel_when=None):
+        self.progress: list[tuple[float, str | None]] = []
+        self.cancel_when = cancel_when
+
+    async def set_progress(self, progress, message=None):
+        self.progress.append((progress, message))
+
+    async def raise_if_cancelled(self):
+        if self.cancel_when is not None and self.cancel_when():
+            raise asyncio.CancelledError("Task was cancelled")
+
+
+def _scheduler(kb, context, **kwargs):
+    results = []
+    scheduler = KBBulkIndexingScheduler(
+        kb,
+        "kb_bulk",
+        stages=(PARSE_STAGE, INDEX_STAGE),
+        statuses={PARSE_STAGE: PARSE_STATUSES, INDEX_STAGE: INDEX_STATUSES},
+        initial_total=len(kb.files),
+        context=context,
+        on_result=lambda stage, item: results.append((stage, item)),
+        parse_workers=4,
+        index_workers=16,
+        page_size=100,
+        **kwargs,
+    )
+    return scheduler, results
+
+
+async def test_synthetic_kb_is_parsed_and_indexed_concurrently_with_failures_isolated(monkeypatch):
+    monkeypatch.setattr(bulk_module, "KB_BULK_PROGRESS_INTERVAL_SECONDS", 0.0)
+    broken_pdfs = {f"file_{index:04d}" for index in range(0, FILE_COUNT, 97)}
+    broken_chunks = {f"file_{index:04d}" for index in range(5, FILE_COUNT, 101)}
+    kb = FakeKnowledgeBase(FILE_COUNT, broken_pdfs=broken_pdfs, broken_chunks=broken_chunks)
+    context = FakeTaskContext()
+    scheduler, results = _scheduler(kb, context)
+
+    summary = await scheduler.run()
+
+    failed = len(broken_pdfs) + len(broken_chunks)
+    assert summary == {
+        "processed": FILE_COUNT,
+        "failed": failed,
+        "recovered": 0,
+        "stages": {PARSE_STAGE: FILE_COUNT - len(broken_pdfs), INDEX_STAGE: FILE_COUNT - failed},
+    }
+    assert kb.statuses() == {
+        "indexed": FILE_COUNT - failed,
+        "error_parsing": len(broken_pdfs),
+        "error_indexing": len(broken_chunks),
+    }
+    # 每个文件每个阶段只处理一次，解析失败的文件不进入入库阶段
+    assert set(kb.parse_calls.values()) == {1} and len(kb.parse_calls) == FILE_COUNT
+    assert set(kb.index_calls.values()) == {1} and not broken_pdfs & set(kb.index_calls)
+    assert sorted(item["file_id"] for _, item in results) == sorted(kb.files)
+    # 解析与入库各自的并发预算，embedding 请求受跨文件共享的并发窗口约束
+    assert 1 < kb.parsing.peak <= 4
+    assert 4 < kb.indexing.peak <= 16
+    assert kb.embedding_in_flight.peak == 4
+    progress = [value for value, _ in context.progress]
+    assert progress == sorted(progress) and progress[-1] == 95.0
+    assert context.progress[-1][1] == (
+        f"已处理 {FILE_COUNT}/{FILE_COUNT} 个文档（解析 {FILE_COUNT - len(broken_pdfs)}，"
+        f"入库 {FILE_COUNT - failed}，失败 {failed}，进行中 0）"
+    )
+
+
+async def test_interrupted_job_resumes_from_persisted_file_status():
+    kb = FakeKnowledgeBase(FILE_COUNT)
+    crashed = FakeTaskContext(cancel_when=lambda: sum(kb.index_calls.values()) >= 300)
+    scheduler, _ = _scheduler(kb, crashed)
+
+    with pytest.raises(asyncio.CancelledError):
+        await scheduler.run()
+
+    interrupted = kb.statuses()["parsing"] + kb.statuses()["indexing"]
+    indexed_before_restart = {file_id for file_id, record in kb.files.items() if record["status"] == "indexed"}
+    assert interrupted > 0 and 0 < len(indexed_before_restart) < FILE_COUNT
+
+    # 租约未到期前，其他调度器不会回退这些文件
+    assert await kb.process("process-b").recover_interrupted_files("kb_bulk") == 0
+
+    # 模拟进程重启：崩溃进程不再续约，租约到期后由新进程回退并续跑
+    kb.expire_claims()
+    scheduler, results = _scheduler(kb.process("process-b"), FakeTaskContext())
+    summary = await scheduler.run()
+
+    assert summary["recovered"] == interrupted
+    assert summary["failed"] == 0
+    assert kb.statuses() == {"indexed": FILE_COUNT}
+    # 已完成的文件不会重复处理，只有中断的文件会重做对应阶段
+    assert not indexed_before_restart & {item["file_id"] for _, item in results}
+    assert summary["processed"] == FILE_COUNT - len(indexed_before_restart)
+    assert max(kb.parse_calls.values()) <= 2 and max(kb.index_calls.values()) <= 2
+    assert sum(kb.parse_calls.values()) + sum(kb.index_calls.values()) <= 2 * FILE_COUNT + interrupted
+
+
+async def test_concurrent_schedulers_do_not_reset_each_others_claims():
+    kb = FakeKnowledgeBase(200)
+    first, _ = _scheduler(kb, FakeTaskContext())
+    first_run = asyncio.create_task(first.run())
+    while not kb.index_calls:
+        await asyncio.sleep(0.001)
+
+    second, _ = _scheduler(kb.process("process-b"), FakeTaskContext())
+    first_summary, second_summary = await asyncio.gather(first_run, second.run())
+
+    assert first_summary["recovered"] == second_summary["recovered"] == 0
+    assert not kb.lost_claims
+    assert kb.statuses() == {"indexed": 200}
+    # 同一文件同一时刻只被一个调度器认领，抢不到的一方记为失败并跳过
+    assert set(kb.parse_calls.values()) == {1}
+
+
+async def test_single_stage_job_only_processes_entry_statuses():
+    kb = FakeKnowledgeBase(20, broken_pdfs={"file_0003"})
+    scheduler = KBBulkIndexingScheduler(
+        kb, "kb_bulk", stages=(PARSE_STAGE,), statuses={PARSE_STAGE: PARSE_STATUSES}, page_size=8
+    )
+
+    summary = await scheduler.run()
+
+    assert summary == {"processed": 20, "failed": 1, "recovered": 0, "stages": {PARSE_STAGE: 19}}
+    assert kb.statuses() == {"parsed": 19, "error_parsing": 1}
+    assert not kb.index_calls
+    with pytest.raises(ValueError):
+        KBBulkIndexingScheduler(kb, "kb_bulk", stages=(PARSE_STAGE,), statuses={INDEX_STAGE: INDEX_STATUSES})
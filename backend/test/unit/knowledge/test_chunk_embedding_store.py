@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import itertools
+import types
+
+import pytest
+
+import yuxi.knowledge.chunk_embedding_store as store_module
+import yuxi.knowledge.implementations.milvus as milvus_module
+from yuxi.knowledge.chunk_embedding_store import (
+    ChunkEmbeddingStore,
+    SqliteChunkEmbeddingBackend,
+    chunk_text_hash,
+    create_chunk_embedding_backend,
+)
+from yuxi.knowledge.implementations.milvus import MilvusKB
+
+pytestmark = pytest.mark.unit
+
+SPEC = "test:embedding"
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+    @property
+    def texts(self) -> list[str]:
+        return [text for call in self.calls for text in call]
+
+
+class BrokenBackend:
+    def is_ready(self):
+        return True
+
+    async def get_many(self, model_spec, content_hashes, dimension=None):
+        raise ConnectionError("database is down")
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SqliteChunkEmbeddingBackend(tmp_path / "chunk_embeddings.sqlite3")
+    yield backend
+    backend.close()
+
+
+async def test_reuses_vectors_across_batches_and_deduplicates_within_batch(backend):
+    store = ChunkEmbeddingStore(backend)
+    embed = CountingEmbedder()
+
+    first = await store.get_or_embed_many(SPEC, ["免责声明", "正文 A", "免责声明"], embed)
+    second = await store.get_or_embed_many(SPEC, ["免责声明\r\n", "正文 B"], embed)
+    other_model = await store.get_or_embed_many("other:embedding", ["免责声明"], embed)
+
+    assert embed.calls == [["免责声明", "正文 A"], ["正文 B"], ["免责声明"]]
+    assert first[0] == first[2] == second[0] == [4.0, 0.5]
+    assert other_model == [[4.0, 0.5]]
+    assert store.get_stats() == {
+        "requested": 6,
+        "deduplicated": 1,
+        "hits": 1,
+        "embedded": 4,
+        "evicted": 0,
+        "reuse_ratio": 2 / 6,
+    }
+    assert await backend.count() == 4
+
+
+def test_normalization_keeps_inner_whitespace():
+    assert chunk_text_hash("| a | b |\r\n| 1 | 2 |  ") == chunk_text_hash("| a | b |\n| 1 | 2 |")
+    assert chunk_text_hash("a  b") != chunk_text_hash("a b")
+
+
+async def test_gc_evicts_least_recently_used_over_cap(backend, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(store_module.time, "time", lambda: float(next(clock)))
+    store = ChunkEmbeddingStore(backend, max_entries=10, gc_interval=1_000)
+    embed = CountingEmbedder()
+
+    texts = [f"chunk-{index}" for index in range(12)]
+    for text in texts:
+        await store.get_or_embed_many(SPEC, [text], embed)
+    # 最早写入的 chunk-0 重新被使用，不应被淘汰
+    await store.get_or_embed_many(SPEC, ["chunk-0"], embed)
+
+    assert await store.gc() == 3
+    assert await backend.count() == 9
+
+    embed.calls.clear()
+    await store.get_or_embed_many(SPEC, texts, embed)
+    assert embed.calls == [["chunk-1", "chunk-2", "chunk-3"]]
+
+
+async def test_gc_runs_after_interval(backend):
+    store = ChunkEmbeddingStore(backend, max_entries=4, gc_interval=5)
+    embed = CountingEmbedder()
+
+    await store.get_or_embed_many(SPEC, [f"chunk-{index}" for index in range(4)], embed)
+    assert await backend.count() == 4
+    await store.get_or_embed_many(SPEC, ["chunk-4"], embed)
+
+    assert store.evicted == 2 and await backend.count() == 3
+
+
+async def test_unavailable_backend_falls_back_to_embedding():
+    store = ChunkEmbeddingStore(BrokenBackend())
+    embed = CountingEmbedder()
+
+    assert await store.get_or_embed_many(SPEC, ["a", "a"], embed) == [[1.0, 0.5], [1.0, 0.5]]
+    # 旁路期间不再访问存储
+    assert store._get_backend() is None
+    assert embed.calls == [["a"]]
+
+
+async def test_vectors_of_another_dimension_are_not_reused(backend):
+    store = ChunkEmbeddingStore(backend)
+    embed = CountingEmbedder()
+    await store.get_or_embed_many(SPEC, ["免责声明"], embed, dimension=2)
+
+    async def embed_wide(texts):
+        embed.calls.append(list(texts))
+        return [[1.0, 2.0, 3.0] for _ in texts]
+
+    # 同一 spec 调整维度后重新嵌入，新向量覆盖旧维度的条目
+    assert await store.get_or_embed_many(SPEC, ["免责声明"], embed_wide, dimension=3) == [[1.0, 2.0, 3.0]]
+    assert await store.get_or_embed_many(SPEC, ["免责声明"], embed_wide, dimension=3) == [[1.0, 2.0, 3.0]]
+    assert embed.calls == [["免责声明"], ["免责声明"]]
+    assert await backend.count() == 1
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.setenv("LITE_MODE", "true")
+    assert isinstance(create_chunk_embedding_backend("auto"), SqliteChunkEmbeddingBackend)
+    assert create_chunk_embedding_backend("off") is None
+    monkeypatch.delenv("LITE_MODE")
+    assert isinstance(create_chunk_embedding_backend("auto"), store_module.PostgresChunkEmbeddingBackend)
+
+
+async def test_duplicate_file_in_second_kb_is_not_reembedded(backend, monkeypatch):
+    monkeypatch.setattr(milvus_module, "chunk_embedding_store", ChunkEmbeddingStore(backend))
+    monkeypatch.setattr(milvus_module.model_cache, "get_model_info", lambda spec: types.SimpleNamespace(dimension=2))
+    embed = CountingEmbedder()
+    kb = MilvusKB.__new__(MilvusKB)
+    kb._get_embedding_function = lambda embedding_model_spec: embed
+    stored: dict[str, list] = {}
+
+    async def insert_chunks_to_stores(kb_id, file_id, collection, chunks, embeddings):
+        stored[kb_id] = embeddings
+
+    kb._insert_chunks_to_stores = insert_chunks_to_stores
+    chunks = [{"content": f"第 {index} 段 FAQ"} for index in range(5)]
+
+    for kb_id in ("kb_a", "kb_b"):
+        embedding_function = kb._get_chunk_embedding_function(SPEC)
+        await kb._embed_and_store_chunks(kb_id, "file-1", None, chunks, embedding_function)
+
+    assert len(embed.texts) == 5
+    assert stored["kb_a"] == stored["kb_b"]
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+import yuxi.knowledge.base as knowledge_base_module
+from yuxi.knowledge.base import KnowledgeBase
+from yuxi.knowledge.document_cache import MarkdownDocument, MarkdownDocumentCache
+from yuxi.knowledge.implementations.milvus import MilvusKB
+
+pytestmark = pytest.mark.unit
+
+MARKDOWN_URL = "minio://kb-parsed/kb_1/parsed/file_1.md"
+
+
+class _FakeMinio:
+    def __init__(self, content: str, etag: str = "etag-1"):
+        self.objects = {("kb-parsed", "kb_1/parsed/file_1.md"): (content.encode("utf-8"), etag)}
+        self.downloads = 0
+        self.stats = 0
+
+    def put(self, content: str, etag: str) -> None:
+        self.objects[("kb-parsed", "kb_1/parsed/file_1.md")] = (content.encode("utf-8"), etag)
+
+    async def aget_object_etag(self, bucket_name: str, object_name: str):
+        self.stats += 1
+        item = self.objects.get((bucket_name, object_name))
+        return item[1] if item else None
+
+    async def adownload_file_with_etag(self, bucket_name: str, object_name: str):
+        self.downloads += 1
+        return self.objects[(bucket_name, object_name)]
+
+
+def _make_kb(monkeypatch: pytest.MonkeyPatch, cache: MarkdownDocumentCache) -> MilvusKB:
+    kb = object.__new__(MilvusKB)
+
+    async def fake_load_file_meta(kb_id: str, file_id: str, *, refresh: bool = False):
+        return {"file_id": file_id, "markdown_file": MARKDOWN_URL, "is_folder": False}
+
+    monkeypatch.setattr(kb, "_load_file_meta", fake_load_file_meta)
+    monkeypatch.setattr(knowledge_base_module, "markdown_document_cache", cache)
+    return kb
+
+
+async def test_paging_reuses_cached_document_until_etag_changes(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    content = "\n".join(f"第 {index} 行" for index in range(1, 3001))
+    minio = _FakeMinio(content)
+    cache = MarkdownDocumentCache(cache_dir=tmp_path, minio_client_factory=lambda: minio)
+    kb = _make_kb(monkeypatch, cache)
+
+    pages = [await kb.open_file_content("kb_1", "file_1", offset=offset, limit=500) for offset in range(0, 3000, 500)]
+    found = await kb.find_file_content("kb_1", "file_1", ["第 2999 行"])
+
+    assert minio.downloads == 1
+    assert [page["start_line"] for page in pages] == [1, 501, 1001, 1501, 2001, 2501]
+    assert pages[-1]["content"].endswith("  3000\t第 3000 行")
+    assert found["windows"][0]["matched_lines"] == [2999]
+
+    cache.clear_memory()
+    await kb.open_file_content("kb_1", "file_1", offset=10, limit=1)
+    assert minio.downloads == 1
+    assert cache.get_stats()["disk_hits"] == 1
+
+    minio.put("重新解析后的内容", "etag-2")
+    page = await kb.open_file_content("kb_1", "file_1")
+    assert minio.downloads == 2
+    assert page["content"] == "     1\t重新解析后的内容"
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",
+        "单行无换行",
+        "a\r\nb\rc\n\nd e\x0cf\n",
+        "标题\n\n正文 Café\n末尾\n\n",
+    ],
+)
+def test_line_index_matches_str_splitlines(content: str):
+    document = MarkdownDocument.from_text(content)
+
+    assert document.lines(0, document.total_lines) == content.splitlines()
+
+
+async def test_large_document_is_memory_mapped_and_searchable(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    lines = [f"row {index} {'ERROR' if index % 250 == 0 else 'ok'} 数据" for index in range(2000)]
+    content = "\n".join(lines)
+    minio = _FakeMinio(content)
+    cache = MarkdownDocumentCache(cache_dir=tmp_path, memory_max_doc_bytes=1024, minio_client_factory=lambda: minio)
+    kb = _make_kb(monkeypatch, cache)
+
+    document = await kb._load_markdown_document("file_1", MARKDOWN_URL)
+    assert document.is_mapped
+
+    for use_regex, case_sensitive, patterns in [
+        (True, False, [r"row \d+ error"]),
+        (False, True, ["ERROR"]),
+        (False, False, ["error"]),
+    ]:
+        result = await kb.find_file_content(
+            "kb_1",
+            "file_1",
+            patterns,
+            use_regex=use_regex,
+            case_sensitive=case_sensitive,
+            max_windows=10,
+            window_size=10,
+        )
+        expected = KnowledgeBase._build_find_file_windows(
+            content,
+            patterns=patterns,
+            use_regex=use_regex,
+            case_sensitive=case_sensitive,
+            max_windows=10,
+            window_size=10,
+        )
+        assert result == expected
+        assert result["total_matches"] == 8
+    assert minio.downloads == 1
+
+
+async def test_disk_tier_evicts_least_recently_used_entries(tmp_path):
+    minio = _FakeMinio("x" * 1000)
+    cache = MarkdownDocumentCache(cache_dir=tmp_path, disk_max_bytes=2500, minio_client_factory=lambda: minio)
+
+    for index in range(4):
+        minio.put(f"{index}" * 1000, f"etag-{index}")
+        await cache.get_document("file_1", MARKDOWN_URL)
+        # 保证 mtime 严格递增，淘汰顺序与写入顺序一致。
+        for path in tmp_path.iterdir():
+            stat = path.stat()
+            os.utime(path, (stat.st_atime - 10, stat.st_mtime - 10))
+
+    assert len(list(tmp_path.glob("*.md"))) == 2
+    assert len(list(tmp_path.glob("*.lines"))) == 2
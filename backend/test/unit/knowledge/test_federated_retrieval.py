@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from yuxi.knowledge.base import KnowledgeBase
+from yuxi.knowledge.federated_retrieval import fan_out_retrieval, reciprocal_rank_fusion
+from yuxi.knowledge.manager import KnowledgeBaseManager
+
+pytestmark = pytest.mark.unit
+
+# 各知识库的模拟检索耗时（秒）
+LATENCIES = {"kb_fast": 0.05, "kb_mid": 0.1, "kb_slow": 0.25, "kb_stuck": 5.0}
+
+
+def _manager_with_fake_kbs(monkeypatch, tmp_path, *, failing: set[str] | None = None):
+    manager = KnowledgeBaseManager(str(tmp_path))
+    state = {"in_flight": 0, "peak": 0, "cancelled": []}
+
+    async def fake_retrieve(kb_id: str, query: str, **options):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(LATENCIES[kb_id])
+        except asyncio.CancelledError:
+            state["cancelled"].append(kb_id)
+            raise
+        finally:
+            state["in_flight"] -= 1
+        if failing and kb_id in failing:
+            raise RuntimeError(f"{kb_id} unavailable")
+        chunks = [
+            {"content": f"{kb_id} {query} {rank}", "metadata": {"chunk_id": f"{kb_id}-c{rank}", "file_id": "f"}}
+            for rank in range(3)
+        ]
+        return KnowledgeBase.build_search_output(kb_id, chunks)
+
+    monkeypatch.setattr(manager, "retrieve", fake_retrieve)
+    return manager, state
+
+
+async def test_kbs_run_in_parallel_and_deadline_cancels_only_slow_kbs(monkeypatch, tmp_path):
+    manager, state = _manager_with_fake_kbs(monkeypatch, tmp_path)
+    allowed = ["kb_fast", "kb_mid", "kb_slow"]
+
+    # 各知识库同时在途，总耗时取决于最慢的知识库而不是耗时之和
+    result = await manager.federated_retrieve(allowed, "宝玉", top_k=6, timeout=2)
+    assert state["peak"] == len(allowed)
+    assert state["cancelled"] == []
+    assert result["partial"] is False
+
+    # 超出截止时间的知识库被取消，其余知识库正常返回
+    kb_ids = list(LATENCIES)
+    result = await manager.federated_retrieve(kb_ids, "宝玉", top_k=6, timeout=0.5)
+
+    assert result["partial"] is True
+    assert result["kbs"]["kb_stuck"]["status"] == "timeout"
+    assert state["cancelled"] == ["kb_stuck"]
+    assert {kb_id for kb_id, status in result["kbs"].items() if status["status"] == "ok"} == set(kb_ids) - {"kb_stuck"}
+
+    # RRF：各知识库的第一名并列领先，其次是各自第二名
+    assert len(result["results"]) == 6
+    assert {item["id"] for item in result["results"][:3]} == {"kb_fast-c0", "kb_mid-c0", "kb_slow-c0"}
+    assert all(item["kb_id"] in {"kb_fast", "kb_mid", "kb_slow"} for item in result["results"])
+
+
+async def test_concurrency_budget_and_failures_are_isolated(monkeypatch, tmp_path):
+    manager, state = _manager_with_fake_kbs(monkeypatch, tmp_path, failing={"kb_mid"})
+
+    result = await manager.federated_retrieve(["kb_fast", "kb_mid", "kb_slow"], "黛玉", max_concurrency=2, timeout=2)
+
+    assert state["peak"] == 2
+    assert result["kbs"]["kb_mid"]["status"] == "error"
+    assert result["kbs"]["kb_mid"]["error"] == "kb_mid unavailable"
+    assert result["partial"] is True
+    assert {item["kb_id"] for item in result["results"]} == {"kb_fast", "kb_slow"}
+
+
+async def test_concurrency_budget_is_shared_across_requests(monkeypatch, tmp_path):
+    manager, state = _manager_with_fake_kbs(monkeypatch, tmp_path)
+    manager.federated_budget = asyncio.Semaphore(2)
+
+    results = await asyncio.gather(
+        manager.federated_retrieve(["kb_fast", "kb_mid"], "宝玉", timeout=2),
+        manager.federated_retrieve(["kb_fast", "kb_slow"], "黛玉", timeout=2),
+    )
+
+    # 两个请求各有两个知识库，同时在途的检索仍受全局预算限制
+    assert state["peak"] == 2
+    assert all(result["partial"] is False for result in results)
+
+
+async def test_optional_cross_kb_rerank_reorders_fused_results(monkeypatch, tmp_path):
+    manager, _state = _manager_with_fake_kbs(monkeypatch, tmp_path)
+    scored = []
+
+    class FakeReranker:
+        async def acompute_score(self, sentence_pairs, normalize=True, chunk_ids=None):
+            query, documents = sentence_pairs
+            scored.append(len(documents))
+            # kb_slow 的内容与 Query 最相关
+            return [1.0 if document.startswith("kb_slow") else 0.1 for document in documents]
+
+    monkeypatch.setattr("yuxi.models.rerank.get_shared_reranker", lambda model: FakeReranker())
+
+    result = await manager.federated_retrieve(
+        ["kb_fast", "kb_slow"], "宝钗", top_k=2, timeout=2, reranker_model="fake:rerank"
+    )
+
+    assert scored == [6]
+    assert [item["kb_id"] for item in result["results"]] == ["kb_slow", "kb_slow"]
+    assert result["partial"] is False
+
+
+def test_rrf_merges_duplicates_across_lists():
+    fused = reciprocal_rank_fusion(
+        {
+            "kb_a": [{"id": "x", "kb_id": "kb_a"}, {"id": "y", "kb_id": "kb_a"}],
+            "kb_a_mirror": [{"id": "y", "kb_id": "kb_a"}, {"id": "z", "kb_id": "kb_b"}],
+        },
+        rrf_k=1.0,
+    )
+
+    # 同一 (kb_id, id) 出现在多个列表中时累加各自名次的分数：y = 1/(1+2) + 1/(1+1)
+    assert [item["id"] for item in fused] == ["y", "x", "z"]
+    assert [item["fusion_score"] for item in fused] == pytest.approx([1 / 3 + 1 / 2, 1 / 2, 1 / 3])
+
+
+async def test_fan_out_cancels_pending_work_when_caller_is_cancelled():
+    cancelled = []
+
+    async def retrieve(kb_id):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(kb_id)
+            raise
+
+    task = asyncio.create_task(fan_out_retrieval(["a", "b"], retrieve, timeout=10))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert sorted(cancelled) == ["a", "b"]
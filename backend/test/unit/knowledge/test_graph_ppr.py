@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import random
+
+import numpy as np
+import pytest
+
+from yuxi.knowledge.graphs.milvus_graph_service import MilvusGraphService
+from yuxi.knowledge.graphs.ppr import build_adjacency, networkx_personalized_pagerank, personalized_pagerank
+
+pytestmark = pytest.mark.unit
+
+
+def _random_graph(seed: int, num_nodes: int, num_edges: int) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+    # 保留部分孤立节点，并混入重复边与自环，覆盖悬挂质量回流和去重语义。
+    connected = max(num_nodes - 5, 2)
+    edges = [(rng.randrange(connected), rng.randrange(connected)) for _ in range(num_edges)]
+    return edges + edges[:10] + [(0, 0)]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_sparse_ppr_matches_networkx_reference(seed: int):
+    num_nodes = 300
+    edges = _random_graph(seed, num_nodes, 900)
+    rng = np.random.default_rng(seed)
+    personalization = np.zeros(num_nodes)
+    personalization[rng.choice(num_nodes, size=5, replace=False)] = rng.random(5) + 0.1
+
+    expected = networkx_personalized_pagerank(num_nodes, edges, personalization, alpha=0.85)
+    actual = personalized_pagerank(build_adjacency(num_nodes, edges), personalization, alpha=0.85)
+
+    assert actual.shape == (num_nodes,)
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+
+def test_sparse_ppr_batched_columns_match_single_runs():
+    num_nodes = 120
+    adjacency = build_adjacency(num_nodes, _random_graph(7, num_nodes, 300))
+    personalization = np.zeros((num_nodes, 3))
+    personalization[[1, 2], 0] = [1.0, 3.0]
+    personalization[[50], 1] = [2.0]
+
+    batched = personalized_pagerank(adjacency, personalization, alpha=0.8)
+
+    for column in range(2):
+        single = personalized_pagerank(adjacency, personalization[:, column], alpha=0.8)
+        np.testing.assert_allclose(batched[:, column], single, atol=1e-6)
+    assert batched[:, 2].sum() == 0
+
+
+def test_rank_chunks_by_ppr_batch_keeps_seed_set_order():
+    subgraph = {
+        "nodes": [
+            {"id": "e1", "type": "Entity", "properties": {"entity_id": "left"}},
+            {"id": "c1", "type": "Chunk", "properties": {"chunk_id": "chunk_a"}},
+            {"id": "e2", "type": "Entity", "properties": {"entity_id": "right"}},
+            {"id": "c2", "type": "Chunk", "properties": {"chunk_id": "chunk_b"}},
+        ],
+        "edges": [
+            {"source_id": "e1", "target_id": "c1"},
+            {"source_id": "e1", "target_id": "e2"},
+            {"source_id": "e2", "target_id": "c2"},
+        ],
+    }
+
+    ranked = MilvusGraphService.rank_chunks_by_ppr_batch(
+        subgraph,
+        [{"left": 1.0}, {"missing": 1.0}, {"right": 1.0}],
+        top_k=1,
+        damping=0.85,
+    )
+
+    assert [[chunk_id for chunk_id, _ in item] for item in ranked] == [["chunk_a"], [], ["chunk_b"]]
+    assert ranked[0] == MilvusGraphService.rank_chunks_by_ppr(subgraph, {"left": 1.0}, top_k=1, damping=0.85)
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import types
+
+import pytest
+
+import yuxi.knowledge.implementations.milvus as milvus_module
+from yuxi.knowledge.implementations.milvus import MilvusKB
+from yuxi.knowledge.implementations.milvus_filter import FOLDER_ID_FIELD
+from yuxi.knowledge.utils.chunk_diff import diff_chunks
+
+pytestmark = pytest.mark.unit
+
+FILTER_SCHEMA = types.SimpleNamespace(
+    fields=[
+        types.SimpleNamespace(name="file_id", is_partition_key=True),
+        types.SimpleNamespace(name=FOLDER_ID_FIELD, is_partition_key=False),
+    ]
+)
+COLUMNS = ["id", "content", "chunk_id", "file_id", "chunk_index", "embedding", FOLDER_ID_FIELD]
+
+
+class FakeChunkRepository:
+    def __init__(self):
+        self.records: dict[str, types.SimpleNamespace] = {}
+
+    async def list_by_file_id(self, file_id):
+        records = [record for record in self.records.values() if record.file_id == file_id]
+        return sorted(records, key=lambda record: record.chunk_index)
+
+    async def batch_upsert(self, chunks):
+        for chunk in chunks:
+            record = self.records.setdefault(chunk["chunk_id"], types.SimpleNamespace(graph_indexed=False))
+            for key, value in chunk.items():
+                setattr(record, key, value)
+        return []
+
+    async def delete_by_chunk_ids(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            self.records.pop(chunk_id, None)
+        return len(chunk_ids)
+
+    async def delete_by_file_id(self, file_id):
+        for chunk_id in [key for key, record in self.records.items() if record.file_id == file_id]:
+            self.records.pop(chunk_id)
+        return 0
+
+
+class FakeCollection:
+    name = "db"
+    schema = FILTER_SCHEMA
+
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+        self.upserted = 0
+
+    def insert(self, entities):
+        for values in zip(*entities):
+            row = dict(zip(COLUMNS, values))
+            self.rows[row["id"]] = row
+
+    def upsert(self, rows):
+        self.upserted += len(rows)
+        for row in rows:
+            self.rows[row["id"]] = dict(row)
+
+    def query(self, *, expr, expr_params, output_fields, limit=None):
+        if "ids" not in (expr_params or {}):
+            return [{"id": row_id} for row_id in self.rows][:limit]
+        return [
+            {name: self.rows[row_id][name] for name in output_fields}
+            for row_id in expr_params["ids"]
+            if row_id in self.rows
+        ]
+
+    def delete(self, expr, expr_params=None):
+        if expr_params:
+            for row_id in expr_params["ids"]:
+                self.rows.pop(row_id, None)
+        else:
+            file_id = expr.split('"')[1]
+            self.rows = {key: row for key, row in self.rows.items() if row["file_id"] != file_id}
+
+
+def _manual(sections: int = 100, *, edited: int | None = None, inserted_at: int | None = None) -> str:
+    parts = []
+    for index in range(sections):
+        sentence = f"这是第 {index} 节的说明文字，介绍设备的操作步骤与注意事项。"
+        if index == edited:
+            sentence = f"这是第 {index} 节的修订文字，说明设备的启动步骤与安全事项。"
+        parts.append(f"## 第 {index} 节\n\n" + sentence * 25)
+    if inserted_at is not None:
+        parts.insert(inserted_at, "## 新增章节\n\n" + "新增的安全警示内容。" * 60)
+    return "\n\n".join(parts)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    repo = FakeChunkRepository()
+    monkeypatch.setattr(milvus_module, "KnowledgeChunkRepository", lambda: repo)
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.collections = {}
+    collection = FakeCollection()
+    embedded: list[str] = []
+
+    async def embedding_function(texts):
+        embedded.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+    async def delete_file_chunks_only(kb_id, file_id):
+        await repo.delete_by_file_id(file_id)
+        collection.delete(f'file_id == "{file_id}"')
+
+    kb.delete_file_chunks_only = delete_file_chunks_only
+
+    async def index(markdown: str, previous_chunk_count: int) -> dict:
+        chunks = kb._split_text_into_chunks(markdown, "file-1", "manual.md", {})
+        kb._assign_chunk_folder(chunks, {"parent_id": "docs"})
+        return await kb._replace_file_chunks(
+            "db",
+            "file-1",
+            collection,
+            chunks,
+            embedding_function,
+            incremental=True,
+            previous_chunk_count=previous_chunk_count,
+        )
+
+    return types.SimpleNamespace(repo=repo, collection=collection, embedded=embedded, index=index)
+
+
+def _stored_contents(env) -> list[str]:
+    records = sorted(env.repo.records.values(), key=lambda record: record.chunk_index)
+    rows = sorted(env.collection.rows.values(), key=lambda row: row["chunk_index"])
+    assert [row["content"] for row in rows] == [record.content for record in records]
+    assert [row["chunk_id"] for row in rows] == [record.chunk_id for record in records]
+    return [record.content for record in records]
+
+
+async def test_editing_one_section_only_embeds_that_chunk(env):
+    first = await env.index(_manual(), previous_chunk_count=0)
+    assert first["mode"] == "full" and len(env.embedded) == 100
+
+    env.embedded.clear()
+    stats = await env.index(_manual(edited=42), previous_chunk_count=100)
+
+    assert len(env.embedded) == 1 and "第 42 节的修订文字" in env.embedded[0]
+    assert stats == {"mode": "incremental", "reused": 99, "embedded": 1, "removed": 1, "reuse_ratio": 0.99}
+    assert env.collection.upserted == 0
+    assert len(_stored_contents(env)) == 100
+
+
+async def test_inserted_section_shifts_positions_without_reembedding(env):
+    await env.index(_manual(), previous_chunk_count=0)
+    before = {row["content"]: row["embedding"] for row in env.collection.rows.values()}
+    env.embedded.clear()
+
+    stats = await env.index(_manual(inserted_at=40), previous_chunk_count=100)
+
+    assert len(env.embedded) == 1 and stats["reused"] == 100 and stats["removed"] == 0
+    # 插入点之后的 chunk 仅更新 chunk_index，沿用原向量
+    assert env.collection.upserted == 60
+    contents = _stored_contents(env)
+    assert contents == [
+        chunk["content"]
+        for chunk in MilvusKB.__new__(MilvusKB)._split_text_into_chunks(
+            _manual(inserted_at=40), "file-1", "manual.md", {}
+        )
+    ]
+    assert all(
+        row["embedding"] == before[row["content"]] for row in env.collection.rows.values() if row["content"] in before
+    )
+    assert len(env.repo.records) == len(env.collection.rows) == 101
+
+
+async def test_graph_indexed_file_falls_back_to_full_reindex(env):
+    await env.index(_manual(10), previous_chunk_count=0)
+    next(iter(env.repo.records.values())).graph_indexed = True
+    env.embedded.clear()
+
+    stats = await env.index(_manual(10, edited=3), previous_chunk_count=10)
+
+    assert stats["mode"] == "full" and len(env.embedded) == 10
+    assert len(_stored_contents(env)) == 10
+
+
+def test_diff_pairs_duplicates_in_order_and_avoids_id_collisions():
+    stored = [("f_chunk_0", "a"), ("f_chunk_1", "b"), ("f_chunk_2", "a")]
+    new_chunks = [
+        {"id": f"f_chunk_{index}", "chunk_id": f"f_chunk_{index}", "content": content}
+        for index, content in enumerate(["x", "a", "a", "a"])
+    ]
+
+    diff = diff_chunks(new_chunks, stored)
+
+    assert [chunk["chunk_id"] for chunk in diff.reused] == ["f_chunk_0", "f_chunk_2"]
+    assert diff.removed_ids == ["f_chunk_1"]
+    # 新增 chunk 的位置 id f_chunk_0 已被复用 chunk 占用
+    assert diff.added[0]["chunk_id"].startswith("f_chunk_0_")
+    assert diff.added[1]["chunk_id"] == "f_chunk_3"
+    assert diff.reuse_ratio == 0.5
+
+    diff.mark_unavailable({"f_chunk_0"})
+    assert [chunk["chunk_id"] for chunk in diff.reused] == ["f_chunk_0"]
+    assert len(diff.added) == 3
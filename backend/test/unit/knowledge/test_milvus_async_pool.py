@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from yuxi.knowledge.implementations.milvus_async import MilvusAsyncQueryPool, create_milvus_query_pool
+
+pytestmark = pytest.mark.unit
+
+SCRIPT_PATH = Path(__file__).resolve().parents[3] / "scripts" / "benchmarks" / "milvus_query_io_benchmark.py"
+
+
+class _SlowClient:
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.calls = 0
+        self.closed = False
+
+    async def search(self, collection_name, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [[]]
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_pool_round_robins_clients_and_caps_in_flight_requests():
+    clients: list[_SlowClient] = []
+
+    def factory():
+        clients.append(_SlowClient())
+        return clients[-1]
+
+    pool = MilvusAsyncQueryPool(size=3, max_inflight=4, client_factory=factory)
+
+    await asyncio.gather(*(pool.search("kb") for _ in range(12)))
+
+    assert [client.calls for client in clients] == [4, 4, 4]
+    stats = pool.get_stats()
+    assert stats["requests"] == 12
+    assert stats["peak_in_flight"] == 4
+    assert stats["in_flight"] == 0
+
+    await pool.aclose()
+    assert all(client.closed for client in clients)
+
+
+async def test_pool_concurrency_exceeds_thread_offload_limit():
+    clients: list[_SlowClient] = []
+
+    def factory():
+        clients.append(_SlowClient(latency=0.05))
+        return clients[-1]
+
+    pool = MilvusAsyncQueryPool(size=2, max_inflight=64, client_factory=factory)
+
+    await asyncio.gather(*(pool.search("kb") for _ in range(64)))
+
+    # 线程卸载上限为 8；异步客户端让 64 个请求同时在途，而不是分 8 轮排队
+    assert pool.get_stats()["peak_in_flight"] == 64
+    assert sum(client.calls for client in clients) == 64
+
+
+def test_create_pool_respects_mode_and_local_uri():
+    assert create_milvus_query_pool("http://milvus:19530", mode="thread") is None
+    assert create_milvus_query_pool("./milvus_lite.db", mode="async") is None
+    assert isinstance(create_milvus_query_pool("http://milvus:19530", mode="async"), MilvusAsyncQueryPool)
+
+
+async def test_benchmark_reports_async_speedup_at_high_concurrency():
+    spec = importlib.util.spec_from_file_location("milvus_query_io_benchmark", SCRIPT_PATH)
+    assert spec is not None and spec.loader is not None
+    bench = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bench)
+    args = bench.build_parser().parse_args(
+        ["--concurrency", "8", "32", "--latency-ms", "10", "--queries-per-worker", "2"]
+    )
+
+    report = await bench.run_benchmark(args)
+
+    assert {(item["mode"], item["concurrency"]) for item in report["results"]} == {
+        (mode, concurrency) for mode in ("thread", "async") for concurrency in (8, 32)
+    }
+    peaks = {(item["mode"], item["concurrency"]): item["peak_in_flight"] for item in report["results"]}
+    offload_limit = report["meta"]["offload_limit"]
+    # 线程模式的在途检索数受卸载上限约束，异步模式随并发度增长
+    assert peaks[("thread", 32)] <= offload_limit
+    assert peaks[("async", 32)] > offload_limit
+    assert set(report["qps_speedup"]) == {"8", "32"}
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import asyncio
+import types
+
+import pytest
+
+import yuxi.knowledge.implementations.milvus as milvus_module
+from yuxi.knowledge.implementations.milvus import MilvusKB
+from yuxi.knowledge.implementations.milvus_filter import (
+    FOLDER_ID_FIELD,
+    NO_MATCH_FILE_ID,
+    build_file_filter,
+    expand_folder_ids,
+)
+from yuxi.knowledge.query_embedding_cache import QueryEmbeddingCache
+from yuxi.knowledge.read_models import KnowledgeBaseConfig
+
+pytestmark = pytest.mark.unit
+
+CONFIG = KnowledgeBaseConfig(kb_id="db", kb_type="milvus", embedding_model_spec="test:embedding")
+FILTER_SCHEMA = types.SimpleNamespace(
+    fields=[
+        types.SimpleNamespace(name="id", is_partition_key=False),
+        types.SimpleNamespace(name="file_id", is_partition_key=True),
+        types.SimpleNamespace(name=FOLDER_ID_FIELD, is_partition_key=False),
+    ]
+)
+COLUMNS = ["id", "content", "chunk_id", "file_id", "chunk_index", "embedding", FOLDER_ID_FIELD]
+LEGACY_SCHEMA = types.SimpleNamespace(fields=[types.SimpleNamespace(name="file_id", is_partition_key=False)])
+
+
+class _Iterator:
+    def __init__(self, rows: list[dict], batch_size: int, on_batch=None):
+        self.rows = rows
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.offset = 0
+
+    def next(self):
+        batch = self.rows[self.offset : self.offset + self.batch_size]
+        self.offset += self.batch_size
+        if batch and self.on_batch:
+            self.on_batch()
+        return batch
+
+    def close(self):
+        return None
+
+
+class FakeCollection:
+    def __init__(self, name: str, rows: list[dict] | None = None, schema=FILTER_SCHEMA):
+        self.name = name
+        self.schema = schema
+        self.rows = {row["id"]: dict(row) for row in rows or []}
+        self.search_calls: list[dict] = []
+        self.on_copy_batch = None
+
+    def _match(self, expr, expr_params=None):
+        rows = sorted(self.rows.values(), key=lambda row: row["id"])
+        if expr.startswith("file_id =="):
+            file_id = expr.split('"')[1]
+            rows = [row for row in rows if row["file_id"] == file_id]
+        elif expr == "file_id in {file_ids}":
+            rows = [row for row in rows if row["file_id"] in expr_params["file_ids"]]
+        elif expr == "id in {ids}":
+            rows = [row for row in rows if row["id"] in expr_params["ids"]]
+        return rows
+
+    def query_iterator(self, *, batch_size, expr, output_fields, expr_params=None):
+        rows = self._match(expr, expr_params)
+        on_batch = self.on_copy_batch if expr == 'id != ""' else None
+        return _Iterator([{name: row[name] for name in output_fields} for row in rows], batch_size, on_batch)
+
+    def query(self, *, expr, output_fields, expr_params=None, limit=None):
+        rows = self._match(expr, expr_params)[:limit]
+        return [{name: row[name] for name in output_fields} for row in rows]
+
+    def insert(self, rows):
+        if rows and isinstance(rows[0], list):
+            # 按列插入：id, content, chunk_id, file_id, chunk_index, embedding[, folder_id]
+            rows = [dict(zip(COLUMNS, values, strict=False)) for values in zip(*rows, strict=True)]
+        for row in rows:
+            self.rows[row["id"]] = dict(row)
+
+    def upsert(self, rows):
+        for row in rows:
+            self.rows[row["id"]] = dict(row)
+
+    def delete(self, expr, expr_params=None):
+        for row in self._match(expr, expr_params):
+            self.rows.pop(row["id"])
+
+    def search(self, **kwargs):
+        self.search_calls.append(kwargs)
+        return [[]]
+
+
+def _row(index: int, file_id: str = "file-a") -> dict:
+    return {
+        "id": f"id-{index:03d}",
+        "content": f"chunk {index}",
+        "chunk_id": f"chunk-{index}",
+        "file_id": file_id,
+        "chunk_index": index,
+        "embedding": [0.1, 0.2],
+    }
+
+
+class FakeFileRepository:
+    def __init__(self):
+        # root ─ docs ─ docs/api ；file-a 在 docs，file-b 在 docs/api，file-c 在根目录
+        self.parents = {"docs": None, "api": "docs", "file-a": "docs", "file-b": "api", "file-c": None}
+        self.folders = {"docs", "api"}
+        self.filenames = {"file-a": "guide.md", "file-b": "api-guide.md", "file-c": "notes.md"}
+
+    async def list_file_ids_by_filename_contains(self, *, kb_id, filename_pattern, limit=10_000):
+        return sorted(file_id for file_id, name in self.filenames.items() if filename_pattern in name)
+
+    async def list_parent_ids(self, *, kb_id, folders_only=False):
+        return {
+            file_id: parent for file_id, parent in self.parents.items() if not folders_only or file_id in self.folders
+        }
+
+    async def list_file_ids_by_parent_ids(self, *, kb_id, parent_ids, limit=10_000):
+        return sorted(file_id for file_id in self.filenames if self.parents[file_id] in parent_ids)
+
+    async def update_fields(self, *, file_id, kb_id, data):
+        return None
+
+
+class FakeChunkRepository:
+    async def batch_upsert(self, chunks):
+        return []
+
+    async def delete_by_file_id(self, file_id):
+        return None
+
+    async def count_graph_indexed_by_file_id(self, file_id):
+        return 0
+
+
+@pytest.fixture
+def file_repo(monkeypatch):
+    repo = FakeFileRepository()
+    monkeypatch.setattr(milvus_module, "KnowledgeFileRepository", lambda: repo)
+    monkeypatch.setattr(milvus_module, "query_embedding_cache", QueryEmbeddingCache(redis_enabled=False))
+    return repo
+
+
+def _make_kb(collection: FakeCollection) -> MilvusKB:
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.connection_alias = "test"
+    kb.collections = {"db": collection}
+    kb.vector_indexes = {}
+    kb.switch_gates = {}
+    kb._get_embedding_function = lambda spec, **kwargs: lambda texts: [[0.1, 0.2] for _ in texts]
+
+    async def get_collection(kb_id, embedding_model_spec):
+        return kb.collections[kb_id]
+
+    kb._get_or_create_milvus_collection = get_collection
+    return kb
+
+
+def test_file_filter_sends_ids_as_template_params():
+    ids = [f"file-{index}" for index in range(5000)]
+    file_filter = build_file_filter(file_ids=ids, folder_ids=["docs"])
+
+    # 表达式长度与候选 id 数量无关
+    assert file_filter.expr == "(file_id in {file_ids}) and (folder_id in {folder_ids})"
+    assert file_filter.params == {"file_ids": ids, "folder_ids": ["docs"]}
+    assert build_file_filter(file_ids=[]).params == {"file_ids": [NO_MATCH_FILE_ID]}
+    assert build_file_filter() is None
+    assert sorted(expand_folder_ids("docs", {"docs": None, "api": "docs", "misc": None})) == ["api", "docs"]
+
+
+async def test_new_schema_filters_by_indexed_folder_field(file_repo):
+    collection = FakeCollection("db")
+    kb = _make_kb(collection)
+
+    await kb.aquery("q", "db", config=CONFIG, file_name="guide", folder_id="docs")
+
+    call = collection.search_calls[0]
+    assert call["expr"] == "(file_id in {file_ids}) and (folder_id in {folder_ids})"
+    assert call["expr_params"] == {"file_ids": ["file-a", "file-b"], "folder_ids": ["docs", "api"]}
+
+
+async def test_legacy_schema_falls_back_to_file_ids_under_folder(file_repo):
+    collection = FakeCollection("db", schema=LEGACY_SCHEMA)
+    kb = _make_kb(collection)
+
+    await kb.aquery("q", "db", config=CONFIG, folder_id="api")
+    await kb.aquery("q", "db", config=CONFIG, file_name="notes", folder_id="docs")
+
+    assert collection.search_calls[0]["expr"] == "file_id in {file_ids}"
+    assert collection.search_calls[0]["expr_params"] == {"file_ids": ["file-b"]}
+    assert collection.search_calls[1]["expr_params"] == {"file_ids": [NO_MATCH_FILE_ID]}
+
+
+async def test_insert_writes_folder_column_only_for_new_schema(monkeypatch):
+    class FakeChunkRepo:
+        async def batch_upsert(self, chunks):
+            return []
+
+    monkeypatch.setattr(milvus_module, "KnowledgeChunkRepository", FakeChunkRepo)
+    inserted = []
+    chunks = [{**_row(0), FOLDER_ID_FIELD: "docs"}]
+
+    for schema in (FILTER_SCHEMA, LEGACY_SCHEMA):
+        collection = FakeCollection("db", schema=schema)
+        collection.insert = inserted.append
+        await _make_kb(collection)._insert_chunks_to_stores("db", "file-a", collection, chunks, [[0.1, 0.2]])
+
+    assert len(inserted[0]) == 7 and inserted[0][6] == ["docs"]
+    assert len(inserted[1]) == 6
+
+
+async def test_migration_replays_writes_and_does_not_resurrect_deletes(monkeypatch, file_repo):
+    monkeypatch.setattr(milvus_module, "KnowledgeChunkRepository", FakeChunkRepository)
+    source = FakeCollection("db", [_row(i) for i in range(5)] + [_row(9, "file-c")], schema=LEGACY_SCHEMA)
+    shadow = FakeCollection("db__filter_v2")
+    collections = {"db": source}
+    dropped = []
+    loop = asyncio.get_running_loop()
+    kb = _make_kb(source)
+
+    # 复制过程中旧集合仍在写入：删除 file-a（已在复制快照中），新增 file-b
+    async def concurrent_writes():
+        await kb.delete_file_chunks_only("db", "file-a")
+        await kb._insert_chunks_to_stores("db", "file-b", source, [_row(100, "file-b")], [[0.1, 0.2]])
+
+    def write_once():
+        source.on_copy_batch = None
+        asyncio.run_coroutine_threadsafe(concurrent_writes(), loop).result()
+
+    source.on_copy_batch = write_once
+    during_swap = []
+
+    def fake_collection(name, using):
+        return collections[name]
+
+    def rename_collection(old, new, using):
+        if not during_swap:
+            gate = kb.switch_gates["db"]
+            during_swap.append((gate._paused["read"], gate._paused["write"]))
+            # 换名期间到达的删除与检索都要等切换完成，再作用于新集合
+            during_swap.append(asyncio.run_coroutine_threadsafe(kb.delete_file_chunks_only("db", "file-c"), loop))
+            during_swap.append(asyncio.run_coroutine_threadsafe(kb.aquery("q", "db", config=CONFIG), loop))
+        collections[new] = collections.pop(old)
+        collections[new].name = new
+
+    def create_new_collection(name, embedding_info, kb_id):
+        collections[name] = shadow
+        return shadow
+
+    monkeypatch.setattr(milvus_module, "Collection", fake_collection)
+    monkeypatch.setattr(milvus_module.utility, "has_collection", lambda name, using: name in collections)
+    monkeypatch.setattr(milvus_module.utility, "drop_collection", lambda name, using: dropped.append(name))
+    monkeypatch.setattr(milvus_module.utility, "rename_collection", rename_collection)
+    monkeypatch.setattr(milvus_module.model_cache, "get_model_info", lambda spec: object())
+    shadow.load = lambda: None
+
+    kb._create_new_collection = create_new_collection
+    result = await kb.migrate_file_filter_schema(
+        "db", embedding_model_spec="test:embedding", additional_params={}, batch_size=2
+    )
+    paused, delete_future, query_future = during_swap
+    await asyncio.wrap_future(delete_future)
+    await asyncio.wrap_future(query_future)
+
+    assert result["status"] == "migrated"
+    assert result["copied"] == 6 and result["replayed_files"] == 2 and result["replayed"] == 1
+    assert paused == (True, True)
+    assert kb.collections["db"] is shadow and shadow.name == "db"
+    assert dropped == ["db__legacy"]
+    # 复制快照中的 file-a 被墓碑清除，切换后删除的 file-c 不会从旧集合补回
+    assert set(shadow.rows) == {"id-100"}
+    assert shadow.rows["id-100"][FOLDER_ID_FIELD] == "api"
+    assert shadow.search_calls and not source.search_calls
+    assert kb.switch_gates["db"].touched_files is None
+
+    again = await kb.migrate_file_filter_schema("db", embedding_model_spec="test:embedding", additional_params={})
+    assert again == {"kb_id": "db", "status": "up_to_date"}
+
+
+@pytest.mark.parametrize(
+    ("leftover", "expected", "dropped_names"),
+    [
+        # 第一次换名后退出：补完换名，已复制的新集合接替
+        ({"db__legacy": "legacy", "db__filter_v2": "shadow"}, {"db": "shadow"}, ["db__legacy"]),
+        # 新集合缺失：回滚旧集合的换名
+        ({"db__legacy": "legacy"}, {"db": "legacy"}, []),
+        # 两次换名均已完成：只删除残留的旧集合
+        ({"db": "shadow", "db__legacy": "legacy"}, {"db": "shadow"}, ["db__legacy"]),
+    ],
+)
+def test_interrupted_swap_is_finished_before_creating_collection(monkeypatch, leftover, expected, dropped_names):
+    collections = dict(leftover)
+    dropped = []
+
+    def drop_collection(name, using):
+        dropped.append(name)
+        collections.pop(name)
+
+    def rename_collection(old, new, using):
+        collections[new] = collections.pop(old)
+
+    monkeypatch.setattr(milvus_module.utility, "has_collection", lambda name, using: name in collections)
+    monkeypatch.setattr(milvus_module.utility, "drop_collection", drop_collection)
+    monkeypatch.setattr(milvus_module.utility, "rename_collection", rename_collection)
+
+    _make_kb(FakeCollection("db"))._finish_interrupted_swap("db")
+
+    assert collections == expected
+    assert dropped == dropped_names
+
+
+async def test_move_file_rewrites_folder_of_its_chunks(monkeypatch):
+    collection = FakeCollection("db", [{**_row(0), FOLDER_ID_FIELD: "docs"}, {**_row(1, "file-c"), "folder_id": ""}])
+    kb = _make_kb(collection)
+
+    async def base_move(self, kb_id, file_id, new_parent_id):
+        return {"file_id": file_id, "parent_id": new_parent_id, "is_folder": False}
+
+    monkeypatch.setattr(milvus_module.KnowledgeBase, "move_file", base_move)
+
+    await kb.move_file("db", "file-a", "api")
+
+    assert collection.rows["id-000"][FOLDER_ID_FIELD] == "api"
+    assert collection.rows["id-001"][FOLDER_ID_FIELD] == ""
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import types
+
+import numpy as np
+import pytest
+
+from yuxi.knowledge.implementations.milvus import MilvusKB
+from yuxi.knowledge.implementations.milvus_index import (
+    INDEX_PROFILES,
+    TUNED_SEARCH_PARAMS_KEY,
+    SearchParamTuner,
+    apply_index_profile,
+    build_vector_search_params,
+    describe_vector_index,
+)
+from yuxi.knowledge.implementations.milvus_residency import CollectionResidencyManager
+
+pytestmark = pytest.mark.unit
+
+
+def test_search_params_follow_profile_and_matching_tuned_values():
+    assert build_vector_search_params({}, 10, "COSINE") == {"metric_type": "COSINE", "params": {"nprobe": 10}}
+
+    hnsw = {"index_profile": "HNSW"}
+    assert build_vector_search_params(hnsw, 10, "COSINE")["params"] == {"ef": 64}
+    # ef 不能小于召回数量
+    assert build_vector_search_params(hnsw, 100, "COSINE")["params"] == {"ef": 100}
+
+    tuned = {"profile": "HNSW", "params": {"ef": 128}}
+    assert build_vector_search_params({**hnsw, TUNED_SEARCH_PARAMS_KEY: tuned}, 10, "COSINE")["params"] == {"ef": 128}
+    # 调优结果对应的索引类型已变化时不再使用
+    ivf = {"index_profile": "IVF_SQ8", TUNED_SEARCH_PARAMS_KEY: tuned}
+    assert build_vector_search_params(ivf, 10, "COSINE")["params"] == {"nprobe": 10}
+
+
+def test_validate_additional_params_normalizes_index_profile():
+    assert MilvusKB.validate_additional_params({"index_profile": "hnsw"})["index_profile"] == "HNSW"
+    assert "index_profile" not in MilvusKB.validate_additional_params({})
+    with pytest.raises(ValueError, match="不支持的向量索引类型"):
+        MilvusKB.validate_additional_params({"index_profile": "SCANN"})
+
+
+class _FakeIndexedCollection:
+    name = "kb_demo"
+
+    def __init__(self, index_type: str = "IVF_FLAT", unsupported: set[str] | None = None):
+        self.unsupported = unsupported or set()
+        self.indexes = [
+            types.SimpleNamespace(field_name="embedding", index_name="emb_idx", params={"index_type": index_type})
+        ]
+        self.calls: list[str] = []
+
+    def release(self):
+        self.calls.append("release")
+
+    def load(self):
+        self.calls.append("load")
+
+    def drop_index(self, index_name):
+        self.calls.append(f"drop:{index_name}")
+        self.indexes = []
+
+    def create_index(self, field_name, index_params, index_name="emb_idx"):
+        if index_params["index_type"] in self.unsupported:
+            raise RuntimeError("index type not supported")
+        self.calls.append(f"create:{index_params['index_type']}")
+        self.indexes = [
+            types.SimpleNamespace(
+                field_name=field_name, index_name=index_name, params={"index_type": index_params["index_type"]}
+            )
+        ]
+
+
+def test_apply_index_profile_rebuilds_and_falls_back_when_unavailable():
+    collection = _FakeIndexedCollection()
+    assert apply_index_profile(collection, INDEX_PROFILES["HNSW"], "COSINE") == "HNSW"
+    assert collection.calls == ["release", "drop:emb_idx", "create:HNSW", "load"]
+
+    collection.calls.clear()
+    assert apply_index_profile(collection, INDEX_PROFILES["HNSW"], "COSINE") == "HNSW"
+    assert collection.calls == []
+
+    lite = _FakeIndexedCollection(unsupported={"DISKANN"})
+    assert apply_index_profile(lite, INDEX_PROFILES["DISKANN"], "COSINE") == "IVF_FLAT"
+    # 回退后的索引记录了请求的配置档，再次应用（如进程重启后）不会删建索引
+    lite.calls.clear()
+    assert describe_vector_index(lite) == ("IVF_FLAT", "DISKANN")
+    assert apply_index_profile(lite, INDEX_PROFILES["DISKANN"], "COSINE") == "IVF_FLAT"
+    assert lite.calls == []
+
+
+def test_search_params_follow_actual_index_type_after_fallback():
+    params = {"index_profile": "DISKANN"}
+    assert build_vector_search_params(params, 10, "COSINE")["params"] == {"search_list": 100}
+    assert build_vector_search_params(params, 10, "COSINE", "IVF_FLAT")["params"] == {"nprobe": 10}
+
+    tuned = {"profile": "IVF_FLAT", "params": {"nprobe": 32}}
+    assert build_vector_search_params({**params, TUNED_SEARCH_PARAMS_KEY: tuned}, 10, "COSINE", "IVF_FLAT") == {
+        "metric_type": "COSINE",
+        "params": {"nprobe": 32},
+    }
+
+
+class _Iterator:
+    def __init__(self, rows, batch_size):
+        self.rows = rows
+        self.batch_size = batch_size
+
+    def next(self):
+        batch, self.rows = self.rows[: self.batch_size], self.rows[self.batch_size :]
+        return batch
+
+    def close(self):
+        pass
+
+
+class _ApproxCollection:
+    """模拟 IVF：nprobe 越大，参与比较的向量比例越高，nprobe>=32 时等价于暴力检索。"""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.searched_values: list[int] = []
+        self.scopes: list[int | None] = []
+
+    def query_iterator(self, batch_size, output_fields):
+        rows = [{"id": f"c{index}", "embedding": vector.tolist()} for index, vector in enumerate(self.vectors)]
+        return _Iterator(rows, batch_size)
+
+    def search(self, data, anns_field, param, limit, output_fields, expr=None, expr_params=None):
+        nprobe = param["params"]["nprobe"]
+        self.searched_values.append(nprobe)
+        indexes = np.arange(len(self.vectors))
+        if expr is not None:
+            assert expr == "id in {corpus_ids}"
+            indexes = np.asarray([int(item[1:]) for item in expr_params["corpus_ids"]])
+        self.scopes.append(None if expr is None else len(indexes))
+        visible = indexes[: max(limit, int(len(indexes) * min(nprobe / 32, 1.0)))]
+        results = []
+        for query in np.asarray(data, dtype=np.float32):
+            scores = self.vectors[visible] @ (query / np.linalg.norm(query))
+            top = visible[np.argsort(-scores)[:limit]]
+            results.append([types.SimpleNamespace(id=f"c{index}") for index in top])
+        return results
+
+
+def test_tuner_picks_cheapest_nprobe_meeting_target_recall():
+    rng = np.random.default_rng(7)
+    collection = _ApproxCollection(rng.normal(size=(400, 16)).astype(np.float32))
+    tuner = SearchParamTuner(
+        collection,
+        INDEX_PROFILES["IVF_FLAT"],
+        metric_type="COSINE",
+        k=5,
+        target_recall=0.99,
+        sample_size=40,
+        batch_size=64,
+    )
+
+    result = tuner.run()
+
+    assert result["params"] == {"nprobe": 32}
+    assert result["meets_target"] is True
+    assert result["recall"] >= 0.99
+    assert result["corpus_size"] == 400
+    assert result["corpus_truncated"] is False and set(collection.scopes) == {None}
+    # 从小到大扫描，满足目标后停止
+    assert collection.searched_values == [1, 2, 4, 8, 16, 32]
+    assert [item["recall"] for item in result["sweep"]] == sorted(item["recall"] for item in result["sweep"])
+
+
+def test_tuner_restricts_searches_to_truncated_corpus():
+    rng = np.random.default_rng(7)
+    collection = _ApproxCollection(rng.normal(size=(400, 16)).astype(np.float32))
+    tuner = SearchParamTuner(
+        collection,
+        INDEX_PROFILES["IVF_FLAT"],
+        metric_type="COSINE",
+        k=5,
+        target_recall=0.99,
+        sample_size=40,
+        max_corpus=200,
+        batch_size=64,
+    )
+
+    result = tuner.run()
+
+    # 基准只覆盖前 200 行，ANN 检索限定在同一批 id 内，recall 不会因语料外的结果被低估
+    assert result["corpus_size"] == 200 and result["corpus_truncated"] is True
+    assert set(collection.scopes) == {200}
+    assert result["meets_target"] is True and result["params"] == {"nprobe": 32}
+
+
+async def test_index_file_profile_switch_runs_once_per_kb(monkeypatch):
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.vector_indexes = {}
+    collection = _FakeIndexedCollection()
+
+    await kb._ensure_index_profile("kb_demo", collection, {})
+    assert collection.calls == []
+
+    await kb._ensure_index_profile("kb_demo", collection, {"index_profile": "IVF_SQ8"})
+    await kb._ensure_index_profile("kb_demo", collection, {"index_profile": "IVF_SQ8"})
+    assert collection.calls == ["release", "drop:emb_idx", "create:IVF_SQ8", "load"]
+    assert kb.vector_indexes == {"kb_demo": ("IVF_SQ8", "IVF_SQ8")}
+
+
+async def test_restarted_process_reads_index_from_milvus_instead_of_rebuilding():
+    collection = _FakeIndexedCollection(unsupported={"DISKANN"})
+    first = MilvusKB.__new__(MilvusKB)
+    first.vector_indexes = {}
+    await first._ensure_index_profile("kb_demo", collection, {"index_profile": "DISKANN"})
+    assert collection.calls == ["release", "drop:emb_idx", "create:IVF_FLAT", "load"]
+
+    collection.calls.clear()
+    restarted = MilvusKB.__new__(MilvusKB)
+    restarted.vector_indexes = {}
+    await restarted._ensure_index_profile("kb_demo", collection, {"index_profile": "DISKANN"})
+
+    assert collection.calls == []
+    assert await restarted._get_vector_index_type("kb_demo", collection) == "IVF_FLAT"
+
+
+async def test_concurrent_profile_switch_rebuilds_once_through_residency():
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.vector_indexes = {}
+    kb.residency = CollectionResidencyManager(max_collections=0, pinned=frozenset(), size_estimator=lambda c: 0)
+    collection = _FakeIndexedCollection()
+
+    await asyncio.gather(
+        *(kb._ensure_index_profile("kb_demo", collection, {"index_profile": "HNSW"}) for _ in range(5))
+    )
+
+    assert collection.calls == ["release", "drop:emb_idx", "create:HNSW", "load"]
+    # 重建后的加载经驻留管理器记录
+    assert kb.residency.get_stats()["collections"][0]["loaded"] is True
+    assert kb.residency.loads == 1
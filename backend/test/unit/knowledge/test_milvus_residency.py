@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+import yuxi.knowledge.implementations.milvus as milvus_module
+from yuxi.knowledge.implementations.milvus import MilvusKB
+from yuxi.knowledge.implementations.milvus_residency import (
+    PIN_COLLECTION_KEY,
+    CollectionResidencyManager,
+    SharedResidencyLeases,
+)
+
+pytestmark = pytest.mark.unit
+
+
+class FakeCollection:
+    def __init__(self, name: str, calls: list[tuple[str, str]], size: int = 100, description: str | None = None):
+        self.name = name
+        self.size = size
+        self.calls = calls
+        self.description = description or f"Knowledge base collection for {name} using test-embedding"
+
+    def load(self):
+        self.calls.append(("load", self.name))
+
+    def release(self):
+        self.calls.append(("release", self.name))
+
+    def search(self, **kwargs):
+        self.calls.append(("search", self.name))
+        return [[]]
+
+
+class FakeRedis:
+    """多个进程共享的 Redis，只实现租约协调用到的命令。"""
+
+    def __init__(self):
+        self.values: dict[str, object] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def lock(self, key, timeout):
+        return FakeLock(self, key)
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def get(self, key):
+        value = self.values.get(key)
+        return None if value is None else str(value).encode()
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def zremrangebyscore(self, key, low, high):
+        members = self.zsets.get(key, {})
+        for member, score in list(members.items()):
+            if score <= high:
+                del members[member]
+
+    async def zrange(self, key, start, end):
+        return [member.encode() for member in self.zsets.get(key, {})]
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args) for name, args in self.commands]
+
+
+class FakeLock:
+    def __init__(self, redis: FakeRedis, key: str):
+        self.redis = redis
+        self.key = key
+
+    async def acquire(self, blocking=True):
+        if self.key in self.redis.values:
+            return False
+        self.redis.values[self.key] = 1
+        return True
+
+    async def release(self):
+        self.redis.values.pop(self.key, None)
+
+
+class SharedRedis:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    async def get_client(self):
+        return self.redis
+
+    def mark_unavailable(self, exc):
+        raise exc
+
+
+def _manager(**kwargs) -> CollectionResidencyManager:
+    kwargs.setdefault("pinned", frozenset())
+    return CollectionResidencyManager(size_estimator=lambda collection: collection.size, **kwargs)
+
+
+async def test_releases_least_recently_used_collection_over_budget():
+    calls = []
+    manager = _manager(max_collections=2)
+    a, b, c = (FakeCollection(name, calls) for name in ("a", "b", "c"))
+
+    await manager.ensure_loaded("a", a)
+    await manager.ensure_loaded("b", b)
+    await manager.ensure_loaded("a", a)  # a 变为最近访问，b 最冷
+    await manager.ensure_loaded("c", c)
+
+    assert calls == [("load", "a"), ("load", "b"), ("load", "c"), ("release", "b")]
+    stats = manager.get_stats()
+    assert stats["loaded_collections"] == 2 and stats["evictions"] == 1 and stats["hits"] == 1
+    assert [item["name"] for item in stats["collections"]] == ["c", "a", "b"]
+    assert stats["load_wait_ms"]["samples"] == 3
+
+    # 被释放的集合在下次访问时重新加载，并挤出此时最冷的 a
+    await manager.ensure_loaded("b", b)
+    assert calls[-2:] == [("load", "b"), ("release", "a")]
+
+
+async def test_memory_budget_skips_pinned_collections():
+    calls = []
+    manager = _manager(memory_budget_bytes=250, pinned=frozenset({"a"}))
+    a, b, c = (FakeCollection(name, calls) for name in ("a", "b", "c"))
+
+    await manager.ensure_loaded("a", a)
+    await manager.ensure_loaded("b", b, pinned=True)
+    await manager.ensure_loaded("c", c)
+
+    # a、b 均被固定，只能暂时超出预算
+    assert ("release", "a") not in calls and ("release", "b") not in calls
+    assert manager.get_stats()["loaded_bytes"] == 300
+
+    await manager.ensure_loaded("b", b, pinned=False)
+    await manager.ensure_loaded("c", c)
+    assert calls[-1] == ("release", "b")
+
+
+async def test_in_flight_collection_is_not_released():
+    calls = []
+    manager = _manager(max_collections=1)
+    a, b = FakeCollection("a", calls), FakeCollection("b", calls)
+
+    async with manager.lease("a", a):
+        await manager.ensure_loaded("b", b)
+        assert ("release", "a") not in calls
+        assert manager.get_stats()["collections"][1]["in_flight"] == 1
+
+    # 检索结束后，下一次加载会按 LRU 释放 a
+    await manager.ensure_loaded("b", b)
+    assert calls[-1] == ("release", "a")
+
+
+async def test_concurrent_access_loads_collection_once():
+    calls = []
+    manager = _manager()
+    a = FakeCollection("a", calls)
+
+    await asyncio.gather(*(manager.ensure_loaded("a", a) for _ in range(5)))
+
+    assert calls == [("load", "a")]
+
+
+async def test_milvus_search_reloads_released_collection():
+    calls = []
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.residency = _manager(max_collections=1)
+    a, b = FakeCollection("kb_a", calls), FakeCollection("kb_b", calls)
+    kb.collections = {"kb_a": a, "kb_b": b}
+    search = {"data": [[0.1]], "anns_field": "embedding", "param": {}, "limit": 1, "expr": None, "output_fields": []}
+
+    kb._sync_collection_pin("kb_a", {PIN_COLLECTION_KEY: False})
+    await kb._search_collection(a, **search)
+    await kb._search_collection(b, **search)
+    await kb._search_collection(a, **search)
+
+    assert calls == [
+        ("load", "kb_a"),
+        ("search", "kb_a"),
+        ("load", "kb_b"),
+        ("release", "kb_a"),
+        ("search", "kb_b"),
+        ("load", "kb_a"),
+        ("release", "kb_b"),
+        ("search", "kb_a"),
+    ]
+    assert MilvusKB.validate_additional_params({PIN_COLLECTION_KEY: 1})[PIN_COLLECTION_KEY] is True
+
+    kb._sync_collection_pin("kb_a", {PIN_COLLECTION_KEY: True})
+    await kb._search_collection(b, **search)
+    assert ("release", "kb_a") not in calls[-3:]
+
+
+async def test_collection_leased_by_another_process_is_not_released():
+    redis = FakeRedis()
+    calls = []
+    api = _manager(max_collections=1, shared=SharedResidencyLeases(process_id="api", redis=SharedRedis(redis)))
+    worker = _manager(max_collections=1, shared=SharedResidencyLeases(process_id="worker", redis=SharedRedis(redis)))
+    a, b = FakeCollection("a", calls), FakeCollection("b", calls)
+
+    async with worker.lease("a", a):
+        await api.ensure_loaded("a", a)
+        await api.ensure_loaded("b", b)
+    # worker 仍持有 a 的租约，api 超出预算也不能释放
+    assert ("release", "a") not in calls and api.evictions == 0
+
+    # worker 的租约过期后，api 释放 a 并递增释放代数
+    redis.zsets["yuxi:milvus_residency:a:leases"]["worker"] = 0
+    await api.ensure_loaded("b", b)
+    assert calls[-1] == ("release", "a") and api.evictions == 1
+
+    # worker 本地仍认为 a 已加载，代数变化后重新加载
+    await worker.ensure_loaded("a", a)
+    assert calls[-1] == ("load", "a") and worker.loads == 2
+
+
+async def test_seeds_collections_loaded_before_startup(monkeypatch):
+    calls = []
+    loaded = milvus_module.LoadState.Loaded
+    states = {
+        "kb_a": loaded,
+        "kb_b": milvus_module.LoadState.NotLoad,
+        "kb_a_entity": loaded,
+        "kb_a__legacy": loaded,
+        "kb_a__filter_v2": loaded,
+    }
+    descriptions = {
+        "kb_a_entity": "Entity collection",
+        "kb_a__legacy": "Knowledge base collection for kb_a using test-embedding",
+        "kb_a__filter_v2": "Knowledge base collection for kb_a using test-embedding",
+    }
+    monkeypatch.setattr(milvus_module.utility, "list_collections", lambda using: list(states))
+    monkeypatch.setattr(milvus_module.utility, "load_state", lambda name, using: states[name])
+    monkeypatch.setattr(
+        milvus_module, "Collection", lambda name, using: FakeCollection(name, calls, description=descriptions.get(name))
+    )
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.connection_alias = "test"
+    kb.residency = _manager(max_collections=1)
+
+    kb._seed_residency()
+    await kb.residency.ensure_loaded("kb_c", FakeCollection("kb_c", calls))
+
+    # 上次运行加载的 kb_a 视为最冷的集合被释放；图谱集合与迁移中的集合不参与驻留管理
+    assert calls == [("load", "kb_c"), ("release", "kb_a")]
+    assert [item["name"] for item in kb.residency.get_stats()["collections"]] == ["kb_c", "kb_a"]
+
+
+async def test_seeded_collection_released_by_another_process_is_reloaded():
+    redis = FakeRedis()
+    calls = []
+    api = _manager(max_collections=1, shared=SharedResidencyLeases(process_id="api", redis=SharedRedis(redis)))
+    worker = _manager(max_collections=1, shared=SharedResidencyLeases(process_id="worker", redis=SharedRedis(redis)))
+    a, b = FakeCollection("a", calls), FakeCollection("b", calls)
+
+    # 两个进程启动时都看到 a 已加载，随后 api 按预算释放了 a
+    api.seed_loaded("a", a)
+    worker.seed_loaded("a", a)
+    await api.ensure_loaded("b", b)
+    assert ("release", "a") in calls
+
+    await worker.ensure_loaded("a", a)
+    assert calls[-1] == ("load", "a")
+
+
+async def test_unloaded_collection_is_reloaded_by_other_processes():
+    redis = FakeRedis()
+    calls = []
+    api = _manager(max_collections=2, shared=SharedResidencyLeases(process_id="api", redis=SharedRedis(redis)))
+    worker = _manager(max_collections=2, shared=SharedResidencyLeases(process_id="worker", redis=SharedRedis(redis)))
+    a = FakeCollection("a", calls)
+    await api.ensure_loaded("a", a)
+    await worker.ensure_loaded("a", a)
+
+    async with worker.unloaded("a", a):
+        calls.append(("rebuild", "a"))
+    assert calls[-3:] == [("release", "a"), ("rebuild", "a"), ("load", "a")]
+
+    # 释放代数已递增，api 下次使用时重新加载
+    await api.ensure_loaded("a", a)
+    assert calls[-1] == ("load", "a") and api.loads == 2
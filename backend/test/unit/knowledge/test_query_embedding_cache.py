@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+import yuxi.knowledge.query_embedding_cache as cache_module
+import yuxi.storage.redis.fallback as redis_fallback_module
+from yuxi.knowledge.query_embedding_cache import QueryEmbeddingCache
+
+pytestmark = pytest.mark.unit
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    async def get(self, key: str):
+        return self.data.get(key)
+
+    async def set(self, key: str, value: str, *, ex: int):
+        self.data[key] = value
+        self.expires[key] = ex
+
+    async def mget(self, keys: list[str]):
+        return [self.data.get(key) for key in keys]
+
+
+class _CountingEmbedder:
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    async def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+async def _async_value(value):
+    return value
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_skips_embedding_call():
+    cache = QueryEmbeddingCache(redis_enabled=False)
+    embedder = _CountingEmbedder()
+
+    first = await cache.get_or_embed("provider:embed", "what is  yuxi?", embedder)
+    second = await cache.get_or_embed("provider:embed", " what is yuxi? ", embedder)
+
+    assert first == second
+    assert embedder.calls == [["what is yuxi?"]]
+    assert cache.get_stats()["local_hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_embedding_model_change_uses_separate_entries():
+    cache = QueryEmbeddingCache(redis_enabled=False)
+    embedder = _CountingEmbedder()
+
+    await cache.get_or_embed("provider:embed-a", "query", embedder)
+    await cache.get_or_embed("provider:embed-b", "query", embedder)
+    await cache.get_or_embed("provider:embed-a", "query", embedder)
+
+    assert len(embedder.calls) == 2
+
+    cache.invalidate("provider:embed-a")
+    await cache.get_or_embed("provider:embed-a", "query", embedder)
+    await cache.get_or_embed("provider:embed-b", "query", embedder)
+
+    assert len(embedder.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_local_tier_evicts_least_recently_used():
+    cache = QueryEmbeddingCache(max_entries=2, redis_enabled=False)
+    embedder = _CountingEmbedder()
+
+    await cache.get_or_embed("spec", "a", embedder)
+    await cache.get_or_embed("spec", "b", embedder)
+    await cache.get_or_embed("spec", "a", embedder)
+    await cache.get_or_embed("spec", "c", embedder)
+    await cache.get_or_embed("spec", "a", embedder)
+    await cache.get_or_embed("spec", "b", embedder)
+
+    assert embedder.calls == [["a"], ["b"], ["c"], ["b"]]
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_processes(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", lambda: _async_value(redis))
+    embedder = _CountingEmbedder()
+
+    await QueryEmbeddingCache(ttl_seconds=60).get_or_embed("spec", "query", embedder)
+    other_process_cache = QueryEmbeddingCache(ttl_seconds=60)
+    vector = await other_process_cache.get_or_embed("spec", "query", embedder)
+
+    assert vector == [5.0, 1.0]
+    assert len(embedder.calls) == 1
+    assert other_process_cache.get_stats()["redis_hits"] == 1
+    (key,) = redis.data
+    assert key.startswith(cache_module.QUERY_EMBEDDING_CACHE_KEY_PREFIX)
+    assert json.loads(redis.data[key]) == [5.0, 1.0]
+    assert redis.expires[key] == 60
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_embedding(monkeypatch):
+    calls = 0
+
+    async def failing_redis():
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("redis down")
+
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", failing_redis)
+    cache = QueryEmbeddingCache()
+    embedder = _CountingEmbedder()
+
+    await cache.get_or_embed("spec", "first", embedder)
+    await cache.get_or_embed("spec", "second", embedder)
+
+    assert len(embedder.calls) == 2
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_embed_many_batches_misses_into_one_call(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", lambda: _async_value(redis))
+    embedder = _CountingEmbedder()
+    await QueryEmbeddingCache(ttl_seconds=60).get_or_embed("spec", "shared", embedder)
+
+    cache = QueryEmbeddingCache(ttl_seconds=60)
+    await cache.get_or_embed("spec", "local", embedder)
+    vectors = await cache.get_or_embed_many("spec", ["local", "shared", "new one", " new  one ", "x"], embedder)
+
+    assert vectors == [[5.0, 1.0], [6.0, 1.0], [7.0, 1.0], [7.0, 1.0], [1.0, 1.0]]
+    assert embedder.calls == [["shared"], ["local"], ["new one", "x"]]
+    stats = cache.get_stats()
+    assert (stats["local_hits"], stats["redis_hits"], stats["misses"]) == (1, 1, 3)
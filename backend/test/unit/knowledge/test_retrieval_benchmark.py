@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+pytestmark = pytest.mark.unit
+
+SCRIPT_PATH = Path(__file__).resolve().parents[3] / "scripts" / "benchmarks" / "retrieval_benchmark.py"
+
+
+def _load_script() -> ModuleType:
+    spec = importlib.util.spec_from_file_location("retrieval_benchmark", SCRIPT_PATH)
+    assert spec is not None
+    assert spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def bench_script() -> ModuleType:
+    return _load_script()
+
+
+def test_hash_embedding_is_deterministic_and_similarity_aware(bench_script):
+    embedder = bench_script.HashEmbedding(dimension=128)
+    first, again, related, unrelated = embedder.batch_encode(["林黛玉进贾府", "林黛玉进贾府", "黛玉进府", "abc xyz"])
+
+    def dot(left, right):
+        return sum(a * b for a, b in zip(left, right, strict=True))
+
+    assert first == again
+    assert dot(first, related) > dot(first, unrelated)
+
+
+async def test_in_process_benchmark_runs_all_modes(bench_script, monkeypatch):
+    # run_case 会替换模块级 Query 向量缓存，测试结束后恢复
+    monkeypatch.setattr(
+        bench_script.milvus_module, "query_embedding_cache", bench_script.milvus_module.query_embedding_cache
+    )
+    args = bench_script.build_parser().parse_args(
+        ["--max-files", "2", "--queries", "12", "--warmup", "1", "--top-k", "3", "--concurrency", "1", "4"]
+    )
+
+    report = await bench_script.run_benchmark(args)
+
+    assert report["meta"]["chunks"] > 0
+    cases = {(item["mode"], item["concurrency"]) for item in report["results"]}
+    assert cases == {(mode, concurrency) for mode in ("vector", "keyword", "hybrid") for concurrency in (1, 4)}
+    for item in report["results"]:
+        assert item["queries"] == 12
+        # 种子问题未必出现在前两回中，BM25 可能无命中；向量与混合检索总能返回结果
+        assert item["empty_results"] < item["queries"]
+        if item["mode"] != "keyword":
+            assert item["empty_results"] == 0
+        assert 0 < item["p50_ms"] <= item["p95_ms"] <= item["p99_ms"]
+        assert item["qps"] > 0
+
+
+def test_keyword_search_ranks_matching_chunks_first(bench_script):
+    chunks = bench_script.build_chunks(bench_script.load_corpus("tiny")[:3])
+    embedder = bench_script.HashEmbedding(dimension=64)
+    collection = bench_script.InProcessCollection(chunks, embedder.batch_encode([c["content"] for c in chunks]))
+
+    hits = collection.search(["甄士隐"], bench_script.CONTENT_SPARSE_FIELD, {"metric_type": "BM25"}, limit=3)[0]
+
+    assert hits
+    assert "甄士隐" in hits[0].entity["content"]
+    assert [hit.distance for hit in hits] == sorted((hit.distance for hit in hits), reverse=True)
+
+
+def test_compare_with_baseline_flags_regressions(bench_script):
+    def case(p95_ms: float, qps: float) -> dict:
+        return {
+            "mode": "vector",
+            "final_top_k": 10,
+            "concurrency": 8,
+            "p50_ms": 1.0,
+            "p95_ms": p95_ms,
+            "p99_ms": p95_ms,
+            "qps": qps,
+        }
+
+    baseline = {"results": [case(p95_ms=10.0, qps=100.0)]}
+
+    within = bench_script.compare_with_baseline({"results": [case(p95_ms=11.0, qps=95.0)]}, baseline, 0.2)
+    regressed = bench_script.compare_with_baseline({"results": [case(p95_ms=15.0, qps=60.0)]}, baseline, 0.2)
+
+    assert within["regressed_cases"] == 0
+    assert regressed["regressed_cases"] == 1
+    assert set(regressed["cases"][0]["regressions"]) == {"p95_ms", "p99_ms", "qps"}
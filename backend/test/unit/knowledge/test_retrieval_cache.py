@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import pytest
+
+from yuxi.knowledge import retrieval_cache as retrieval_cache_module
+from yuxi.knowledge.manager import KnowledgeBaseManager
+from yuxi.knowledge.read_models import KnowledgeBaseConfig
+from yuxi.knowledge.retrieval_cache import RetrievalResultCache, build_retrieval_cache_key
+from yuxi.storage.redis import fallback as redis_fallback_module
+
+pytestmark = pytest.mark.unit
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values: dict[str, int] = {}
+
+    async def get(self, key):
+        value = self.values.get(key)
+        return None if value is None else str(value).encode()
+
+    async def set(self, key, value, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = int(value)
+        return True
+
+    async def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+class _FakeKnowledgeBase:
+    kb_type = "milvus"
+
+    def __init__(self):
+        self.queries: list[tuple[str, dict]] = []
+        self.indexed: list[str] = []
+        self.batches: list[list[str]] = []
+
+    async def aquery(self, query_text, kb_id, **options):
+        options.pop("config")
+        self.queries.append((query_text, options))
+        return [{"content": f"{query_text} #{len(self.queries)}", "metadata": {"chunk_id": "c1"}}]
+
+    async def aquery_many(self, kb_id, queries, **options):
+        self.batches.append(list(queries))
+        return [await self.aquery(query_text, kb_id, **options) for query_text in queries]
+
+    async def move_file(self, kb_id, file_id, new_parent_id):
+        return {"file_id": file_id, "parent_id": new_parent_id}
+
+    async def index_file(self, kb_id, file_id, operator_id=None, **kwargs):
+        self.indexed.append(file_id)
+        return {"file_id": file_id, "status": "indexed"}
+
+    def build_search_output(self, kb_id, results):
+        return {"kb_id": kb_id, "results": results}
+
+
+CONFIG = KnowledgeBaseConfig(
+    kb_id="kb_1",
+    kb_type="milvus",
+    embedding_model_spec="provider:embedding",
+    query_params={"options": {"final_top_k": 5}},
+)
+
+
+@pytest.fixture
+def cache_env(monkeypatch, tmp_path):
+    redis = _FakeRedis()
+    cache = RetrievalResultCache(max_entries=8)
+
+    async def fake_get_redis():
+        return redis
+
+    async def fake_get_config(_kb_id):
+        return CONFIG
+
+    async def noop_refresh(_kb_id):
+        return None
+
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", fake_get_redis)
+    monkeypatch.setattr(retrieval_cache_module, "retrieval_result_cache", cache)
+    monkeypatch.setattr("yuxi.knowledge.manager.retrieval_result_cache", cache)
+
+    manager = KnowledgeBaseManager(str(tmp_path))
+    fake_kb = _FakeKnowledgeBase()
+    monkeypatch.setattr(manager, "get_kb_config", fake_get_config)
+    monkeypatch.setattr(manager, "_get_or_create_kb_instance", lambda _kb_type: fake_kb)
+    monkeypatch.setattr(manager, "_refresh_database_stats", noop_refresh)
+    return manager, fake_kb, cache, redis
+
+
+async def test_repeated_query_hits_cache_and_returns_copies(cache_env):
+    manager, fake_kb, cache, _redis = cache_env
+
+    first = await manager.aquery("什么是贾宝玉", "kb_1", final_top_k=3)
+    first[0]["content"] = "mutated"
+    second = await manager.aquery("  什么是贾宝玉 ", "kb_1", final_top_k=3)
+
+    assert len(fake_kb.queries) == 1
+    assert second[0]["content"] == "什么是贾宝玉 #1"
+    assert cache.get_stats()["hits"] == 1
+
+    # 单次覆盖参数不同视为不同检索
+    await manager.aquery("什么是贾宝玉", "kb_1", final_top_k=10)
+    assert len(fake_kb.queries) == 2
+
+
+async def test_use_cache_false_skips_cache_without_forwarding_flag(cache_env):
+    manager, fake_kb, _cache, _redis = cache_env
+
+    await manager.aquery("林黛玉", "kb_1")
+    await manager.aquery("林黛玉", "kb_1", use_cache=False)
+
+    assert len(fake_kb.queries) == 2
+    assert "use_cache" not in fake_kb.queries[1][1]
+
+
+async def test_index_file_bumps_version_and_invalidates(cache_env):
+    manager, fake_kb, cache, _redis = cache_env
+
+    await manager.retrieve("kb_1", "薛宝钗")
+    await manager.retrieve("kb_1", "薛宝钗")
+    assert len(fake_kb.queries) == 1
+    assert fake_kb.queries[0][1]["agent_call"] is True
+
+    await manager.index_file("kb_1", "file_1")
+    assert cache.get_stats()["local_entries"] == 0
+
+    result = await manager.retrieve("kb_1", "薛宝钗")
+    assert len(fake_kb.queries) == 2
+    assert result["results"][0]["content"] == "薛宝钗 #2"
+
+
+async def test_move_file_invalidates_folder_scoped_results(cache_env):
+    manager, fake_kb, _cache, _redis = cache_env
+
+    await manager.aquery("王熙凤", "kb_1", folder_id="folder_a")
+    await manager.aquery("王熙凤", "kb_1", folder_id="folder_a")
+    assert len(fake_kb.queries) == 1
+
+    await manager.move_file("kb_1", "file_1", "folder_a")
+    await manager.aquery("王熙凤", "kb_1", folder_id="folder_a")
+    assert len(fake_kb.queries) == 2
+
+
+async def test_flushed_version_is_not_reseeded_with_a_constant(cache_env):
+    manager, fake_kb, cache, redis = cache_env
+
+    await manager.aquery("史湘云", "kb_1")
+    version = await cache.get_version("kb_1")
+    # 模拟 Redis 被清空：重新生成的版本不能与进程内旧缓存项的版本相同
+    redis.values.clear()
+    assert await cache.get_version("kb_1") != version
+    await manager.aquery("史湘云", "kb_1")
+    assert len(fake_kb.queries) == 2
+
+
+async def test_retrieve_many_only_batches_cache_misses(cache_env):
+    manager, fake_kb, _cache, _redis = cache_env
+
+    await manager.retrieve("kb_1", "贾宝玉")
+    outputs = await manager.retrieve_many("kb_1", ["贾宝玉", "林黛玉", "薛宝钗"])
+
+    assert fake_kb.batches == [["林黛玉", "薛宝钗"]]
+    assert [output["results"][0]["content"] for output in outputs] == ["贾宝玉 #1", "林黛玉 #2", "薛宝钗 #3"]
+    assert all(options["agent_call"] is True for _, options in fake_kb.queries)
+
+
+async def test_cache_bypassed_when_version_unavailable(monkeypatch):
+    cache = RetrievalResultCache()
+
+    async def unavailable():
+        raise RuntimeError("redis down")
+
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", unavailable)
+
+    assert await cache.get_version("kb_1") is None
+    # 进入重试等待期后不再尝试连接
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", None)
+    assert await cache.get_version("kb_1") is None
+    await cache.bump_version("kb_1")
+
+
+def test_lru_bound_and_empty_results_not_stored():
+    cache = RetrievalResultCache(max_entries=2, max_results=3)
+    keys = [build_retrieval_cache_key("kb_1", "0", f"q{i}", CONFIG, {}) for i in range(3)]
+
+    for key in keys:
+        cache.set(key, [{"content": "x"}])
+    cache.set(build_retrieval_cache_key("kb_1", "0", "empty", CONFIG, {}), [])
+    cache.set(build_retrieval_cache_key("kb_1", "0", "big", CONFIG, {}), [{}] * 4)
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.get_stats()["local_entries"] == 2
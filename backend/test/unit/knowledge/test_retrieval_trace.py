@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+import yuxi.knowledge.implementations.milvus as milvus_module
+import yuxi.knowledge.retrieval_trace as trace_module
+from yuxi.knowledge.implementations.milvus import MilvusKB
+from yuxi.knowledge.query_embedding_cache import QueryEmbeddingCache
+from yuxi.knowledge.read_models import KnowledgeBaseConfig
+from yuxi.knowledge.retrieval_trace import (
+    JsonLinesTraceSink,
+    OpenTelemetryTraceSink,
+    create_trace_sink,
+    retrieval_trace,
+    stage_latency,
+    trace_stage,
+)
+
+pytestmark = pytest.mark.unit
+
+CONFIG = KnowledgeBaseConfig(kb_id="db", kb_type="milvus", embedding_model_spec="test:embedding")
+
+
+class FakeSink:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class FakeHit:
+    def __init__(self, chunk_id: str, distance: float):
+        self.distance = distance
+        self.entity = {"content": chunk_id, "chunk_id": chunk_id, "file_id": "file-1", "chunk_index": 0}
+
+
+class FakeCollection:
+    name = "db"
+
+    def search(self, **kwargs):
+        return [[FakeHit("a", 0.9), FakeHit("b", 0.8)] for _ in kwargs["data"]]
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    fake = FakeSink()
+    monkeypatch.setattr(trace_module, "_sink", fake)
+    monkeypatch.setattr(trace_module, "_sink_resolved", True)
+    stage_latency.reset()
+    yield fake
+    stage_latency.reset()
+
+
+def _make_kb() -> MilvusKB:
+    kb = MilvusKB.__new__(MilvusKB)
+    kb.collections = {}
+    kb.vector_indexes = {}
+    kb._get_embedding_function = lambda spec, **kwargs: lambda texts: [[0.1, 0.2] for _ in texts]
+
+    async def get_collection(kb_id, embedding_model_spec):
+        return FakeCollection()
+
+    async def hydrate(kb_id, chunks):
+        return None
+
+    async def rerank(query_text, kb_id, chunks, reranker_model):
+        await asyncio.sleep(0)
+
+    kb._get_or_create_milvus_collection = get_collection
+    kb._hydrate_chunk_sources = hydrate
+    kb._rerank_chunks = rerank
+    return kb
+
+
+async def test_milvus_query_records_stage_span_tree(monkeypatch, sink):
+    monkeypatch.setattr(milvus_module, "query_embedding_cache", QueryEmbeddingCache(redis_enabled=False))
+    kb = _make_kb()
+
+    with retrieval_trace("retrieval", "db") as root:
+        await kb.aquery("q", "db", config=CONFIG, use_reranker=True, reranker_model="test:rerank")
+
+    assert sink.spans == [root]
+    stages = {child.name: child for child in root.children}
+    assert list(stages) == [
+        "load_collection",
+        "file_filter",
+        "query_embedding",
+        "milvus_search",
+        "hydrate_sources",
+        "rerank",
+    ]
+    assert [child.name for child in stages["query_embedding"].children] == ["embedding_request"]
+    assert stages["milvus_search"].attributes == {"mode": "vector", "limit": 50, "candidates": 2}
+    assert stages["hydrate_sources"].attributes["candidates"] == 2
+    assert all(child.kb_id == "db" and child.duration_ms >= 0 for child in root.children)
+
+    data = root.to_dict()
+    assert data["children"][3]["attributes"]["candidates"] == 2
+    assert json.dumps(data)
+
+    metrics = stage_latency.render_prometheus()
+    assert 'yuxi_retrieval_stage_duration_seconds_count{stage="milvus_search",kb_id="db"} 1' in metrics
+    assert 'yuxi_retrieval_stage_duration_seconds_bucket{stage="rerank",kb_id="db",le="+Inf"} 1' in metrics
+
+
+async def test_concurrent_stages_attach_to_their_own_kb_span(sink):
+    async def retrieve(kb_id: str, delay: float):
+        with retrieval_trace("retrieval", kb_id):
+            with trace_stage("milvus_search") as span:
+                await asyncio.sleep(delay)
+                span.set(candidates=1)
+
+    with trace_stage("outside") as span:
+        span.set(ignored=True)
+    with retrieval_trace("federated", queries=1) as root:
+        await asyncio.gather(retrieve("kb_a", 0.02), retrieve("kb_b", 0.0))
+
+    assert [child.kb_id for child in root.children] == ["kb_a", "kb_b"]
+    assert root.children[0].children[0].duration_ms >= 20
+    assert len(sink.spans) == 1
+    assert {(item["stage"], item["kb_id"]) for item in stage_latency.get_stats()} == {
+        ("federated", ""),
+        ("retrieval", "kb_a"),
+        ("retrieval", "kb_b"),
+        ("milvus_search", "kb_a"),
+        ("milvus_search", "kb_b"),
+    }
+
+
+async def test_failed_stage_is_marked_and_still_exported(sink):
+    with pytest.raises(RuntimeError):
+        with retrieval_trace("retrieval", "db"):
+            with trace_stage("milvus_search"):
+                raise RuntimeError("boom")
+
+    assert sink.spans[0].attributes == {"error": "RuntimeError"}
+    assert sink.spans[0].children[0].attributes == {"error": "RuntimeError"}
+
+
+def test_json_sink_appends_span_trees(tmp_path, monkeypatch):
+    for name in trace_module.OTEL_ENDPOINT_ENVS:
+        monkeypatch.delenv(name, raising=False)
+    assert create_trace_sink("off") is None
+    assert isinstance(create_trace_sink("auto"), JsonLinesTraceSink)
+
+    sink = JsonLinesTraceSink(tmp_path / "traces" / "retrieval.jsonl")
+    with retrieval_trace("retrieval", "db") as first:
+        pass
+    sink.export(first)
+    sink.export(first)
+    sink.close()
+
+    lines = (tmp_path / "traces" / "retrieval.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["retrieval", "retrieval"]
+
+
+def test_json_sink_rotates_and_keeps_limited_backups(tmp_path):
+    path = tmp_path / "retrieval.jsonl"
+    line_bytes = len(json.dumps(trace_module.TraceSpan("retrieval", attributes={"n": 0}).to_dict()).encode()) + 1
+    sink = JsonLinesTraceSink(path, max_bytes=line_bytes + 10, backups=2)
+
+    for index in range(4):
+        sink.export(trace_module.TraceSpan("retrieval", attributes={"n": index}))
+        sink.close()
+
+    def written(name):
+        lines = (tmp_path / name).read_text(encoding="utf-8").splitlines()
+        return [json.loads(line)["attributes"]["n"] for line in lines]
+
+    # 每次写入前超出上限即轮转，最旧的文件被丢弃
+    assert written("retrieval.jsonl") == [3]
+    assert written("retrieval.jsonl.1") == [2]
+    assert written("retrieval.jsonl.2") == [1]
+    assert not (tmp_path / "retrieval.jsonl.3").exists()
+
+
+def test_close_trace_sink_flushes_and_resets(monkeypatch):
+    class ClosableSink:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    sink = ClosableSink()
+    monkeypatch.setattr(trace_module, "_sink", sink)
+    monkeypatch.setattr(trace_module, "_sink_resolved", True)
+
+    trace_module.close_trace_sink()
+
+    assert sink.closed and trace_module._sink is None and not trace_module._sink_resolved
+    assert trace_module.RETRIEVAL_TRACE_SINK == "off"
+
+
+def test_otel_sink_replays_span_tree():
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    in_memory = pytest.importorskip("opentelemetry.sdk.trace.export.in_memory_span_exporter")
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+    exporter = in_memory.InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    root = trace_module.TraceSpan("retrieval", kb_id="db", duration_ms=12.0)
+    root.children.append(trace_module.TraceSpan("milvus_search", kb_id="db", attributes={"candidates": 3}))
+    OpenTelemetryTraceSink(provider.get_tracer("test")).export(root)
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {"retrieval.retrieval", "retrieval.milvus_search"}
+    assert spans["retrieval.milvus_search"].parent.span_id == spans["retrieval.retrieval"].context.span_id
+    assert spans["retrieval.milvus_search"].attributes["candidates"] == 3
+    assert spans["retrieval.retrieval"].end_time - spans["retrieval.retrieval"].start_time == 12_000_000
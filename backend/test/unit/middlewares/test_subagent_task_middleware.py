@@ -507,6 +507,43 @@ async def test_subagent_start_creates_child_run_and_enqueues(monkeypatch) -> Non
     assert result.update["subagent_runs"][0]["run_id"] == "child-run"
 
 
+@pytest.mark.asyncio
+async def test_subagent_start_prefers_runtime_context_over_build_context(monkeypatch) -> None:
+    """缓存的 graph 跨 run 复用时，父运行信息必须取自本次调用的运行时 context。"""
+    captured: dict[str, object] = {}
+
+    class _SubagentRunService:
+        def __init__(self, db):
+            pass
+
+        async def start(self, **kwargs):
+            captured["start"] = kwargs
+            return SimpleNamespace(
+                run=_subagent_run(status="pending"),
+                created=True,
+                continuing=False,
+                relation=SimpleNamespace(id=77, child_thread_id="child-thread"),
+            )
+
+    _patch_session(monkeypatch)
+    _patch_subagent_run_service(monkeypatch, _SubagentRunService)
+
+    middleware = _async_tool_middleware()
+    runtime = SimpleNamespace(
+        tool_call_id="tool-async",
+        state={},
+        config={},
+        context=SimpleNamespace(thread_id="next-thread", uid="user-2", run_id="next-run"),
+    )
+    tool = next(item for item in middleware.tools if item.name == "subagent_start")
+
+    await tool.coroutine(description="run in background", subagent_slug="worker", runtime=runtime)
+
+    assert captured["start"]["uid"] == "user-2"
+    assert captured["start"]["created_by_run_id"] == "next-run"
+    assert captured["start"]["file_thread_id"] == "next-thread"
+
+
 @pytest.mark.asyncio
 async def test_subagent_status_returns_terminal_result(monkeypatch) -> None:
     captured: dict[str, object] = {}
@@ -14,11 +14,20 @@ from yuxi.knowledge.implementations.milvus import (
     VECTOR_METRIC_TYPE,
     MilvusKB,
 )
+from yuxi.knowledge.implementations.milvus_async import MilvusAsyncQueryPool
+from yuxi.knowledge.query_embedding_cache import QueryEmbeddingCache
 from yuxi.knowledge.read_models import KnowledgeBaseConfig
 
 EMBEDDING_MODEL_SPEC = "test-provider:test-embedding"
 
 
+@pytest.fixture(autouse=True)
+def isolated_query_embedding_cache(monkeypatch):
+    cache = QueryEmbeddingCache(redis_enabled=False)
+    monkeypatch.setattr(milvus_module, "query_embedding_cache", cache)
+    return cache
+
+
 def make_query_config() -> KnowledgeBaseConfig:
     return KnowledgeBaseConfig(
         kb_id="db",
@@ -39,6 +48,8 @@ class FakeHit:
 
 
 class FakeCollection:
+    name = "db"
+
     def __init__(self, distance: float = 0.8):
         self.search_calls = []
         self.hybrid_calls = []
@@ -59,6 +70,8 @@ class FakeCollection:
 
 def make_kb(collection: FakeCollection) -> MilvusKB:
     kb = MilvusKB.__new__(MilvusKB)
+    kb.collections = {}
+    kb.vector_indexes = {}
     kb._get_embedding_function = lambda embedding_model_spec, **kwargs: lambda texts: [[0.1, 0.2] for _ in texts]
 
     async def get_collection(kb_id: str, embedding_model_spec: str | None):
@@ -169,6 +182,7 @@ def make_chunk(index: int, content: str = "content") -> dict:
 async def test_cleanup_database_resources_offloads_milvus_cleanup(monkeypatch):
     kb = MilvusKB.__new__(MilvusKB)
     kb.connection_alias = "test-alias"
+    kb.vector_indexes = {}
     event_loop_thread = threading.get_ident()
     cleanup_threads = []
     calls = []
@@ -207,7 +221,12 @@ async def test_cleanup_database_resources_offloads_milvus_cleanup(monkeypatch):
     result = await kb.cleanup_database_resources("db")
 
     assert result == {"message": "删除成功"}
-    assert calls == ["has_collection", "drop_collection", "graph_init", "drop_graph_collections", "delete_base"]
+    assert calls == [
+        *["has_collection", "drop_collection"] * 3,
+        "graph_init",
+        "drop_graph_collections",
+        "delete_base",
+    ]
     assert cleanup_threads
     assert all(thread_id != event_loop_thread for thread_id in cleanup_threads)
 
@@ -304,6 +323,111 @@ async def test_embed_and_store_chunks_batches_embedding_and_insert():
     assert all(call["kwargs"] == {} for call in store_calls)
 
 
+async def test_embed_and_store_chunks_limits_batches_by_token_budget():
+    kb = MilvusKB.__new__(MilvusKB)
+    # 每个长 chunk 约 501 token，短 chunk 约 3 token
+    chunks = [make_chunk(index, content="长" * 500) for index in range(5)]
+    chunks += [make_chunk(index, content="短句") for index in range(5, 25)]
+    batch_sizes = []
+
+    async def embedding_function(texts):
+        batch_sizes.append(len(texts))
+        return [[0.1] for _ in texts]
+
+    async def insert_chunks_to_stores(kb_id, file_id, collection, batch_chunks, embeddings):
+        return None
+
+    kb._insert_chunks_to_stores = insert_chunks_to_stores
+
+    await kb._embed_and_store_chunks(
+        "db", "file-1", FakeCollection(), chunks, embedding_function, chunk_batch_size=10, chunk_batch_tokens=1200
+    )
+
+    assert batch_sizes == [2, 2, 10, 10, 1]
+
+
+async def test_embed_and_store_chunks_overlaps_embedding_with_storage_writes():
+    kb = MilvusKB.__new__(MilvusKB)
+    chunks = [make_chunk(index, content=f"content-{index}") for index in range(60)]
+    stage_latency = 0.05
+    timeline = []
+
+    async def embedding_function(texts):
+        timeline.append(("embed", texts[0]))
+        await asyncio.sleep(stage_latency)
+        return [[0.1] for _ in texts]
+
+    async def insert_chunks_to_stores(kb_id, file_id, collection, batch_chunks, embeddings):
+        timeline.append(("store", batch_chunks[0]["content"]))
+        await asyncio.sleep(stage_latency)
+
+    kb._insert_chunks_to_stores = insert_chunks_to_stores
+
+    started_at = asyncio.get_running_loop().time()
+    await kb._embed_and_store_chunks(
+        "db", "file-1", FakeCollection(), chunks, embedding_function, chunk_batch_size=10, pipeline_depth=2
+    )
+    elapsed = asyncio.get_running_loop().time() - started_at
+
+    # 6 批 × (嵌入 + 写入) 串行约 0.6s；流水线后约为 6 次写入 + 首批嵌入
+    assert 6 * stage_latency <= elapsed < 6 * stage_latency * 2 * 0.8
+    stores = [content for kind, content in timeline if kind == "store"]
+    assert stores == [f"content-{index}" for index in range(0, 60, 10)]
+
+
+async def test_embed_and_store_chunks_stops_embedding_when_store_fails():
+    kb = MilvusKB.__new__(MilvusKB)
+    chunks = [make_chunk(index, content=f"content-{index}") for index in range(50)]
+    embedded = []
+    stored = []
+
+    async def embedding_function(texts):
+        embedded.append(texts[0])
+        await asyncio.sleep(0.01)
+        return [[0.1] for _ in texts]
+
+    async def insert_chunks_to_stores(kb_id, file_id, collection, batch_chunks, embeddings):
+        if batch_chunks[0]["content"] == "content-10":
+            raise RuntimeError("milvus insert failed")
+        stored.append(batch_chunks[0]["content"])
+
+    kb._insert_chunks_to_stores = insert_chunks_to_stores
+
+    with pytest.raises(RuntimeError, match="milvus insert failed"):
+        await kb._embed_and_store_chunks(
+            "db", "file-1", FakeCollection(), chunks, embedding_function, chunk_batch_size=10, pipeline_depth=1
+        )
+    await asyncio.sleep(0.05)
+
+    assert stored == ["content-0"]
+    # 写入失败后不再继续嵌入剩余批次
+    assert len(embedded) < 5
+
+
+async def test_embed_and_store_chunks_writes_embedded_batches_before_embedding_error():
+    kb = MilvusKB.__new__(MilvusKB)
+    chunks = [make_chunk(index, content=f"content-{index}") for index in range(30)]
+    stored = []
+
+    async def embedding_function(texts):
+        if texts[0] == "content-20":
+            raise RuntimeError("embedding service unavailable")
+        return [[0.1] for _ in texts]
+
+    async def insert_chunks_to_stores(kb_id, file_id, collection, batch_chunks, embeddings):
+        await asyncio.sleep(0.01)
+        stored.append(batch_chunks[0]["content"])
+
+    kb._insert_chunks_to_stores = insert_chunks_to_stores
+
+    with pytest.raises(RuntimeError, match="embedding service unavailable"):
+        await kb._embed_and_store_chunks(
+            "db", "file-1", FakeCollection(), chunks, embedding_function, chunk_batch_size=10, pipeline_depth=4
+        )
+
+    assert stored == ["content-0", "content-10"]
+
+
 def test_calculate_chunk_stats_counts_chunks_and_tokens():
     kb = MilvusKB.__new__(MilvusKB)
     chunks = [make_chunk(0, content="alpha beta"), make_chunk(1, content="中文")]
@@ -495,6 +619,7 @@ async def test_insert_chunks_to_stores_inserts_current_batch(monkeypatch):
 
     monkeypatch.setattr("yuxi.knowledge.implementations.milvus.KnowledgeChunkRepository", FakeChunkRepo)
     kb = MilvusKB.__new__(MilvusKB)
+    kb.collections = {}
     collection = FakeCollection()
     chunks = [make_chunk(index) for index in range(3)]
     embeddings = [[0.1, 0.2] for _ in chunks]
@@ -532,6 +657,7 @@ async def test_insert_chunks_to_stores_rolls_back_file_when_milvus_insert_fails(
 
     monkeypatch.setattr("yuxi.knowledge.implementations.milvus.KnowledgeChunkRepository", FakeChunkRepo)
     kb = MilvusKB.__new__(MilvusKB)
+    kb.collections = {}
     collection = FailingCollection()
     milvus_delete_calls = []
 
@@ -591,7 +717,8 @@ async def test_update_content_uses_streaming_chunk_store(monkeypatch):
     assert len(store_calls) == 1
     assert store_calls[0][2] is collection
     assert [chunk["chunk_id"] for chunk in store_calls[0][3]] == ["chunk-0", "chunk-1"]
-    assert store_calls[0][4] is forbidden_embedding
+    # 入库经内容寻址向量存储包装，未命中时才调用模型
+    assert store_calls[0][4].keywords["embed"] is forbidden_embedding
     assert result[0]["status"] == FileStatus.INDEXED
     assert file_repo.records["file-1"].status == FileStatus.INDEXED
     assert file_repo.update_calls[0][2]["status"] == FileStatus.INDEXING
@@ -692,6 +819,33 @@ async def test_hybrid_mode_filters_scores_below_similarity_threshold():
     assert chunks == []
 
 
+async def test_repeated_vector_queries_reuse_cached_query_embedding(isolated_query_embedding_cache):
+    collection = FakeCollection()
+    kb = make_kb(collection)
+    config = make_query_config()
+    embedded_texts = []
+
+    def counting_embedding_function(embedding_model_spec, **kwargs):
+        def embed(texts):
+            embedded_texts.append(list(texts))
+            return [[0.3, 0.4] for _ in texts]
+
+        return embed
+
+    kb._get_embedding_function = counting_embedding_function
+
+    await kb.aquery("vector query", "db", config=config, search_mode="vector")
+    await kb.aquery("  vector   query ", "db", config=config, search_mode="vector")
+    await kb.aquery("vector query", "db", config=config, search_mode="hybrid")
+
+    assert embedded_texts == [["vector query"]]
+    assert [call["data"] for call in collection.search_calls] == [[[0.3, 0.4]], [[0.3, 0.4]]]
+    assert collection.hybrid_calls[0]["reqs"][0].data == [[0.3, 0.4]]
+    stats = isolated_query_embedding_cache.get_stats()
+    assert stats["misses"] == 1
+    assert stats["local_hits"] == 2
+
+
 def test_query_params_config_uses_bm25_parameters():
     kb = MilvusKB.__new__(MilvusKB)
 
@@ -740,3 +894,162 @@ def test_collection_supports_bm25_requires_analyzed_content_sparse_field_and_fun
     collection = type("Collection", (), {"schema": schema})()
 
     assert kb._collection_supports_bm25(collection)
+
+
+class FakeAsyncMilvusClient:
+    def __init__(self):
+        self.calls = []
+
+    async def search(self, collection_name, **kwargs):
+        self.calls.append(("search", collection_name, kwargs))
+        return [[FakeHit("Async result", 0.9)]]
+
+    async def hybrid_search(self, collection_name, **kwargs):
+        self.calls.append(("hybrid_search", collection_name, kwargs))
+        return [[FakeHit("Async hybrid result", 0.9)]]
+
+
+async def test_query_pool_serves_searches_without_thread_offload(monkeypatch):
+    collection = FakeCollection()
+    collection.name = "kb_db"
+    kb = make_kb(collection)
+    client = FakeAsyncMilvusClient()
+    kb.query_pool = MilvusAsyncQueryPool(size=1, client_factory=lambda: client)
+
+    async def forbidden_offload(func, /, *args, **kwargs):
+        # Query 向量仍经线程执行，Milvus 检索不应再卸载到线程
+        assert getattr(func, "__name__", "") not in {"search", "hybrid_search"}
+        return func(*args, **kwargs)
+
+    monkeypatch.setattr(milvus_module, "_run_milvus_query_io", forbidden_offload)
+
+    keyword = await kb.aquery("alpha", "db", config=make_query_config(), search_mode="keyword", bm25_top_k=5)
+    hybrid = await kb.aquery("alpha", "db", config=make_query_config(), search_mode="hybrid", vector_weight=0.6)
+
+    assert keyword[0]["content"] == "Async result"
+    assert hybrid[0]["content"] == "Async hybrid result"
+    (_, name, search_kwargs), (_, _, hybrid_kwargs) = client.calls
+    assert name == "kb_db"
+    assert search_kwargs["anns_field"] == CONTENT_SPARSE_FIELD
+    assert search_kwargs["search_params"]["metric_type"] == "BM25"
+    assert search_kwargs["limit"] == 5
+    assert search_kwargs["filter"] == ""
+    assert hybrid_kwargs["ranker"]._weights == [0.6, 0.3]
+    assert collection.search_calls == [] and collection.hybrid_calls == []
+
+
+async def test_query_pool_falls_back_to_thread_offload_when_client_unavailable():
+    collection = FakeCollection()
+    collection.name = "kb_db"
+    kb = make_kb(collection)
+
+    def broken_factory():
+        raise RuntimeError("grpc aio unsupported")
+
+    kb.query_pool = MilvusAsyncQueryPool(client_factory=broken_factory)
+
+    first = await kb.aquery("alpha", "db", config=make_query_config(), search_mode="keyword")
+    second = await kb.aquery("alpha", "db", config=make_query_config(), search_mode="keyword")
+
+    assert first[0]["content"] == second[0]["content"] == "BM25 result"
+    assert len(collection.search_calls) == 2
+    assert not kb.query_pool.available
+
+
+class BatchFakeCollection:
+    """按请求中的每个 Query 返回各自的命中，模拟 nq>1 检索。"""
+
+    name = "db"
+
+    def __init__(self):
+        self.search_calls = []
+        self.hybrid_calls = []
+
+    @staticmethod
+    def _hits(item) -> list[FakeHit]:
+        label = item if isinstance(item, str) else f"v{item[0]:g}"
+        hits = [FakeHit(f"{label}-{rank}", 0.9 - rank * 0.1) for rank in range(3)]
+        for rank, hit in enumerate(hits):
+            hit.entity = {**hit.entity, "chunk_id": f"{label}-{rank}", "file_id": f"file-{label}"}
+        return hits
+
+    def search(self, **kwargs):
+        self.search_calls.append(kwargs)
+        return [self._hits(item) for item in kwargs["data"]]
+
+    def hybrid_search(self, **kwargs):
+        self.hybrid_calls.append(kwargs)
+        return [self._hits(item) for item in kwargs["reqs"][0].data]
+
+
+@pytest.mark.parametrize("search_mode", ["vector", "keyword", "hybrid"])
+async def test_aquery_many_matches_single_queries_with_one_round_trip(monkeypatch, search_mode):
+    queries = ["贾宝玉", "林黛玉进贾府", "薛宝钗与史湘云"]
+
+    def build():
+        collection = BatchFakeCollection()
+        kb = make_kb(collection)
+        counters = {"embed": [], "hydrate": 0}
+
+        def embedding_function(embedding_model_spec, **kwargs):
+            def embed(texts):
+                counters["embed"].append(list(texts))
+                return [[float(len(text)), 1.0] for text in texts]
+
+            return embed
+
+        async def hydrate(kb_id, chunks):
+            counters["hydrate"] += 1
+            for chunk in chunks:
+                chunk["metadata"]["source"] = f"{chunk['metadata']['file_id']}.md"
+
+        kb._get_embedding_function = embedding_function
+        kb._hydrate_chunk_sources = hydrate
+        monkeypatch.setattr(milvus_module, "query_embedding_cache", QueryEmbeddingCache(redis_enabled=False))
+        return kb, collection, counters
+
+    options = {"search_mode": search_mode, "final_top_k": 2, "similarity_threshold": 0.0}
+    single_kb, single_collection, single_counters = build()
+    expected = [await single_kb.aquery(query, "db", config=make_query_config(), **options) for query in queries]
+
+    batch_kb, batch_collection, batch_counters = build()
+    results = await batch_kb.aquery_many("db", queries, config=make_query_config(), **options)
+
+    assert results == expected
+    assert [len(chunks) for chunks in results] == [2, 2, 2]
+    assert batch_counters["hydrate"] == 1 and single_counters["hydrate"] == 3
+    calls = batch_collection.hybrid_calls if search_mode == "hybrid" else batch_collection.search_calls
+    assert len(calls) == 1
+    if search_mode != "keyword":
+        assert batch_counters["embed"] == [queries]
+        assert len(single_counters["embed"]) == 3
+
+
+async def test_aquery_many_reranks_each_query_against_its_own_chunks(monkeypatch):
+    collection = BatchFakeCollection()
+    kb = make_kb(collection)
+    scored = []
+
+    class FakeReranker:
+        async def acompute_score(self, sentence_pairs, normalize=True, chunk_ids=None):
+            query, documents = sentence_pairs
+            scored.append((query, list(chunk_ids)))
+            # 反转原有顺序
+            return [float(index) for index in range(len(documents))]
+
+    monkeypatch.setattr("yuxi.models.rerank.get_shared_reranker", lambda model: FakeReranker())
+
+    results = await kb.aquery_many(
+        "db",
+        ["alpha", "beta"],
+        config=make_query_config(),
+        search_mode="keyword",
+        use_reranker=True,
+        reranker_model="fake:rerank",
+        recall_top_k=3,
+        final_top_k=2,
+    )
+
+    assert sorted(scored) == [("alpha", ["alpha-0", "alpha-1", "alpha-2"]), ("beta", ["beta-0", "beta-1", "beta-2"])]
+    assert [chunk["metadata"]["chunk_id"] for chunk in results[0]] == ["alpha-2", "alpha-1"]
+    assert [chunk["metadata"]["chunk_id"] for chunk in results[1]] == ["beta-2", "beta-1"]
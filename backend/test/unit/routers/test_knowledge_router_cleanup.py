@@ -1,5 +1,9 @@
+import hashlib
+import tracemalloc
+from contextlib import asynccontextmanager
 from inspect import signature
 from io import BytesIO
+from pathlib import Path
 from types import SimpleNamespace
 
 import pytest
@@ -8,6 +12,7 @@ from httpx import ASGITransport, AsyncClient
 
 from server.routers import knowledge_router
 from yuxi.knowledge.read_models import KnowledgeBaseDetail
+from yuxi.utils.upload_utils import SpooledUpload
 
 pytestmark = pytest.mark.asyncio
 
@@ -179,9 +184,10 @@ async def test_upload_file_invalid_kb_fails_before_read_or_minio(monkeypatch):
     async def fake_ensure_database_supports_documents(kb_id: str, operation: str) -> None:
         raise HTTPException(status_code=404, detail=f"知识库 {kb_id} 不存在")
 
-    async def fake_read_upload_with_limit(*_args, **_kwargs) -> bytes:
+    @asynccontextmanager
+    async def fake_spool_upload_with_hash(*_args, **_kwargs):
         calls["read"] += 1
-        return b"demo"
+        yield SpooledUpload(path=Path("demo.txt"), size=4, content_hash="hash")
 
     async def fake_upload_to_minio(*_args, **_kwargs) -> str:
         calls["upload"] += 1
@@ -192,8 +198,8 @@ async def test_upload_file_invalid_kb_fails_before_read_or_minio(monkeypatch):
         "_ensure_database_supports_documents",
         fake_ensure_database_supports_documents,
     )
-    monkeypatch.setattr(knowledge_router, "read_upload_with_limit", fake_read_upload_with_limit)
-    monkeypatch.setattr(knowledge_router, "aupload_file_to_minio", fake_upload_to_minio)
+    monkeypatch.setattr(knowledge_router, "spool_upload_with_hash", fake_spool_upload_with_hash)
+    monkeypatch.setattr(knowledge_router, "aupload_path_to_minio", fake_upload_to_minio)
 
     upload = UploadFile(filename="demo.txt", file=BytesIO(b"demo"))
 
@@ -210,9 +216,10 @@ async def test_upload_file_read_only_kb_fails_before_read_or_minio(monkeypatch):
     async def fake_ensure_database_supports_documents(kb_id: str, operation: str) -> None:
         raise HTTPException(status_code=400, detail="只支持检索，不支持文档上传")
 
-    async def fake_read_upload_with_limit(*_args, **_kwargs) -> bytes:
+    @asynccontextmanager
+    async def fake_spool_upload_with_hash(*_args, **_kwargs):
         calls["read"] += 1
-        return b"demo"
+        yield SpooledUpload(path=Path("demo.txt"), size=4, content_hash="hash")
 
     async def fake_upload_to_minio(*_args, **_kwargs) -> str:
         calls["upload"] += 1
@@ -223,8 +230,8 @@ async def test_upload_file_read_only_kb_fails_before_read_or_minio(monkeypatch):
         "_ensure_database_supports_documents",
         fake_ensure_database_supports_documents,
     )
-    monkeypatch.setattr(knowledge_router, "read_upload_with_limit", fake_read_upload_with_limit)
-    monkeypatch.setattr(knowledge_router, "aupload_file_to_minio", fake_upload_to_minio)
+    monkeypatch.setattr(knowledge_router, "spool_upload_with_hash", fake_spool_upload_with_hash)
+    monkeypatch.setattr(knowledge_router, "aupload_path_to_minio", fake_upload_to_minio)
 
     upload = UploadFile(filename="demo.txt", file=BytesIO(b"demo"))
 
@@ -235,6 +242,94 @@ async def test_upload_file_read_only_kb_fails_before_read_or_minio(monkeypatch):
     assert calls == {"read": 0, "upload": 0}
 
 
+async def test_upload_file_streams_large_file_with_bounded_memory(tmp_path, monkeypatch):
+    source = tmp_path / "large.txt"
+    block = bytes(range(256)) * 4096
+    expected_hash = hashlib.sha256()
+    with source.open("wb") as output:
+        for index in range(48):
+            chunk = block[index:] + block[:index]
+            expected_hash.update(chunk)
+            output.write(chunk)
+    uploaded = {}
+
+    async def fake_ensure_database_supports_documents(kb_id: str, operation: str) -> None:
+        return None
+
+    async def fake_file_existed_in_db(kb_id: str, content_hash: str) -> bool:
+        return False
+
+    async def fake_get_same_name_files(kb_id: str, filename: str) -> list:
+        return []
+
+    async def fake_upload_path(bucket_name: str, object_name: str, file_path: Path) -> str:
+        # 模拟分片上传：按块读取临时文件，不整体载入内存
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as spooled:
+            while part := spooled.read(1024 * 1024):
+                digest.update(part)
+        uploaded.update(path=Path(file_path), digest=digest.hexdigest())
+        return f"http://minio/{bucket_name}/{object_name}"
+
+    monkeypatch.setattr(
+        knowledge_router, "_ensure_database_supports_documents", fake_ensure_database_supports_documents
+    )
+    monkeypatch.setattr(knowledge_router.knowledge_base, "file_existed_in_db", fake_file_existed_in_db)
+    monkeypatch.setattr(knowledge_router.knowledge_base, "get_same_name_files", fake_get_same_name_files)
+    monkeypatch.setattr(knowledge_router, "aupload_path_to_minio", fake_upload_path)
+
+    with source.open("rb") as body:
+        upload = UploadFile(filename="large.txt", file=body)
+        tracemalloc.start()
+        try:
+            result = await knowledge_router.upload_file(upload, kb_id="kb_1", current_user=SimpleNamespace(uid="u1"))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    assert result["size"] == source.stat().st_size == 48 * 1024 * 1024
+    assert result["content_hash"] == expected_hash.hexdigest() == uploaded["digest"]
+    assert peak < 8 * 1024 * 1024
+    assert not uploaded["path"].exists()
+
+
+async def test_upload_file_duplicate_content_skips_minio_and_cleans_spool(monkeypatch):
+    spooled_paths: list[Path] = []
+
+    async def fake_ensure_database_supports_documents(kb_id: str, operation: str) -> None:
+        return None
+
+    async def fake_file_existed_in_db(kb_id: str, content_hash: str) -> bool:
+        assert content_hash == hashlib.sha256(b"same content").hexdigest()
+        return True
+
+    async def fake_upload_path(bucket_name: str, object_name: str, file_path: Path) -> str:
+        raise AssertionError("duplicate upload must not reach MinIO")
+
+    original_spool = knowledge_router.spool_upload_with_hash
+
+    @asynccontextmanager
+    async def tracking_spool(*args, **kwargs):
+        async with original_spool(*args, **kwargs) as spooled:
+            spooled_paths.append(spooled.path)
+            yield spooled
+
+    monkeypatch.setattr(
+        knowledge_router, "_ensure_database_supports_documents", fake_ensure_database_supports_documents
+    )
+    monkeypatch.setattr(knowledge_router.knowledge_base, "file_existed_in_db", fake_file_existed_in_db)
+    monkeypatch.setattr(knowledge_router, "aupload_path_to_minio", fake_upload_path)
+    monkeypatch.setattr(knowledge_router, "spool_upload_with_hash", tracking_spool)
+
+    upload = UploadFile(filename="demo.txt", file=BytesIO(b"same content"))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await knowledge_router.upload_file(upload, kb_id="kb_1", current_user=SimpleNamespace(uid="user_1"))
+
+    assert exc_info.value.status_code == 409
+    assert len(spooled_paths) == 1 and not spooled_paths[0].exists()
+
+
 async def test_markdown_endpoint_rejects_oversized_file(monkeypatch):
     monkeypatch.setattr(knowledge_router, "MAX_UPLOAD_SIZE_BYTES", 5)
     upload = UploadFile(filename="demo.txt", file=BytesIO(b"123456"))
@@ -710,3 +805,39 @@ async def test_add_uploaded_documents_creates_records_without_task(monkeypatch):
         },
         "operator_id": "uid-user",
     }
+
+
+async def test_file_filter_migration_task_reports_migrated_rows(monkeypatch):
+    captured = {}
+
+    class ProgressContext(FakeTaskContext):
+        async def set_progress(self, progress: float, message: str | None = None) -> None:
+            captured.setdefault("progress", []).append((progress, message))
+
+    async def fake_get_database_info(kb_id: str) -> KnowledgeBaseDetail:
+        return _database_detail()
+
+    async def fake_migrate_file_filter_schema(kb_id: str) -> dict:
+        return {
+            "status": "migrated",
+            "copied": 120,
+            "replayed_files": 2,
+            "replayed": 7,
+            "elapsed_seconds": 1.5,
+        }
+
+    async def fake_enqueue_unique_by_payload(**kwargs):
+        context = ProgressContext()
+        captured["result"] = await kwargs["coroutine"](context)
+        captured["task_result"] = context.result
+        return SimpleNamespace(id="task_1"), True
+
+    monkeypatch.setattr(knowledge_router.knowledge_base, "get_database_info", fake_get_database_info)
+    monkeypatch.setattr(knowledge_router.knowledge_base, "migrate_file_filter_schema", fake_migrate_file_filter_schema)
+    monkeypatch.setattr(knowledge_router.tasker, "enqueue_unique_by_payload", fake_enqueue_unique_by_payload)
+
+    result = await knowledge_router.migrate_knowledge_base_file_filter("kb_1", current_user=SimpleNamespace(uid="u"))
+
+    assert result["task_id"] == "task_1"
+    assert captured["task_result"] == captured["result"]
+    assert captured["progress"][-1] == (100.0, "迁移完成：复制 120 个 chunk，重放 7 个迁移期间写入的 chunk")
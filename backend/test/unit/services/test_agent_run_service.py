@@ -437,7 +437,6 @@ async def test_stream_agent_run_events_reads_redis_and_ends_on_end_event(monkeyp
     monkeypatch.setattr(agent_run_service.pg_manager, "get_async_session_context", fake_session_ctx)
     monkeypatch.setattr(agent_run_service, "AgentRunRepository", Repo)
     monkeypatch.setattr(agent_run_service, "list_run_stream_events", fake_list_events)
-    monkeypatch.setattr(agent_run_service, "SSE_POLL_INTERVAL_SECONDS", 0)
 
     chunks = []
     async for chunk in agent_run_service.stream_agent_run_events(
@@ -453,6 +452,74 @@ async def test_stream_agent_run_events_reads_redis_and_ends_on_end_event(monkeyp
     assert "id: 1700000000001-0" in chunks[-1]
 
 
+@pytest.mark.asyncio
+async def test_stream_agent_run_events_follows_live_run_with_single_db_read(monkeypatch: pytest.MonkeyPatch):
+    @asynccontextmanager
+    async def fake_session_ctx():
+        yield object()
+
+    db_reads = {"count": 0}
+
+    class Repo:
+        def __init__(self, db):
+            self.db = db
+
+        async def get_run_for_user(self, run_id: str, uid: str):
+            del run_id, uid
+            db_reads["count"] += 1
+            return SimpleNamespace(status="running", conversation_thread_id="thread-1")
+
+    async def fake_list_events(run_id: str, *, after_seq: str, limit: int):
+        del run_id, after_seq, limit
+        return []
+
+    def make_event(seq: str, event_type: str) -> dict:
+        return {
+            "seq": seq,
+            "event_type": event_type,
+            "payload": {"schema_version": 1, "run_id": "run-1", "event": event_type, "payload": {}},
+            "ts": None,
+        }
+
+    class FakeSubscription:
+        def __init__(self):
+            self.batches = [
+                [],
+                [make_event("1700000000000-0", "messages")],
+                [make_event("1700000000001-0", "end")],
+            ]
+
+        async def get(self, timeout: float | None = None):
+            del timeout
+            return self.batches.pop(0)
+
+    watched = []
+
+    class FakeMultiplexer:
+        @asynccontextmanager
+        async def watch(self, run_id: str, after_seq: str = "0-0"):
+            watched.append((run_id, after_seq))
+            yield FakeSubscription()
+
+    monkeypatch.setattr(agent_run_service.pg_manager, "get_async_session_context", fake_session_ctx)
+    monkeypatch.setattr(agent_run_service, "AgentRunRepository", Repo)
+    monkeypatch.setattr(agent_run_service, "list_run_stream_events", fake_list_events)
+    monkeypatch.setattr(agent_run_service, "get_run_event_multiplexer", lambda: FakeMultiplexer())
+
+    chunks = [
+        chunk
+        async for chunk in agent_run_service.stream_agent_run_events(
+            run_id="run-1",
+            after_seq="0",
+            current_uid="user-1",
+        )
+    ]
+
+    assert watched == [("run-1", "0-0")]
+    assert db_reads["count"] == 1
+    assert [chunk.split("\n", 1)[0] for chunk in chunks] == ["event: messages", "event: end"]
+
+
 @pytest.mark.asyncio
 async def test_stream_agent_run_events_compacts_verbose_false(monkeypatch: pytest.MonkeyPatch):
     @asynccontextmanager
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import yuxi.models.embed as embed_module
+from yuxi.models.embed import OtherEmbedding, close_embedding_http_clients
+from yuxi.models.embed_batching import (
+    AIMDConcurrencyController,
+    estimate_tokens,
+    pack_by_token_budget,
+    parse_retry_after,
+    render_prometheus,
+)
+
+pytestmark = pytest.mark.unit
+
+
+class _StubEmbeddingServer:
+    """最小 HTTP/1.1 keep-alive 服务，统计 TCP 连接数与并发请求数。"""
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.0,
+        fail_first: int = 0,
+        max_concurrent: int | None = None,
+        retry_after: str | None = None,
+    ):
+        self.latency = latency
+        self.fail_first = fail_first
+        # 超过 max_concurrent 个并发请求时返回 429
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.max_accepted_in_flight = 0
+        self.throttled = 0
+        self.inputs: list[list[str]] = []
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1/embeddings"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n")[1:] if ": " in line)
+                lowered = {key.lower(): value for key, value in headers.items()}
+                body = await reader.readexactly(int(lowered.get("content-length", "0")))
+                status, payload = await self._respond(json.loads(body))
+                data = json.dumps(payload).encode()
+                extra = f"Retry-After: {self.retry_after}\r\n" if status.startswith("429") and self.retry_after else ""
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n{extra}"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, payload: dict) -> tuple[str, dict]:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.max_concurrent is not None and self.in_flight > self.max_concurrent:
+                self.throttled += 1
+                return "429 Too Many Requests", {"error": "rate limited"}
+            self.max_accepted_in_flight = max(self.max_accepted_in_flight, self.in_flight)
+            self.inputs.append(payload["input"])
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return "503 Service Unavailable", {"error": "busy"}
+            return "200 OK", {"data": [{"embedding": [float(len(text)), 0.0]} for text in payload["input"]]}
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture(autouse=True)
+async def close_clients():
+    yield
+    await close_embedding_http_clients()
+
+
+async def test_aencode_reuses_pooled_connection():
+    async with _StubEmbeddingServer() as server:
+        model = OtherEmbedding(model="stub", base_url=server.url, api_key="key")
+
+        for text in ["a", "bb", "ccc", "dddd", "eeeee"]:
+            assert await model.aencode([text]) == [[float(len(text)), 0.0]]
+
+    assert server.requests == 5
+    assert server.connections == 1
+
+
+def test_client_of_previous_event_loop_is_closed_when_rebuilt():
+    async def encode_once() -> tuple[str, object]:
+        async with _StubEmbeddingServer() as server:
+            model = OtherEmbedding(model="stub", base_url=server.url, api_key="key")
+            await model.aencode(["a"])
+            return server.url, embed_module._async_http_clients[server.url][1]
+
+    url, stale = asyncio.run(encode_once())
+    assert not stale.is_closed
+
+    async def rebuild():
+        client = await embed_module._get_async_http_client(url)
+        await close_embedding_http_clients()
+        return client
+
+    rebuilt = asyncio.run(rebuild())
+    assert rebuilt is not stale
+    assert stale.is_closed
+
+
+async def test_abatch_encode_dispatches_batches_concurrently_in_order():
+    messages = [f"message-{index:0{index % 4 + 1}d}" for index in range(16)]
+    async with _StubEmbeddingServer(latency=0.1) as server:
+        model = OtherEmbedding(model="stub", base_url=server.url, api_key="key", max_concurrency=4)
+
+        started = time.perf_counter()
+        embeddings = await model.abatch_encode(messages, batch_size=2)
+        elapsed = time.perf_counter() - started
+
+    assert embeddings == [[float(len(text)), 0.0] for text in messages]
+    assert server.requests == 8
+    assert server.max_in_flight == 4
+    assert server.connections <= 4
+    # 8 个批次、并发 4：约 2 轮延迟，串行需要约 8 轮。
+    assert elapsed < 0.5
+
+
+async def test_abatch_encode_keeps_retry_semantics(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(embed_module.asyncio, "sleep", fake_sleep)
+    async with _StubEmbeddingServer(fail_first=1) as server:
+        model = OtherEmbedding(model="stub", base_url=server.url, api_key="key", max_concurrency=1)
+
+        embeddings = await model.abatch_encode(["a", "bb", "ccc"], batch_size=1)
+
+    assert embeddings == [[1.0, 0.0], [2.0, 0.0], [3.0, 0.0]]
+    assert server.requests == 4
+    assert sleeps == [1.0]
+
+
+async def test_abatch_encode_cancels_pending_batches_on_failure():
+    model = OtherEmbedding(model="stub", base_url="http://127.0.0.1:1/v1/embeddings", api_key="key", max_concurrency=2)
+    cancelled = []
+
+    async def fake_aencode(group):
+        if group == ["a"]:
+            raise ValueError("boom")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(group)
+            raise
+        return [[0.0] for _ in group]
+
+    model.aencode = fake_aencode
+
+    with pytest.raises(ValueError, match="boom"):
+        await asyncio.wait_for(model.abatch_encode(["a", "b", "c"], batch_size=1), timeout=1)
+
+    assert ["b"] in cancelled
+
+
+async def test_aimd_window_backs_off_under_throttling_stub():
+    messages = [f"m{index}" for index in range(40)]
+    async with _StubEmbeddingServer(latency=0.02, max_concurrent=2, retry_after="0.01") as server:
+        model = OtherEmbedding(model="stub-aimd", base_url=server.url, api_key="key", max_concurrency=8)
+
+        embeddings = await model.abatch_encode(messages, batch_size=1)
+        stats = model.concurrency.get_stats()
+
+    assert embeddings == [[float(len(text)), 0.0] for text in messages]
+    assert server.max_accepted_in_flight <= 2
+    assert stats["throttled"] == server.throttled > 0
+    assert stats["decreases"] >= 1 and stats["window"] < 8
+    # 同一轮拥塞只减窗一次；窗口收缩后限流次数远少于请求数
+    assert stats["decreases"] <= server.throttled < len(messages)
+    assert stats["in_flight"] == 0
+    assert f'yuxi_embedding_concurrency_window{{endpoint="stub-aimd@{model.base_url}"}}' in render_prometheus()
+
+
+async def test_aimd_window_grows_additively_and_retry_after_pauses_dispatch():
+    controller = AIMDConcurrencyController("unit", max_window=8)
+    started_at = await controller.acquire()
+    controller.on_throttle(started_at, retry_after=0.1)
+    controller.on_throttle(started_at, retry_after=0.1)
+    controller.release()
+    assert controller.window == 4 and controller.decreases == 1
+
+    blocked_at = time.perf_counter()
+    async with controller.slot():
+        assert time.perf_counter() - blocked_at >= 0.09
+
+    for _ in range(4):
+        controller.on_success()
+    assert controller.window == pytest.approx(5.0, abs=0.1)
+    assert controller.limit == 4
+
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+async def test_woken_waiter_cancelled_before_resuming_hands_slot_on():
+    controller = AIMDConcurrencyController("unit-cancel", max_window=1)
+    await controller.acquire()
+    first = asyncio.create_task(controller.acquire())
+    second = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    assert controller.get_stats()["waiting"] == 2
+
+    # first 已被唤醒，但在恢复执行前被取消
+    controller.release()
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    await asyncio.wait_for(second, timeout=1)
+    assert controller.in_flight == 1 and controller.get_stats()["waiting"] == 0
+
+
+async def test_rate_limit_spaces_requests_after_burst():
+    controller = AIMDConcurrencyController("unit-rate", max_window=8, max_rate=50, burst=2)
+
+    async def request() -> float:
+        async with controller.slot() as started_at:
+            return started_at
+
+    started = sorted(await asyncio.gather(*(request() for _ in range(6))))
+
+    # 前 2 个请求为突发额度，之后按 50 次/秒（间隔 20ms）派发
+    assert started[1] - started[0] < 0.01
+    assert started[-1] - started[0] >= 4 * 0.02 * 0.9
+    assert controller.get_stats()["max_rate"] == 50
+
+
+async def test_abatch_encode_packs_batches_by_token_budget():
+    short = ["短句"] * 6
+    long = ["长" * 30]
+    messages = short[:3] + long + short[3:]
+    async with _StubEmbeddingServer() as server:
+        model = OtherEmbedding(model="stub", base_url=server.url, api_key="key", batch_size=4, max_batch_tokens=10)
+
+        embeddings = await model.abatch_encode(messages)
+
+    assert embeddings == [[float(len(text)), 0.0] for text in messages]
+    # 3 条短句共 9 token；超长文本独占一批；其余短句按条数上限 4 打包
+    assert sorted(server.inputs, key=len) == [long, short[:3], short[3:]]
+    assert pack_by_token_budget(messages, max_tokens=10, max_items=4) == [(0, 3), (3, 4), (4, 7)]
+    assert estimate_tokens("短句") == 3 and estimate_tokens("abcdefgh") == 3
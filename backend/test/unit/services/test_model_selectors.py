@@ -404,11 +404,13 @@ async def test_embedding_async_400_logs_warning(monkeypatch):
     )
 
     class FakeAsyncClient:
-        async def __aenter__(self):
-            return self
+        is_closed = False
 
-        async def __aexit__(self, exc_type, exc_val, exc_tb):
-            return False
+        def __init__(self, **_kwargs):
+            pass
+
+        async def aclose(self):
+            pass
 
         async def post(self, url, **_kwargs):
             request = httpx.Request("POST", url)
@@ -447,11 +449,13 @@ async def test_embedding_async_429_retries_ten_times_before_success(monkeypatch)
     responses = [_httpx_embedding_response(429) for _ in range(10)] + [success]
 
     class FakeAsyncClient:
-        async def __aenter__(self):
-            return self
+        is_closed = False
+
+        def __init__(self, **_kwargs):
+            pass
 
-        async def __aexit__(self, exc_type, exc_val, exc_tb):
-            return False
+        async def aclose(self):
+            pass
 
         async def post(self, *_args, **_kwargs):
             return responses.pop(0)
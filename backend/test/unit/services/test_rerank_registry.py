@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from aiohttp import web
+
+from yuxi.models import rerank as rerank_module
+from yuxi.models.providers.cache import ModelInfo
+from yuxi.models.rerank import OpenAIReranker, RerankerRegistry, RerankerUnavailableError
+
+BATCH_LATENCY = 0.05
+
+
+class StubRerankServer:
+    """本地 rerank 桩服务：每次请求固定延迟，分数为文档中的数字，可切换为返回 500。"""
+
+    def __init__(self):
+        self.requests = 0
+        self.peers: set = set()
+        self.healthy = True
+        self.runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(BATCH_LATENCY)
+        if not self.healthy:
+            return web.json_response({"error": "unavailable"}, status=500)
+        payload = await request.json()
+        results = [
+            {"index": index, "relevance_score": float(document.split()[-1])}
+            for index, document in enumerate(payload["documents"])
+        ]
+        # 服务端按分数排序返回，客户端需要按 index 还原顺序
+        results.sort(key=lambda item: item["relevance_score"], reverse=True)
+        return web.json_response({"results": results})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/rerank", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/rerank"
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+@pytest.fixture
+async def stub_server():
+    server = StubRerankServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+
+def _documents(count: int) -> list[str]:
+    return [f"doc {index}" for index in range(count)]
+
+
+def _install_model(monkeypatch, url: str, api_key: str = "test-key") -> None:
+    info = ModelInfo(
+        provider_id="stub",
+        model_id="stub-rerank",
+        model_type="rerank",
+        display_name="Stub rerank",
+        api_key=api_key,
+        base_url=url,
+        provider_type="openai",
+    )
+    monkeypatch.setattr(
+        rerank_module.model_cache, "get_model_info", lambda spec: info if spec == "stub:rerank" else None
+    )
+
+
+async def test_batches_are_scored_concurrently_in_input_order(stub_server):
+    reranker = OpenAIReranker(model_name="stub", api_key="k", base_url=stub_server.url, max_concurrency=4)
+    try:
+        started_at = time.monotonic()
+        scores = await reranker.acompute_score(["q", _documents(16)], batch_size=2, normalize=False)
+        elapsed = time.monotonic() - started_at
+    finally:
+        await reranker.aclose()
+
+    assert scores == [float(index) for index in range(16)]
+    assert stub_server.requests == 8
+    # 8 个批次、并发 4：约 2 轮延迟，顺序执行需要 8 轮
+    assert elapsed < BATCH_LATENCY * 8 * 0.6
+
+
+async def test_registry_reuses_one_pooled_session_per_spec(stub_server, monkeypatch):
+    _install_model(monkeypatch, stub_server.url)
+    registry = RerankerRegistry()
+
+    reranker = registry.get("stub:rerank")
+    for _ in range(5):
+        assert registry.get("stub:rerank") is reranker
+        await reranker.acompute_score(["q", _documents(2)], normalize=False)
+    session = reranker.session
+
+    assert stub_server.requests == 5
+    assert len(stub_server.peers) == 1
+    assert session is not None and not session.closed
+
+    # 配置变化时按新配置重建实例
+    _install_model(monkeypatch, stub_server.url, api_key="rotated-key")
+    rebuilt = registry.get("stub:rerank")
+    assert rebuilt is not reranker
+    assert rebuilt.api_key == "rotated-key"
+
+    await rebuilt.acompute_score(["q", _documents(2)], normalize=False)
+    await registry.aclose()
+    await asyncio.sleep(0)
+    assert session.closed
+    assert rebuilt.session.closed
+
+
+def test_session_of_previous_event_loop_is_closed_when_rebuilt():
+    reranker = OpenAIReranker(model_name="stub", api_key="k", base_url="http://127.0.0.1:9/rerank")
+
+    async def current_session():
+        await reranker._ensure_session()
+        return reranker.session
+
+    # 旧循环已关闭
+    first = asyncio.run(current_session())
+    second = asyncio.run(current_session())
+    assert second is not first
+    assert first.closed and not second.closed
+
+    # 旧循环仍在其他线程中运行
+    thread_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=thread_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        third = asyncio.run_coroutine_threadsafe(current_session(), thread_loop).result(timeout=5)
+        assert second.closed
+        fourth = asyncio.run(current_session())
+        deadline = time.monotonic() + 5
+        while not third.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert third.closed and not fourth.closed
+    finally:
+        thread_loop.call_soon_threadsafe(thread_loop.stop)
+        thread.join(timeout=5)
+        thread_loop.close()
+    asyncio.run(reranker.aclose())
+
+
+async def test_circuit_breaker_skips_unhealthy_backend_and_recovers(stub_server):
+    reranker = OpenAIReranker(model_name="stub", api_key="k", base_url=stub_server.url)
+    reranker.circuit_breaker = rerank_module.RerankCircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+    stub_server.healthy = False
+
+    try:
+        for _ in range(2):
+            with pytest.raises(RerankerUnavailableError, match="request failed"):
+                await reranker.acompute_score(["q", _documents(4)], batch_size=2)
+        assert reranker.circuit_breaker.state == "open"
+        requests_when_opened = stub_server.requests
+
+        with pytest.raises(RerankerUnavailableError, match="unhealthy"):
+            await reranker.acompute_score(["q", _documents(4)], batch_size=2)
+        assert stub_server.requests == requests_when_opened
+
+        stub_server.healthy = True
+        await asyncio.sleep(0.25)
+        assert reranker.circuit_breaker.state == "half-open"
+        scores = await reranker.acompute_score(["q", _documents(4)], batch_size=2, normalize=False)
+    finally:
+        await reranker.aclose()
+
+    assert scores == [0.0, 1.0, 2.0, 3.0]
+    assert reranker.circuit_breaker.state == "closed"
+
+
+async def test_cancelled_half_open_probe_releases_circuit_breaker(stub_server):
+    reranker = OpenAIReranker(model_name="stub", api_key="k", base_url=stub_server.url)
+    breaker = reranker.circuit_breaker = rerank_module.RerankCircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+
+    try:
+        probe = asyncio.create_task(reranker.acompute_score(["q", _documents(4)], batch_size=2, normalize=False))
+        await asyncio.sleep(BATCH_LATENCY / 2)
+        assert breaker._probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # 被取消的探测不计成功也不计失败，下一次请求可以重新探测
+        assert breaker.state == "half-open" and breaker.allow_request()
+        breaker.release_probe()
+        scores = await reranker.acompute_score(["q", _documents(4)], batch_size=2, normalize=False)
+    finally:
+        await reranker.aclose()
+
+    assert scores == [0.0, 1.0, 2.0, 3.0]
+    assert breaker.state == "closed"
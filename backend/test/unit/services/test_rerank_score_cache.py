@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import pytest
+import yuxi.models.rerank_cache as cache_module
+import yuxi.storage.redis.fallback as redis_fallback_module
+from yuxi.models.rerank import OpenAIReranker
+from yuxi.models.rerank_cache import RerankScoreCache
+
+pytestmark = pytest.mark.unit
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    async def mget(self, keys: list[str]):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis: _FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key: str, value: str, *, ex: int):
+        self.commands.append((key, value, ex))
+
+    async def execute(self):
+        for key, value, ex in self.commands:
+            self.redis.data[key] = value
+            self.redis.expires[key] = ex
+
+
+async def _async_value(value):
+    return value
+
+
+def _reranker(cache: RerankScoreCache) -> tuple[OpenAIReranker, list[list[str]]]:
+    """分数为文档末尾的数字，记录每次发给后端的文档。"""
+    reranker = OpenAIReranker(model_name="stub", api_key="k", base_url="http://rerank.local/v1/rerank")
+    reranker.score_cache = cache
+    sent: list[list[str]] = []
+
+    async def fake_batch_rerank(query, documents, max_length):
+        sent.append(list(documents))
+        return [float(document.split()[-1]) for document in documents]
+
+    async def no_session():
+        return None
+
+    reranker._batch_rerank = fake_batch_rerank
+    reranker._ensure_session = no_session
+    return reranker, sent
+
+
+@pytest.mark.asyncio
+async def test_only_uncached_pairs_are_sent_and_merged_in_order():
+    cache = RerankScoreCache(redis_enabled=False)
+    reranker, sent = _reranker(cache)
+
+    await reranker.acompute_score(["query", ["doc 1", "doc 2"]], normalize=False, chunk_ids=["c1", "c2"])
+    scores = await reranker.acompute_score(
+        ["query", ["doc 3", "doc 1", "doc 2", "doc 4"]], normalize=False, chunk_ids=["c3", "c1", "c2", "c4"]
+    )
+
+    assert scores == [3.0, 1.0, 2.0, 4.0]
+    assert sent == [["doc 1", "doc 2"], ["doc 3", "doc 4"]]
+    stats = cache.get_stats()
+    assert (stats["local_hits"], stats["misses"]) == (2, 4)
+    assert stats["hit_ratio"] == pytest.approx(2 / 6)
+
+
+@pytest.mark.asyncio
+async def test_query_text_and_scoring_settings_are_part_of_the_key():
+    cache = RerankScoreCache(redis_enabled=False)
+    reranker, sent = _reranker(cache)
+
+    await reranker.acompute_score(["query", ["doc 1"]], normalize=False, chunk_ids=["c1"])
+    await reranker.acompute_score(["Query", ["doc 1"]], normalize=False, chunk_ids=["c1"])
+    await reranker.acompute_score(["query ", ["doc 1"]], normalize=False, chunk_ids=["c1"])
+    await reranker.acompute_score(["query", ["doc 1"]], max_length=128, normalize=False, chunk_ids=["c1"])
+    reranker.parameters = {"instruct": "other"}
+    await reranker.acompute_score(["query", ["doc 1"]], normalize=False, chunk_ids=["c1"])
+    await reranker.acompute_score(["query", ["doc 1"]], normalize=False, chunk_ids=["c1"])
+
+    assert len(sent) == 5
+    assert cache.get_stats()["local_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_changed_content_or_missing_chunk_id_is_rescored():
+    cache = RerankScoreCache(redis_enabled=False)
+    reranker, sent = _reranker(cache)
+
+    await reranker.acompute_score(["q", ["doc 1", "doc 2"]], normalize=False, chunk_ids=["c1", None])
+    scores = await reranker.acompute_score(["q", ["doc 5", "doc 2"]], normalize=False, chunk_ids=["c1", None])
+    normalized = await reranker.acompute_score(["q", ["doc 5"]], chunk_ids=["c1"])
+
+    assert scores == [5.0, 2.0]
+    assert sent == [["doc 1", "doc 2"], ["doc 5", "doc 2"]]
+    # 缓存保存原始分数，归一化在合并后进行
+    assert normalized[0] == pytest.approx(1 / (1 + 2.718281828459045**-5))
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_processes(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", lambda: _async_value(redis))
+
+    first, first_sent = _reranker(RerankScoreCache(ttl_seconds=60))
+    await first.acompute_score(["q", ["doc 1", "doc 2"]], normalize=False, chunk_ids=["c1", "c2"])
+
+    other_cache = RerankScoreCache(ttl_seconds=60)
+    other, other_sent = _reranker(other_cache)
+    scores = await other.acompute_score(["q", ["doc 2", "doc 1"]], normalize=False, chunk_ids=["c2", "c1"])
+
+    assert scores == [2.0, 1.0]
+    assert other_sent == []
+    assert other_cache.get_stats()["redis_hits"] == 2
+    assert len(redis.data) == 2
+    assert all(key.startswith(cache_module.RERANK_SCORE_CACHE_KEY_PREFIX) for key in redis.data)
+    assert set(redis.expires.values()) == {60}
+
+
+@pytest.mark.asyncio
+async def test_local_tier_evicts_least_recently_used():
+    cache = RerankScoreCache(max_entries=2, redis_enabled=False)
+    reranker, sent = _reranker(cache)
+
+    for doc, chunk_id in [("doc 1", "a"), ("doc 2", "b"), ("doc 1", "a"), ("doc 3", "c"), ("doc 2", "b")]:
+        await reranker.acompute_score(["q", [doc]], normalize=False, chunk_ids=[chunk_id])
+
+    assert sent == [["doc 1"], ["doc 2"], ["doc 3"], ["doc 2"]]
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_is_bypassed_until_retry(monkeypatch):
+    calls = 0
+
+    async def failing_redis():
+        nonlocal calls
+        calls += 1
+        raise RuntimeError("redis down")
+
+    monkeypatch.setattr(redis_fallback_module, "get_async_redis_client", failing_redis)
+    cache = RerankScoreCache()
+    reranker, sent = _reranker(cache)
+
+    await reranker.acompute_score(["q", ["doc 1"]], normalize=False, chunk_ids=["c1"])
+    scores = await reranker.acompute_score(["q", ["doc 1", "doc 2"]], normalize=False, chunk_ids=["c1", "c2"])
+
+    assert scores == [1.0, 2.0]
+    assert sent == [["doc 1"], ["doc 2"]]
+    # 首次连接失败后进入冷却期，后续读写都不再访问 Redis
+    assert calls == 1
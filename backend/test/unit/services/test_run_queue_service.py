@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+
 import pytest
 import yuxi.services.run_queue_service as run_queue_service
 
@@ -8,14 +10,39 @@ class _FakeStreamRedis:
     def __init__(self):
         self.streams: dict[str, list[tuple[str, dict[str, str]]]] = {}
         self.expire_calls: list[tuple[str, int]] = []
+        self.xread_calls = 0
+        self._appended = asyncio.Event()
 
     async def xadd(self, key: str, fields: dict[str, str], **kwargs):
         del kwargs
         stream = self.streams.setdefault(key, [])
         event_id = f"{1700000000000 + len(stream)}-0"
         stream.append((event_id, dict(fields)))
+        self._appended.set()
         return event_id
 
+    async def xread(self, streams: dict[str, str], count: int, block: int):
+        self.xread_calls += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + block / 1000
+        while True:
+            rows = []
+            for key, cursor in streams.items():
+                entries = [(event_id, fields) for event_id, fields in self.streams.get(key, []) if event_id > cursor]
+                if entries:
+                    rows.append([key, entries[:count]])
+            remaining = deadline - loop.time()
+            if rows or remaining <= 0:
+                return rows
+            self._appended.clear()
+            try:
+                await asyncio.wait_for(self._appended.wait(), timeout=remaining)
+            except TimeoutError:
+                pass
+
+    async def aclose(self):
+        return None
+
     async def expire(self, key: str, ttl: int):
         self.expire_calls.append((key, ttl))
 
@@ -90,3 +117,80 @@ def test_normalize_after_seq_stream_id_only():
     assert run_queue_service.normalize_after_seq("1700000000000-3") == "1700000000000-3"
     assert run_queue_service.normalize_after_seq("12") == "0-0"
     assert run_queue_service.normalize_after_seq("bad-value") == "0-0"
+
+
+async def _fake_redis_factory(fake_redis: _FakeStreamRedis):
+    async def factory():
+        return fake_redis
+
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_run_event_multiplexer_fans_out_with_single_reader(monkeypatch: pytest.MonkeyPatch):
+    fake_redis = _FakeStreamRedis()
+
+    async def fake_get_async_redis_client():
+        return fake_redis
+
+    monkeypatch.setattr(run_queue_service, "get_async_redis_client", fake_get_async_redis_client)
+    multiplexer = run_queue_service.RunEventMultiplexer(await _fake_redis_factory(fake_redis))
+
+    seq1 = await run_queue_service.append_run_stream_event("run-a", "loading", {"n": 1})
+    try:
+        async with (
+            multiplexer.watch("run-a", "0-0") as from_start,
+            multiplexer.watch("run-a", seq1) as from_seq1,
+            multiplexer.watch("run-b", "0-0") as other_run,
+        ):
+            seq2 = await run_queue_service.append_run_stream_event("run-a", "loading", {"n": 2})
+            await run_queue_service.append_run_stream_event("run-b", "end", {})
+
+            first = await from_start.get(timeout=1)
+            while first[-1]["seq"] != seq2:
+                first += await from_start.get(timeout=1)
+            assert [event["seq"] for event in first] == [seq1, seq2]
+            assert [event["seq"] for event in await from_seq1.get(timeout=1)] == [seq2]
+            assert [event["event_type"] for event in await other_run.get(timeout=1)] == ["end"]
+            assert await from_seq1.get(timeout=0.05) == []
+            assert sorted(multiplexer.watched_run_ids) == ["run-a", "run-b"]
+        # 同一时刻只有一个阻塞 XREAD，调用次数与订阅者数量无关。
+        assert fake_redis.xread_calls == multiplexer.xread_calls
+    finally:
+        await multiplexer.close()
+    assert multiplexer.watched_run_ids == []
+
+
+@pytest.mark.asyncio
+async def test_run_event_multiplexer_fails_subscribers_on_redis_error():
+    class _BrokenRedis:
+        async def xread(self, streams, count, block):
+            del streams, count, block
+            raise ConnectionError("redis down")
+
+        async def aclose(self):
+            return None
+
+    async def factory():
+        return _BrokenRedis()
+
+    multiplexer = run_queue_service.RunEventMultiplexer(factory)
+    try:
+        async with multiplexer.watch("run-a") as subscription:
+            with pytest.raises(run_queue_service.RunEventStreamError) as exc_info:
+                await subscription.get(timeout=1)
+        assert exc_info.value.reason == "redis_error"
+    finally:
+        await multiplexer.close()
+
+
+def test_run_event_subscription_reports_lagging_when_queue_full(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(run_queue_service, "RUN_EVENTS_SUBSCRIBER_QUEUE_SIZE", 1)
+    subscription = run_queue_service.RunEventSubscription("run-a", "0-0")
+
+    subscription._deliver([{"seq": "1-0"}])
+    subscription._deliver([{"seq": "2-0"}])
+
+    with pytest.raises(run_queue_service.RunEventStreamError) as exc_info:
+        asyncio.run(subscription.get(timeout=0))
+    assert exc_info.value.reason == "lagging"
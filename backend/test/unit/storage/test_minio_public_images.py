@@ -19,6 +19,10 @@ class FakeMinio:
     def put_object(self, **kwargs):
         return object()
 
+    def fput_object(self, **kwargs):
+        self.fput_kwargs = kwargs
+        return object()
+
 
 def test_public_image_uses_same_origin_url_without_bucket_listing(monkeypatch):
     monkeypatch.setenv("MINIO_PUBLIC_URL", "/minio")
@@ -52,3 +56,21 @@ def test_legacy_public_minio_url_preserves_query_and_fragment(monkeypatch):
         normalize_public_minio_url("http://example.test:9000/public/avatar/user.png?v=123#preview")
         == "/minio/public/avatar/user.png?v=123#preview"
     )
+
+
+def test_upload_from_path_streams_with_multipart_settings(monkeypatch, tmp_path):
+    source = tmp_path / "report.pdf"
+    source.write_bytes(b"%PDF-1.7")
+    client = MinIOClient()
+    fake_minio = FakeMinio()
+    client._client = fake_minio
+
+    result = client.upload_file_from_path(
+        "knowledgebases", "kb_1/upload/report.pdf", source, part_size=8 * 1024 * 1024, num_parallel_uploads=6
+    )
+
+    assert result.url.endswith("/knowledgebases/kb_1/upload/report.pdf")
+    assert fake_minio.fput_kwargs["file_path"] == str(source)
+    assert fake_minio.fput_kwargs["content_type"] == "application/pdf"
+    assert fake_minio.fput_kwargs["part_size"] == 8 * 1024 * 1024
+    assert fake_minio.fput_kwargs["num_parallel_uploads"] == 6
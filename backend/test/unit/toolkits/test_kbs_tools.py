@@ -885,3 +885,58 @@ def _async_get_file_download(content: bytes, filename: str):
         }
 
     return _impl
+
+
+@pytest.mark.asyncio
+async def test_query_kb_multi_retrieves_all_queries_in_one_batch(monkeypatch) -> None:
+    batches = []
+
+    async def _retrieve_many(kb_id: str, queries: list[str], **options):
+        batches.append((kb_id, list(queries), options))
+        return [
+            KnowledgeBase.build_search_output(
+                kb_id, [{"content": f"{query} guide", "metadata": {"file_id": f"file-{index}"}}]
+            )
+            for index, query in enumerate(queries)
+        ]
+
+    manager = _patch_retrievers(monkeypatch)
+    manager.retrieve_many = _retrieve_many
+    monkeypatch.setattr(tools, "_resolve_visible_knowledge_bases_for_query", _fake_visible_kbs)
+
+    runtime = SimpleNamespace(context=SimpleNamespace())
+    result = await _run_tool(
+        _tool_callable(tools.query_kb_multi), kb_id="db-1", queries=["auth", " ", "billing "], runtime=runtime
+    )
+
+    assert batches == [("db-1", ["auth", "billing"], {})]
+    assert [item["query"] for item in result["queries"]] == ["auth", "billing"]
+    assert result["queries"][1]["results"][0]["content"] == "billing guide"
+    assert result["queries"][1]["results"][0]["file_id"] == "file-1"
+
+    denied = await _run_tool(_tool_callable(tools.query_kb_multi), kb_id="db-2", queries=["auth"], runtime=runtime)
+    assert denied == "知识库资源 'db-2' 不存在或当前会话未启用"
+
+
+@pytest.mark.asyncio
+async def test_query_kbs_defaults_to_all_visible_knowledge_bases(monkeypatch) -> None:
+    calls = []
+
+    async def _federated_retrieve(kb_ids: list[str], query: str, **options):
+        calls.append((list(kb_ids), query))
+        return {"query": query, "results": [], "kbs": {kb_id: {"status": "ok"} for kb_id in kb_ids}, "partial": False}
+
+    async def _two_visible_kbs(runtime):
+        return [{"kb_id": "db-1", "name": "FAQ"}, {"kb_id": "db-2", "name": "Guide"}]
+
+    manager = _patch_retrievers(monkeypatch)
+    manager.federated_retrieve = _federated_retrieve
+    monkeypatch.setattr(tools, "_resolve_visible_knowledge_bases_for_query", _two_visible_kbs)
+    runtime = SimpleNamespace(context=SimpleNamespace())
+
+    result = await _run_tool(_tool_callable(tools.query_kbs), query_text="auth", runtime=runtime)
+    assert calls == [(["db-1", "db-2"], "auth")]
+    assert set(result["kbs"]) == {"db-1", "db-2"}
+
+    denied = await _run_tool(_tool_callable(tools.query_kbs), query_text="auth", kb_ids=["db-3"], runtime=runtime)
+    assert denied == "知识库资源 'db-3' 不存在或当前会话未启用"
@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from yuxi.utils.prometheus import escape_label, format_labels, metric_header, render_lines
+
+
+def test_label_values_are_escaped() -> None:
+    assert escape_label('a\\b"c\nd') == 'a\\\\b\\"c\\nd'
+    assert format_labels(stage="embed", le=0.5) == '{stage="embed",le="0.5"}'
+    assert format_labels() == ""
+
+
+def test_exposition_lines_end_with_newline() -> None:
+    text = render_lines([*metric_header("yuxi_demo", "gauge", "Demo metric."), f"yuxi_demo{format_labels(k='v')} 1"])
+    assert text == '# HELP yuxi_demo Demo metric.\n# TYPE yuxi_demo gauge\nyuxi_demo{k="v"} 1\n'
@@ -39,6 +39,8 @@ export const TOOL_ICON_MAP = {
   open_kb_document: FileText,
   present_artifacts: FolderOutput,
   query_kb: BookOpen,
+  query_kb_multi: BookOpen,
+  query_kbs: BookOpen,
   read_file: FileText,
   replace: FilePen,
   run_shell_command: SquareTerminal,